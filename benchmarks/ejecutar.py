@@ -0,0 +1,284 @@
+"""
+Benchmarks del ETL: cada paso de TransformadorDatos y cada escritor de CargadorDatos por separado
+
+Para cada tamaño de datos se mide el tiempo (el mejor de varias repeticiones), el throughput en filas/s y el pico
+de memoria reservada durante el paso (con tracemalloc, en una ejecución aparte para no falsear los tiempos).
+tracemalloc ve la memoria de Python, NumPy y pandas, pero no la que pyarrow reserva con su propio asignador,
+así que en el escritor de Parquet el pico está subestimado.
+Los resultados se comparan con un baseline guardado y se marcan los pasos que se han vuelto más lentos.
+
+Uso:
+    python -m benchmarks.ejecutar --filas 10000 100000 1000000
+    python -m benchmarks.ejecutar --filas 100000 --guardar-baseline   # fija los resultados actuales como referencia
+
+El comando termina con código 1 si algún paso es más lento que el baseline más allá de la tolerancia.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src import TransformadorDatos, CargadorDatos
+from benchmarks.generador import generar_datos
+
+RUTA_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+MAX_FILAS_EXCEL = 1_048_576 - 1 # límite de filas de una hoja de Excel (menos la cabecera)
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS_PESADOS = ('pandas', 'numpy', 'pyarrow', 'requests', 'openpyxl')
+# importaciones que se miden: el paquete solo y las etapas de una ejecución normal con archivos locales
+IMPORTACIONES = {
+    'importar.src': 'import src',
+    'importar.etapas': 'from src import ExtractorDatos, TransformadorDatos, CargadorDatos',
+}
+
+
+def medir(funcion: Callable[[], Any], repeticiones: int = 3) -> Dict[str, float]:
+    """
+    Mide una función sin argumentos
+
+    Args:
+        funcion: Función a medir; debe preparar su propia entrada (ej. copiar el DataFrame) para que cada
+            repetición sea independiente
+        repeticiones: Número de ejecuciones cronometradas; se guarda la más rápida
+
+    Returns:
+        Diccionario con segundos y pico de memoria en MB
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    # La memoria se mide en una ejecución aparte porque tracemalloc hace más lento el código que observa
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'segundos': min(tiempos), 'pico_memoria_mb': pico / (1024 * 1024)}
+
+
+def _pasos_transformador(datos: pd.DataFrame) -> Dict[str, Callable[[], Any]]:
+    """Un benchmark por paso de la limpieza; la entrada de cada paso es la salida del anterior, preparada antes"""
+    transformador = TransformadorDatos()
+
+    con_nulos_tratados = datos.copy()
+    transformador._manejar_nulos(con_nulos_tratados)
+    normalizados = con_nulos_tratados.copy()
+    transformador._normalizar_strings(normalizados)
+    filtrados = transformador._filtrar_filas(normalizados)
+    limpios = transformador.limpiar_datos(datos)
+
+    return {
+        'transformador.manejar_nulos': lambda: transformador._manejar_nulos(datos.copy()),
+        'transformador.normalizar_strings': lambda: transformador._normalizar_strings(con_nulos_tratados.copy()),
+        'transformador.filtrar_filas': lambda: transformador._filtrar_filas(normalizados),
+        'transformador.convertir_tipos': lambda: transformador._convertir_tipos(filtrados.copy()),
+        'transformador.limpiar_datos': lambda: transformador.limpiar_datos(datos),
+        'transformador.agregar_columnas_calculadas': lambda: transformador.agregar_columnas_calculadas(limpios),
+    }
+
+
+def _escritores(limpios: pd.DataFrame) -> Dict[str, Callable[[], Any]]:
+    """Un benchmark por formato de salida"""
+    cargador = CargadorDatos()
+    escritores = {
+        'cargador.csv': lambda: cargador.guardar_como_csv(limpios, 'benchmark'),
+        'cargador.json': lambda: cargador.guardar_como_json(limpios, 'benchmark'),
+        'cargador.jsonl': lambda: cargador.guardar_como_json(limpios, 'benchmark', formato_json='lineas'),
+        'cargador.parquet': lambda: cargador.guardar_como_parquet(limpios, 'benchmark'),
+    }
+    if len(limpios) <= MAX_FILAS_EXCEL: # con más filas no cabe en una hoja
+        escritores['cargador.excel'] = lambda: cargador.guardar_como_excel(limpios, 'benchmark', streaming=False)
+    escritores['cargador.excel_streaming'] = lambda: cargador.guardar_como_excel(limpios, 'benchmark', streaming=True)
+    return escritores
+
+
+def medir_importacion(sentencia: str, repeticiones: int = 5) -> Dict[str, Any]:
+    """
+    Mide una importación en un intérprete nuevo (en el actual los módulos ya estarían cargados)
+
+    Cada repetición es un proceso aparte que arranca en una carpeta vacía, para ver también si la importación deja
+    archivos (ej. la carpeta logs).
+
+    Args:
+        sentencia: Código de la importación, ej. 'import src'
+        repeticiones: Procesos que se lanzan; se guarda el más rápido
+
+    Returns:
+        Diccionario con segundos, módulos pesados (MODULOS_PESADOS) que quedaron cargados y archivos creados
+    """
+    codigo = (f"import json, sys, time\ninicio = time.perf_counter()\n{sentencia}\nsegundos = time.perf_counter() - inicio\n"
+              f"print(json.dumps({{'segundos': segundos, 'modulos_pesados': [m for m in {MODULOS_PESADOS!r} if m in sys.modules]}}))")
+    entorno = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [RAIZ_PROYECTO, os.environ.get('PYTHONPATH')])))
+    mediciones = []
+    for _ in range(repeticiones):
+        directorio = tempfile.mkdtemp(prefix='benchmark_importacion_')
+        try:
+            salida = subprocess.run([sys.executable, '-c', codigo], cwd=directorio, env=entorno, capture_output=True,
+                                    text=True, check=True).stdout
+            medicion = json.loads(salida.strip().splitlines()[-1])
+            medicion['archivos_creados'] = sorted(os.listdir(directorio))
+            mediciones.append(medicion)
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    return min(mediciones, key=lambda medicion: medicion['segundos'])
+
+
+def ejecutar_benchmarks(tamanos: List[int], repeticiones: int = 3, semilla: int = 42,
+                        incluir_excel: bool = True) -> Dict[str, Any]:
+    """
+    Ejecuta todos los benchmarks para cada tamaño
+
+    Args:
+        tamanos: Números de filas de los datos sintéticos
+        repeticiones: Repeticiones cronometradas por benchmark
+        semilla: Semilla del generador de datos
+        incluir_excel: Si es False no se mide el escritor de Excel (es el más lento con diferencia)
+
+    Returns:
+        Diccionario con metadatos del entorno y resultados[tamaño][benchmark]; el tiempo de importación (no depende
+        del tamaño) va en resultados['importacion']
+    """
+    resultados = {'importacion': {}}
+    for nombre, sentencia in IMPORTACIONES.items(): # lo que paga cada ejecución corta antes de procesar la primera fila
+        medicion = medir_importacion(sentencia, repeticiones)
+        resultados['importacion'][nombre] = medicion
+        print(f"  {'importación':>16}  {nombre:<45} {medicion['segundos']:>9.4f} s  "
+              f"(módulos pesados: {', '.join(medicion['modulos_pesados']) or 'ninguno'})")
+
+    directorio_original = os.getcwd()
+    directorio_trabajo = tempfile.mkdtemp(prefix='benchmark_etl_') # los escritores guardan en data/processed relativo al directorio actual
+    os.chdir(directorio_trabajo)
+    try:
+        for n_filas in tamanos:
+            datos = generar_datos(n_filas, semilla=semilla)
+            benchmarks = _pasos_transformador(datos)
+            limpios = TransformadorDatos().limpiar_datos(datos)
+            benchmarks.update(_escritores(limpios))
+            if not incluir_excel:
+                benchmarks.pop('cargador.excel', None)
+                benchmarks.pop('cargador.excel_streaming', None)
+
+            resultados[str(n_filas)] = {}
+            for nombre, funcion in benchmarks.items():
+                medicion = medir(funcion, repeticiones)
+                medicion['filas_por_segundo'] = n_filas / medicion['segundos'] if medicion['segundos'] > 0 else None
+                resultados[str(n_filas)][nombre] = medicion
+                print(f"  {n_filas:>10} filas  {nombre:<45} {medicion['segundos']:>9.4f} s "
+                      f"{medicion['pico_memoria_mb']:>9.1f} MB")
+    finally:
+        os.chdir(directorio_original)
+        shutil.rmtree(directorio_trabajo, ignore_errors=True)
+
+    return {
+        'meta': {
+            'fecha': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeticiones': repeticiones,
+            'semilla': semilla,
+        },
+        'resultados': resultados,
+    }
+
+
+def comparar_con_baseline(actual: Dict[str, Any], baseline: Dict[str, Any], tolerancia: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Compara los tiempos con los del baseline
+
+    Args:
+        actual: Resultado de ejecutar_benchmarks
+        baseline: Resultado guardado anteriormente
+        tolerancia: Proporción de tiempo extra admitida antes de considerar una regresión (0.2 = 20% más lento)
+
+    Returns:
+        Lista con una entrada por benchmark presente en ambos: tamaño, nombre, segundos de cada uno, ratio y regresion
+    """
+    comparacion = []
+    for tamano, benchmarks in actual['resultados'].items():
+        for nombre, medicion in benchmarks.items():
+            referencia = baseline.get('resultados', {}).get(tamano, {}).get(nombre)
+            if not referencia or not referencia['segundos']:
+                continue
+            ratio = medicion['segundos'] / referencia['segundos']
+            comparacion.append({
+                'tamano': tamano,
+                'benchmark': nombre,
+                'segundos_baseline': referencia['segundos'],
+                'segundos': medicion['segundos'],
+                'ratio': ratio,
+                'regresion': ratio > 1 + tolerancia,
+            })
+    return comparacion
+
+
+def main(argumentos: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de los pasos del ETL")
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000], help="Tamaños a medir")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--sin-excel', action='store_true', help="No medir el escritor de Excel")
+    parser.add_argument('--baseline', default=RUTA_BASELINE, help="Archivo JSON con los resultados de referencia")
+    parser.add_argument('--guardar-baseline', action='store_true', help="Guardar los resultados como nuevo baseline")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Tiempo extra admitido (0.2 = 20%%)")
+    parser.add_argument('--salida', help="Guardar también los resultados de esta ejecución en este JSON")
+    args = parser.parse_args(argumentos)
+
+    logging.disable(logging.INFO) # el log de cada paso falsearía los tiempos (setLevel no basta: cada LoggerPersonalizado lo restablece)
+
+    print(f"Ejecutando benchmarks ({args.repeticiones} repeticiones, se guarda la más rápida)")
+    actual = ejecutar_benchmarks(args.filas, args.repeticiones, args.semilla, incluir_excel=not args.sin_excel)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(actual, f, indent=2)
+
+    if args.guardar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(actual, f, indent=2)
+        print(f"Baseline guardado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No hay baseline en {args.baseline}; usa --guardar-baseline para crearlo")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    comparacion = comparar_con_baseline(actual, baseline, args.tolerancia)
+    print(f"\nComparación con el baseline del {baseline['meta']['fecha']}:")
+    for fila in comparacion:
+        marca = "  ⚠️ REGRESIÓN" if fila['regresion'] else ""
+        print(f"  {fila['tamano']:>10} filas  {fila['benchmark']:<45} {fila['segundos_baseline']:>9.4f} s -> "
+              f"{fila['segundos']:>9.4f} s  (x{fila['ratio']:.2f}){marca}")
+
+    regresiones = [fila for fila in comparacion if fila['regresion']]
+    if regresiones:
+        print(f"\n❌ {len(regresiones)} benchmark(s) más lentos que el baseline (tolerancia {args.tolerancia:.0%})")
+        return 1
+    print("\n✅ Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Generador de datos sintéticos para los benchmarks del ETL
+
+Genera DataFrames con el mismo esquema que usa el pipeline (id, nombre, edad, ciudad, salario, fecha_ingreso)
+y con los mismos "problemas" que la limpieza tiene que resolver: nulos, filas duplicadas, edades inválidas
+y textos con mayúsculas y espacios mezclados. Con la misma semilla siempre se obtienen los mismos datos.
+
+Uso desde la línea de comandos (escribe el CSV por chunks, sirve para decenas de millones de filas):
+    python -m benchmarks.generador --filas 10000000 --salida data/raw/sinteticos.csv
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from typing import Iterator
+
+COLUMNAS = ['id', 'nombre', 'edad', 'ciudad', 'salario', 'fecha_ingreso']
+
+NOMBRES = ['Juan', 'María', 'Pedro', 'Ana', 'Luis', 'Carmen', 'José', 'Lucía', 'Javier', 'Elena',
+           'Carlos', 'Laura', 'Miguel', 'Sofía', 'Antonio', 'Isabel', 'Manuel', 'Paula', 'David', 'Marta']
+APELLIDOS = ['Pérez', 'García', 'López', 'Martínez', 'Sánchez', 'González', 'Rodríguez', 'Fernández',
+             'Gómez', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Navarro', 'Torres', 'Ruiz', 'Ramos']
+CIUDADES = ['Madrid', 'Barcelona', 'Valencia', 'Sevilla', 'Zaragoza', 'Málaga', 'Murcia', 'Palma',
+            'Bilbao', 'Alicante', 'Córdoba', 'Valladolid']
+
+FECHA_MINIMA = np.datetime64('2000-01-01')
+DIAS_RANGO_FECHAS = 25 * 365
+EDADES_INVALIDAS = np.array([-5, 0, 120, 150]) # valores que _filtrar_filas debe descartar
+
+
+def _variantes(textos) -> np.ndarray:
+    """Cada texto en cuatro formas que la normalización debe unificar (tal cual, mayúsculas, minúsculas, con espacios)"""
+    variantes = []
+    for texto in textos:
+        variantes.extend([texto, texto.upper(), texto.lower(), f"  {texto}  "])
+    return np.array(variantes, dtype=object)
+
+
+_VARIANTES_NOMBRES = _variantes([f"{nombre} {apellido}" for nombre in NOMBRES for apellido in APELLIDOS])
+_VARIANTES_CIUDADES = _variantes(CIUDADES)
+
+
+def generar_datos(n_filas: int, semilla: int = 42, proporcion_nulos: float = 0.05,
+                  proporcion_duplicados: float = 0.02, proporcion_edades_invalidas: float = 0.01,
+                  id_inicial: int = 1) -> pd.DataFrame:
+    """
+    Genera un DataFrame sintético con el esquema del pipeline
+
+    Args:
+        n_filas: Número de filas a generar (incluidas las duplicadas)
+        semilla: Semilla del generador aleatorio; con la misma semilla se obtienen los mismos datos
+        proporcion_nulos: Proporción de valores nulos en cada columna salvo id
+        proporcion_duplicados: Proporción de filas que son copia exacta de otra fila
+        proporcion_edades_invalidas: Proporción de edades fuera de rango (negativas, 0 o >= 120)
+        id_inicial: Primer id (para generar por partes sin repetir ids)
+
+    Returns:
+        DataFrame con las columnas de COLUMNAS
+    """
+    rng = np.random.default_rng(semilla)
+    n_duplicadas = int(round(n_filas * proporcion_duplicados))
+    n_unicas = n_filas - n_duplicadas
+
+    edad = rng.integers(18, 70, n_unicas).astype('float64') # float porque admite NaN, igual que al leer un CSV con nulos
+    invalidas = rng.random(n_unicas) < proporcion_edades_invalidas
+    edad[invalidas] = rng.choice(EDADES_INVALIDAS, int(invalidas.sum()))
+
+    dias = rng.integers(0, DIAS_RANGO_FECHAS, n_unicas)
+    datos = {
+        'id': np.arange(id_inicial, id_inicial + n_unicas, dtype='int64'),
+        'nombre': _VARIANTES_NOMBRES[rng.integers(0, len(_VARIANTES_NOMBRES), n_unicas)],
+        'edad': edad,
+        'ciudad': _VARIANTES_CIUDADES[rng.integers(0, len(_VARIANTES_CIUDADES), n_unicas)],
+        'salario': np.round(rng.uniform(15_000, 90_000, n_unicas), 2),
+        'fecha_ingreso': np.datetime_as_string(FECHA_MINIMA + dias.astype('timedelta64[D]'), unit='D').astype(object),
+    }
+
+    # Nulos: una máscara independiente por columna
+    for columna in COLUMNAS[1:]:
+        nulos = rng.random(n_unicas) < proporcion_nulos
+        if datos[columna].dtype == object:
+            datos[columna][nulos] = None
+        else:
+            datos[columna][nulos] = np.nan
+
+    df = pd.DataFrame(datos, columns=COLUMNAS)
+
+    # Duplicados: copias exactas de filas elegidas al azar, repartidas por todo el DataFrame
+    if n_duplicadas > 0 and n_unicas > 0:
+        copias = df.iloc[rng.integers(0, n_unicas, n_duplicadas)]
+        df = pd.concat([df, copias], ignore_index=True)
+        df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+    return df
+
+
+def generar_por_chunks(n_filas: int, tamano_chunk: int = 1_000_000, semilla: int = 42,
+                       **proporciones) -> Iterator[pd.DataFrame]:
+    """
+    Genera n_filas en DataFrames de como mucho tamano_chunk filas (para tamaños que no caben en memoria)
+
+    Cada chunk usa su propia semilla derivada de la semilla y del número de chunk, así que el resultado
+    es reproducible. Los ids son consecutivos entre chunks; los duplicados se generan dentro de cada chunk.
+
+    Args:
+        n_filas: Número total de filas
+        tamano_chunk: Número de filas por chunk
+        semilla: Semilla base
+        **proporciones: proporcion_nulos, proporcion_duplicados, proporcion_edades_invalidas
+
+    Yields:
+        DataFrames con el esquema de COLUMNAS
+    """
+    id_inicial = 1
+    for numero_chunk, inicio in enumerate(range(0, n_filas, tamano_chunk)):
+        filas = min(tamano_chunk, n_filas - inicio)
+        semilla_chunk = int(np.random.SeedSequence([semilla, numero_chunk]).generate_state(1)[0])
+        chunk = generar_datos(filas, semilla=semilla_chunk, id_inicial=id_inicial, **proporciones)
+        id_inicial += filas
+        yield chunk
+
+
+def escribir_csv(ruta: str, n_filas: int, tamano_chunk: int = 1_000_000, semilla: int = 42, **proporciones) -> str:
+    """
+    Escribe un CSV sintético chunk a chunk (la memoria usada depende de tamano_chunk, no de n_filas)
+
+    Args:
+        ruta: Ruta del CSV a crear
+        n_filas: Número total de filas
+        tamano_chunk: Número de filas por chunk
+        semilla: Semilla base
+        **proporciones: proporcion_nulos, proporcion_duplicados, proporcion_edades_invalidas
+
+    Returns:
+        Ruta del archivo creado
+    """
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+        for i, chunk in enumerate(generar_por_chunks(n_filas, tamano_chunk, semilla, **proporciones)):
+            chunk.to_csv(archivo, index=False, header=(i == 0))
+    return ruta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un CSV sintético con el esquema del ETL")
+    parser.add_argument('--filas', type=int, default=100_000, help="Número de filas")
+    parser.add_argument('--salida', default='data/raw/sinteticos.csv', help="Ruta del CSV de salida")
+    parser.add_argument('--chunk', type=int, default=1_000_000, help="Filas generadas en memoria a la vez")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--nulos', type=float, default=0.05, help="Proporción de nulos por columna")
+    parser.add_argument('--duplicados', type=float, default=0.02, help="Proporción de filas duplicadas")
+    parser.add_argument('--edades-invalidas', type=float, default=0.01, help="Proporción de edades fuera de rango")
+    args = parser.parse_args()
+
+    ruta = escribir_csv(args.salida, args.filas, args.chunk, args.semilla, proporcion_nulos=args.nulos,
+                        proporcion_duplicados=args.duplicados, proporcion_edades_invalidas=args.edades_invalidas)
+    print(f"✅ {args.filas} filas escritas en {ruta}")
@@ -15,53 +15,192 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 # os.path.join(...) combina ese directorio con 'src' para formar la ruta completa a la carpeta src.
 # Esto permite importar módulos desde src sin importar desde dónde se ejecute el script main.py. ahora con src en el path, podemos importar módulos desde esa carpeta directamente.
 
-from src import ExtractorDatos, TransformadorDatos, CargadorDatos #importamos las clases principales del paquete src para usarlas en el pipeline ETL.
-from src.logger import LoggerPersonalizado #importamos el logger personalizado para registrar eventos durante la ejecución del ETL. se importa diferente porque no es una clase principal del paquete src, sino una utilidad específica para logging.   
+import argparse #argparse permite leer opciones de la línea de comandos, por ejemplo: python main.py --entrada datos.csv --chunk 100000
+from src import ExtractorDatos, TransformadorDatos, CargadorDatos, Deduplicador, Pipeline, ejecutar_etl_por_chunks, ejecutar_etl_incremental #importamos las clases principales del paquete src para usarlas en el pipeline ETL.
+from src.cache import CacheDatos #caché por contenido: si la entrada no cambió se reutiliza el resultado anterior
+from src.transformador import VERSION_TRANSFORMACION
+from src.compresion import codec_de_ruta #códec (gzip, bz2, xz) según la extensión del archivo
+from src.esquema import EsquemaDatos #tipos compactos y columnas a leer (opcional)
+from src.reglas import ReglasDatos #filtros de validez y columnas calculadas declarados en JSON (opcional)
+from src.metricas import registro_metricas #registro global donde cada etapa decorada con manejar_error deja su tiempo, filas y memoria
+from src.logger import LoggerPersonalizado, activar_logging_asincrono #importamos el logger personalizado para registrar eventos durante la ejecución del ETL. se importa diferente porque no es una clase principal del paquete src, sino una utilidad específica para logging.   
 #una utilidad es una función o clase que proporciona funcionalidades auxiliares o de soporte para el programa principal. en este caso, LoggerPersonalizado es una utilidad para manejar el logging de manera consistente en todo el proyecto ETL.
 #pero se podría importar igual que las otras clases principales si se quisiera.
 
-def main(): #esta es la función principal que orquesta todo el proceso ETL (Extracción, Transformación, Carga).
-    """Función principal del ETL"""
+def main(ruta_entrada: str = None, tamano_chunk: int = None, n_procesos: int = None, memoria_mb: float = None,
+         ruta_esquema: str = None, marca_incremental: str = None, usar_cache: bool = False,
+         cache_mb: float = 1024, usar_plan: bool = False, columnas: list = None,
+         columnas_duplicados: list = None, estrategias_relleno: dict = None, ruta_sqlite: str = None,
+         compresion: str = None, hilos_compresion: int = 1, columnas_particion: list = None,
+         ruta_reglas: str = None): #esta es la función principal que orquesta todo el proceso ETL (Extracción, Transformación, Carga).
+    """
+    Función principal del ETL
+
+    Args:
+        ruta_entrada: Archivo CSV de entrada. Si es None se usan los datos de ejemplo
+        tamano_chunk: Si se indica (junto con ruta_entrada), el ETL se ejecuta por chunks de ese número de filas
+        n_procesos: Si se indica, la transformación se reparte en ese número de procesos
+        memoria_mb: Presupuesto de memoria de la limpieza; si se superaría, la limpieza se hace por partes
+        ruta_esquema: Archivo JSON con un EsquemaDatos (tipos compactos y columnas) para leer ruta_entrada
+        marca_incremental: 'id', 'fecha' u 'offset': solo se procesan los registros de ruta_entrada posteriores a la
+            marca de la ejecución anterior y se agregan a data/processed/{nombre del archivo}_procesados.*
+        usar_cache: Reutilizar (y guardar) en data/cache la lectura y la transformación de ruta_entrada
+        cache_mb: Tamaño máximo de la caché en MB
+        usar_plan: Ejecutar con Pipeline: los pasos se planifican antes de leer y las filas y columnas que se
+            descartarían no se llegan a acumular en memoria
+        columnas: Con usar_plan, columnas de la salida (el plan solo lee de ruta_entrada las que hacen falta)
+        columnas_duplicados: Columnas clave para eliminar duplicados (por defecto, filas completas). En modo
+            incremental las claves vistas se guardan y tampoco se repiten entre ejecuciones
+        estrategias_relleno: Columna numérica -> 'media', 'mediana' o 'moda' con que se rellenan sus nulos (por
+            defecto, media). En modo incremental siempre se usa la media acumulada de todas las ejecuciones
+        ruta_sqlite: Base de datos SQLite donde además se cargan los datos transformados (tabla datos, upsert por id),
+            para consultarlos con SQL. Cada ejecución agrega las filas nuevas y actualiza las que ya estaban
+        compresion: 'gzip', 'bz2' o 'xz': los datos raw y las salidas csv y json se escriben comprimidos. Las entradas
+            comprimidas (.gz, .bz2, .xz) se leen siempre, sin necesidad de indicarlo
+        hilos_compresion: Hilos que comprimen en paralelo bloques de las salidas comprimidas
+        columnas_particion: Columnas por las que además se guarda una salida parquet particionada al estilo Hive
+            (data/processed/{nombre}_particionado/ciudad=Madrid/...); al leerla con filtros sobre esas columnas solo se
+            abren los archivos de las particiones que pueden cumplirlos
+        ruta_reglas: Archivo JSON con unas ReglasDatos (filtros de validez y columnas calculadas) que sustituyen a
+            las de siempre (edad entre 0 y 120, salario positivo, categoria_edad y salario_anual)
+    """
     
     # Inicializar logger
     logger = LoggerPersonalizado().get_logger() #crea una instancia del logger personalizado y obtiene el logger configurado para registrar eventos durante la ejecución del ETL.
+    activar_logging_asincrono() #a partir de aquí la escritura en archivo y consola la hace un hilo en segundo plano
     logger.info("=" * 50) #registra una línea de separación en el log para mejorar la legibilidad. el =* 50 crea una cadena de 50 caracteres '='.
     logger.info("INICIANDO PIPELINE ETL") #registra un mensaje informativo indicando el inicio del pipeline ETL.
     logger.info(f"Fecha y hora: {datetime.now()}") #registra la fecha y hora actuales en el log.
     logger.info("=" * 50) #registra otra línea de separación en el log.
+    registro_metricas.reiniciar() #las métricas del reporte son solo de esta ejecución
     
     try:
-        # ========== 1. EXTRACCIÓN ==========
-        logger.info("\n🔍 FASE 1: EXTRACCIÓN") 
-        extractor = ExtractorDatos()
-        
-        # Opción 1: Descargar CSV público (descomentar para usar)
-        # url_ejemplo = "https://raw.githubusercontent.com/datasets/covid-19/master/data/time-series-19-covid-combined.csv"
-        # datos_crudos = extractor.descargar_csv_publico(url_ejemplo)
+        esquema = EsquemaDatos.cargar(ruta_esquema) if ruta_esquema else None
+        reglas = ReglasDatos.cargar(ruta_reglas) if ruta_reglas else None # None: las reglas por defecto
+        deduplicador = Deduplicador(columnas_duplicados) if columnas_duplicados else None # None: duplicados por fila completa
+
+        # ========== MODO INCREMENTAL ==========
+        # solo se procesa lo que llegó desde la última ejecución; las salidas tienen siempre el mismo nombre y van creciendo
+        if ruta_entrada and marca_incremental:
+            nombre_entrada = os.path.basename(ruta_entrada)
+            if codec_de_ruta(nombre_entrada): # datos.csv.gz -> datos
+                nombre_entrada = os.path.splitext(nombre_entrada)[0]
+            nombre_base = f"{os.path.splitext(nombre_entrada)[0]}_procesados"
+            logger.info(f"\n➕ MODO INCREMENTAL: marca '{marca_incremental}', salida {nombre_base}")
+            if columnas_duplicados: # las claves vistas se guardan para no repetirlas en las próximas ejecuciones
+                deduplicador = Deduplicador(columnas_duplicados, ruta=f"data/estado/{nombre_base}_duplicados.npz")
+            resultado = ejecutar_etl_incremental(ruta_entrada, nombre_base, marca=marca_incremental,
+                                                 tamano_chunk=tamano_chunk or 100_000, esquema=esquema,
+                                                 deduplicador=deduplicador, reglas=reglas)
+            logger.info(f"  • Registros nuevos: {resultado['registros_nuevos']} (marca {resultado['marca_anterior']} -> {resultado['marca_nueva']})")
+            for formato, ruta in resultado['archivos_generados'].items():
+                logger.info(f"  • {formato.upper()}: {ruta}")
+            resultado['metricas'] = registrar_reporte_metricas(logger, nombre_base)
+            return resultado
+
+        # ========== MODO PLAN ==========
+        # los pasos se declaran y el Pipeline decide cómo ejecutarlos: qué columnas leer y qué filas descartar al leer
+        if ruta_entrada and usar_plan:
+            fecha_procesamiento = datetime.now().strftime("%Y%m%d_%H%M%S")
+            nombre_base = f"datos_procesados_{fecha_procesamiento}"
+            plan = Pipeline(ruta_entrada, tamano_chunk=tamano_chunk or 100_000, esquema=esquema,
+                            transformador=TransformadorDatos(estrategias_relleno=estrategias_relleno, reglas=reglas))
+            plan = plan.limpiar(deduplicador=deduplicador).agregar_columnas_calculadas()
+            if columnas:
+                plan = plan.seleccionar(columnas)
+            logger.info(f"\n🧭 MODO PLAN:\n{plan.explicar()}")
+            datos_transformados = plan.ejecutar()
+            cargador = CargadorDatos(compresion=compresion, hilos_compresion=hilos_compresion)
+            rutas_guardadas = cargador.guardar_multiple_formatos(datos_transformados, nombre_base, paralelo=True,
+                                                                 fallar_si_error=True)
+            rutas_guardadas['perfil'] = cargador.guardar_perfil(datos_transformados, nombre_base)
+            if ruta_sqlite:
+                rutas_guardadas['sqlite'] = cargador.guardar_como_sqlite(datos_transformados, nombre_base, ruta=ruta_sqlite)
+            if columnas_particion:
+                rutas_guardadas['particionado'] = cargador.guardar_particionado(datos_transformados, f"{nombre_base}_particionado",
+                                                                                columnas_particion)
+            for formato, ruta in rutas_guardadas.items():
+                logger.info(f"  • {formato.upper()}: {ruta}")
+            return {'success': True, 'registros_procesados': len(datos_transformados), 'archivos_generados': rutas_guardadas,
+                    'metricas': registrar_reporte_metricas(logger, nombre_base)}
+
+        # ========== MODO STREAMING ==========
+        # con archivos grandes no se carga todo en memoria: cada chunk pasa por extracción, transformación y carga por separado
+        if ruta_entrada and tamano_chunk:
+            logger.info(f"\n🌊 MODO STREAMING: chunks de {tamano_chunk} filas")
+            fecha_procesamiento = datetime.now().strftime("%Y%m%d_%H%M%S")
+            nombre_base = f"datos_procesados_{fecha_procesamiento}"
+            resultado = ejecutar_etl_por_chunks(ruta_entrada, nombre_base, tamano_chunk=tamano_chunk, esquema=esquema,
+                                                deduplicador=deduplicador, estrategias_relleno=estrategias_relleno,
+                                                compresion=compresion, hilos_compresion=hilos_compresion, reglas=reglas)
+            logger.info("\n📁 ARCHIVOS GENERADOS:")
+            for formato, ruta in resultado['archivos_generados'].items():
+                logger.info(f"  • {formato.upper()}: {ruta}")
+            resultado['metricas'] = registrar_reporte_metricas(logger, nombre_base)
+            return resultado
+
+        # ========== CACHÉ ==========
+        # si el archivo de entrada y la configuración no cambiaron desde una ejecución anterior, el resultado de la
+        # transformación se toma de la caché y se saltan la extracción y la transformación
+        cache = CacheDatos(max_mb=cache_mb) if usar_cache and ruta_entrada else None
+        datos_transformados = None
+        if cache is not None:
+            clave_cache = cache.clave_archivo(ruta_entrada, 'transformacion', {
+                'version': VERSION_TRANSFORMACION,
+                'esquema': esquema.a_dict() if esquema else None,
+                'duplicados': columnas_duplicados,
+                'relleno': estrategias_relleno,
+                'reglas': reglas.a_dict() if reglas else None,
+                'paralelo': bool(n_procesos), # el resultado es el mismo, pero el orden de las categorías puede variar
+            })
+            datos_transformados = cache.obtener(clave_cache)
+        transformador = TransformadorDatos(estrategias_relleno=estrategias_relleno, reglas=reglas)
+
+        if datos_transformados is not None:
+            logger.info("\n⚡ Datos transformados tomados de la caché: se omiten la extracción y la transformación")
+        else:
+            # ========== 1. EXTRACCIÓN ==========
+            logger.info("\n🔍 FASE 1: EXTRACCIÓN") 
+            extractor = ExtractorDatos(cache) #con caché, una lectura idéntica a una anterior se toma de ahí
         
-        # Opción 2: Usar datos de ejemplo (para practicar)
-        datos_crudos = extractor.descargar_csv_publico("nourl") #la funcion aqui ya lee el csv y retorna un dataframe. 
+            # Opción 1: Descargar CSV público (descomentar para usar)
+            # url_ejemplo = "https://raw.githubusercontent.com/datasets/covid-19/master/data/time-series-19-covid-combined.csv"
+            # datos_crudos = extractor.descargar_csv_publico(url_ejemplo)
         
-        # Guardar datos raw
-        extractor.guardar_raw(datos_crudos, "datos_originales") # guarda los datos crudos en formato CSV en la carpeta data/raw con el nombre "datos_originales.csv"., se le pasa el dataframe y el nombre del archivo sin extension por defecto es csv en al funcion guardar_raw.
+            if ruta_entrada: # Opción 2: leer un archivo local completo
+                datos_crudos = extractor.leer_archivo_local(ruta_entrada, esquema=esquema)
+            else: # Opción 3: Usar datos de ejemplo (para practicar)
+                datos_crudos = extractor.datos_ejemplo() #devuelve un dataframe pequeño con datos ficticios, sin usar la red
         
-        # Mostrar información de los datos crudos
-        logger.info("\n📊 RESUMEN DATOS CRUDOS:")
-        logger.info(f"  • Total registros: {len(datos_crudos)}") #len(datos_crudos) obtiene el número total de filas (registros) en el DataFrame datos_crudos.
-        logger.info(f"  • Total columnas: {len(datos_crudos.columns)}") #len(datos_crudos.columns) obtiene el número total de columnas en el DataFrame datos_crudos.
-        logger.info(f"  • Columnas: {list(datos_crudos.columns)}") #list(datos_crudos.columns) convierte el índice de columnas del DataFrame en una lista para mostrar los nombres de las columnas.
-        logger.info(f"  • Tipos de datos:\n{datos_crudos.dtypes}") #datos_crudos.dtypes devuelve una Serie que contiene los tipos de datos de cada columna en el DataFrame datos_crudos. esto ayuda a entender la estructura de los datos. dtypes es un atributo de los DataFrames de pandas que proporciona información sobre el tipo de datos almacenados en cada columna.
-                                                                #un dataframe es una estructura de datos bidimensional en pandas que puede almacenar datos de diferentes tipos (como enteros, cadenas, flotantes) en columnas etiquetadas. mientras que una serie es una estructura de datos unidimensional que puede almacenar datos de un solo tipo con etiquetas de índice. como una columna de un DataFrame.    
-        # ========== 2. TRANSFORMACIÓN ==========
-        logger.info("\n🔄 FASE 2: TRANSFORMACIÓN")
-        transformador = TransformadorDatos()  #crea una instancia de la clase TransformadorDatos para manejar las transformaciones de los datos.
+            # Guardar datos raw
+            extractor.guardar_raw(datos_crudos, "datos_originales", compresion=compresion, hilos_compresion=hilos_compresion) # guarda los datos crudos en formato CSV en la carpeta data/raw con el nombre "datos_originales.csv"., se le pasa el dataframe y el nombre del archivo sin extension por defecto es csv en al funcion guardar_raw.
         
-        # Limpieza básica
-        datos_limpios = transformador.limpiar_datos(datos_crudos) #llama al método limpiar_datos de la instancia transformador, pasando los datos crudos (datos_crudos) como argumento que es el df. este método realiza una limpieza básica de los datos y devuelve un nuevo DataFrame con los datos limpios, que se almacena en la variable datos_limpios.
+            # Mostrar información de los datos crudos
+            logger.info("\n📊 RESUMEN DATOS CRUDOS:")
+            logger.info(f"  • Total registros: {len(datos_crudos)}") #len(datos_crudos) obtiene el número total de filas (registros) en el DataFrame datos_crudos.
+            logger.info(f"  • Total columnas: {len(datos_crudos.columns)}") #len(datos_crudos.columns) obtiene el número total de columnas en el DataFrame datos_crudos.
+            logger.info(f"  • Columnas: {list(datos_crudos.columns)}") #list(datos_crudos.columns) convierte el índice de columnas del DataFrame en una lista para mostrar los nombres de las columnas.
+            logger.info(f"  • Tipos de datos:\n{datos_crudos.dtypes}") #datos_crudos.dtypes devuelve una Serie que contiene los tipos de datos de cada columna en el DataFrame datos_crudos. esto ayuda a entender la estructura de los datos. dtypes es un atributo de los DataFrames de pandas que proporciona información sobre el tipo de datos almacenados en cada columna.
+                                                                    #un dataframe es una estructura de datos bidimensional en pandas que puede almacenar datos de diferentes tipos (como enteros, cadenas, flotantes) en columnas etiquetadas. mientras que una serie es una estructura de datos unidimensional que puede almacenar datos de un solo tipo con etiquetas de índice. como una columna de un DataFrame.    
+            # ========== 2. TRANSFORMACIÓN ==========
+            logger.info("\n🔄 FASE 2: TRANSFORMACIÓN")
         
-        # Agregar columnas calculadas
-        datos_transformados = transformador.agregar_columnas_calculadas(datos_limpios) #llama al método agregar_columnas_calculadas de la instancia transformador, pasando los datos limpios (datos_limpios) como argumento. este método agrega nuevas columnas calculadas al DataFrame y devuelve un nuevo DataFrame con las transformaciones aplicadas, que se almacena en la variable datos_transformados.
+            if n_procesos: # Limpieza y columnas calculadas repartidas en varios núcleos (mismo resultado que el camino secuencial)
+                datos_transformados = transformador.limpiar_y_calcular_paralelo(datos_crudos, max_workers=n_procesos,
+                                                                                deduplicador=deduplicador)
+            else:
+                # Limpieza básica
+                datos_limpios = transformador.limpiar_datos( #los datos crudos ya están guardados en data/raw y no se vuelven a usar, así que se limpian sobre el mismo DataFrame (inplace) sin hacer copias
+                    datos_crudos, inplace=True, presupuesto_memoria_mb=memoria_mb, si_excede_presupuesto='particionar',
+                    deduplicador=deduplicador
+                ) #llama al método limpiar_datos de la instancia transformador, pasando los datos crudos (datos_crudos) como argumento que es el df. este método realiza una limpieza básica de los datos y devuelve un nuevo DataFrame con los datos limpios, que se almacena en la variable datos_limpios.
+
+                # Agregar columnas calculadas
+                datos_transformados = transformador.agregar_columnas_calculadas(datos_limpios, inplace=True) #llama al método agregar_columnas_calculadas de la instancia transformador, pasando los datos limpios (datos_limpios) como argumento. este método agrega nuevas columnas calculadas al DataFrame y devuelve un nuevo DataFrame con las transformaciones aplicadas, que se almacena en la variable datos_transformados.
         
+            if cache is not None:
+                cache.guardar(clave_cache, datos_transformados, descripcion=f"transformacion {ruta_entrada}")
+
         # Mostrar información de transformación
         logger.info("\n📈 RESUMEN TRANSFORMACIÓN:")
         logger.info(f"  • Registros después de limpieza: {len(datos_transformados)}")
@@ -75,7 +214,7 @@ def main(): #esta es la función principal que orquesta todo el proceso ETL (Ext
         
         # ========== 3. CARGA ==========
         logger.info("\n💾 FASE 3: CARGA")
-        cargador = CargadorDatos() #crea una instancia de la clase CargadorDatos para manejar la carga de los datos transformados.
+        cargador = CargadorDatos(compresion=compresion, hilos_compresion=hilos_compresion) #crea una instancia de la clase CargadorDatos para manejar la carga de los datos transformados.
         
         # Guardar en múltiples formatos
         fecha_procesamiento = datetime.now().strftime("%Y%m%d_%H%M%S") #datetime.now().strftime("%Y%m%d_%H%M%S") obtiene la fecha y hora actuales y las formatea como una cadena en el formato "YYYYMMDD_HHMMSS". esto se utiliza para crear un nombre de archivo único basado en la fecha y hora de procesamiento.
@@ -83,8 +222,11 @@ def main(): #esta es la función principal que orquesta todo el proceso ETL (Ext
         
         rutas_guardadas = cargador.guardar_multiple_formatos( #esta línea llama al método guardar_multiple_formatos de la instancia cargador, pasando los datos transformados (datos_transformados) y el nombre base (nombre_base) como argumentos. este método guarda los datos en múltiples formatos (csv, json, excel) y devuelve un diccionario con las rutas de los archivos guardados, que se almacena en la variable rutas_guardadas.
             datos_transformados, 
-            nombre_base
+            nombre_base,
+            paralelo=True, # los formatos se escriben a la vez, cada uno en su hilo
+            fallar_si_error=True
         ) #devuelve un diccionario con las rutas de los archivos guardados en diferentes formatos.
+        ruta_perfil = cargador.guardar_perfil(datos_transformados, nombre_base) #perfil de los datos (nulos, distintos, media, cuantiles y valores más frecuentes de cada columna) junto a los archivos
         
         # Resumen final
         logger.info("\n" + "=" * 50)
@@ -92,18 +234,30 @@ def main(): #esta es la función principal que orquesta todo el proceso ETL (Ext
         logger.info("=" * 50)
         logger.info("\n📁 ARCHIVOS GENERADOS:") # 
         for formato, ruta in rutas_guardadas.items(): #rutas_guardadas.items() itera sobre los pares clave-valor en el diccionario rutas_guardadas, donde la clave es el formato del archivo (formato) y el valor es la ruta del archivo guardado (ruta).
-            logger.info(f"  • {formato.upper()}: {ruta}") #registra la ruta de cada archivo guardado, mostrando el formato en mayúsculas (formato.upper()) que es la clave y la ruta correspondiente (ruta) que es el valor.
+            logger.info(f"  • {formato.upper()}: {ruta} ({cargador.tiempos_por_formato[formato]:.3f} s)") #registra la ruta de cada archivo guardado, mostrando el formato en mayúsculas (formato.upper()) que es la clave y la ruta correspondiente (ruta) que es el valor, junto con lo que tardó en escribirse.
+        logger.info(f"  • PERFIL: {ruta_perfil}")
+        rutas_guardadas['perfil'] = ruta_perfil
+        if ruta_sqlite: #carga en bloque en la base de datos: las filas con un id que ya estaba se actualizan
+            rutas_guardadas['sqlite'] = cargador.guardar_como_sqlite(datos_transformados, nombre_base, ruta=ruta_sqlite)
+            logger.info(f"  • SQLITE: {ruta_sqlite} ({cargador.rendimiento_sqlite['filas_por_segundo'] or 0:,.0f} filas/s)")
+        if columnas_particion: #una carpeta por valor de las columnas de partición: los filtros sobre ellas se resuelven sin abrir archivos
+            rutas_guardadas['particionado'] = cargador.guardar_particionado(datos_transformados, f"{nombre_base}_particionado",
+                                                                            columnas_particion)
+            logger.info(f"  • PARTICIONADO: {rutas_guardadas['particionado']}")
         
         logger.info(f"\n📊 ESTADÍSTICAS FINALES:")
         logger.info(f"  • Registros procesados: {len(datos_transformados)}") #len(datos_transformados) obtiene el número total de filas (registros) en el DataFrame datos_transformados.
         logger.info(f"  • Columnas finales: {len(datos_transformados.columns)}") #len(datos_transformados.columns) obtiene el número total de columnas en el DataFrame datos_transformados.
         logger.info(f"  • Columnas: {list(datos_transformados.columns)}") #list(datos_transformados.columns) convierte el índice de columnas del DataFrame en una lista para mostrar los nombres de las columnas finales.
         
+        metricas = registrar_reporte_metricas(logger, nombre_base) #tiempos, filas/s y memoria de cada etapa, también guardados en un JSON junto a los datos
+
         return { #ella función main devuelve un diccionario con un resumen del resultado del pipeline ETL.
             'success': True, #indica que el pipeline se completó exitosamente.
             'registros_procesados': len(datos_transformados), #devuelve el número total de registros procesados.
             'archivos_generados': rutas_guardadas, #devuelve un diccionario con las rutas de los archivos generados.
-            'transformaciones': transformador.transformaciones_aplicadas #devuelve la lista de transformaciones aplicadas durante el proceso ETL.
+            'transformaciones': transformador.transformaciones_aplicadas, #devuelve la lista de transformaciones aplicadas durante el proceso ETL.
+            'metricas': metricas #reporte de rendimiento por etapa (el mismo que se guarda en el JSON de métricas)
         }
         
     except Exception as e: #si ocurre cualquier excepción durante la ejecución del bloque try, se captura aquí.
@@ -113,9 +267,62 @@ def main(): #esta es la función principal que orquesta todo el proceso ETL (Ext
             'error': str(e) #devuelve el mensaje de error como una cadena.
         }
 
+def registrar_reporte_metricas(logger, nombre_base: str) -> dict:
+    """
+    Muestra en el log el tiempo de cada etapa y guarda el reporte de métricas de la ejecución
+
+    Args:
+        logger: Logger donde se escribe el resumen
+        nombre_base: Nombre base de los archivos generados; el reporte se guarda como {nombre_base}_metricas.json
+
+    Returns:
+        Diccionario con el reporte, incluida la ruta donde se guardó
+    """
+    ruta = registro_metricas.guardar_reporte(f"data/processed/{nombre_base}_metricas.json")
+    reporte = registro_metricas.reporte()
+    reporte['archivo'] = ruta
+
+    logger.info("\n⏱️ RENDIMIENTO POR ETAPA:")
+    for etapa, total in reporte['etapas'].items():
+        filas_por_segundo = f"{total['filas_por_segundo']:,.0f} filas/s" if total['filas_por_segundo'] else "-"
+        logger.info(f"  • {etapa}: {total['segundos']:.3f} s en {total['llamadas']} llamada(s), {filas_por_segundo}")
+    if reporte['pico_memoria_mb'] is not None: #en Windows no se puede medir
+        logger.info(f"  • Pico de memoria: {reporte['pico_memoria_mb']:.1f} MB")
+    logger.info(f"  • Reporte guardado en: {ruta}")
+    return reporte
+
 if __name__ == "__main__": #name es una variable especial en Python que contiene el nombre del módulo actual. Si el módulo se está ejecutando como el programa principal, name se establece en "__main__". si es verdadero, significa que este script se está ejecutando directamente (no importado como un módulo en otro script), por lo que se ejecuta el bloque de código dentro de esta condición.
+    parser = argparse.ArgumentParser(description="Mini ETL")
+    parser.add_argument('--entrada', help="Archivo CSV de entrada (por defecto, datos de ejemplo)")
+    parser.add_argument('--chunk', type=int, help="Procesar la entrada por chunks de este número de filas")
+    parser.add_argument('--procesos', type=int, help="Repartir la transformación en este número de procesos")
+    parser.add_argument('--esquema', help="Archivo JSON con el esquema de la entrada (tipos compactos y columnas a leer)")
+    parser.add_argument('--reglas', help="Archivo JSON con los filtros de validez y las columnas calculadas (por defecto, las de siempre)")
+    parser.add_argument('--incremental', choices=['id', 'fecha', 'offset'], help="Procesar solo los registros nuevos de --entrada según esta marca de agua")
+    parser.add_argument('--cache', action='store_true', help="Reutilizar los resultados de ejecuciones anteriores si la entrada no cambió")
+    parser.add_argument('--cache-mb', type=float, default=1024, help="Tamaño máximo de la caché en MB")
+    parser.add_argument('--plan', action='store_true', help="Ejecutar con Pipeline (plan con filtros y columnas empujados a la lectura)")
+    parser.add_argument('--columnas', type=lambda texto: texto.split(','), help="Con --plan, columnas de la salida separadas por comas")
+    parser.add_argument('--duplicados-por', type=lambda texto: texto.split(','), help="Columnas clave de los duplicados separadas por comas (por defecto, filas completas)")
+    parser.add_argument('--relleno', type=lambda texto: dict(par.split('=') for par in texto.split(',')),
+                        help="Estrategia de relleno de nulos por columna, ej. edad=mediana,salario=moda (por defecto, media)")
+    parser.add_argument('--sqlite', help="Cargar también los datos transformados en esta base de datos SQLite (upsert por id)")
+    parser.add_argument('--comprimir', choices=['gzip', 'bz2', 'xz'], help="Escribir comprimidos los datos raw y las salidas csv y json")
+    parser.add_argument('--hilos-compresion', type=int, default=1, help="Hilos que comprimen bloques de las salidas en paralelo")
+    parser.add_argument('--particionar', type=lambda texto: texto.split(','), help="Guardar también una salida parquet particionada por estas columnas (separadas por comas)")
+    parser.add_argument('--memoria-mb', type=float, help="Presupuesto de memoria de la limpieza en MB (si no alcanza, se limpia por partes)")
+    argumentos = parser.parse_args()
+
     # Ejecutar el pipeline
-    resultado = main()  #llama a la función main() para ejecutar el pipeline ETL y almacena el resultado en la variable resultado.
+    # por nombre: con tantos parámetros, un argumento nuevo en medio de main() no debe desplazar a los demás
+    resultado = main(ruta_entrada=argumentos.entrada, tamano_chunk=argumentos.chunk, n_procesos=argumentos.procesos,
+                     memoria_mb=argumentos.memoria_mb, ruta_esquema=argumentos.esquema,
+                     marca_incremental=argumentos.incremental, usar_cache=argumentos.cache,
+                     cache_mb=argumentos.cache_mb, usar_plan=argumentos.plan, columnas=argumentos.columnas,
+                     columnas_duplicados=argumentos.duplicados_por, estrategias_relleno=argumentos.relleno,
+                     ruta_sqlite=argumentos.sqlite, compresion=argumentos.comprimir,
+                     hilos_compresion=argumentos.hilos_compresion, columnas_particion=argumentos.particionar,
+                     ruta_reglas=argumentos.reglas)  #llama a la función main() para ejecutar el pipeline ETL y almacena el resultado en la variable resultado.
     
     # Mostrar resultado en consola
     print("\n" + "=" * 50)
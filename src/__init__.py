@@ -5,12 +5,63 @@
 """
 Paquete ETL - Mini proyecto de Data Engineering
 """
-# Importar las clases y funciones principales para exponerlas en el paquete src
-# al importar src, se pueden acceder directamente a estas clases y funciones sin necesidad de importar cada módulo individualmente.
-from .extractor import ExtractorDatos
-from .transformador import TransformadorDatos
-from .loader import CargadorDatos
-from .logger import LoggerPersonalizado, manejar_error
+# Las clases y funciones principales se exponen en el paquete src: se puede hacer from src import ExtractorDatos sin
+# importar cada módulo individualmente. Pero no se importan aquí: importar extractor, loader... carga pandas, numpy y
+# pyarrow, y eso tarda medio segundo en cada ejecución. Con __getattr__ (PEP 562) cada nombre se importa la primera vez
+# que se pide, así import src es instantáneo y cada ejecución solo carga los módulos de las etapas que usa.
+import importlib
+from typing import TYPE_CHECKING
+
+_EXPORTADOS = { # nombre -> módulo de src donde está definido
+    'ExtractorDatos': 'extractor',
+    'TransformadorDatos': 'transformador',
+    'CargadorDatos': 'loader',
+    'LoggerPersonalizado': 'logger',
+    'manejar_error': 'logger',
+    'activar_logging_asincrono': 'logger',
+    'detener_logging_asincrono': 'logger',
+    'ejecutar_etl_por_chunks': 'pipeline',
+    'Pipeline': 'pipeline',
+    'registro_metricas': 'metricas',
+    'EsquemaDatos': 'esquema',
+    'ESQUEMA_EMPLEADOS': 'esquema',
+    'ReglasDatos': 'reglas',
+    'REGLAS_EMPLEADOS': 'reglas',
+    'ejecutar_etl_incremental': 'incremental',
+    'EstadoIncremental': 'incremental',
+    'extraer_fuentes': 'extraccion_concurrente',
+    'iterar_fuentes': 'extraccion_concurrente',
+    'Deduplicador': 'deduplicacion',
+    'EstadisticasColumnas': 'estadisticas',
+}
+
+if TYPE_CHECKING: # los editores y los analizadores de tipos sí ven los imports normales
+    from .extractor import ExtractorDatos
+    from .transformador import TransformadorDatos
+    from .loader import CargadorDatos
+    from .logger import LoggerPersonalizado, manejar_error, activar_logging_asincrono, detener_logging_asincrono
+    from .pipeline import ejecutar_etl_por_chunks, Pipeline
+    from .metricas import registro_metricas
+    from .esquema import EsquemaDatos, ESQUEMA_EMPLEADOS
+    from .reglas import ReglasDatos, REGLAS_EMPLEADOS
+    from .incremental import ejecutar_etl_incremental, EstadoIncremental
+    from .extraccion_concurrente import extraer_fuentes, iterar_fuentes
+    from .deduplicacion import Deduplicador
+    from .estadisticas import EstadisticasColumnas
+
+
+def __getattr__(nombre):
+    """Importa el módulo que define nombre la primera vez que se pide (src.ExtractorDatos, from src import ...)"""
+    if nombre not in _EXPORTADOS:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(importlib.import_module(f'.{_EXPORTADOS[nombre]}', __name__), nombre)
+    globals()[nombre] = valor # las siguientes veces lo encuentra Python directamente, sin pasar por __getattr__
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTADOS))
+
 
 __version__ = "1.0.0"
 __author__ = "Data Engineer en formación"
@@ -19,13 +70,28 @@ __all__ = [
     'TransformadorDatos', 
     'CargadorDatos',
     'LoggerPersonalizado',
-    'manejar_error'
+    'manejar_error',
+    'activar_logging_asincrono',
+    'detener_logging_asincrono',
+    'ejecutar_etl_por_chunks',
+    'Pipeline',
+    'registro_metricas',
+    'EsquemaDatos',
+    'ESQUEMA_EMPLEADOS',
+    'ReglasDatos',
+    'REGLAS_EMPLEADOS',
+    'ejecutar_etl_incremental',
+    'EstadoIncremental',
+    'extraer_fuentes',
+    'iterar_fuentes',
+    'Deduplicador',
+    'EstadisticasColumnas'
 ]
 
 
 #En este caso, __all__ define una lista de nombres que se exportarán cuando alguien use from src import *. Esto ayuda a controlar qué partes del paquete son accesibles desde fuera.
 # Al definir __all__, se mejora la encapsulación y se evita la exposición accidental de módulos o funciones internas que no deberían ser accesibles directamente.
-#para construir el all primero se debe imprortar todo lo que se quiere incluir en el paquete.
+#from src import * también funciona: pide a __getattr__ cada nombre de __all__.
 
 #Entonces en lugar de hacer from src.extractor import ExtractorDatos, se puede hacer simplemente from src import ExtractorDatos desde otro módulo o script.
 
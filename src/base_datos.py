@@ -0,0 +1,181 @@
+"""
+Carga de datos en una base de datos SQLite (viene con Python: no necesita servidor ni dependencias)
+
+Insertar fila a fila con una transacción por fila es lento: cada COMMIT espera a que el disco confirme la escritura.
+EscritorSQLite carga en bloque:
+  - executemany por lotes de filas dentro de transacciones grandes (un COMMIT cada filas_por_transaccion filas)
+  - journal_mode=WAL y synchronous=NORMAL: los COMMIT no esperan al disco (solo los checkpoints del WAL) y la base
+    no se corrompe si se corta la luz; como mucho se pierden las últimas transacciones
+  - upsert por clave (INSERT ... ON CONFLICT DO UPDATE): una fila con un id que ya existe sustituye a la anterior
+  - índices diferidos: en la carga inicial los índices secundarios se borran antes de cargar y se crean al final de una
+    vez, en lugar de actualizarlos con cada fila insertada
+Al terminar, el rendimiento (filas/s) queda en rendimiento() y en el log.
+"""
+import os
+import sqlite3
+import time
+import pandas as pd
+from typing import Dict, Any, List, Optional, Sequence, Union
+from .logger import obtener_logger
+from .loader import _valores_json # nulos -> None, fechas -> texto ISO, tipos de numpy -> tipos de Python
+
+logger = obtener_logger()
+
+SINCRONIZACIONES = ('OFF', 'NORMAL', 'FULL')
+
+
+class EscritorSQLite:
+    """Escribe DataFrames en una tabla de SQLite por lotes, con upsert por clave e índices diferidos"""
+
+    def __init__(self, ruta: str, tabla: str = 'datos', clave: Optional[str] = 'id',
+                 indices: Sequence[Union[str, Sequence[str]]] = (), diferir_indices: Optional[bool] = None,
+                 tamano_lote: int = 10_000, filas_por_transaccion: int = 500_000, sincronizacion: str = 'NORMAL'):
+        """
+        Args:
+            ruta: Archivo de la base de datos (se crea si no existe)
+            tabla: Tabla donde se cargan las filas (se crea con las columnas del primer DataFrame si no existe)
+            clave: Columna clave: las filas con una clave que ya está en la tabla la actualizan (upsert).
+                None para insertar siempre
+            indices: Columnas (o grupos de columnas) por las que se indexa la tabla para consultarla
+            diferir_indices: Si es True los índices se crean después de cargar todas las filas. None lo decide según la
+                tabla: se difieren si está vacía (carga inicial); si ya tiene filas, rehacer los índices costaría más
+                que actualizarlos con las filas nuevas
+            tamano_lote: Filas por llamada a executemany
+            filas_por_transaccion: Filas entre un COMMIT y el siguiente
+            sincronizacion: PRAGMA synchronous durante la carga: 'NORMAL' (recomendado con WAL), 'OFF' (más rápido,
+                pero un corte de luz puede corromper la base) o 'FULL'
+        """
+        if sincronizacion not in SINCRONIZACIONES:
+            raise ValueError(f"Sincronización no soportada: {sincronizacion}. Opciones: {SINCRONIZACIONES}")
+        self.ruta = ruta
+        self.tabla = tabla
+        self.clave = clave
+        self.indices = [[columnas] if isinstance(columnas, str) else list(columnas) for columnas in indices]
+        self.diferir_indices = diferir_indices
+        self.tamano_lote = tamano_lote
+        self.filas_por_transaccion = filas_por_transaccion
+        self.sincronizacion = sincronizacion
+        self.filas_escritas = 0
+        self._conexion: Optional[sqlite3.Connection] = None
+        self._columnas: Optional[List[str]] = None
+        self._sql = None
+        self._filas_transaccion = 0
+        self._diferir = False
+        self._segundos_carga = self._segundos_indices = 0.0
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+        # isolation_level=None: las transacciones se abren y cierran aquí, no en cada execute
+        self._conexion = sqlite3.connect(self.ruta, isolation_level=None)
+        self._conexion.execute('PRAGMA journal_mode=WAL')
+        self._conexion.execute(f'PRAGMA synchronous={self.sincronizacion}')
+        self._conexion.execute('PRAGMA temp_store=MEMORY') # las tablas temporales (ej. al crear índices) en memoria
+        self._conexion.execute('PRAGMA cache_size=-262144') # 256 MB de caché de páginas (negativo: en KB)
+        return self
+
+    def escribir(self, df: pd.DataFrame):
+        """Carga las filas de df (todos los DataFrames deben tener las mismas columnas)"""
+        if self._columnas is None:
+            self._preparar_tabla(df)
+        elif list(df.columns) != self._columnas:
+            raise ValueError(f"Columnas distintas a las del primer DataFrame: {list(df.columns)} != {self._columnas}")
+        if df.empty:
+            return
+
+        inicio = time.perf_counter()
+        for posicion in range(0, len(df), self.tamano_lote): # la conversión también por lotes: memoria acotada al lote
+            lote = df.iloc[posicion:posicion + self.tamano_lote]
+            filas = zip(*(_valores_json(lote.iloc[:, indice]) for indice in range(lote.shape[1])))
+            if not self._conexion.in_transaction:
+                self._conexion.execute('BEGIN')
+            self._conexion.executemany(self._sql, filas)
+            self._filas_transaccion += len(lote)
+            if self._filas_transaccion >= self.filas_por_transaccion:
+                self._conexion.execute('COMMIT')
+                self._filas_transaccion = 0
+        self.filas_escritas += len(df)
+        self._segundos_carga += time.perf_counter() - inicio
+
+    def __exit__(self, tipo_error, error, traza):
+        try:
+            if self._conexion.in_transaction:
+                # si algo falló, se deshace solo la transacción en curso (las anteriores ya están confirmadas)
+                self._conexion.execute('ROLLBACK' if tipo_error else 'COMMIT')
+            if tipo_error is None and self._columnas is not None and self._diferir:
+                inicio = time.perf_counter()
+                self._crear_indices()
+                self._segundos_indices = time.perf_counter() - inicio
+            if tipo_error is None:
+                self._conexion.execute('PRAGMA optimize') # estadísticas para el planificador de consultas
+        finally:
+            self._conexion.close()
+        if tipo_error is None:
+            rendimiento = self.rendimiento()
+            logger.info("Cargadas %s filas en %s:%s en %.2f s (%.0f filas/s; índices: %.2f s)", self.filas_escritas,
+                        self.ruta, self.tabla, rendimiento['segundos'], rendimiento['filas_por_segundo'] or 0,
+                        rendimiento['segundos_indices'])
+        return False
+
+    def rendimiento(self) -> Dict[str, Any]:
+        """Filas cargadas, segundos de la carga y de los índices, y filas por segundo (contando los índices)"""
+        segundos = self._segundos_carga + self._segundos_indices
+        return {'filas': self.filas_escritas, 'segundos': segundos, 'segundos_indices': self._segundos_indices,
+                'filas_por_segundo': self.filas_escritas / segundos if segundos > 0 else None}
+
+    def _preparar_tabla(self, df: pd.DataFrame):
+        """Crea la tabla (o le agrega las columnas que falten), prepara el INSERT y borra los índices que se difieren"""
+        self._columnas = list(df.columns)
+        if self.clave is not None and self.clave not in self._columnas:
+            raise KeyError(f"Columna clave no encontrada: {self.clave}")
+        tabla = _nombre(self.tabla)
+        informacion = list(self._conexion.execute(f'PRAGMA table_info({tabla})')) # (posición, nombre, tipo, ..., pk)
+        if not informacion:
+            definiciones = [f'{_nombre(columna)} {_tipo_sql(df[columna])}'
+                            + (' PRIMARY KEY' if columna == self.clave else '') for columna in self._columnas]
+            self._conexion.execute(f'CREATE TABLE {tabla} ({", ".join(definiciones)})')
+        else:
+            existentes = [fila[1] for fila in informacion]
+            for columna in self._columnas:
+                if columna not in existentes:
+                    self._conexion.execute(f'ALTER TABLE {tabla} ADD COLUMN {_nombre(columna)} {_tipo_sql(df[columna])}')
+            primaria = [fila[1] for fila in informacion if fila[5]]
+            if self.clave is not None and primaria != [self.clave]: # el upsert necesita que la clave sea única
+                self._conexion.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {_nombre(f"ux_{self.tabla}_{self.clave}")} '
+                                       f'ON {tabla} ({_nombre(self.clave)})')
+
+        nombres = ', '.join(_nombre(columna) for columna in self._columnas)
+        self._sql = f'INSERT INTO {tabla} ({nombres}) VALUES ({", ".join("?" * len(self._columnas))})'
+        if self.clave is not None:
+            actualizar = [f'{_nombre(columna)} = excluded.{_nombre(columna)}' for columna in self._columnas if columna != self.clave]
+            self._sql += f' ON CONFLICT ({_nombre(self.clave)}) DO ' + (f'UPDATE SET {", ".join(actualizar)}' if actualizar else 'NOTHING')
+
+        self._diferir = self.diferir_indices
+        if self._diferir is None:
+            self._diferir = self._conexion.execute(f'SELECT 1 FROM {tabla} LIMIT 1').fetchone() is None
+        if self._diferir:
+            for columnas in self.indices: # se vuelven a crear en __exit__, con todas las filas ya cargadas
+                self._conexion.execute(f'DROP INDEX IF EXISTS {self._nombre_indice(columnas)}')
+        else:
+            self._crear_indices()
+
+    def _crear_indices(self):
+        for columnas in self.indices:
+            self._conexion.execute(f'CREATE INDEX IF NOT EXISTS {self._nombre_indice(columnas)} ON {_nombre(self.tabla)} '
+                                   f'({", ".join(_nombre(columna) for columna in columnas)})')
+
+    def _nombre_indice(self, columnas: Sequence[str]) -> str:
+        return _nombre(f"idx_{self.tabla}_{'_'.join(columnas)}")
+
+
+def _nombre(identificador: str) -> str:
+    """Identificador de SQL entre comillas dobles (admite espacios, tildes y palabras reservadas)"""
+    return '"' + str(identificador).replace('"', '""') + '"'
+
+
+def _tipo_sql(serie: pd.Series) -> str:
+    """Tipo de la columna en SQLite (las fechas se guardan como texto ISO, que se ordena y compara bien)"""
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(serie):
+        return 'REAL'
+    return 'TEXT'
@@ -0,0 +1,282 @@
+"""
+Caché por contenido de extracciones y resultados de la transformación
+
+La clave de cada entrada es un hash SHA-256 de los bytes de la entrada, la versión de la transformación y la
+configuración usada (esquema, opciones de limpieza...). Si el archivo no cambió, la siguiente ejecución devuelve el
+DataFrame guardado sin volver a leer ni limpiar nada; si cambia un solo byte, la versión o la configuración, la clave
+es otra y se vuelve a calcular.
+
+Los DataFrames se guardan en formato Arrow IPC sin comprimir: al leerlos el archivo se mapea en memoria (mmap) en
+lugar de copiarse y parsearse, así que un acierto cuesta poco más que convertir las columnas a pandas. Esa conversión
+no copia las columnas numéricas y de fechas sin nulos ni los códigos de las categóricas (apuntan al archivo mapeado);
+las columnas con nulos y los textos object sí se copian. Los tipos (category, string[pyarrow], fechas) se conservan.
+
+El tamaño total está acotado: al superar max_mb se borran las entradas usadas hace más tiempo (LRU).
+
+Uso desde la línea de comandos:
+    python -m src.cache listar
+    python -m src.cache purgar --todo
+    python -m src.cache purgar --max-mb 200
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+from .dependencias import importar_pyarrow
+from .logger import obtener_logger
+
+logger = obtener_logger()
+
+DIRECTORIO_CACHE = 'data/cache'
+MAX_MB_CACHE = 1024
+TAMANO_BLOQUE_HASH = 1024 * 1024 # el archivo se lee por bloques para calcular el hash sin cargarlo entero
+
+
+class CacheDatos:
+    """Caché de DataFrames en disco direccionada por el contenido de la entrada"""
+
+    def __init__(self, directorio: str = DIRECTORIO_CACHE, max_mb: float = MAX_MB_CACHE):
+        """
+        Args:
+            directorio: Carpeta de la caché (archivos .arrow e indice.json)
+            max_mb: Tamaño máximo de la caché; al superarlo se borran las entradas menos usadas recientemente
+        """
+        self.directorio = directorio
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ruta_indice = os.path.join(directorio, 'indice.json')
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._indice = self._leer_indice()
+
+    # ---------- claves ----------
+
+    def huella_archivo(self, ruta: str) -> str:
+        """
+        SHA-256 del contenido de un archivo
+
+        El hash se recuerda junto con el tamaño y la fecha de modificación del archivo: si no cambiaron, no se
+        vuelve a leer (un archivo de varios GB tarda segundos en recorrerse).
+        """
+        estado = os.stat(ruta)
+        firma = {'tamano': estado.st_size, 'modificado': estado.st_mtime_ns}
+        huellas = self._indice.setdefault('huellas', {})
+        conocida = huellas.get(os.path.abspath(ruta))
+        if conocida and conocida['firma'] == firma:
+            return conocida['sha256']
+
+        sha = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+                sha.update(bloque)
+        huella = sha.hexdigest()
+        with self._lock:
+            huellas[os.path.abspath(ruta)] = {'firma': firma, 'sha256': huella}
+        return huella
+
+    @staticmethod
+    def clave(huella_entrada: str, etapa: str, configuracion: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Clave de una entrada de la caché
+
+        Args:
+            huella_entrada: Hash del contenido de la entrada (huella_archivo o hashlib sobre los bytes descargados)
+            etapa: Qué se guarda, ej. 'extraccion' o 'transformacion'
+            configuracion: Todo lo que cambia el resultado además de la entrada (versión, esquema, opciones)
+
+        Returns:
+            Clave hexadecimal
+        """
+        contenido = json.dumps({'entrada': huella_entrada, 'etapa': etapa, 'configuracion': configuracion or {}},
+                               sort_keys=True, default=str)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def clave_archivo(self, ruta: str, etapa: str, configuracion: Optional[Dict[str, Any]] = None) -> str:
+        """Clave para el resultado de procesar el archivo ruta en la etapa indicada"""
+        return self.clave(self.huella_archivo(ruta), etapa, configuracion)
+
+    # ---------- lectura y escritura ----------
+
+    def obtener(self, clave: str) -> Optional[pd.DataFrame]:
+        """Devuelve el DataFrame guardado con esa clave, o None si no está"""
+        entrada = self._indice['entradas'].get(clave)
+        ruta = self._ruta_datos(clave)
+        if entrada is None or not os.path.exists(ruta):
+            self.fallos += 1
+            return None
+
+        pa, _ = importar_pyarrow()
+        with pa.memory_map(ruta, 'r') as archivo:
+            tabla = pa.ipc.open_file(archivo).read_all() # leer la tabla no copia: sus buffers apuntan al archivo mapeado
+            textos_arrow = [campo.name for campo in tabla.schema if campo.type == pa.large_string()]
+            df = tabla.select([nombre for nombre in tabla.column_names if nombre not in textos_arrow]).to_pandas(
+                split_blocks=True) # un bloque por columna: las que no tienen nulos se quedan sin copia (ver arriba)
+            for posicion, nombre in enumerate(tabla.column_names):
+                if nombre in textos_arrow: # string[pyarrow]: los textos se quedan en Arrow, sin crear objetos de Python
+                    df.insert(posicion, nombre, pd.arrays.ArrowStringArray(tabla.column(nombre).cast(pa.string())))
+
+        with self._lock:
+            entrada['ultimo_acceso'] = time.time()
+            entrada['aciertos'] = entrada.get('aciertos', 0) + 1
+            self._guardar_indice()
+        self.aciertos += 1
+        logger.info("Caché: acierto %s (%s filas, %s)", clave[:12], len(df), entrada.get('descripcion', ''))
+        return df
+
+    def guardar(self, clave: str, df: pd.DataFrame, descripcion: str = '') -> bool:
+        """
+        Guarda df con esa clave y aplica la política de tamaño
+
+        Args:
+            clave: Clave (ver clave / clave_archivo)
+            df: DataFrame a guardar
+            descripcion: Texto libre que se muestra al listar la caché (ej. la ruta de la entrada)
+
+        Returns:
+            True si se guardó; False si el DataFrame no se puede convertir a Arrow (ej. columnas con tipos mezclados)
+            o si es más grande que la caché entera
+        """
+        pa, _ = importar_pyarrow()
+        try:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            # Las columnas string[pyarrow] se guardan como large_string para distinguirlas al leer de las de texto
+            # object (que Arrow guarda como string) y devolverlas con el mismo tipo
+            for columna in df.columns[[isinstance(tipo, pd.StringDtype) and tipo.storage == 'pyarrow' for tipo in df.dtypes]]:
+                indice = tabla.schema.get_field_index(columna)
+                tabla = tabla.set_column(indice, columna, tabla.column(indice).cast(pa.large_string()))
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            logger.warning("Caché: no se guarda %s, no se puede convertir a Arrow: %s", descripcion, e)
+            return False
+        if tabla.nbytes > self.max_bytes:
+            logger.warning("Caché: %s ocupa más que la caché completa (%.1f MB), no se guarda",
+                           descripcion, tabla.nbytes / (1024 * 1024))
+            return False
+
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self._ruta_datos(clave)
+        temporal = ruta + '.tmp'
+        with pa.OSFile(temporal, 'wb') as archivo:
+            with pa.ipc.new_file(archivo, tabla.schema) as escritor:
+                escritor.write_table(tabla)
+        os.replace(temporal, ruta) # otro proceso nunca ve un archivo a medio escribir
+
+        ahora = time.time()
+        with self._lock:
+            self._indice['entradas'][clave] = {
+                'descripcion': descripcion,
+                'bytes': os.path.getsize(ruta),
+                'filas': len(df),
+                'creado': ahora,
+                'ultimo_acceso': ahora,
+                'aciertos': 0,
+            }
+            self._expulsar(self.max_bytes)
+            self._guardar_indice()
+        logger.info("Caché: guardado %s (%s filas, %s)", clave[:12], len(df), descripcion)
+        return True
+
+    # ---------- mantenimiento ----------
+
+    def entradas(self) -> List[Dict[str, Any]]:
+        """Entradas de la caché, de la usada más recientemente a la menos"""
+        entradas = [dict(datos, clave=clave) for clave, datos in self._indice['entradas'].items()]
+        return sorted(entradas, key=lambda entrada: entrada['ultimo_acceso'], reverse=True)
+
+    def tamano_bytes(self) -> int:
+        return sum(entrada['bytes'] for entrada in self._indice['entradas'].values())
+
+    def purgar(self, max_mb: Optional[float] = None) -> int:
+        """
+        Borra entradas
+
+        Args:
+            max_mb: Deja la caché por debajo de este tamaño borrando las menos usadas; None la vacía
+
+        Returns:
+            Número de entradas borradas
+        """
+        with self._lock:
+            antes = len(self._indice['entradas'])
+            self._expulsar(0 if max_mb is None else int(max_mb * 1024 * 1024))
+            if max_mb is None:
+                self._indice['huellas'] = {}
+            self._guardar_indice()
+            return antes - len(self._indice['entradas'])
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            'entradas': len(self._indice['entradas']),
+            'mb': self.tamano_bytes() / (1024 * 1024),
+            'max_mb': self.max_bytes / (1024 * 1024),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+        }
+
+    # ---------- internos ----------
+
+    def _ruta_datos(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.arrow")
+
+    def _expulsar(self, max_bytes: int):
+        """Borra las entradas menos usadas recientemente hasta que el total quede en max_bytes (con el lock tomado)"""
+        entradas = self._indice['entradas']
+        total = sum(entrada['bytes'] for entrada in entradas.values())
+        for clave in sorted(entradas, key=lambda clave: entradas[clave]['ultimo_acceso']):
+            if total <= max_bytes:
+                break
+            total -= entradas.pop(clave)['bytes']
+            try:
+                os.remove(self._ruta_datos(clave))
+            except FileNotFoundError:
+                pass
+            logger.debug("Caché: expulsada %s", clave[:12])
+
+    def _leer_indice(self) -> Dict[str, Any]:
+        if os.path.exists(self.ruta_indice):
+            with open(self.ruta_indice, encoding='utf-8') as f:
+                indice = json.load(f)
+            indice.setdefault('entradas', {})
+            indice.setdefault('huellas', {})
+            return indice
+        return {'entradas': {}, 'huellas': {}}
+
+    def _guardar_indice(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = self.ruta_indice + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self._indice, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, self.ruta_indice)
+
+
+def main(argumentos: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspeccionar y purgar la caché del ETL")
+    parser.add_argument('--directorio', default=DIRECTORIO_CACHE)
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    subcomandos.add_parser('listar', help="Muestra las entradas, de la más reciente a la más antigua")
+    purgar = subcomandos.add_parser('purgar', help="Borra entradas")
+    opciones_purgar = purgar.add_mutually_exclusive_group(required=True)
+    opciones_purgar.add_argument('--todo', action='store_true', help="Vacía la caché")
+    opciones_purgar.add_argument('--max-mb', type=float, help="Borra las menos usadas hasta quedar por debajo de este tamaño")
+    args = parser.parse_args(argumentos)
+
+    cache = CacheDatos(args.directorio)
+    if args.comando == 'listar':
+        for entrada in cache.entradas():
+            ultimo_acceso = datetime.fromtimestamp(entrada['ultimo_acceso']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{entrada['clave'][:12]}  {entrada['bytes'] / (1024 * 1024):>9.2f} MB  {entrada['filas']:>10} filas  "
+                  f"{entrada['aciertos']:>4} aciertos  {ultimo_acceso}  {entrada['descripcion']}")
+        print(f"Total: {len(cache.entradas())} entradas, {cache.tamano_bytes() / (1024 * 1024):.2f} MB")
+    else:
+        borradas = cache.purgar(None if args.todo else args.max_mb)
+        print(f"Borradas {borradas} entradas; quedan {cache.tamano_bytes() / (1024 * 1024):.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
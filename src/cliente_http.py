@@ -0,0 +1,222 @@
+"""
+Cliente HTTP para la extracción de datos
+
+Todas las descargas comparten una requests.Session, que reutiliza las conexiones TCP/TLS (keep-alive) en lugar de
+abrir una por petición, y que acepta respuestas comprimidas con gzip. Además:
+  - GET condicional: se recuerdan el ETag y el Last-Modified de cada URL; si el servidor responde 304 (no cambió)
+    no se descarga nada y se usa la copia local
+  - Reanudación: si la conexión se corta, la descarga continúa desde el último byte recibido con una petición Range
+    en lugar de empezar de cero
+  - Lectura en streaming: leer_csv_por_chunks pasa la respuesta directamente al parser de CSV de pandas, sin
+    guardarla en disco ni cargarla entera en memoria
+  - Estadísticas: bytes recibidos, tiempo y MB/s de cada descarga y acumulados
+"""
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+from urllib.parse import urlparse
+from typing import TYPE_CHECKING, Dict, Any, Iterator, Optional
+from .logger import manejar_error, obtener_logger
+
+logger = obtener_logger()
+
+if TYPE_CHECKING: # requests solo se importa al crear un ClienteHTTP: las ejecuciones con archivos locales no lo cargan
+    import requests
+
+DIRECTORIO_DESCARGAS = 'data/raw/descargas'
+TAMANO_BLOQUE = 64 * 1024 # si la conexión se corta, se pierde como mucho el último bloque a medio recibir
+
+
+def es_url(ruta: str) -> bool:
+    """Indica si ruta es una URL http(s) y no un archivo local"""
+    return urlparse(str(ruta)).scheme in ('http', 'https')
+
+
+class ClienteHTTP:
+    """Descargas HTTP con conexiones reutilizadas, GET condicional, reanudación y estadísticas"""
+
+    def __init__(self, directorio: str = DIRECTORIO_DESCARGAS, reintentos: int = 3, timeout: tuple = (10, 60),
+                 max_conexiones: int = 10, sesion: Optional['requests.Session'] = None):
+        """
+        Args:
+            directorio: Carpeta donde se guardan las descargas y sus metadatos (ETag, Last-Modified)
+            reintentos: Reintentos ante errores de conexión o respuestas 5xx / 429
+            timeout: Segundos para conectar y para recibir cada bloque de la respuesta
+            max_conexiones: Conexiones abiertas que se mantienen por servidor
+            sesion: Sesión de requests a usar (por defecto se crea una)
+        """
+        self.directorio = directorio
+        self.reintentos = reintentos
+        self.timeout = timeout
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # Errores de red tras los que se reintenta la descarga continuando desde lo ya recibido
+        self._errores_red = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                             requests.exceptions.Timeout)
+        self.sesion = sesion or requests.Session()
+        # El adaptador mantiene el pool de conexiones y reintenta (con espera creciente) los fallos del servidor
+        reintentos_servidor = Retry(total=reintentos, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                                    allowed_methods=('GET', 'HEAD'))
+        adaptador = HTTPAdapter(pool_connections=max_conexiones, pool_maxsize=max_conexiones,
+                                max_retries=reintentos_servidor)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.mount('https://', adaptador)
+        self.sesion.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        self.ruta_metadatos = os.path.join(directorio, 'metadatos.json')
+        self._metadatos = self._leer_metadatos()
+        self.estadisticas = {'peticiones': 0, 'descargas': 0, 'no_modificados': 0, 'reanudaciones': 0,
+                             'bytes': 0, 'segundos': 0.0}
+
+    @manejar_error
+    def descargar(self, url: str, ruta_destino: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Descarga url a disco (solo si cambió desde la última descarga)
+
+        Args:
+            url: URL del archivo
+            ruta_destino: Dónde guardarlo (por defecto, en el directorio de descargas con un nombre derivado de la URL)
+
+        Returns:
+            Diccionario con ruta, estado ('descargado' o 'sin_cambios'), bytes, segundos, mb_por_segundo y reanudaciones
+        """
+        destino = ruta_destino or self._ruta_por_defecto(url)
+        parcial = destino + '.parcial'
+        conocido = self._metadatos.get(url, {})
+        os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+
+        inicio = time.perf_counter()
+        recibidos = 0
+        reanudaciones = 0
+        for intento in range(self.reintentos + 1):
+            cabeceras = {}
+            if os.path.exists(destino) and conocido.get('ruta') == destino:
+                if conocido.get('etag'): # GET condicional: el servidor responde 304 si no cambió
+                    cabeceras['If-None-Match'] = conocido['etag']
+                if conocido.get('last_modified'):
+                    cabeceras['If-Modified-Since'] = conocido['last_modified']
+            desde = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+            if desde:
+                cabeceras['Range'] = f'bytes={desde}-'
+                cabeceras['Accept-Encoding'] = 'identity' # los bytes del archivo parcial son los del contenido sin comprimir
+                validador = conocido.get('etag_parcial') or conocido.get('last_modified_parcial')
+                if validador:
+                    cabeceras['If-Range'] = validador # si el archivo cambió en el servidor, responde 200 con el archivo completo
+
+            self.estadisticas['peticiones'] += 1
+            try:
+                with self.sesion.get(url, headers=cabeceras, stream=True, timeout=self.timeout) as respuesta:
+                    if respuesta.status_code == 304:
+                        self.estadisticas['no_modificados'] += 1
+                        logger.info("Sin cambios desde la última descarga (304): %s", url)
+                        return self._resultado(destino, 'sin_cambios', 0, time.perf_counter() - inicio, reanudaciones)
+                    respuesta.raise_for_status()
+
+                    continuar = desde and respuesta.status_code == 206
+                    if desde and not continuar:
+                        logger.info("El servidor no admite continuar la descarga (o el archivo cambió): se descarga completa")
+                    conocido['etag_parcial'] = respuesta.headers.get('ETag')
+                    conocido['last_modified_parcial'] = respuesta.headers.get('Last-Modified')
+                    self._metadatos[url] = conocido
+
+                    with open(parcial, 'ab' if continuar else 'wb') as archivo:
+                        for bloque in respuesta.iter_content(TAMANO_BLOQUE): # iter_content descomprime gzip/deflate
+                            archivo.write(bloque)
+                        recibidos += respuesta.raw.tell() # bytes que llegaron por la red (comprimidos)
+                    etag, ultima_modificacion = respuesta.headers.get('ETag'), respuesta.headers.get('Last-Modified')
+                break
+            except self._errores_red as e:
+                if intento == self.reintentos:
+                    self._guardar_metadatos() # lo recibido se conserva para continuar en la próxima llamada
+                    raise
+                reanudaciones += 1
+                self.estadisticas['reanudaciones'] += 1
+                logger.warning("Descarga interrumpida (%s); se continúa desde el byte %s", e,
+                               os.path.getsize(parcial) if os.path.exists(parcial) else 0)
+
+        os.replace(parcial, destino)
+        self._metadatos[url] = {'ruta': destino, 'etag': etag, 'last_modified': ultima_modificacion,
+                                'bytes': os.path.getsize(destino)}
+        self._guardar_metadatos()
+
+        segundos = time.perf_counter() - inicio
+        self.estadisticas['descargas'] += 1
+        self.estadisticas['bytes'] += recibidos
+        self.estadisticas['segundos'] += segundos
+        resultado = self._resultado(destino, 'descargado', recibidos, segundos, reanudaciones)
+        logger.info("Descargados %s bytes de %s en %.2f s (%.2f MB/s)", recibidos, url, segundos,
+                    resultado['mb_por_segundo'] or 0)
+        return resultado
+
+    def leer_csv_por_chunks(self, url: str, tamano_chunk: int = 100_000, **opciones) -> Iterator[pd.DataFrame]:
+        """
+        Lee un CSV remoto por chunks a medida que llega, sin guardarlo en disco
+
+        Args:
+            url: URL del CSV
+            tamano_chunk: Filas por chunk
+            **opciones: Argumentos adicionales para pd.read_csv (usecols, dtype...)
+
+        Yields:
+            DataFrames de como máximo tamano_chunk filas
+        """
+        inicio = time.perf_counter()
+        self.estadisticas['peticiones'] += 1
+        with self.sesion.get(url, stream=True, timeout=self.timeout) as respuesta:
+            respuesta.raise_for_status()
+            respuesta.raw.decode_content = True # el parser recibe el contenido ya descomprimido
+            with pd.read_csv(respuesta.raw, encoding='utf-8', chunksize=tamano_chunk, **opciones) as lector:
+                yield from lector
+            recibidos = respuesta.raw.tell()
+
+        segundos = time.perf_counter() - inicio
+        self.estadisticas['descargas'] += 1
+        self.estadisticas['bytes'] += recibidos
+        self.estadisticas['segundos'] += segundos
+        logger.info("Leídos %s bytes de %s en streaming en %.2f s", recibidos, url, segundos)
+
+    def rendimiento(self) -> Dict[str, Any]:
+        """Estadísticas acumuladas de todas las descargas, con el throughput medio en MB/s"""
+        estadisticas = dict(self.estadisticas)
+        estadisticas['mb_por_segundo'] = _mb_por_segundo(estadisticas['bytes'], estadisticas['segundos'])
+        return estadisticas
+
+    def cerrar(self):
+        """Cierra las conexiones abiertas del pool"""
+        self.sesion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def _resultado(self, ruta: str, estado: str, recibidos: int, segundos: float, reanudaciones: int) -> Dict[str, Any]:
+        return {'ruta': ruta, 'estado': estado, 'bytes': recibidos, 'segundos': segundos,
+                'mb_por_segundo': _mb_por_segundo(recibidos, segundos), 'reanudaciones': reanudaciones}
+
+    def _ruta_por_defecto(self, url: str) -> str:
+        """Nombre estable por URL: hash corto (distintas URLs con el mismo nombre de archivo) + nombre del archivo"""
+        nombre = os.path.basename(urlparse(url).path) or 'descarga'
+        return os.path.join(self.directorio, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}_{nombre}")
+
+    def _leer_metadatos(self) -> Dict[str, Any]:
+        if os.path.exists(self.ruta_metadatos):
+            with open(self.ruta_metadatos, encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _guardar_metadatos(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = self.ruta_metadatos + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self._metadatos, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, self.ruta_metadatos)
+
+
+def _mb_por_segundo(recibidos: int, segundos: float) -> Optional[float]:
+    return recibidos / (1024 * 1024) / segundos if segundos > 0 else None
@@ -0,0 +1,249 @@
+"""
+Eliminación de duplicados por clave y entre lotes (chunks, archivos o ejecuciones incrementales)
+
+Cada fila se reduce a una huella de 64 bits calculada solo con las columnas clave (ej. id), o con todas si no se
+indican. Las huellas ya vistas se guardan en un conjunto compacto que puede persistirse en disco, así los duplicados
+se detectan aunque lleguen en otro chunk, en otro archivo o en otra ejecución. Dos modos:
+  - 'exacto': array ordenado de huellas (8 bytes por fila distinta en lugar de la fila completa)
+  - 'bloom': filtro de Bloom de tamaño fijo (~1,8 bytes por fila con 0,1 % de falsos positivos). Es aproximado: una
+    fila nueva puede tomarse por duplicada con probabilidad tasa_falsos_positivos, pero un duplicado nunca se escapa
+'auto' empieza en modo exacto y pasa a Bloom cuando el conjunto exacto supera max_mb.
+"""
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Sequence
+from .logger import obtener_logger
+
+logger = obtener_logger()
+
+MODOS = ('exacto', 'bloom', 'auto')
+ALGORITMO_HUELLAS = 'hash_pandas_object-v1' # se guarda con el conjunto: huellas de otro algoritmo no son comparables
+MAX_TANDAS = 8 # tandas de huellas nuevas que se acumulan antes de fundirlas con el array principal
+
+
+class Deduplicador:
+    """Conjunto de huellas ya vistas para descartar filas duplicadas dentro de un lote y respecto a los anteriores"""
+
+    def __init__(self, columnas: Optional[Sequence[str]] = None, modo: str = 'exacto', ruta: Optional[str] = None,
+                 max_mb: float = 256, capacidad: Optional[int] = None, tasa_falsos_positivos: float = 0.001):
+        """
+        Args:
+            columnas: Columnas clave; dos filas son duplicadas si coinciden en ellas (None: todas las columnas)
+            modo: 'exacto', 'bloom' o 'auto' (exacto hasta max_mb, después Bloom)
+            ruta: Archivo .npz donde se guarda el conjunto (si existe, se carga). Sin ruta el conjunto solo vive en memoria
+            max_mb: Memoria máxima del conjunto exacto en modo 'auto'
+            capacidad: Filas distintas para las que se dimensiona el filtro de Bloom (por defecto 10 millones, o
+                4 veces las ya vistas al pasar de exacto a Bloom)
+            tasa_falsos_positivos: Probabilidad de que el filtro de Bloom tome por duplicada una fila nueva
+        """
+        if modo not in MODOS:
+            raise ValueError(f"Modo no soportado: {modo}. Opciones: {MODOS}")
+        if not 0 < tasa_falsos_positivos < 1:
+            raise ValueError(f"tasa_falsos_positivos debe estar entre 0 y 1: {tasa_falsos_positivos}")
+        self.columnas = list(columnas) if columnas is not None else None
+        self.modo = modo
+        self.ruta = ruta
+        self.max_mb = max_mb
+        self.capacidad = capacidad
+        self.tasa_falsos_positivos = tasa_falsos_positivos
+        self.descartadas = 0 # filas marcadas como duplicadas desde que se creó el objeto
+        self._vistas = np.empty(0, dtype=np.uint64) # huellas exactas, ordenadas y sin repetir
+        self._tandas: List[np.ndarray] = [] # huellas nuevas (ordenadas) pendientes de fundir con _vistas
+        self._bloom: Optional[_FiltroBloom] = None
+        if modo == 'bloom':
+            self._bloom = _FiltroBloom(capacidad or 10_000_000, tasa_falsos_positivos)
+        if ruta and os.path.exists(ruta):
+            self._cargar()
+
+    def huellas(self, df: pd.DataFrame) -> np.ndarray:
+        """Huella de 64 bits de cada fila calculada con las columnas clave"""
+        faltan = [columna for columna in (self.columnas or []) if columna not in df.columns]
+        if faltan:
+            raise KeyError(f"Columnas clave no encontradas: {faltan}")
+        claves = df[self.columnas] if self.columnas is not None else df
+        # las numéricas se comparan como float64: 5 (int) y 5.0 (float, ej. el mismo id en un chunk con nulos) son iguales
+        numericas = [columna for columna in claves.columns
+                     if pd.api.types.is_numeric_dtype(claves[columna]) and not pd.api.types.is_bool_dtype(claves[columna])
+                     and claves[columna].dtype != np.float64]
+        if numericas:
+            claves = claves.astype({columna: 'float64' for columna in numericas})
+        return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+    def marcar_duplicadas(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Marca las filas de df que repiten una fila anterior (del mismo df o de lotes ya vistos) y recuerda las demás
+
+        Returns:
+            Array booleano con True en las filas duplicadas (las que descartaría drop_duplicates)
+        """
+        huellas = self.huellas(df)
+        duplicadas = pd.Series(huellas).duplicated().to_numpy() # dentro del lote se conserva la primera aparición
+        if len(self):
+            duplicadas |= self.contiene(huellas)
+        self._agregar(huellas[~duplicadas])
+        self.descartadas += int(duplicadas.sum())
+        return duplicadas
+
+    def descartar(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Devuelve df sin las filas duplicadas (df tal cual si no hay ninguna)"""
+        duplicadas = self.marcar_duplicadas(df)
+        if duplicadas.any():
+            logger.info("Eliminados %s registros duplicados", int(duplicadas.sum()))
+            return df[~duplicadas]
+        return df
+
+    def contiene(self, huellas: np.ndarray) -> np.ndarray:
+        """Indica qué huellas ya se vieron (en modo Bloom puede dar falsos positivos)"""
+        if self._bloom is not None:
+            return self._bloom.contiene(huellas)
+        vistas = np.zeros(len(huellas), dtype=bool)
+        for conjunto in [self._vistas] + self._tandas:
+            if len(conjunto):
+                posiciones = np.searchsorted(conjunto, huellas).clip(max=len(conjunto) - 1)
+                vistas |= conjunto[posiciones] == huellas
+        return vistas
+
+    def _agregar(self, huellas: np.ndarray):
+        if not len(huellas):
+            return
+        if self._bloom is not None:
+            self._bloom.agregar(huellas)
+            return
+        self._tandas.append(np.sort(huellas))
+        if len(self._tandas) > MAX_TANDAS:
+            self._fundir()
+        if self.modo == 'auto' and self.memoria_mb() > self.max_mb:
+            self._pasar_a_bloom()
+
+    def _fundir(self):
+        if self._tandas:
+            self._vistas = np.unique(np.concatenate([self._vistas] + self._tandas))
+            self._tandas = []
+
+    def _pasar_a_bloom(self):
+        self._fundir()
+        capacidad = max(self.capacidad or 0, 4 * len(self._vistas))
+        logger.warning("El conjunto de duplicados supera %s MB: se pasa a un filtro de Bloom para %s filas "
+                       "(falsos positivos: %s)", self.max_mb, capacidad, self.tasa_falsos_positivos)
+        self._bloom = _FiltroBloom(capacidad, self.tasa_falsos_positivos)
+        self._bloom.agregar(self._vistas)
+        self._vistas = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        """Filas distintas vistas (en modo Bloom, las agregadas al filtro)"""
+        if self._bloom is not None:
+            return self._bloom.elementos
+        return len(self._vistas) + sum(len(tanda) for tanda in self._tandas)
+
+    def memoria_mb(self) -> float:
+        if self._bloom is not None:
+            return self._bloom.bits.nbytes / (1024 * 1024)
+        return (self._vistas.nbytes + sum(tanda.nbytes for tanda in self._tandas)) / (1024 * 1024)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            'modo': 'bloom' if self._bloom is not None else 'exacto',
+            'columnas': self.columnas,
+            'vistas': len(self),
+            'descartadas': self.descartadas,
+            'memoria_mb': self.memoria_mb(),
+            'falsos_positivos_estimados': self._bloom.tasa_estimada() if self._bloom is not None else 0.0,
+        }
+
+    def reiniciar(self):
+        """Olvida todas las huellas vistas (el archivo se vacía al volver a guardar)"""
+        self._vistas = np.empty(0, dtype=np.uint64)
+        self._tandas = []
+        if self._bloom is not None:
+            self._bloom = _FiltroBloom(self._bloom.capacidad, self.tasa_falsos_positivos)
+
+    def guardar(self, ruta: Optional[str] = None) -> str:
+        """Escribe el conjunto en disco de forma atómica (por defecto en self.ruta)"""
+        ruta = ruta or self.ruta
+        if not ruta:
+            raise ValueError("No se indicó una ruta donde guardar las huellas")
+        self._fundir()
+        datos = {'configuracion': np.array(json.dumps({'columnas': self.columnas, 'algoritmo': ALGORITMO_HUELLAS}))}
+        if self._bloom is not None:
+            datos.update(bits=self._bloom.bits, bloom=np.array([self._bloom.capacidad, self._bloom.hashes,
+                                                                 self._bloom.elementos], dtype=np.int64))
+        else:
+            datos['vistas'] = self._vistas
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as f: # con un archivo abierto np.savez no agrega la extensión .npz
+            np.savez(f, **datos)
+        os.replace(temporal, ruta)
+        logger.info("Huellas de duplicados guardadas en %s (%s filas, %.1f MB)", ruta, len(self), self.memoria_mb())
+        return ruta
+
+    def _cargar(self):
+        with np.load(self.ruta, allow_pickle=False) as datos:
+            configuracion = json.loads(str(datos['configuracion']))
+            if configuracion['algoritmo'] != ALGORITMO_HUELLAS or configuracion['columnas'] != self.columnas:
+                raise ValueError(f"{self.ruta} tiene huellas de otras columnas clave ({configuracion['columnas']}) "
+                                 f"o de otro algoritmo; usa otra ruta o bórralo")
+            if 'bits' in datos:
+                capacidad, hashes, elementos = (int(valor) for valor in datos['bloom'])
+                self._bloom = _FiltroBloom(capacidad, self.tasa_falsos_positivos, bits=datos['bits'].copy(), hashes=hashes)
+                self._bloom.elementos = elementos
+                self._vistas = np.empty(0, dtype=np.uint64)
+            else:
+                self._vistas = datos['vistas'].copy()
+                if self.modo == 'bloom': # se pidió Bloom y lo guardado era exacto: se cargan las huellas en el filtro
+                    self._bloom.agregar(self._vistas)
+                    self._vistas = np.empty(0, dtype=np.uint64)
+        logger.info("Cargadas %s huellas de duplicados de %s", len(self), self.ruta)
+
+
+class _FiltroBloom:
+    """Filtro de Bloom sobre huellas de 64 bits, con k posiciones por huella obtenidas por doble hashing"""
+
+    def __init__(self, capacidad: int, tasa_falsos_positivos: float, bits: Optional[np.ndarray] = None,
+                 hashes: Optional[int] = None):
+        self.capacidad = capacidad
+        # tamaño y número de hashes óptimos para capacidad elementos y la tasa de falsos positivos pedida
+        n_bits = max(64, int(math.ceil(-capacidad * math.log(tasa_falsos_positivos) / math.log(2) ** 2)))
+        self.bits = bits if bits is not None else np.zeros((n_bits + 7) // 8, dtype=np.uint8)
+        self.n_bits = self.bits.size * 8
+        self.hashes = hashes or max(1, round(self.n_bits / capacidad * math.log(2)))
+        self.elementos = 0
+
+    def _posiciones(self, huellas: np.ndarray):
+        h1 = huellas.astype(np.uint64)
+        h2 = _mezclar(h1) | np.uint64(1) # segunda huella independiente (impar: recorre todas las posiciones)
+        for i in range(self.hashes):
+            yield (h1 + np.uint64(i) * h2) % np.uint64(self.n_bits)
+
+    def agregar(self, huellas: np.ndarray):
+        for posiciones in self._posiciones(huellas):
+            np.bitwise_or.at(self.bits, (posiciones >> np.uint64(3)).astype(np.intp),
+                             (np.uint8(1) << (posiciones & np.uint64(7)).astype(np.uint8)))
+        if self.elementos <= self.capacidad < self.elementos + len(huellas):
+            logger.warning("El filtro de Bloom supera su capacidad (%s filas): los falsos positivos irán en aumento",
+                           self.capacidad)
+        self.elementos += len(huellas)
+
+    def contiene(self, huellas: np.ndarray) -> np.ndarray:
+        presentes = np.ones(len(huellas), dtype=bool)
+        for posiciones in self._posiciones(huellas):
+            bytes_ = self.bits[(posiciones >> np.uint64(3)).astype(np.intp)]
+            presentes &= (bytes_ >> (posiciones & np.uint64(7)).astype(np.uint8)) & np.uint8(1) == 1
+        return presentes
+
+    def tasa_estimada(self) -> float:
+        """Probabilidad de falso positivo con los elementos agregados hasta ahora"""
+        return (1 - math.exp(-self.hashes * self.elementos / self.n_bits)) ** self.hashes
+
+
+def _mezclar(valores: np.ndarray) -> np.ndarray:
+    """Finalizador de splitmix64: cambia todos los bits de la salida aunque la entrada cambie en uno solo"""
+    with np.errstate(over='ignore'):
+        z = valores ^ (valores >> np.uint64(30))
+        z = z * np.uint64(0xBF58476D1CE4E5B9)
+        z = z ^ (z >> np.uint64(27))
+        z = z * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
@@ -0,0 +1,34 @@
+"""
+Importación de dependencias opcionales
+
+Algunos formatos (por ejemplo Parquet) necesitan librerías que no son obligatorias para el ETL básico.
+Se importan solo cuando se usan, y si faltan se lanza un ImportError que explica qué instalar.
+"""
+
+
+def importar_pyarrow():
+    """Devuelve los módulos pyarrow y pyarrow.parquet"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("El formato Parquet requiere pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+def pyarrow_disponible() -> bool:
+    """Indica si pyarrow está instalado"""
+    try:
+        importar_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+
+def numexpr_disponible() -> bool:
+    """Indica si numexpr está instalado (DataFrame.eval lo usa para evaluar expresiones en una sola pasada)"""
+    try:
+        import numexpr # noqa: F401
+    except ImportError:
+        return False
+    return True
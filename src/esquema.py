@@ -0,0 +1,183 @@
+"""
+Esquema de columnas para leer y guardar datos con tipos compactos
+
+Por defecto pandas lee los enteros y decimales como int64/float64 y los textos como object (un objeto de Python
+por celda). Un EsquemaDatos indica qué columnas leer y con qué tipo guardarlas en memoria:
+  - enteros y decimales reducidos (int8/int16/int32, float32) cuando los valores caben sin perder precisión
+  - 'category' para columnas con pocos valores distintos (ej. ciudad): un código entero por fila
+  - 'string[pyarrow]' para texto libre: los textos se guardan en un buffer de Arrow en lugar de objetos de Python
+
+El mismo esquema lo usan el extractor (al leer), el transformador (respeta los tipos que recibe) y el cargador
+(al guardar Parquet), y se puede guardar en JSON para reutilizarlo entre ejecuciones.
+"""
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from .dependencias import pyarrow_disponible
+from .fechas import a_fechas
+
+TIPO_TEXTO_ARROW = 'string[pyarrow]'
+
+
+class EsquemaDatos:
+    """Columnas a leer, tipo de cada columna y columnas de fecha"""
+
+    def __init__(self, tipos: Optional[Dict[str, str]] = None, columnas: Optional[List[str]] = None,
+                 fechas: Optional[List[str]] = None, motor_csv: str = 'c'):
+        """
+        Args:
+            tipos: Tipo de pandas por columna, ej. {'edad': 'float32', 'ciudad': 'category'}
+            columnas: Columnas a leer (proyección); None lee todas
+            fechas: Columnas que se interpretan como fechas al leer
+            motor_csv: 'c' (el de pandas) o 'pyarrow' (lee con varios hilos, bastante más rápido en archivos
+                grandes). Ojo: pyarrow convierte por su cuenta las columnas con fechas ISO (ej. 2020-01-15) en
+                fechas aunque no estén en fechas; si deben seguir siendo texto hay que darles un tipo en tipos
+        """
+        if motor_csv not in ('c', 'pyarrow'):
+            raise ValueError(f"Motor de CSV no soportado: {motor_csv}")
+        self.tipos = dict(tipos or {})
+        self.columnas = list(columnas) if columnas is not None else None
+        self.fechas = list(fechas or [])
+        self.motor_csv = motor_csv
+
+    @classmethod
+    def inferir(cls, df: pd.DataFrame, umbral_categorias: float = 0.5,
+                columnas: Optional[List[str]] = None) -> 'EsquemaDatos':
+        """
+        Propone el tipo más compacto para cada columna de df sin perder información
+
+        Args:
+            df: DataFrame de referencia (idealmente el archivo completo: un entero reducido según una muestra
+                puede no alcanzar para el resto del archivo)
+            umbral_categorias: Proporción máxima de valores distintos para usar 'category'
+            columnas: Proyección que tendrá el esquema (None: todas)
+
+        Returns:
+            EsquemaDatos con los tipos propuestos
+        """
+        tipos = {}
+        for columna in (columnas or df.columns):
+            tipo = _tipo_compacto(df[columna], umbral_categorias)
+            if tipo is not None:
+                tipos[columna] = tipo
+        return cls(tipos, columnas=columnas)
+
+    def opciones_csv(self, por_chunks: bool = False) -> Dict[str, Any]:
+        """
+        Argumentos para pd.read_csv
+
+        Args:
+            por_chunks: Si la lectura será con chunksize (el motor de pyarrow no lo admite: se usa el de C)
+
+        Returns:
+            Diccionario de argumentos (usecols, dtype, parse_dates y engine)
+        """
+        opciones = {}
+        if self.columnas is not None:
+            opciones['usecols'] = self.columnas
+        tipos = {columna: _resolver_tipo(tipo) for columna, tipo in self.tipos.items()
+                 if self.columnas is None or columna in self.columnas}
+        if tipos:
+            opciones['dtype'] = tipos
+        if self.fechas:
+            opciones['parse_dates'] = self.fechas
+        if self.motor_csv == 'pyarrow' and not por_chunks and pyarrow_disponible():
+            opciones['engine'] = 'pyarrow'
+        return opciones
+
+    def aplicar(self, df: pd.DataFrame, proyectar: bool = True) -> pd.DataFrame:
+        """
+        Devuelve df con la proyección y los tipos del esquema (las columnas que no están en el esquema no cambian)
+
+        Args:
+            df: DataFrame leído sin esquema (ej. de JSON o Excel) o que se va a guardar
+            proyectar: Si es False solo se aplican los tipos (ej. porque las columnas ya se eligieron al leer)
+
+        Returns:
+            DataFrame con los tipos aplicados (el mismo df si no había nada que cambiar)
+        """
+        if proyectar and self.columnas is not None:
+            df = df[[columna for columna in self.columnas if columna in df.columns]]
+        tipos = {columna: _resolver_tipo(tipo) for columna, tipo in self.tipos.items()
+                 if columna in df.columns and str(df[columna].dtype) != _resolver_tipo(tipo)}
+        if tipos:
+            df = df.astype(tipos)
+        for columna in self.fechas:
+            if columna in df.columns and not pd.api.types.is_datetime64_any_dtype(df[columna]):
+                df[columna] = a_fechas(df[columna])
+        return df
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {'tipos': self.tipos, 'columnas': self.columnas, 'fechas': self.fechas, 'motor_csv': self.motor_csv}
+
+    @classmethod
+    def desde_dict(cls, datos: Dict[str, Any]) -> 'EsquemaDatos':
+        return cls(datos.get('tipos'), datos.get('columnas'), datos.get('fechas'), datos.get('motor_csv', 'c'))
+
+    def guardar(self, ruta: str) -> str:
+        """Guarda el esquema en un archivo JSON"""
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.a_dict(), f, indent=2, ensure_ascii=False)
+        return ruta
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'EsquemaDatos':
+        """Lee un esquema guardado con guardar()"""
+        with open(ruta, encoding='utf-8') as f:
+            return cls.desde_dict(json.load(f))
+
+    def __repr__(self):
+        return (f"EsquemaDatos(tipos={self.tipos}, columnas={self.columnas}, fechas={self.fechas}, "
+                f"motor_csv={self.motor_csv!r})")
+
+
+def _resolver_tipo(tipo: str) -> str:
+    """Sin pyarrow los textos de Arrow se leen como object (el esquema sigue siendo válido, solo ahorra menos)"""
+    if tipo == TIPO_TEXTO_ARROW and not pyarrow_disponible():
+        return 'object'
+    return tipo
+
+
+def _tipo_compacto(serie: pd.Series, umbral_categorias: float) -> Optional[str]:
+    """Tipo compacto para una columna, o None si conviene dejar el que tiene"""
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+        return None
+
+    if pd.api.types.is_integer_dtype(serie):
+        if len(serie) == 0:
+            return None
+        minimo, maximo = serie.min(), serie.max()
+        for tipo in ('int8', 'int16', 'int32'):
+            if np.iinfo(tipo).min <= minimo and maximo <= np.iinfo(tipo).max:
+                return tipo
+        return None
+
+    if pd.api.types.is_float_dtype(serie):
+        # float32 solo si todos los valores se representan exactamente (ej. edades enteras con nulos);
+        # importes con decimales como 30123.45 perderían precisión y se dejan en float64
+        valores = serie.to_numpy(dtype='float64')
+        reducidos = valores.astype('float32').astype('float64')
+        exactos = (reducidos == valores) | (np.isnan(valores) & np.isnan(reducidos))
+        return 'float32' if exactos.all() else None
+
+    if serie.dtype == object or isinstance(serie.dtype, pd.StringDtype):
+        if serie.nunique(dropna=False) <= umbral_categorias * len(serie):
+            return 'category'
+        return TIPO_TEXTO_ARROW
+
+    return None
+
+
+# Esquema de los datos de empleados con los que trabaja el pipeline (id, nombre, edad, ciudad, salario, fecha_ingreso).
+# edad es float32 porque puede tener nulos (un int no admite NaN) y salario se deja en float64 porque tiene céntimos.
+ESQUEMA_EMPLEADOS = EsquemaDatos(
+    tipos={
+        'id': 'int64', # sin reducir: los ids crecen con la tabla y astype('int32') los desbordaría sin avisar
+        'nombre': TIPO_TEXTO_ARROW,
+        'edad': 'float32',
+        'ciudad': 'category',
+        'salario': 'float64',
+    },
+    columnas=['id', 'nombre', 'edad', 'ciudad', 'salario', 'fecha_ingreso'],
+)
@@ -0,0 +1,427 @@
+"""
+Estadísticas por columna calculadas en una pasada y combinables entre chunks o procesos
+
+EstadisticasColumnas.actualizar recorre un DataFrame una vez con operaciones vectorizadas y acumula por columna:
+nulos, media (suma y conteo), mínimo, máximo, cuantiles aproximados, número aproximado de valores distintos y los
+valores más frecuentes. Todo se guarda en resúmenes de tamaño acotado que se pueden sumar: las estadísticas de dos
+chunks (o de las particiones de dos procesos) se combinan con fusionar y dan las de todas sus filas juntas.
+  - cuantiles: boceto con cubos logarítmicos (tipo DDSketch); cualquier cuantil con un error relativo de como mucho
+    precision_cuantiles (1 %), sin guardar los valores (exactos mientras la columna no pase de 10.000 valores)
+  - valores distintos: HyperLogLog con 2**precision_distintos registros de un byte (4 KB por columna, ~1,6 % de error)
+  - valores frecuentes: conteos exactos de los max_frecuencias valores más repetidos (la moda es exacta salvo en
+    columnas con más valores distintos que ese límite)
+
+Con ellas se rellenan los nulos (media, mediana o moda por columna, ver valores_relleno) y se genera el perfil de
+los datos (perfil / guardar_perfil).
+"""
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional, Sequence
+from .deduplicacion import _mezclar
+
+ESTRATEGIAS_RELLENO = ('media', 'mediana', 'moda')
+# Resúmenes opcionales (nulos, media, mínimo y máximo se calculan siempre). Son los que más cuestan: quien solo
+# necesita medias (rellenar nulos con la media) no los pide
+MEDIDAS = ('cuantiles', 'distintos', 'frecuencias')
+MEDIDAS_ESTRATEGIA = {'media': (), 'mediana': ('cuantiles',), 'moda': ('frecuencias',)} # lo que necesita cada estrategia
+CUANTILES_PERFIL = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+
+class EstadisticasColumnas:
+    """Estadísticas de cada columna de uno o varios DataFrames (ver el docstring del módulo)"""
+
+    def __init__(self, medidas: Sequence[str] = MEDIDAS, precision_cuantiles: float = 0.01,
+                 precision_distintos: int = 12, max_frecuencias: int = 10_000):
+        """
+        Args:
+            medidas: Resúmenes opcionales que se calculan, de MEDIDAS
+            precision_cuantiles: Error relativo máximo de los cuantiles (0.01 = 1 %)
+            precision_distintos: Bits de índice del HyperLogLog (2**p registros; error ~1.04 / sqrt(2**p))
+            max_frecuencias: Valores distintos por columna cuyos conteos se conservan para la moda y el perfil
+        """
+        desconocidas = set(medidas) - set(MEDIDAS)
+        if desconocidas:
+            raise ValueError(f"Medidas no soportadas: {sorted(desconocidas)}. Opciones: {MEDIDAS}")
+        if not 0 < precision_cuantiles < 1:
+            raise ValueError(f"precision_cuantiles debe estar entre 0 y 1: {precision_cuantiles}")
+        if not 4 <= precision_distintos <= 18:
+            raise ValueError(f"precision_distintos debe estar entre 4 y 18: {precision_distintos}")
+        self.medidas = tuple(medida for medida in MEDIDAS if medida in medidas)
+        self.precision_cuantiles = precision_cuantiles
+        self.precision_distintos = precision_distintos
+        self.max_frecuencias = max_frecuencias
+        self.filas = 0
+        self.columnas: Dict[str, _Columna] = {}
+
+    @classmethod
+    def para_estrategias(cls, estrategias: Sequence[str], **opciones) -> 'EstadisticasColumnas':
+        """Estadísticas con solo los resúmenes que necesitan esas estrategias de relleno"""
+        return cls(medidas=[medida for estrategia in estrategias for medida in MEDIDAS_ESTRATEGIA[estrategia]], **opciones)
+
+    @classmethod
+    def desde_dataframe(cls, df: pd.DataFrame, **opciones) -> 'EstadisticasColumnas':
+        """Estadísticas de df (opciones: ver __init__)"""
+        return cls(**opciones).actualizar(df)
+
+    def actualizar(self, df: pd.DataFrame) -> 'EstadisticasColumnas':
+        """Acumula las estadísticas de las filas de df (un chunk, una partición...) y devuelve self"""
+        self.filas += len(df)
+        for columna in df.columns:
+            if columna not in self.columnas:
+                self.columnas[columna] = _Columna(self)
+            self.columnas[columna].actualizar(df[columna])
+        return self
+
+    def fusionar(self, otra: 'EstadisticasColumnas') -> 'EstadisticasColumnas':
+        """
+        Suma a self las estadísticas de otra (de otras filas: otro chunk, otra partición) y devuelve self
+
+        Raises:
+            ValueError: Si las dos se crearon con medidas o precisiones distintas (sus resúmenes no se pueden sumar)
+        """
+        if ((otra.medidas, otra.precision_cuantiles, otra.precision_distintos)
+                != (self.medidas, self.precision_cuantiles, self.precision_distintos)):
+            raise ValueError("Solo se pueden fusionar estadísticas con las mismas medidas y precisiones")
+        self.filas += otra.filas
+        for nombre, columna in otra.columnas.items():
+            if nombre in self.columnas:
+                self.columnas[nombre].fusionar(columna)
+            else:
+                self.columnas[nombre] = columna.copiar(self)
+        return self
+
+    def nulos(self, columna: str) -> int:
+        return self.columnas[columna].nulos
+
+    def media(self, columna: str) -> Optional[float]:
+        datos = self.columnas[columna]
+        return datos.suma / datos.conteo if datos.tipo == 'numerica' and datos.conteo else None
+
+    def cuantil(self, columna: str, q: float) -> Optional[float]:
+        """Cuantil q (0..1) aproximado de una columna numérica (None si no tiene valores)"""
+        datos = self.columnas[columna]
+        if datos.cuantiles is None or not datos.conteo:
+            return None
+        return float(min(max(datos.cuantiles.cuantil(q), datos.minimo), datos.maximo)) # los extremos son exactos
+
+    def mediana(self, columna: str) -> Optional[float]:
+        return self.cuantil(columna, 0.5)
+
+    def moda(self, columna: str) -> Any:
+        """Valor más frecuente (ante un empate, el menor, como Series.mode); None si la columna no tiene valores"""
+        frecuencias = self.columnas[columna].frecuencias
+        if frecuencias is None or frecuencias.empty:
+            return None
+        empatados = frecuencias.index[frecuencias.to_numpy() == frecuencias.max()]
+        try:
+            return _nativo(min(empatados))
+        except TypeError: # valores de tipos que no se pueden comparar
+            return _nativo(empatados[0])
+
+    def distintos(self, columna: str) -> Optional[int]:
+        """Número aproximado de valores distintos sin contar los nulos (None si no se calcula esa medida)"""
+        contador = self.columnas[columna].distintos
+        return contador.estimar() if contador is not None else None
+
+    def valores_relleno(self, estrategias: Optional[Dict[str, str]] = None, por_defecto: str = 'media',
+                        columnas: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Valor con el que rellenar los nulos de cada columna numérica que los tiene
+
+        Args:
+            estrategias: Estrategia por columna: 'media', 'mediana' o 'moda'
+            por_defecto: Estrategia de las columnas que no están en estrategias
+            columnas: Columnas para las que se calcula (por defecto, las numéricas con nulos)
+
+        Returns:
+            Diccionario columna -> valor de relleno (las columnas sin ningún valor no aparecen)
+        """
+        estrategias = estrategias or {}
+        for estrategia in [por_defecto, *estrategias.values()]:
+            if estrategia not in ESTRATEGIAS_RELLENO:
+                raise ValueError(f"Estrategia de relleno no soportada: {estrategia}. Opciones: {ESTRATEGIAS_RELLENO}")
+        if columnas is None:
+            columnas = [nombre for nombre, datos in self.columnas.items() if datos.tipo == 'numerica' and datos.nulos]
+        valores = {}
+        for columna in columnas:
+            estrategia = estrategias.get(columna, por_defecto)
+            valor = {'media': self.media, 'mediana': self.mediana, 'moda': self.moda}[estrategia](columna)
+            if valor is not None:
+                valores[columna] = valor
+        return valores
+
+    def perfil(self) -> Dict[str, Any]:
+        """Perfil de los datos: filas y, por columna, tipo, nulos, distintos y las estadísticas de su tipo"""
+        columnas = {}
+        for nombre, datos in self.columnas.items():
+            resumen = {'tipo': datos.tipo, 'dtype': datos.dtype, 'nulos': datos.nulos,
+                       'porcentaje_nulos': round(100 * datos.nulos / datos.filas, 2) if datos.filas else 0.0,
+                       'distintos_aprox': self.distintos(nombre)}
+            if datos.tipo == 'numerica' and datos.conteo:
+                resumen.update(media=self.media(nombre), minimo=_nativo(datos.minimo), maximo=_nativo(datos.maximo))
+                if datos.cuantiles is not None:
+                    resumen['cuantiles_aprox'] = {f'p{round(q * 100)}': self.cuantil(nombre, q) for q in CUANTILES_PERFIL}
+            elif datos.tipo == 'fecha' and datos.conteo:
+                resumen.update(minimo=pd.Timestamp(datos.minimo).isoformat(), maximo=pd.Timestamp(datos.maximo).isoformat())
+            if datos.frecuencias is not None and not datos.frecuencias.empty:
+                resumen['moda'] = self.moda(nombre)
+                frecuentes = datos.frecuencias.nlargest(5)
+                resumen['frecuentes'] = [{'valor': _nativo(valor), 'filas': int(filas)} for valor, filas in frecuentes.items()]
+            columnas[str(nombre)] = resumen
+        return {'filas': self.filas, 'columnas': columnas}
+
+    def guardar_perfil(self, ruta: str) -> str:
+        """Guarda perfil() en un archivo JSON y devuelve su ruta"""
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.perfil(), f, indent=2, ensure_ascii=False, default=str)
+        return ruta
+
+
+class _Columna:
+    """Resúmenes acumulados de una columna"""
+
+    def __init__(self, estadisticas: EstadisticasColumnas):
+        self.estadisticas = estadisticas
+        self.tipo = None # 'numerica', 'fecha' u 'otra' (texto, categórica, booleana): se fija con el primer chunk
+        self.dtype = None
+        self.filas = self.nulos = self.conteo = 0
+        self.suma = 0.0
+        self.minimo = self.maximo = None
+        self.cuantiles: Optional[_BocetoCuantiles] = None
+        self.distintos = _ContadorDistintos(estadisticas.precision_distintos) if 'distintos' in estadisticas.medidas else None
+        self.frecuencias: Optional[pd.Series] = None
+
+    def actualizar(self, serie: pd.Series):
+        nulos = serie.isna().to_numpy()
+        self.filas += len(serie)
+        self.nulos += int(nulos.sum())
+        if nulos.all():
+            return
+        self._fijar_tipo(_tipo(serie), str(serie.dtype))
+        self.conteo += len(serie) - int(nulos.sum())
+
+        if self.tipo == 'numerica':
+            # float64 para todo: la suma no desborda con enteros pequeños y 5 y 5.0 (un chunk con nulos) son el mismo valor.
+            # nansum suma igual que Series.mean, así que la media de un solo DataFrame es exactamente la de pandas
+            numeros = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+            self.suma += float(np.nansum(numeros))
+            self._extremos(np.nanmin(numeros), np.nanmax(numeros))
+            valores = numeros[~nulos] if nulos.any() else numeros
+            if self.cuantiles is not None:
+                self.cuantiles.actualizar(valores)
+        else:
+            valores = serie[~nulos] if nulos.any() else serie
+            if self.tipo == 'fecha':
+                self._extremos(valores.min(), valores.max())
+
+        if self.distintos is None and 'frecuencias' not in self.estadisticas.medidas:
+            return
+        # una sola pasada por la tabla hash: factorize da los valores distintos y el código de cada fila
+        if isinstance(valores.dtype, pd.CategoricalDtype):
+            codigos, unicos = valores.cat.codes.to_numpy(), valores.cat.categories
+        else:
+            codigos, unicos = pd.factorize(valores)
+        conteos = np.bincount(codigos, minlength=len(unicos))
+        presentes = conteos > 0 # en una categórica puede haber categorías sin filas
+        unicos = pd.Index(unicos)[presentes]
+        if self.distintos is not None: # basta con las huellas de los distintos: repetir un valor no cambia el HyperLogLog
+            self.distintos.actualizar(pd.util.hash_pandas_object(unicos, index=False).to_numpy())
+        if 'frecuencias' in self.estadisticas.medidas:
+            self._contar(pd.Series(conteos[presentes], index=unicos))
+
+    def _fijar_tipo(self, tipo: str, dtype: str):
+        """El tipo lo decide el primer chunk con valores (uno solo con nulos no dice nada: se lee como object o float)"""
+        if self.tipo is None:
+            self.tipo, self.dtype = tipo, dtype
+            if tipo == 'numerica' and 'cuantiles' in self.estadisticas.medidas:
+                self.cuantiles = _BocetoCuantiles(self.estadisticas.precision_cuantiles)
+        elif tipo != self.tipo: # chunks con tipos distintos (ej. números y después texto): solo se cuenta lo común
+            self.tipo, self.dtype = 'otra', 'object'
+            self.cuantiles = self.minimo = self.maximo = None
+
+    def _extremos(self, minimo, maximo):
+        self.minimo = minimo if self.minimo is None else min(self.minimo, minimo)
+        self.maximo = maximo if self.maximo is None else max(self.maximo, maximo)
+
+    def _contar(self, conteos: pd.Series):
+        if self.frecuencias is not None:
+            conteos = self.frecuencias.add(conteos, fill_value=0)
+        if len(conteos) > self.estadisticas.max_frecuencias: # solo se conservan los más repetidos
+            conteos = conteos.nlargest(self.estadisticas.max_frecuencias)
+        self.frecuencias = conteos.astype(np.int64)
+
+    def fusionar(self, otra: '_Columna'):
+        if otra.tipo is not None:
+            self._fijar_tipo(otra.tipo, otra.dtype)
+            if self.cuantiles is not None and otra.cuantiles is not None:
+                self.cuantiles.fusionar(otra.cuantiles)
+        self.filas += otra.filas
+        self.nulos += otra.nulos
+        self.conteo += otra.conteo
+        self.suma += otra.suma
+        if otra.minimo is not None and self.tipo == otra.tipo:
+            self._extremos(otra.minimo, otra.maximo)
+        if self.distintos is not None:
+            self.distintos.fusionar(otra.distintos)
+        if otra.frecuencias is not None:
+            self._contar(otra.frecuencias)
+
+    def copiar(self, estadisticas: EstadisticasColumnas) -> '_Columna':
+        copia = _Columna(estadisticas)
+        copia.fusionar(self)
+        return copia
+
+
+class _BocetoCuantiles:
+    """
+    Boceto de cuantiles con cubos logarítmicos: el valor x > 0 cuenta en el cubo ceil(log_gamma(x)), con
+    gamma = (1 + e) / (1 - e). Todos los valores de un cubo están a menos de un error relativo e de su centro, así que
+    cualquier cuantil se estima con ese error. Los negativos van en otros cubos con el valor absoluto y los ~0 aparte.
+    Combinar dos bocetos es sumar los conteos de cada cubo.
+    Mientras no hay más de MAX_EXACTOS valores se guardan tal cual y los cuantiles son exactos (como Series.quantile)
+    """
+
+    MINIMO_INDEXABLE = 1e-12 # los valores más cercanos a cero que esto cuentan como cero
+    MAX_EXACTOS = 10_000
+
+    def __init__(self, error_relativo: float):
+        self.error_relativo = error_relativo
+        self.gamma = (1 + error_relativo) / (1 - error_relativo)
+        self.log_gamma = math.log(self.gamma)
+        self.exactos: Optional[np.ndarray] = np.empty(0) # None en cuanto los valores pasan a los cubos
+        self.positivos = _Cubos()
+        self.negativos = _Cubos()
+        self.ceros = 0
+
+    def actualizar(self, valores: np.ndarray):
+        valores = valores[np.isfinite(valores)]
+        if self.exactos is not None:
+            self.exactos = np.concatenate([self.exactos, valores])
+            if len(self.exactos) <= self.MAX_EXACTOS:
+                return
+            valores, self.exactos = self.exactos, None
+        positivos = valores > self.MINIMO_INDEXABLE
+        negativos = valores < -self.MINIMO_INDEXABLE
+        self.positivos.agregar(self._indices(valores[positivos]))
+        self.negativos.agregar(self._indices(-valores[negativos]))
+        self.ceros += int(len(valores) - positivos.sum() - negativos.sum())
+
+    def _indices(self, valores: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(valores) / self.log_gamma).astype(np.int64)
+
+    def _valor(self, indice: int) -> float:
+        return 2 * self.gamma ** indice / (self.gamma + 1) # centro del cubo (en error relativo)
+
+    def fusionar(self, otro: '_BocetoCuantiles'):
+        if otro.exactos is not None:
+            self.actualizar(otro.exactos)
+            return
+        if self.exactos is not None: # el otro ya está en cubos: estos valores también pasan a cubos
+            exactos, self.exactos = self.exactos, None
+            self.actualizar(exactos)
+        self.positivos.fusionar(otro.positivos)
+        self.negativos.fusionar(otro.negativos)
+        self.ceros += otro.ceros
+
+    def copiar(self) -> '_BocetoCuantiles':
+        copia = _BocetoCuantiles(self.error_relativo)
+        copia.fusionar(self)
+        return copia
+
+    def cuantil(self, q: float) -> float:
+        if self.exactos is not None:
+            return float(np.quantile(self.exactos, q)) if len(self.exactos) else float('nan')
+        total = self.negativos.total() + self.ceros + self.positivos.total()
+        rango = q * (total - 1) # posición del cuantil en los valores ordenados (0..total-1)
+        # los negativos, de más negativo (índice mayor) a menos
+        acumulado = np.cumsum(self.negativos.conteos[::-1])
+        if len(acumulado) and rango < acumulado[-1]:
+            return -self._valor(int(self.negativos.indices[::-1][np.searchsorted(acumulado, rango, side='right')]))
+        rango -= acumulado[-1] if len(acumulado) else 0
+        if rango < self.ceros:
+            return 0.0
+        rango -= self.ceros
+        acumulado = np.cumsum(self.positivos.conteos)
+        posicion = min(int(np.searchsorted(acumulado, rango, side='right')), len(acumulado) - 1)
+        return self._valor(int(self.positivos.indices[posicion]))
+
+
+class _Cubos:
+    """Conteos por índice de cubo, en arrays ordenados por índice"""
+
+    def __init__(self):
+        self.indices = np.empty(0, dtype=np.int64)
+        self.conteos = np.empty(0, dtype=np.int64)
+
+    def agregar(self, indices: np.ndarray, conteos: Optional[np.ndarray] = None):
+        if not len(indices):
+            return
+        conteos = np.ones(len(indices), dtype=np.int64) if conteos is None else conteos
+        self.indices, posiciones = np.unique(np.concatenate([self.indices, indices]), return_inverse=True)
+        self.conteos = np.bincount(posiciones, weights=np.concatenate([self.conteos, conteos]),
+                                   minlength=len(self.indices)).astype(np.int64)
+
+    def fusionar(self, otros: '_Cubos'):
+        self.agregar(otros.indices, otros.conteos)
+
+    def total(self) -> int:
+        return int(self.conteos.sum())
+
+
+class _ContadorDistintos:
+    """HyperLogLog: cada huella de 64 bits va a un registro (sus primeros p bits) que guarda el máximo de ceros iniciales"""
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self.registros = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def actualizar(self, huellas: np.ndarray):
+        if not len(huellas):
+            return
+        huellas = _mezclar(huellas.astype(np.uint64)) # hash_pandas_object de números pequeños no reparte bien los bits altos
+        bits_resto = 64 - self.precision
+        registro = (huellas >> np.uint64(bits_resto)).astype(np.intp)
+        resto = huellas & np.uint64((1 << bits_resto) - 1)
+        # posición del primer 1 contando desde el bit más alto del resto
+        rango = (bits_resto - _numero_de_bits(resto) + 1).astype(np.uint8)
+        np.maximum.at(self.registros, registro, rango)
+
+    def fusionar(self, otro: '_ContadorDistintos'):
+        np.maximum(self.registros, otro.registros, out=self.registros)
+
+    def estimar(self) -> int:
+        m = len(self.registros)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimacion = alfa * m * m / np.sum(np.ldexp(1.0, -self.registros.astype(np.int64)))
+        vacios = int((self.registros == 0).sum())
+        if estimacion <= 2.5 * m and vacios: # pocos valores: el conteo lineal de registros vacíos es más preciso
+            estimacion = m * math.log(m / vacios)
+        return int(round(estimacion))
+
+
+def _numero_de_bits(valores: np.ndarray) -> np.ndarray:
+    """Bits significativos de cada uint64 (0 para el 0)
+
+    frexp da el número de bits exacto, pero un uint64 de más de 53 bits se redondea al pasar a float64 (2**60 - 1
+    se convertiría en 2**60). Por eso se mira por mitades de 32 bits, que sí son exactas.
+    """
+    alta = (valores >> np.uint64(32)).astype(np.float64)
+    baja = (valores & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(alta > 0, np.frexp(alta)[1] + 32, np.frexp(baja)[1])
+
+
+def _tipo(serie: pd.Series) -> str:
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return 'numerica'
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return 'fecha'
+    return 'otra'
+
+
+def _nativo(valor: Any) -> Any:
+    """Valor de numpy como tipo de Python (para el JSON del perfil y para rellenar nulos)"""
+    return valor.item() if isinstance(valor, np.generic) else valor
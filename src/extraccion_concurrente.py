@@ -0,0 +1,202 @@
+"""
+Extracción concurrente de muchas fuentes (archivos locales o URLs)
+
+Cada fuente pasa por dos fases con recursos distintos:
+  - descarga (solo URLs): espera de red. Se coordina con asyncio y cada descarga corre en un hilo con el
+    ClienteHTTP compartido (requests no es asíncrono, pero mientras un hilo espera a la red los demás avanzan)
+  - parseo: CPU. Se envía a un pool de procesos para usar varios núcleos (el GIL no deja parsear en paralelo con hilos)
+
+Como mucho max_concurrencia fuentes están en curso a la vez (semáforo), así que ni se abren cientos de conexiones
+ni se acumulan en memoria cientos de DataFrames a medio procesar.
+"""
+import asyncio
+import multiprocessing
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Sequence, Iterator, Tuple, AsyncIterator
+from .extractor import ExtractorDatos
+from .cliente_http import ClienteHTTP, es_url
+from .esquema import EsquemaDatos
+from .loader import POOLS
+from .logger import obtener_logger
+
+logger = obtener_logger()
+
+_FIN = object() # marca de fin en la cola de iterar_fuentes
+
+
+def _parsear(ruta: str, tipo: str, esquema: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Lee un archivo local. Es una función de módulo para poder enviarla a un ProcessPoolExecutor"""
+    esquema = EsquemaDatos.desde_dict(esquema) if esquema is not None else None
+    return ExtractorDatos().leer_archivo_local(ruta, tipo, esquema=esquema)
+
+
+async def extraer_fuentes_async(fuentes: Sequence[str], ejecutor: Executor, tipo: str = 'csv',
+                                max_concurrencia: int = 8, esquema: Optional[EsquemaDatos] = None,
+                                cliente_http: Optional[ClienteHTTP] = None
+                                ) -> AsyncIterator[Tuple[str, Optional[pd.DataFrame], Dict[str, Any]]]:
+    """
+    Extrae las fuentes concurrentemente y las entrega a medida que terminan (no en el orden de entrada)
+
+    Args:
+        fuentes: Rutas locales o URLs
+        ejecutor: Pool donde se parsean los archivos
+        tipo: Tipo de archivo de todas las fuentes (csv, json, excel, parquet)
+        max_concurrencia: Fuentes en curso a la vez como máximo
+        esquema: Tipos compactos y proyección de columnas
+        cliente_http: Cliente para las URLs (por defecto se crea uno con max_concurrencia conexiones)
+
+    Yields:
+        (fuente, DataFrame o None si falló, resumen de la fuente)
+    """
+    fuentes = list(fuentes)
+    # el cliente (y con él requests) solo se crea si hay alguna URL
+    cliente = cliente_http or (ClienteHTTP(max_conexiones=max_concurrencia) if any(map(es_url, fuentes)) else None)
+    semaforo = asyncio.Semaphore(max_concurrencia)
+    loop = asyncio.get_running_loop()
+    esquema_dict = esquema.a_dict() if esquema is not None else None
+
+    async def extraer(fuente: str):
+        resumen = {'fuente': fuente, 'exito': False, 'filas': 0, 'estado': 'local', 'bytes': 0,
+                   'segundos_descarga': 0.0, 'segundos_parseo': 0.0, 'segundos': 0.0, 'error': None}
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                ruta = fuente
+                if es_url(fuente):
+                    descarga = await asyncio.to_thread(cliente.descargar, fuente)
+                    ruta = descarga['ruta']
+                    resumen.update(estado=descarga['estado'], bytes=descarga['bytes'])
+                    resumen['segundos_descarga'] = time.perf_counter() - inicio
+
+                inicio_parseo = time.perf_counter()
+                df = await loop.run_in_executor(ejecutor, _parsear, ruta, tipo, esquema_dict)
+                resumen['segundos_parseo'] = time.perf_counter() - inicio_parseo
+                resumen.update(exito=True, filas=len(df))
+            except Exception as e:
+                df = None
+                resumen['error'] = str(e)
+                logger.error("Error extrayendo %s: %s", fuente, e)
+            resumen['segundos'] = time.perf_counter() - inicio
+        return fuente, df, resumen
+
+    tareas = [asyncio.ensure_future(extraer(fuente)) for fuente in fuentes]
+    try:
+        for tarea in asyncio.as_completed(tareas):
+            yield await tarea
+    finally:
+        for tarea in tareas: # si quien itera se detiene antes, no se siguen descargando fuentes
+            tarea.cancel()
+        if cliente_http is None and cliente is not None:
+            cliente.cerrar()
+
+
+def iterar_fuentes(fuentes: Sequence[str], tipo: str = 'csv', max_concurrencia: int = 8,
+                   max_workers: Optional[int] = None, pool: str = 'procesos',
+                   esquema: Optional[EsquemaDatos] = None,
+                   cliente_http: Optional[ClienteHTTP] = None) -> Iterator[Tuple[str, Optional[pd.DataFrame], Dict[str, Any]]]:
+    """
+    Versión síncrona de extraer_fuentes_async: un generador normal que entrega cada fuente en cuanto termina
+
+    El bucle de asyncio corre en un hilo aparte y pasa los resultados por una cola acotada: si quien itera va más
+    lento, la extracción se frena en lugar de acumular DataFrames en memoria.
+
+    Args:
+        fuentes, tipo, max_concurrencia, esquema, cliente_http: Ver extraer_fuentes_async
+        max_workers: Procesos (o hilos) del pool de parseo
+        pool: 'procesos' o 'hilos' (con archivos pequeños los hilos evitan el coste de copiar entre procesos)
+
+    Yields:
+        (fuente, DataFrame o None si falló, resumen de la fuente)
+    """
+    if pool not in POOLS:
+        raise ValueError(f"Pool no soportado: {pool}. Opciones: {list(POOLS)}")
+
+    resultados = queue.Queue(maxsize=max_concurrencia)
+    detener = threading.Event()
+
+    async def producir(ejecutor: Executor):
+        async for resultado in extraer_fuentes_async(fuentes, ejecutor, tipo, max_concurrencia, esquema, cliente_http):
+            await asyncio.to_thread(resultados.put, resultado) # esperar sitio en la cola sin bloquear el bucle de eventos
+            if detener.is_set(): # quien iteraba dejó de hacerlo: no se extrae nada más
+                return
+
+    def hilo():
+        opciones = {'max_workers': max_workers}
+        if pool == 'procesos' and 'forkserver' in multiprocessing.get_all_start_methods():
+            # Este hilo no es el único del proceso (HTTP, logging...): un fork copiaría los locks que otros hilos
+            # tengan tomados en ese instante y el proceso hijo podría quedarse bloqueado. forkserver crea los
+            # procesos desde un proceso limpio, sin hilos
+            opciones['mp_context'] = multiprocessing.get_context('forkserver')
+        try:
+            with POOLS[pool](**opciones) as ejecutor:
+                asyncio.run(producir(ejecutor))
+        except BaseException as e:
+            resultados.put(e)
+        finally:
+            resultados.put(_FIN)
+
+    productor = threading.Thread(target=hilo, name='extraccion_concurrente', daemon=True)
+    productor.start()
+    try:
+        while True:
+            resultado = resultados.get()
+            if resultado is _FIN:
+                break
+            if isinstance(resultado, BaseException):
+                raise resultado
+            yield resultado
+    finally:
+        detener.set()
+        while productor.is_alive(): # vaciar la cola para que el productor no quede bloqueado y pueda terminar
+            try:
+                resultados.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        productor.join()
+
+
+def extraer_fuentes(fuentes: Sequence[str], tipo: str = 'csv', max_concurrencia: int = 8,
+                    max_workers: Optional[int] = None, pool: str = 'procesos',
+                    esquema: Optional[EsquemaDatos] = None, cliente_http: Optional[ClienteHTTP] = None,
+                    columna_fuente: Optional[str] = 'fuente',
+                    fallar_si_error: bool = False) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Extrae todas las fuentes concurrentemente y las une en un solo DataFrame
+
+    Args:
+        fuentes, tipo, max_concurrencia, max_workers, pool, esquema, cliente_http: Ver iterar_fuentes
+        columna_fuente: Nombre de la columna (categórica) con la fuente de cada fila; None para no añadirla
+        fallar_si_error: Si es True, el error de cualquier fuente se lanza; si es False, la fuente se omite
+            y el error queda en el resumen
+
+    Returns:
+        (DataFrame con las filas de todas las fuentes en el orden de entrada, resumen por fuente)
+    """
+    inicio = time.perf_counter()
+    fuentes = list(dict.fromkeys(fuentes)) # sin repetidas: cada fuente se extrae una vez
+    datos, resumenes = {}, {}
+    for fuente, df, resumen in iterar_fuentes(fuentes, tipo, max_concurrencia, max_workers, pool, esquema, cliente_http):
+        if df is None and fallar_si_error:
+            raise RuntimeError(f"No se pudo extraer {fuente}: {resumen['error']}")
+        resumenes[fuente] = resumen
+        if df is not None:
+            if columna_fuente:
+                # categórica: un código entero por fila en lugar de repetir el texto de la fuente
+                df[columna_fuente] = pd.Categorical.from_codes(np.full(len(df), fuentes.index(fuente)), categories=fuentes)
+            datos[fuente] = df
+
+    resumen = [resumenes[fuente] for fuente in fuentes]
+    ordenados = [datos[fuente] for fuente in fuentes if fuente in datos] # orden de entrada, no de llegada: resultado reproducible
+    df = pd.concat(ordenados, ignore_index=True) if ordenados else pd.DataFrame()
+
+    fallidas = [fila['fuente'] for fila in resumen if not fila['exito']]
+    logger.info("Extraídas %s/%s fuentes (%s filas) en %.2f s", len(ordenados), len(fuentes), len(df),
+                time.perf_counter() - inicio)
+    if fallidas:
+        logger.warning("Fuentes con error: %s", fallidas)
+    return df, resumen
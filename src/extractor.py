@@ -1,16 +1,37 @@
+import contextlib
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import re
 import pandas as pd
-import requests
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Iterator, List, Optional
 # El módulo typing se usa para añadir anotaciones de tipo (o "type hints") al código. Estas anotaciones no cambian cómo funciona el programa cuando se ejecuta, pero sirven para dos propósitos vitales:
 # Documentación y Legibilidad: Hacen que el código sea mucho más claro para otros programadores (¡o para ti mismo en el futuro!). Indican claramente qué espera una función como entrada y qué tipo de dato devolverá.
-from .logger import manejar_error, LoggerPersonalizado
+from .logger import manejar_error, obtener_logger
+from .dependencias import importar_pyarrow
+from .esquema import EsquemaDatos
+from .cache import CacheDatos
+from .cliente_http import ClienteHTTP, es_url
+from .compresion import abrir, codec_de_ruta, resolver_codec, ruta_comprimida
+from .particiones import listar_particiones, podar_particiones, _cumple
 
-logger = LoggerPersonalizado().get_logger() #se obtiene el logger personalizado para registrar eventos en este módulo.
+TAMANO_LOTE_EXCEL = 10_000 # filas de Excel que se convierten a DataFrame de cada vez al leer un archivo completo
+HOJAS_DATOS_EXCEL = re.compile(r'^Datos(_(\d+))?$') # hojas de datos que escribe CargadorDatos.guardar_como_excel
+
+logger = obtener_logger() #se obtiene el logger personalizado para registrar eventos en este módulo (se configura con el primer mensaje).
 # esto es una inyección de dependencia, donde se crea una instancia del logger personalizado para ser utilizado en el módulo extractor.py.
 
 class ExtractorDatos:
     """Clase para extraer datos de diversas fuentes."""
-    def __init__(self):None
+    def __init__(self, cache: Optional[CacheDatos] = None, cliente_http: Optional[ClienteHTTP] = None):
+        self.cache = cache # si se indica, leer_archivo_local no vuelve a leer un archivo cuyo contenido no cambió
+        self._cliente_http = cliente_http # se crea al hacer la primera descarga y se reutiliza (con sus conexiones abiertas)
+
+    @property
+    def cliente_http(self) -> ClienteHTTP:
+        if self._cliente_http is None:
+            self._cliente_http = ClienteHTTP()
+        return self._cliente_http
 # el método __init__ es el constructor de la clase ExtractorDatos. En este caso, no realiza ninguna inicialización específica.
 #Dentro del constructor, esta línea inicializa una variable de instancia (un atributo)
 #  llamada datos_extraidos y le asigna el valor None. 
@@ -19,40 +40,50 @@ class ExtractorDatos:
 #typing se muestra aqui url: str: Le dice al lector que la variable url debe ser una cadena de texto (string)
 
     @manejar_error #se aplica el decorador manejar_error a la función descargar_csv_publico para agregar manejo de errores y logging automáticamente.
-    def descargar_csv_publico(self, url: str) -> pd.DataFrame: #self es una referencia a la instancia actual de la clase ExtractorDatos. url es un parámetro que representa la URL desde donde se descargará el archivo CSV. -> pd.DataFrame indica que esta función devolverá un objeto DataFrame de pandas.
+    def descargar_csv_publico(self, url: str, usar_respaldo: bool = False,
+                              esquema: Optional[EsquemaDatos] = None) -> pd.DataFrame: #self es una referencia a la instancia actual de la clase ExtractorDatos. url es un parámetro que representa la URL desde donde se descargará el archivo CSV. -> pd.DataFrame indica que esta función devolverá un objeto DataFrame de pandas.
         """
         Descarga un CSV desde una URL pública
         
         Args:
             url: URL del CSV
+            usar_respaldo: Si la descarga falla, devolver los datos de ejemplo en lugar de lanzar el error
+            esquema: Tipos compactos y proyección de columnas para leer el CSV descargado
             
         Returns:
             DataFrame de pandas
         """
-        logger.info(f"Descargando CSV desde: {url}") #Registra un mensaje informativo antes de intentar la descarga del CSV.
+        logger.info("Descargando CSV desde: %s", url) #Registra un mensaje informativo antes de intentar la descarga del CSV.
         
-        # Opción 1: Desde URL directa
+        # La descarga pasa por el cliente HTTP: conexión reutilizada, gzip, y si el archivo no cambió desde la
+        # última vez (304) no se vuelve a bajar y se lee la copia local
         try:
-            df = pd.read_csv(url) #intenta usar pd.read_csv(url) para leer directamente el CSV desde la URL proporcionada y almacenarlo en un DataFrame llamado df.
-            logger.info(f"CSV descargado. Filas: {len(df)}, Columnas: {len(df.columns)}")
-            self.datos_extraidos = df #si tien exito, asigna el DataFrame df al atributo datos_extraidos de la instancia actual.
-            return df #devuelve el DataFrame df.
+            descarga = self.cliente_http.descargar(url)
         except Exception as e:
-            logger.warning(f"No se pudo descargar desde URL: {e}")
-            
-            # Opción 2: Para datos locales de respaldo
-            logger.info("Usando datos de respaldo locales...") #si la descarga directa falla, archivo no existe o url esta caida, registra un mensaje informativo indicando que se usará un conjunto de datos de respaldo local.
-            # Datos de ejemplo # se registra u na advertencia y luego crea un DataFrame de ejemplo con datos ficticios. Para que el programa siga funcionando sin depender de la red.
-            datos_ejemplo = {
-                'id': [1, 2, 3, 4, 5],
-                'nombre': ['Juan Pérez', 'María García', 'Pedro López', None, 'Ana Martínez'],
-                'edad': [25, 30, None, 40, 35],
-                'ciudad': ['Madrid', 'Barcelona', 'Madrid', 'Valencia', 'Sevilla'],
-                'salario': [30000, 35000, 28000, 42000, 32000],
-                'fecha_ingreso': ['2020-01-15', '2019-03-20', None, '2018-06-10', '2021-09-05']
-            }
-            df = pd.DataFrame(datos_ejemplo) #crea un DataFrame de pandas a partir del diccionario datos_ejemplo. con pd.DataFrame(datos_ejemplo)
-            return df #devuelve el DataFrame df creado con los datos de ejemplo.
+            if not usar_respaldo: # sin respaldo el error llega a quien llamó, en lugar de continuar con otros datos sin avisar
+                raise
+            logger.warning("No se pudo descargar desde URL: %s", e)
+            logger.warning("Usando los datos de ejemplo como respaldo: el resultado NO corresponde a %s", url)
+            return self.datos_ejemplo()
+
+        df = self.leer_archivo_local(descarga['ruta'], esquema=esquema)
+        logger.info("CSV descargado. Filas: %s, Columnas: %s", len(df), len(df.columns))
+        self.datos_extraidos = df #si tien exito, asigna el DataFrame df al atributo datos_extraidos de la instancia actual.
+        return df #devuelve el DataFrame df.
+
+    @staticmethod
+    def datos_ejemplo() -> pd.DataFrame:
+        """Conjunto pequeño de datos ficticios para practicar sin depender de la red"""
+        # Datos de ejemplo: un DataFrame con datos ficticios para que el programa funcione sin red.
+        datos_ejemplo = {
+            'id': [1, 2, 3, 4, 5],
+            'nombre': ['Juan Pérez', 'María García', 'Pedro López', None, 'Ana Martínez'],
+            'edad': [25, 30, None, 40, 35],
+            'ciudad': ['Madrid', 'Barcelona', 'Madrid', 'Valencia', 'Sevilla'],
+            'salario': [30000, 35000, 28000, 42000, 32000],
+            'fecha_ingreso': ['2020-01-15', '2019-03-20', None, '2018-06-10', '2021-09-05']
+        }
+        return pd.DataFrame(datos_ejemplo) #crea un DataFrame de pandas a partir del diccionario datos_ejemplo. con pd.DataFrame(datos_ejemplo)
 #Las claves del diccionario se convierten en los nombres de las columnas del DataFrame.
 #Los valores asociados a cada clave (que deben ser listas o arrays de igual longitud) se convierten en los datos de esas columnas. 
 
@@ -65,34 +96,217 @@ class ExtractorDatos:
 # tipo: str = 'csv': Espera un argumento tipo, que también es una cadena de texto. Tiene un valor por defecto de 'csv', lo que significa que si no especificas el tipo al llamar la función, asumirá que es un CSV.
 # -> pd.DataFrame: Indica que el método devolverá un DataFrame de Pandas.
     @manejar_error
-    def leer_archivo_local(self, ruta: str, tipo: str = 'csv') -> pd.DataFrame:
+    def leer_archivo_local(self, ruta: str, tipo: str = 'csv', columnas: Optional[List[str]] = None,
+                           filtros: Optional[List[tuple]] = None,
+                           esquema: Optional[EsquemaDatos] = None, compresion: Optional[str] = None) -> pd.DataFrame:
         """
         Lee archivos locales
         
         Args:
             ruta: Ruta del archivo
-            tipo: Tipo de archivo (csv, json, excel)
+            tipo: Tipo de archivo (csv, json, excel, parquet)
+            columnas: Columnas a leer (None lee todas, o las del esquema si se indica uno)
+            filtros: Solo para parquet: filtros estilo pyarrow, ej. [('edad', '>=', 30)]. Los row groups
+                cuyas estadísticas min/max no pueden cumplir el filtro no se leen
+            esquema: Tipos compactos y proyección de columnas (ver EsquemaDatos). En CSV los tipos se aplican
+                mientras se lee el archivo; en el resto de formatos, justo después de leerlo
+            compresion: Solo csv y json: 'gzip', 'bz2', 'xz' o 'none'. Por defecto se deduce de la extensión (.gz,
+                .bz2, .xz); el archivo se descomprime mientras se lee
             
         Returns:
             DataFrame de pandas
         """
-        logger.info(f"Leyendo archivo {tipo} desde: {ruta}")
+        logger.info("Leyendo archivo %s desde: %s", tipo, ruta)
+        if columnas is None and esquema is not None:
+            columnas = esquema.columnas
+        codec = _codec_lectura(ruta, tipo, compresion)
+
+        clave_cache = None
+        if self.cache is not None: # la clave depende del contenido del archivo y de todo lo que cambia el resultado de la lectura
+            clave_cache = self.cache.clave_archivo(ruta, 'extraccion', {
+                'tipo': tipo, 'columnas': columnas, 'filtros': filtros, 'compresion': codec,
+                'esquema': esquema.a_dict() if esquema is not None else None,
+            })
+            df = self.cache.obtener(clave_cache)
+            if df is not None:
+                self.datos_extraidos = df
+                return df
         
         if tipo == 'csv':
-            df = pd.read_csv(ruta, encoding='utf-8')
+            opciones = esquema.opciones_csv() if esquema is not None else {}
+            if columnas is not None:
+                opciones['usecols'] = columnas # las columnas que no se piden no se llegan a convertir
+            df = pd.read_csv(ruta, encoding='utf-8', compression=codec, **opciones)
         elif tipo == 'json':
-            df = pd.read_json(ruta)
+            df = pd.read_json(ruta, compression=codec)
+            if columnas is not None: # read_json no tiene usecols
+                df = df[columnas]
         elif tipo == 'excel':
-            df = pd.read_excel(ruta, engine='openpyxl') #Pandas necesita el motor 'openpyxl' para manejar archivos .xlsx
+            # modo read_only de openpyxl: las filas se leen del XML según se recorren, sin cargar el libro entero
+            # (pd.read_excel lo carga completo). Se leen todas las hojas de datos (Datos_1, Datos_2...)
+            with _LectorExcelPorChunks(ruta, TAMANO_LOTE_EXCEL, columnas) as lector:
+                df = _unir_lotes_excel(list(lector))
+        elif tipo == 'parquet':
+            importar_pyarrow()
+            df = pd.read_parquet(ruta, engine='pyarrow', columns=columnas, filters=filtros) # lectura columnar: solo se decodifican las columnas pedidas
         else:
             raise ValueError(f"Tipo de archivo no soportado: {tipo}") #Si el tipo especificado no es ninguno de los anteriores (ej. alguien pasa "pdf"), lanza un error (raise ValueError) indicando que el tipo de archivo no está soportado.
+
+        if esquema is not None:
+            df = esquema.aplicar(df, proyectar=False) # las columnas ya se eligieron al leer; en CSV los tipos ya vienen aplicados y no se vuelven a convertir
         
-        logger.info(f"Archivo leído. Filas: {len(df)}, Columnas: {len(df.columns)}")
+        logger.info("Archivo leído. Filas: %s, Columnas: %s", len(df), len(df.columns))
+        if clave_cache is not None:
+            self.cache.guardar(clave_cache, df, descripcion=f"extraccion {ruta}")
         self.datos_extraidos = df
-        return 
+        return df
 #Almacena el DataFrame resultante en el atributo de la instancia self.datos_extraidos, asegurándose de que los datos estén disponibles para otros métodos de la clase más tarde.
 #Devuelve el DataFrame (return df).
-    
+
+# leer_por_chunks es la versión "streaming" de leer_archivo_local: en lugar de devolver un DataFrame con todo el archivo,
+# devuelve un generador que entrega el archivo por partes (chunks) de tamano_chunk filas. Así la memoria usada depende
+# del tamaño del chunk y no del tamaño del archivo. No lleva @manejar_error porque el decorador solo envolvería la
+# creación del generador y no la lectura real, que ocurre al iterar.
+    def leer_por_chunks(self, ruta: str, tipo: str = 'csv', tamano_chunk: int = 100_000,
+                        columnas: Optional[List[str]] = None,
+                        esquema: Optional[EsquemaDatos] = None,
+                        compresion: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Lee un archivo local (o una URL) por partes
+
+        Args:
+            ruta: Ruta del archivo o URL
+            tipo: Tipo de archivo (csv, json con un registro por línea, parquet, excel)
+            tamano_chunk: Número de filas por chunk
+            columnas: Columnas a leer (None lee todas, o las del esquema si se indica uno)
+            esquema: Tipos compactos y proyección de columnas que se aplican a cada chunk
+            compresion: Solo csv y json: códec del archivo (por defecto, según la extensión). Se descomprime en
+                streaming, a medida que se leen los chunks
+
+        Yields:
+            DataFrames de pandas de como máximo tamano_chunk filas
+        """
+        if tamano_chunk <= 0:
+            raise ValueError(f"tamano_chunk debe ser mayor que 0: {tamano_chunk}")
+
+        logger.info("Leyendo %s por chunks de %s filas desde: %s", tipo, tamano_chunk, ruta)
+        if columnas is None and esquema is not None:
+            columnas = esquema.columnas
+        codec = _codec_lectura(ruta, tipo, compresion) if not es_url(ruta) else None # en HTTP la compresión la negocia el cliente
+
+        if tipo == 'csv':
+            opciones = esquema.opciones_csv(por_chunks=True) if esquema is not None else {}
+            opciones['usecols'] = columnas
+            if es_url(ruta): # la respuesta HTTP se pasa al parser a medida que llega, sin guardarla en disco
+                lector = contextlib.closing(self.cliente_http.leer_csv_por_chunks(ruta, tamano_chunk, **opciones))
+            else:
+                lector = pd.read_csv(ruta, encoding='utf-8', chunksize=tamano_chunk, compression=codec, **opciones)
+        elif tipo == 'json':
+            lector = pd.read_json(ruta, lines=True, chunksize=tamano_chunk, compression=codec) # read_json solo permite chunksize con lines=True (JSON Lines)
+        elif tipo == 'parquet':
+            lector = _LectorParquetPorChunks(ruta, tamano_chunk, columnas)
+        elif tipo == 'excel':
+            lector = _LectorExcelPorChunks(ruta, tamano_chunk, columnas)
+        else:
+            raise ValueError(f"Tipo de archivo no soportado para lectura por chunks: {tipo}")
+
+        total_filas = 0
+        with lector as chunks: # el lector mantiene el archivo (o la conexión) abierto mientras se itera; with lo cierra al terminar
+            for numero, chunk in enumerate(chunks, 1):
+                if columnas is not None and tipo == 'json': # read_json no tiene usecols
+                    chunk = chunk[columnas]
+                if esquema is not None:
+                    chunk = esquema.aplicar(chunk, proyectar=False)
+                total_filas += len(chunk)
+                logger.debug("Chunk %s leído. Filas: %s", numero, len(chunk))
+                yield chunk
+
+        logger.info("Lectura por chunks completada. Filas: %s", total_filas)
+
+# leer_particionado es la contraparte de CargadorDatos.guardar_particionado: antes de abrir nada lista las carpetas
+# col=valor y descarta las que no cumplen los filtros sobre columnas de partición, así que solo se leen los archivos
+# necesarios. Las condiciones sobre otras columnas se aplican a las filas de cada archivo leído.
+    @manejar_error
+    def leer_particionado(self, ruta: str, filtros: Optional[List[tuple]] = None, columnas: Optional[List[str]] = None,
+                          esquema: Optional[EsquemaDatos] = None, max_workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Lee una salida particionada al estilo Hive (carpetas col=valor), leyendo solo las particiones que cumplen los filtros
+
+        Args:
+            ruta: Carpeta raíz de la salida
+            filtros: Condiciones (columna, operador, valor), ej. [('ciudad', '==', 'Madrid'), ('anio_ingreso', '>=', 2020)].
+                Operadores: ==, !=, <, <=, >, >=, in, not in. Las columnas de partición se comparan como números si
+                todos sus valores lo son
+            columnas: Columnas a devolver (pueden incluir las de partición); None devuelve todas
+            esquema: Tipos compactos que se aplican a cada archivo leído
+            max_workers: Hilos que leen archivos a la vez (por defecto, el de ThreadPoolExecutor)
+
+        Returns:
+            DataFrame con las filas de las particiones leídas; las columnas de partición van al final
+        """
+        particiones = listar_particiones(ruta)
+        claves = list(particiones.columns[1:])
+        seleccionadas, restantes = podar_particiones(particiones, filtros)
+        logger.info("Leyendo %s de %s archivos de %s (particiones: %s)", len(seleccionadas), len(particiones), ruta, claves)
+
+        leer = None # columnas que se leen de cada archivo: las pedidas y las de los filtros restantes
+        if columnas is not None:
+            leer = list(dict.fromkeys([columna for columna in columnas if columna not in claves]
+                                      + [columna for columna, _, _ in restantes]))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool: # lectura y descompresión liberan el GIL
+            leidos = pool.map(_leer_archivo_particion, seleccionadas['archivo'], [leer] * len(seleccionadas),
+                              [restantes] * len(seleccionadas))
+            partes = []
+            for fila, df in zip(seleccionadas.itertuples(index=False), leidos): # el resto, en este hilo y en orden
+                if not isinstance(df, pd.DataFrame):
+                    df = df.to_pandas() # tabla de Arrow: pyarrow no admite convertir a pandas desde varios hilos a la vez
+                if restantes: # take devuelve un DataFrame propio (no una vista a la que pandas avise al agregar columnas)
+                    df = df.take(np.flatnonzero(_cumple(df, restantes)))
+                if esquema is not None:
+                    df = esquema.aplicar(df, proyectar=False)
+                for clave in claves: # el valor de la partición, que no está dentro del archivo, en todas sus filas
+                    df[clave] = pd.Series(getattr(fila, clave), index=df.index, dtype=particiones[clave].dtype)
+                partes.append(df)
+
+        df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=(leer or []) + claves)
+        if columnas is not None:
+            df = df[columnas]
+        logger.info("Particiones leídas. Filas: %s, Columnas: %s", len(df), len(df.columns))
+        self.datos_extraidos = df
+        return df
+
+# estadisticas_parquet lee solo el pie (footer) del archivo Parquet, sin leer los datos, y combina las estadísticas
+# de todos los row groups. Sirve para conocer rangos de valores o decidir filtros sin abrir el archivo completo.
+    def estadisticas_parquet(self, ruta: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Devuelve mínimo, máximo y número de nulos por columna de un archivo Parquet
+
+        Args:
+            ruta: Ruta del archivo Parquet
+
+        Returns:
+            Diccionario columna -> {'min', 'max', 'nulos'}
+        """
+        _, pq = importar_pyarrow()
+        metadatos = pq.ParquetFile(ruta).metadata
+
+        estadisticas = {}
+        for grupo in range(metadatos.num_row_groups):
+            row_group = metadatos.row_group(grupo)
+            for indice in range(row_group.num_columns):
+                columna = row_group.column(indice)
+                nombre = columna.path_in_schema
+                actual = estadisticas.setdefault(nombre, {'min': None, 'max': None, 'nulos': 0})
+                if columna.statistics is None:
+                    continue
+                actual['nulos'] += columna.statistics.null_count
+                if columna.statistics.has_min_max:
+                    minimo, maximo = columna.statistics.min, columna.statistics.max
+                    actual['min'] = minimo if actual['min'] is None else min(actual['min'], minimo)
+                    actual['max'] = maximo if actual['max'] is None else max(actual['max'], maximo)
+        return estadisticas
+
 
 #Su propósito es tomar los datos que se acaban de extraer (o cualquier DataFrame que le pases) y guardarlos en el sistema de archivos local en un formato consistente, típicamente como un archivo CSV simple, en una carpeta específica.
 # self: Referencia a la instancia de la clase.
@@ -111,19 +325,147 @@ class ExtractorDatos:
 #  de procesamiento o limpieza más complejas.
 
 #esta funcion maneja varios formatos de guardado: csv, json, excel la anterior solo era para csv
-    def guardar_raw(self, df: pd.DataFrame, nombre: str = "datos_raw", formato: str = "csv"): #la funcion necesita tres parametros: self, df (el DataFrame a guardar), nombre (el nombre del archivo sin extension) y formato (el formato en que se guardara el archivo, por defecto es 'csv').
-        """Guarda los datos extraídos en formato raw (csv, json, excel)"""
+    def guardar_raw(self, df: pd.DataFrame, nombre: str = "datos_raw", formato: str = "csv",
+                    compresion: Optional[str] = None, hilos_compresion: int = 1): #la funcion necesita los parametros: self, df (el DataFrame a guardar), nombre (el nombre del archivo sin extension) y formato (el formato en que se guardara el archivo, por defecto es 'csv'). compresion y hilos_compresion son opcionales.
+        """
+        Guarda los datos extraídos en formato raw (csv, json, excel)
+
+        Args:
+            df: DataFrame a guardar
+            nombre: Nombre del archivo (sin extensión)
+            formato: csv, json (un registro por línea) o excel
+            compresion: Solo csv y json: 'gzip', 'bz2' o 'xz'. Se agrega la extensión (ej. datos_raw.csv.gz)
+            hilos_compresion: Hilos que comprimen bloques en paralelo (1: compresión normal en un solo flujo)
+        """
+        os.makedirs("data/raw", exist_ok=True) # crea la carpeta data/raw si no existe, igual que hace el cargador con data/processed
+        if compresion is not None and formato == 'excel':
+            raise ValueError("La compresión solo se puede usar con csv y json (un .xlsx ya está comprimido)")
 
         if formato == 'csv':
-            ruta = f"data/raw/{nombre}.csv"   #si el formatio es 'csv', construye la ruta del archivo con extensión .csv en la carpeta data/raw del proyecto.
-            df.to_csv(ruta, index=False)      # guarda el DataFrame (df) como un archivo CSV en la ruta especificada (ruta). El parámetro index=False asegura que los índices del DataFrame no se guarden como una columna adicional en el archivo CSV.
+            ruta = ruta_comprimida(f"data/raw/{nombre}.csv", compresion)   #si el formatio es 'csv', construye la ruta del archivo con extensión .csv (y la del códec si se comprime) en la carpeta data/raw del proyecto.
+            with abrir(ruta, 'w', compresion, hilos=hilos_compresion, newline='') as f: # abrir devuelve un archivo normal o uno que comprime según se escribe
+                df.to_csv(f, index=False)      # guarda el DataFrame (df) como un archivo CSV en el archivo abierto. El parámetro index=False asegura que los índices del DataFrame no se guarden como una columna adicional en el archivo CSV.
         elif formato == 'json':
-            ruta = f"data/raw/{nombre}.json"
-            df.to_json(ruta, orient='records', lines=True) # Ejemplo de opciones para JSON
+            ruta = ruta_comprimida(f"data/raw/{nombre}.json", compresion)
+            with abrir(ruta, 'w', compresion, hilos=hilos_compresion) as f:
+                df.to_json(f, orient='records', lines=True) # Ejemplo de opciones para JSON
         elif formato == 'excel':
             ruta = f"data/raw/{nombre}.xlsx"
             df.to_excel(ruta, index=False, engine='openpyxl')
         else:
             raise ValueError(f"Formato de guardado no soportado: {formato}")
             
-        logger.info(f"Datos raw ({formato}) guardados en: {ruta}")
\ No newline at end of file
+        logger.info("Datos raw (%s) guardados en: %s", formato, ruta)
+        return ruta
+
+
+def _leer_archivo_particion(ruta: str, columnas: Optional[List[str]], filtros: List[tuple]):
+    """Lee un archivo de una partición según su extensión: parquet (tabla de Arrow), csv o jsonl (DataFrame, quizá comprimidos)"""
+    codec = codec_de_ruta(ruta)
+    extension = os.path.splitext(os.path.splitext(ruta)[0] if codec else ruta)[1]
+    if extension == '.parquet':
+        _, pq = importar_pyarrow()
+        # los filtros también van a pyarrow: los row groups que no pueden cumplirlos no se leen
+        return pq.read_table(ruta, columns=columnas, filters=filtros or None, partitioning=None)
+    if extension == '.csv':
+        return pd.read_csv(ruta, encoding='utf-8', usecols=columnas, compression=codec)
+    if extension == '.jsonl':
+        df = pd.read_json(ruta, lines=True, compression=codec)
+        return df[columnas] if columnas is not None else df
+    raise ValueError(f"Tipo de archivo no soportado en una partición: {ruta}")
+
+
+def _codec_lectura(ruta: str, tipo: str, compresion: Optional[str]) -> Optional[str]:
+    """Códec con el que se lee el archivo; solo csv y json pueden estar comprimidos"""
+    codec = resolver_codec(ruta, compresion)
+    if codec is not None and tipo not in ('csv', 'json'):
+        raise ValueError(f"La compresión solo se puede usar con csv y json, no con {tipo}")
+    return codec
+
+
+class _LectorParquetPorChunks:
+    """Itera un archivo Parquet por lotes de filas sin cargarlo entero (misma interfaz que el lector por chunks de pandas)"""
+
+    def __init__(self, ruta: str, tamano_chunk: int, columnas: Optional[List[str]] = None):
+        _, pq = importar_pyarrow()
+        self._archivo = pq.ParquetFile(ruta)
+        self._lotes = self._archivo.iter_batches(batch_size=tamano_chunk, columns=columnas)
+
+    def __iter__(self):
+        for lote in self._lotes:
+            yield lote.to_pandas()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        self._archivo.close()
+        return False
+
+
+class _LectorExcelPorChunks:
+    """Itera las hojas de datos de un .xlsx en modo read_only por lotes de filas (misma interfaz que los otros lectores)
+
+    Si el libro tiene hojas Datos o Datos_N (las que escribe CargadorDatos) se leen todas en orden, como si fueran una
+    sola tabla; si no, se lee la primera hoja. La primera fila de cada hoja es la cabecera.
+    """
+
+    def __init__(self, ruta: str, tamano_chunk: int, columnas: Optional[List[str]] = None):
+        from openpyxl import load_workbook # openpyxl solo hace falta para Excel
+        self._libro = load_workbook(ruta, read_only=True, data_only=True)
+        self.tamano_chunk = tamano_chunk
+        self.columnas = columnas
+
+    def _hojas(self):
+        datos = [(int(coincidencia.group(2) or 0), nombre) for nombre in self._libro.sheetnames
+                 if (coincidencia := HOJAS_DATOS_EXCEL.match(nombre))]
+        nombres = [nombre for _, nombre in sorted(datos)] or self._libro.sheetnames[:1]
+        return [self._libro[nombre] for nombre in nombres]
+
+    def __iter__(self):
+        for hoja in self._hojas():
+            filas = hoja.iter_rows(values_only=True)
+            cabecera = next(filas, None)
+            if cabecera is None:
+                continue
+            while cabecera and cabecera[-1] is None: # celdas vacías al final de la cabecera
+                cabecera = cabecera[:-1]
+            posiciones = [indice for indice, nombre in enumerate(cabecera)
+                          if self.columnas is None or nombre in self.columnas]
+            nombres = [cabecera[indice] for indice in posiciones]
+            lote = []
+            for fila in filas:
+                lote.append([fila[indice] if indice < len(fila) else None for indice in posiciones])
+                if len(lote) == self.tamano_chunk:
+                    yield pd.DataFrame.from_records(lote, columns=nombres)
+                    lote = []
+            if lote:
+                yield pd.DataFrame.from_records(lote, columns=nombres)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        self._libro.close() # en modo read_only el archivo queda abierto hasta cerrar el libro
+        return False
+
+
+def _unir_lotes_excel(lotes: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Une los lotes leídos; un lote con una columna toda vacía la tiene como object, por eso se vuelven a inferir los tipos
+
+    Las columnas vacías de un lote que tienen datos en otro no se pasan a concat: concat las completa con nulos del
+    tipo de los lotes con datos (pandas dejará de ignorar por sí mismo las columnas vacías al elegir el tipo)
+    """
+    if not lotes:
+        return pd.DataFrame()
+    if len(lotes) == 1:
+        return lotes[0]
+    columnas = lotes[0].columns
+    con_datos = {columna for lote in lotes for columna in lote.columns if lote[columna].notna().any()}
+    lotes = [lote.drop(columns=[columna for columna in lote.columns if columna in con_datos and lote[columna].isna().all()])
+             for lote in lotes]
+    df = pd.concat(lotes, ignore_index=True)
+    if not df.columns.equals(columnas): # si faltaba en el primer lote, la columna quedó al final
+        df = df.reindex(columns=columnas)
+    return df.infer_objects()
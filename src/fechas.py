@@ -0,0 +1,126 @@
+"""
+Conversión rápida de columnas de texto a fechas
+
+pd.to_datetime sin formato tiene que adivinarlo y, si una fila no encaja, vuelve a analizar valor por valor (lento) o
+falla con toda la columna. Aquí el formato se infiere una vez con una muestra de valores distintos y después se usa
+fijo, que pandas convierte en C. Además:
+  - Columnas con pocos valores distintos (lo normal en fechas: muchas filas por día) solo se convierten los valores
+    únicos y el resultado se reparte con los códigos de factorize
+  - Los valores que no encajan en el formato quedan como NaT y se cuentan, en lugar de abortar la conversión
+"""
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional, Tuple
+
+FORMATO_FECHA = '%Y-%m-%d' # formato con el que se escriben las fechas de relleno si no se puede inferir otro
+# Formatos que se prueban al inferir, en orden de preferencia (ante un empate gana el primero: día/mes antes que mes/día)
+FORMATOS_FECHA = (
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y%m%d',
+)
+TAMANO_MUESTRA_FECHAS = 10_000 # filas con las que se infiere el formato y se estima cuántos valores distintos hay
+UMBRAL_UNICOS_FECHAS = 0.5 # si hay como mucho esta proporción de valores distintos, solo se convierten los únicos
+
+
+def inferir_formato_fecha(valores: pd.Series, tamano_muestra: int = TAMANO_MUESTRA_FECHAS) -> Optional[str]:
+    """
+    Elige el formato de FORMATOS_FECHA con el que se convierten más valores de una muestra
+
+    Args:
+        valores: Columna de texto (los nulos se ignoran)
+        tamano_muestra: Filas de la muestra
+
+    Returns:
+        El formato, o None si ninguno convierte al menos un valor de la muestra
+    """
+    return _inferir(pd.Series(pd.unique(_muestra(valores, tamano_muestra).to_numpy())))
+
+
+def convertir_fechas(serie: pd.Series, formato: Optional[str] = None,
+                     umbral_unicos: float = UMBRAL_UNICOS_FECHAS) -> Tuple[pd.Series, int]:
+    """
+    Convierte una columna a datetime64 con un formato fijo
+
+    Args:
+        serie: Columna de texto (object, string o categórica). Si ya es de fechas se devuelve tal cual
+        formato: Formato de las fechas (por defecto se infiere con una muestra de la columna)
+        umbral_unicos: Proporción máxima de valores distintos (estimada con la muestra) para convertir solo los únicos
+
+    Returns:
+        (columna convertida, número de valores no nulos que no se pudieron convertir y quedaron como NaT)
+
+    Raises:
+        ValueError: Si no se indica formato y no se puede inferir ninguno
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie, 0
+
+    if isinstance(serie.dtype, pd.CategoricalDtype): # las categorías ya son los valores únicos
+        unicos = serie.cat.categories.to_series(index=np.arange(len(serie.cat.categories)))
+        codigos = serie.cat.codes.to_numpy()
+    else:
+        muestra = _muestra(serie)
+        unicos = pd.Series(pd.unique(muestra.to_numpy()))
+        codigos = None
+    formato = formato or _inferir(unicos)
+    if formato is None:
+        raise ValueError(f"No se reconoce el formato de fecha de la columna {serie.name!r}")
+
+    if codigos is None and len(unicos) <= umbral_unicos * len(muestra): # pocos valores distintos (ej. uno por día)
+        codigos, unicos = pd.factorize(serie)
+        unicos = pd.Series(unicos)
+    if codigos is None: # casi todos distintos: factorizar no ahorraría nada
+        fechas = _parsear(serie, formato)
+    else:
+        fechas_unicas = _parsear(unicos, formato).to_numpy()
+        valores = np.append(fechas_unicas, np.datetime64('NaT')).astype(fechas_unicas.dtype) # el código -1 (nulo) cae en el NaT final
+        fechas = pd.Series(valores[codigos], index=serie.index, name=serie.name)
+
+    fallidos = int((fechas.isna() & serie.notna()).sum())
+    return fechas, fallidos
+
+
+def a_fechas(serie: pd.Series) -> pd.Series:
+    """Como convertir_fechas, pero si no se reconoce el formato pandas lo intenta valor por valor (lo no válido queda NaT)"""
+    try:
+        return convertir_fechas(serie)[0]
+    except ValueError:
+        return pd.to_datetime(serie, errors='coerce')
+
+
+def fecha_de_relleno(serie: pd.Series) -> str:
+    """Fecha actual como texto en el mismo formato que el resto de la columna (así se convierte con él)"""
+    return pd.Timestamp(datetime.now().date()).strftime(inferir_formato_fecha(serie) or FORMATO_FECHA)
+
+
+def _muestra(valores: pd.Series, tamano_muestra: int = TAMANO_MUESTRA_FECHAS) -> pd.Series:
+    """Valores no nulos de una muestra de filas (toda la columna si es pequeña)"""
+    valores = valores.dropna()
+    return valores.sample(tamano_muestra, random_state=0) if len(valores) > tamano_muestra else valores
+
+
+def _inferir(unicos: pd.Series) -> Optional[str]:
+    """Formato de FORMATOS_FECHA que convierte más valores distintos (ante un empate, el primero)"""
+    unicos = unicos.dropna()
+    if not len(unicos):
+        return None
+    unicos = unicos.astype(str).str.strip()
+    mejor_formato, mejor_aciertos = None, 0
+    for formato in FORMATOS_FECHA:
+        aciertos = int(pd.to_datetime(unicos, format=formato, errors='coerce').notna().sum())
+        if aciertos > mejor_aciertos:
+            mejor_formato, mejor_aciertos = formato, aciertos
+            if aciertos == len(unicos): # encaja con todos: no hace falta probar el resto
+                break
+    return mejor_formato
+
+
+def _parsear(valores: pd.Series, formato: str) -> pd.Series:
+    """to_datetime con formato fijo; los valores que fallan se reintentan sin espacios en los extremos"""
+    fechas = pd.to_datetime(valores, format=formato, errors='coerce')
+    fallidas = (fechas.isna() & valores.notna()).to_numpy()
+    if fallidas.any(): # solo las que fallaron: quitar espacios a toda la columna cuesta casi tanto como convertirla
+        reintento = valores[fallidas].astype(str).str.strip()
+        fechas[fallidas] = pd.to_datetime(reintento, format=formato, errors='coerce').to_numpy()
+    return fechas
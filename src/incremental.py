@@ -0,0 +1,248 @@
+"""
+Procesamiento incremental con marcas de agua (watermarks)
+
+En lugar de reprocesar todo el archivo en cada ejecución, se guarda por cada fuente hasta dónde se llegó
+(la "marca de agua") y en la siguiente ejecución solo se extraen, transforman y cargan los registros posteriores:
+  - 'id': registros con id mayor que el máximo procesado
+  - 'fecha': registros con fecha_ingreso posterior a la máxima procesada
+  - 'offset': bytes del archivo a partir de la última línea procesada (CSV al que solo se agregan líneas). Es la
+    única marca que no vuelve a leer lo ya procesado; con 'id' y 'fecha' se lee todo pero solo se transforma y
+    guarda lo nuevo
+
+Las marcas se guardan en un JSON (data/estado/marcas_agua.json) que solo se actualiza después de escribir las
+salidas: si una ejecución falla a medias, la siguiente vuelve a procesar el mismo lote (con clave, sin duplicar).
+"""
+import io
+import csv
+import json
+import os
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any, Optional, Sequence, Tuple
+from .extractor import ExtractorDatos
+from .transformador import TransformadorDatos
+from .loader import CargadorDatos
+from .esquema import EsquemaDatos
+from .deduplicacion import Deduplicador
+from .reglas import ReglasDatos
+from .fechas import a_fechas
+from .compresion import codec_de_ruta
+from .logger import manejar_error, obtener_logger
+
+logger = obtener_logger()
+
+MARCAS = ('id', 'fecha', 'offset')
+COLUMNAS_MARCA = {'id': 'id', 'fecha': 'fecha_ingreso'} # columna por defecto de cada tipo de marca
+RUTA_ESTADO = 'data/estado/marcas_agua.json'
+
+
+class EstadoIncremental:
+    """Almacén de marcas de agua por fuente en un archivo JSON"""
+
+    def __init__(self, ruta: str = RUTA_ESTADO):
+        self.ruta = ruta
+        self.fuentes = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                self.fuentes = json.load(f)
+
+    def obtener(self, fuente: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el estado guardado de una fuente (None si nunca se procesó)"""
+        return self.fuentes.get(fuente)
+
+    def actualizar(self, fuente: str, estado: Dict[str, Any]):
+        self.fuentes[fuente] = estado
+
+    def reiniciar(self, fuente: Optional[str] = None):
+        """Olvida la marca de una fuente (o de todas): la próxima ejecución la procesa completa"""
+        if fuente is None:
+            self.fuentes = {}
+        else:
+            self.fuentes.pop(fuente, None)
+
+    def guardar(self):
+        """Escribe el estado en disco de forma atómica (un corte a mitad de escritura no deja el JSON a medias)"""
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = self.ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self.fuentes, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+
+@manejar_error
+def ejecutar_etl_incremental(ruta: str, nombre_base: str, marca: str = 'id', columna_marca: Optional[str] = None,
+                             tipo: str = 'csv', tamano_chunk: int = 100_000,
+                             formatos: Sequence[str] = ('csv', 'jsonl'), clave: Optional[str] = None,
+                             fuente: Optional[str] = None, ruta_estado: str = RUTA_ESTADO,
+                             esquema: Optional[EsquemaDatos] = None,
+                             deduplicador: Optional[Deduplicador] = None,
+                             reglas: Optional[ReglasDatos] = None) -> Dict[str, Any]:
+    """
+    Procesa solo los registros nuevos de ruta y los agrega a las salidas estables data/processed/{nombre_base}.*
+
+    Args:
+        ruta: Archivo de entrada
+        nombre_base: Nombre de los archivos de salida (sin extensión ni fecha: son siempre los mismos)
+        marca: 'id', 'fecha' u 'offset'
+        columna_marca: Columna de la marca (por defecto 'id' o 'fecha_ingreso'); no se usa con 'offset'
+        tipo: Tipo del archivo de entrada (csv, json con un registro por línea, parquet); 'offset' solo admite csv
+        tamano_chunk: Filas por chunk al leer la entrada
+        formatos: Formatos de salida (csv, jsonl, parquet, sqlite)
+        clave: Columna clave para fusionar: las filas nuevas reemplazan a las ya guardadas con la misma clave.
+            Sin clave solo se agregan
+        fuente: Nombre de la fuente en el almacén de estado (por defecto, nombre_base)
+        ruta_estado: Archivo JSON con las marcas de agua
+        esquema: Esquema con el que se lee la entrada
+        deduplicador: Descarta las filas cuya clave ya llegó en este lote o en ejecuciones anteriores (con ruta, sus
+            huellas se guardan junto con la marca). Es la alternativa a clave cuando debe ganar la primera versión
+        reglas: Filtros de validez y columnas calculadas (por defecto, los de REGLAS_EMPLEADOS)
+
+    Returns:
+        Diccionario con el resumen de la ejecución
+    """
+    if marca not in MARCAS:
+        raise ValueError(f"Marca no soportada: {marca}. Opciones: {MARCAS}")
+    if marca == 'offset' and tipo != 'csv':
+        raise ValueError("La marca 'offset' solo se puede usar con archivos CSV")
+    if marca == 'offset' and codec_de_ruta(ruta) is not None: # en un archivo comprimido no se puede saltar a un byte
+        raise ValueError("La marca 'offset' no se puede usar con archivos comprimidos: usa 'id' o 'fecha'")
+
+    columna_marca = columna_marca or COLUMNAS_MARCA.get(marca)
+    fuente = fuente or nombre_base
+    estado = EstadoIncremental(ruta_estado)
+    anterior = estado.obtener(fuente) or {}
+    if anterior and anterior['marca'] != marca:
+        raise ValueError(f"La fuente '{fuente}' se procesó con la marca '{anterior['marca']}', no con '{marca}'")
+
+    # 1. Extracción de los registros posteriores a la marca
+    if marca == 'offset':
+        nuevos, marca_nueva = _leer_desde_offset(ruta, anterior.get('valor', 0), tamano_chunk, esquema)
+    else:
+        nuevos, marca_nueva = _leer_posteriores(ruta, tipo, tamano_chunk, esquema, marca, columna_marca,
+                                                anterior.get('valor'))
+    logger.info("Registros nuevos en %s: %s (marca %s: %s -> %s)", ruta, len(nuevos), marca,
+                anterior.get('valor'), marca_nueva)
+
+    resumen = {
+        'success': True,
+        'registros_nuevos': len(nuevos),
+        'registros_procesados': 0,
+        'marca_anterior': anterior.get('valor'),
+        'marca_nueva': marca_nueva,
+        'archivos_generados': {},
+    }
+    if nuevos.empty:
+        return resumen
+
+    # 2. Transformación: los nulos numéricos se rellenan con la media de todo lo procesado hasta ahora
+    # (sumas y conteos acumulados en el estado), no solo con la del lote nuevo
+    sumas = dict(anterior.get('sumas', {}))
+    conteos = dict(anterior.get('conteos', {}))
+    numericas = nuevos.select_dtypes(include=['number'])
+    for columna in numericas.columns:
+        sumas[columna] = sumas.get(columna, 0.0) + float(numericas[columna].sum())
+        conteos[columna] = conteos.get(columna, 0) + int(numericas[columna].count())
+    medias = {columna: sumas[columna] / conteos[columna] for columna in sumas if conteos[columna] > 0}
+
+    transformador = TransformadorDatos(reglas=reglas)
+    limpio = transformador.limpiar_datos(nuevos, valores_relleno=medias, inplace=True, deduplicador=deduplicador)
+    transformado = transformador.agregar_columnas_calculadas(limpio, inplace=True)
+
+    # 3. Carga en las salidas existentes
+    rutas = CargadorDatos().anexar(transformado, nombre_base, formatos, clave)
+
+    # 4. Las huellas y la marca se guardan al final, cuando las salidas ya están escritas. Si se corta entre las dos, la
+    # siguiente ejecución relee el lote pero el deduplicador ya lo conoce y no lo vuelve a agregar
+    if deduplicador is not None and deduplicador.ruta:
+        deduplicador.guardar()
+    estado.actualizar(fuente, {
+        'marca': marca,
+        'columna': columna_marca,
+        'valor': marca_nueva,
+        'ruta': ruta,
+        'sumas': sumas,
+        'conteos': conteos,
+        'registros_procesados': anterior.get('registros_procesados', 0) + len(transformado),
+        'ejecuciones': anterior.get('ejecuciones', 0) + 1,
+        'actualizado': datetime.now().isoformat(),
+    })
+    estado.guardar()
+
+    resumen['registros_procesados'] = len(transformado)
+    resumen['archivos_generados'] = rutas
+    return resumen
+
+
+def _leer_posteriores(ruta: str, tipo: str, tamano_chunk: int, esquema: Optional[EsquemaDatos], marca: str,
+                      columna: str, valor_anterior: Any) -> Tuple[pd.DataFrame, Any]:
+    """Lee el archivo por chunks y se queda con las filas cuya columna de marca supera valor_anterior"""
+    umbral = None
+    if valor_anterior is not None:
+        umbral = pd.Timestamp(valor_anterior) if marca == 'fecha' else valor_anterior
+
+    partes = []
+    maximo = umbral
+    sin_marca = 0
+    for chunk in ExtractorDatos().leer_por_chunks(ruta, tipo, tamano_chunk, esquema=esquema):
+        valores = a_fechas(chunk[columna]) if marca == 'fecha' else chunk[columna]
+        if umbral is None:
+            nuevas = pd.Series(True, index=chunk.index) # primera ejecución: todo es nuevo
+        else:
+            nuevas = valores > umbral
+            sin_marca += int(valores.isna().sum()) # sin valor de marca no se puede saber si son nuevas
+        if nuevas.any():
+            partes.append(chunk[nuevas.values])
+            maximo_chunk = valores[nuevas.values].max()
+            if pd.notna(maximo_chunk) and (maximo is None or maximo_chunk > maximo):
+                maximo = maximo_chunk
+
+    if sin_marca:
+        logger.warning("%s filas sin valor en '%s' se han ignorado", sin_marca, columna)
+
+    nuevos = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    if isinstance(maximo, pd.Timestamp):
+        maximo = maximo.isoformat()
+    elif hasattr(maximo, 'item'):
+        maximo = maximo.item() # de tipo de numpy a int/float de Python, para poder guardarlo en JSON
+    return nuevos, maximo
+
+
+def _leer_desde_offset(ruta: str, offset: int, tamano_chunk: int,
+                       esquema: Optional[EsquemaDatos]) -> Tuple[pd.DataFrame, int]:
+    """Lee las líneas completas del CSV a partir del byte offset; devuelve las filas y el nuevo offset"""
+    tamano = os.path.getsize(ruta)
+    if offset > tamano:
+        logger.warning("%s es más pequeño que la marca (%s > %s bytes): se procesa desde el principio", ruta, offset, tamano)
+        offset = 0
+
+    with open(ruta, 'rb') as f:
+        cabecera = f.readline()
+        inicio = max(offset, len(cabecera))
+        fin = _fin_ultima_linea(f, tamano) # una última línea sin salto puede estar escribiéndose todavía: se deja para la próxima
+        if fin <= inicio:
+            return pd.DataFrame(), max(offset, inicio)
+        f.seek(inicio)
+        contenido = f.read(fin - inicio)
+
+    nombres = next(csv.reader([cabecera.decode('utf-8')]))
+    opciones = esquema.opciones_csv(por_chunks=True) if esquema is not None else {}
+    lector = pd.read_csv(io.BytesIO(contenido), header=None, names=nombres, encoding='utf-8',
+                         chunksize=tamano_chunk, **opciones)
+    with lector:
+        partes = list(lector)
+    return pd.concat(partes, ignore_index=True), fin
+
+
+def _fin_ultima_linea(archivo, tamano: int, bloque: int = 64 * 1024) -> int:
+    """Posición justo después del último salto de línea del archivo (0 si no hay ninguno)"""
+    posicion = tamano
+    while posicion > 0:
+        leer = min(bloque, posicion)
+        archivo.seek(posicion - leer)
+        indice = archivo.read(leer).rfind(b'\n')
+        if indice >= 0:
+            return posicion - leer + indice + 1
+        posicion -= leer
+    return 0
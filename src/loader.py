@@ -1,102 +1,762 @@
+import csv
 import json
+import numpy as np
 import pandas as pd
 import os
-from typing import Dict, Any
-from .logger import manejar_error, LoggerPersonalizado
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Dict, Any, Callable, Iterable, List, Optional, Sequence, Union
+from .logger import manejar_error, obtener_logger
+from .dependencias import importar_pyarrow
+from .esquema import EsquemaDatos
+from .estadisticas import EstadisticasColumnas
+from .compresion import abrir, resolver_codec, ruta_comprimida
+from .particiones import FORMATOS_PARTICIONADOS, ruta_particion
 
-logger = LoggerPersonalizado().get_logger()
+logger = obtener_logger()
+
+CODECS_PARQUET = ('snappy', 'gzip', 'brotli', 'zstd', 'lz4', 'none')
+POOLS = {'hilos': ThreadPoolExecutor, 'procesos': ProcessPoolExecutor}
+FORMATOS_ANEXABLES = ('csv', 'jsonl', 'parquet', 'sqlite') # formatos a los que se pueden agregar filas sin reescribir el archivo
+FILAS_MAX_EXCEL = 1_048_576 # límite de filas de una hoja de Excel (incluida la cabecera)
+FILAS_STREAMING_EXCEL = 100_000 # a partir de aquí guardar_como_excel escribe en modo streaming aunque no se pida
 
 class CargadorDatos:
     """Clase para cargar datos transformados"""
     
-    def __init__(self):
-        self.formatos_soportados = ['csv', 'json', 'parquet', 'excel']
+    def __init__(self, esquema: Optional[EsquemaDatos] = None, compresion: Optional[str] = None,
+                 hilos_compresion: int = 1):
+        self.formatos_soportados = ['csv', 'json', 'parquet', 'excel', 'sqlite']
+        self.esquema = esquema # tipos con los que se guardan las columnas en Parquet (ej. int32, float32, category)
+        self.compresion = resolver_codec('', compresion) # códec (gzip, bz2, xz) de las salidas de texto: csv, json y jsonl
+        self.hilos_compresion = hilos_compresion # con más de 1, los bloques de las salidas comprimidas se comprimen en paralelo
+        self.tiempos_por_formato = {} # segundos que tardó cada formato en la última llamada a guardar_multiple_formatos
+        self.errores_por_formato = {} # errores por formato de la última llamada en modo paralelo
+        self.rendimiento_sqlite = {} # filas, segundos y filas/s de la última carga en SQLite
 #este constructor inicializa una lista de formatos de archivo soportados para la carga de datos.
 #es una lista que contiene las extensiones de archivo que la clase CargadorDatos puede manejar al guardar datos.
 
     @manejar_error
-    def guardar_como_json(self, df: pd.DataFrame, nombre_archivo: str):
+    def guardar_como_json(self, df: pd.DataFrame, nombre_archivo: str, formato_json: str = 'array',
+                          indentar: bool = True, tamano_lote: int = 10_000, compresion: Optional[str] = None):
         """
         Guarda DataFrame como JSON
         
         Args:
             df: DataFrame a guardar
             nombre_archivo: Nombre del archivo (sin extensión)
+            formato_json: 'array' (una lista JSON, archivo .json) o 'lineas' (JSON Lines, un registro por línea, archivo .jsonl)
+            indentar: Solo para 'array': sangría de 2 espacios (legible) o compacto sin sangría (más rápido y pequeño)
+            tamano_lote: Filas que se serializan de cada vez; limita la memoria usada
+            compresion: 'gzip', 'bz2', 'xz' o 'none' (por defecto, la del cargador). Se agrega la extensión del códec
         """
         # Crear directorio si no existe, exist_ok=True evita error si ya existe
         os.makedirs("data/processed", exist_ok=True)
         
-        ruta = f"data/processed/{nombre_archivo}.json" # Construye la ruta completa del archivo JSON donde se guardarán los datos.
+        extension = 'jsonl' if formato_json == 'lineas' else 'json'
+        compresion = compresion or self.compresion
+        ruta = ruta_comprimida(f"data/processed/{nombre_archivo}.{extension}", compresion) # Construye la ruta completa del archivo JSON donde se guardarán los datos.
         
-        # Convertir a diccionario orientado a registros
-        datos_json = df.to_dict(orient='records') # Convierte el DataFrame de pandas (df) a una lista de diccionarios, donde cada diccionario representa una fila del DataFrame. El parámetro orient='records' especifica este formato.
-                                                    #.to_dict es un método de pandas que convierte un DataFrame en varios formatos de diccionario. y orient='records' indica que cada fila del DataFrame se convertirá en un diccionario separado dentro de una lista.
-                                                    #orient=record , usando los nombres de las columnas como claves, lo que es ideal para trabajar con datos fila por fila o para generar formatos como JSON. 
-
-        # Guardar con formato legible, abre ruta y escribe el diccionario de json a formato json en el archivo
-        with open(ruta, 'w', encoding='utf-8') as f: # with open(ruta, 'w', encoding='utf-8') as f: abre el archivo en la ruta especificada (ruta) en modo de escritura ('w') con codificación UTF-8. El uso de with asegura que el archivo se cierre correctamente después de escribir en él.
-            json.dump(datos_json, f, indent=2, ensure_ascii=False) # json.dump(datos_json, f, indent=2, ensure_ascii=False) escribe la lista de diccionarios (datos_json) en el archivo abierto (f) en formato JSON. El parámetro indent=2 hace que el JSON sea más legible al agregar sangría de 2 espacios, y ensure_ascii=False permite que los caracteres no ASCII se escriban correctamente en el archivo.
-                                                                    # json.dump es una función del módulo json de Python que convierte un objeto de Python (en este caso, una lista de diccionarios) en una cadena JSON y la escribe en un archivo. y ascii false permite que los caracteres especiales se guarden correctamente en el archivo JSON. si fuera true, todos los caracteres no ASCII se escaparían, lo que puede dificultar la lectura de idiomas con caracteres especiales.
+        # En lugar de convertir todo el DataFrame a una lista de diccionarios con to_dict(orient='records') y volcarla
+        # con json.dump, EscritorJSON serializa por lotes de tamano_lote filas leyendo directamente los arrays de cada
+        # columna, así nunca existen en memoria más de tamano_lote diccionarios a la vez.
+        with abrir(ruta, 'w', compresion, hilos=self.hilos_compresion) as f: # abre el archivo en la ruta especificada (ruta) en modo de escritura ('w') con codificación UTF-8; si hay compresión, los datos se comprimen según se escriben. El uso de with asegura que el archivo se cierre correctamente después de escribir en él.
+            with EscritorJSON(f, formato_json, indentar, tamano_lote) as escritor:
+                escritor.escribir(df)
         
-        logger.info(f"Datos guardados como JSON en: {ruta}") # Registra un mensaje informativo indicando que los datos se han guardado correctamente como JSON y muestra la ruta del archivo donde se almacenaron.
-        logger.info(f"Total registros guardados: {len(datos_json)}") # Registra un mensaje informativo indicando el total de registros guardados en el archivo JSON.
+        logger.info("Datos guardados como JSON en: %s", ruta) # Registra un mensaje informativo indicando que los datos se han guardado correctamente como JSON y muestra la ruta del archivo donde se almacenaron.
+        logger.info("Total registros guardados: %s", escritor.filas_escritas) # Registra un mensaje informativo indicando el total de registros guardados en el archivo JSON.
         
         return ruta # Devuelve la ruta del archivo JSON donde se guardaron los datos.
 
-#json.dump:
+#json (EscritorJSON usa json.JSONEncoder por debajo):
 # Serialización: Convierte estructuras de datos de Python (diccionarios, listas) a su representación en formato JSON (JavaScript Object Notation), un formato ligero y legible por humanos para intercambio de datos.
 # Escritura en archivo: Toma el objeto Python y el objeto archivo como argumentos, y vuelca los datos JSON en ese archivo.
 # Persistencia de datos: Permite guardar el estado de tu aplicación o datos de forma estructurada para uso futuro. 
 
 
     @manejar_error
-    def guardar_como_csv(self, df: pd.DataFrame, nombre_archivo: str): # se le pasan dos parámetros: df (el DataFrame de pandas que se desea guardar) y nombre_archivo (el nombre que se le dará al archivo CSV, sin la extensión).
-        """Guarda DataFrame como CSV"""                             #en este caso self se refiere a la instancia de la clase CargadorDatos y se pone como convención en Python para métodos dentro de clases pero realmente no se usa dentro del método.
+    def guardar_como_csv(self, df: pd.DataFrame, nombre_archivo: str, compresion: Optional[str] = None): # se le pasan dos parámetros: df (el DataFrame de pandas que se desea guardar) y nombre_archivo (el nombre que se le dará al archivo CSV, sin la extensión). compresion es opcional: gzip, bz2, xz o none (por defecto, la del cargador).
+        """Guarda DataFrame como CSV (comprimido si se indica un códec)"""                             #en este caso self se refiere a la instancia de la clase CargadorDatos y se pone como convención en Python para métodos dentro de clases pero realmente no se usa dentro del método.
         os.makedirs("data/processed", exist_ok=True) #crea la carpeta data/processed si no existe. exist_ok=True evita que se lance un error si la carpeta ya existe.
         
-        ruta = f"data/processed/{nombre_archivo}.csv" # construye la ruta completa del archivo CSV donde se guardarán los datos. nombre_archivo es el nombre proporcionado para el archivo, y se le añade la extensión .csv. ese nombre se obtiene al llamar a la función.
-        df.to_csv(ruta, index=False, encoding='utf-8') # df.to_csv(ruta, index=False, encoding='utf-8') guarda el DataFrame (df) como un archivo CSV en la ruta especificada (ruta). El parámetro index=False asegura que los índices del DataFrame no se guarden como una columna adicional en el archivo CSV. encoding='utf-8' garantiza que los caracteres especiales se manejen correctamente al escribir en el archivo.
+        compresion = compresion or self.compresion
+        ruta = ruta_comprimida(f"data/processed/{nombre_archivo}.csv", compresion) # construye la ruta completa del archivo CSV donde se guardarán los datos. nombre_archivo es el nombre proporcionado para el archivo, y se le añade la extensión .csv. ese nombre se obtiene al llamar a la función.
+        with abrir(ruta, 'w', compresion, hilos=self.hilos_compresion, newline='') as f: # archivo normal, o uno que comprime en streaming (con varios hilos, por bloques en paralelo)
+            df.to_csv(f, index=False) # df.to_csv(f, index=False) guarda el DataFrame (df) como CSV en el archivo abierto en la ruta especificada (ruta). El parámetro index=False asegura que los índices del DataFrame no se guarden como una columna adicional en el archivo CSV. encoding='utf-8' garantiza que los caracteres especiales se manejen correctamente al escribir en el archivo.
         
-        logger.info(f"Datos guardados como CSV en: {ruta}") # registra un mensaje informativo indicando que los datos se han guardado correctamente como CSV y muestra la ruta del archivo donde se almacenaron.
+        logger.info("Datos guardados como CSV en: %s", ruta) # registra un mensaje informativo indicando que los datos se han guardado correctamente como CSV y muestra la ruta del archivo donde se almacenaron.
         return ruta
 
 #de donde proviene el nombre del archivo? Viene del parámetro nombre_archivo que se pasa a la función guardar_como_csv cuando se llama.
 
     @manejar_error
-    def guardar_como_excel(self, df: pd.DataFrame, nombre_archivo: str):
-        """Guarda DataFrame como Excel"""
+    def guardar_como_excel(self, df: pd.DataFrame, nombre_archivo: str, streaming: Optional[bool] = None,
+                           filas_por_hoja: int = FILAS_MAX_EXCEL - 1, tamano_lote: int = 10_000):
+        """
+        Guarda DataFrame como Excel
+
+        Args:
+            df: DataFrame a guardar
+            nombre_archivo: Nombre del archivo (sin extensión)
+            streaming: Si es True se escribe con el modo write_only de openpyxl: las filas van al archivo según se
+                agregan y la memoria no crece con el tamaño del DataFrame. None lo activa automáticamente a partir de
+                FILAS_STREAMING_EXCEL filas o si los datos no caben en una hoja
+            filas_por_hoja: Filas de datos por hoja (sin la cabecera). Con más filas, en modo streaming los datos
+                se reparten en las hojas Datos_1, Datos_2...; el máximo es el límite de Excel
+            tamano_lote: Solo en modo streaming: filas que se convierten a valores de Python de cada vez
+        """
+        if not 0 < filas_por_hoja < FILAS_MAX_EXCEL:
+            raise ValueError(f"filas_por_hoja debe estar entre 1 y {FILAS_MAX_EXCEL - 1}: {filas_por_hoja}")
+        if streaming is None:
+            streaming = len(df) >= FILAS_STREAMING_EXCEL or len(df) > filas_por_hoja
+        if not streaming and len(df) > filas_por_hoja:
+            raise ValueError(f"{len(df)} filas no caben en una hoja de {filas_por_hoja}: usa streaming=True")
+
         os.makedirs("data/processed", exist_ok=True) #crea la carpeta data/processed si no existe.
         
         ruta = f"data/processed/{nombre_archivo}.xlsx" # construye la ruta completa del archivo Excel donde se guardarán los datos.
-        
+
+        # Opcional: agregar un resumen
+        resumen = pd.DataFrame({ #pd.DataFrame crea un nuevo DataFrame de pandas que contiene un resumen de los datos guardados.
+            'Métrica': ['Total Filas', 'Total Columnas', 'Fecha Generación'], #'Métrica' es una columna que describe las métricas del resumen: el total de filas, el total de columnas y la fecha de generación del archivo.
+            'Valor': [len(df), len(df.columns), pd.Timestamp.now()] #'Valor' es otra columna que contiene los valores correspondientes a cada métrica: el número de filas (len(df)), el número de columnas (len(df.columns)) y la fecha y hora actual (pd.Timestamp.now()).
+        })
+
+        if streaming:
+            with EscritorExcel(ruta, filas_por_hoja, tamano_lote) as escritor:
+                escritor.escribir(df)
+                escritor.escribir_hoja('Resumen', resumen)
+            logger.info("Datos guardados como Excel (streaming, %s hojas de datos) en: %s", escritor.hojas, ruta)
+            return ruta
+
         # Crear un Excel writer con pandas
         with pd.ExcelWriter(ruta, engine='openpyxl') as writer: # pd.ExcelWriter crea un objeto que permite escribir DataFrames de pandas en archivos Excel. El parámetro engine='openpyxl' especifica que se utilizará la biblioteca openpyxl para manejar archivos .xlsx. with asegura que el archivo se cierre correctamente después de escribir en él.
             df.to_excel(writer, sheet_name='Datos', index=False) # df.to_excel(writer, sheet_name='Datos', index=False) escribe el DataFrame (df) en una hoja llamada 'Datos' dentro del archivo Excel. El parámetro index=False asegura que los índices del DataFrame no se guarden como una columna adicional en la hoja de Excel. writer es el objeto ExcelWriter que maneja la escritura en el archivo Excel.
-            
-            # Opcional: agregar un resumen
-            resumen = pd.DataFrame({ #pd.DataFrame crea un nuevo DataFrame de pandas que contiene un resumen de los datos guardados.
-                'Métrica': ['Total Filas', 'Total Columnas', 'Fecha Generación'], #'Métrica' es una columna que describe las métricas del resumen: el total de filas, el total de columnas y la fecha de generación del archivo.
-                'Valor': [len(df), len(df.columns), pd.Timestamp.now()] #'Valor' es otra columna que contiene los valores correspondientes a cada métrica: el número de filas (len(df)), el número de columnas (len(df.columns)) y la fecha y hora actuales (pd.Timestamp.now()).
-            })
             resumen.to_excel(writer, sheet_name='Resumen', index=False) # escribe el DataFrame de resumen en una hoja llamada 'Resumen' dentro del mismo archivo Excel. index=False asegura que los índices del DataFrame de resumen no se guarden como una columna adicional.
         
-        logger.info(f"Datos guardados como Excel en: {ruta}")
+        logger.info("Datos guardados como Excel en: %s", ruta)
         return ruta # Devuelve la ruta del archivo Excel donde se guardaron los datos.
 
+# Parquet es un formato columnar y binario: guarda cada columna comprimida por separado, con sus tipos de datos,
+# y divide el archivo en grupos de filas (row groups). Para cada grupo y columna escribe estadísticas (mínimo, máximo,
+# número de nulos) en el pie del archivo, lo que permite a los lectores saltarse grupos enteros al filtrar.
+# Leerlo es mucho más rápido que volver a interpretar texto CSV o JSON.
+    @manejar_error
+    def guardar_como_parquet(self, df: pd.DataFrame, nombre_archivo: str, compresion: str = 'snappy',
+                             filas_por_grupo: int = 100_000):
+        """
+        Guarda DataFrame como Parquet (requiere pyarrow)
+
+        Args:
+            df: DataFrame a guardar
+            nombre_archivo: Nombre del archivo (sin extensión)
+            compresion: Códec de compresión (snappy, gzip, brotli, zstd, lz4, none)
+            filas_por_grupo: Número de filas por row group
+        """
+        if compresion not in CODECS_PARQUET:
+            raise ValueError(f"Compresión no soportada: {compresion}. Opciones: {CODECS_PARQUET}")
+        if filas_por_grupo <= 0:
+            raise ValueError(f"filas_por_grupo debe ser mayor que 0: {filas_por_grupo}")
+
+        pa, pq = importar_pyarrow()
+        os.makedirs("data/processed", exist_ok=True)
+
+        ruta = f"data/processed/{nombre_archivo}.parquet"
+
+        if self.esquema is not None:
+            df = self.esquema.aplicar(df, proyectar=False) # Parquet conserva los tipos: el archivo ocupa menos y se lee ya con tipos compactos
+        tabla = pa.Table.from_pandas(df, preserve_index=False) # convierte el DataFrame a una tabla de Arrow (columnar)
+        pq.write_table(
+            tabla, ruta,
+            compression=compresion,
+            row_group_size=filas_por_grupo,
+            write_statistics=True # min/max/nulos por columna y row group
+        )
+
+        logger.info("Datos guardados como Parquet (%s) en: %s", compresion, ruta)
+        return ruta
+
+# SQLite deja los datos en una base consultable con SQL (un solo archivo, sin servidor). La carga se hace en bloque
+# con EscritorSQLite: lotes de executemany dentro de transacciones grandes, WAL, upsert por clave e índices diferidos.
+    @manejar_error
+    def guardar_como_sqlite(self, df: pd.DataFrame, nombre_archivo: str, tabla: str = 'datos', clave: Optional[str] = 'id',
+                            indices: Sequence[Union[str, Sequence[str]]] = (), diferir_indices: Optional[bool] = None,
+                            ruta: Optional[str] = None, **opciones):
+        """
+        Carga el DataFrame en una tabla de SQLite; las filas cuya clave ya está en la tabla se actualizan (upsert)
+
+        Args:
+            df: DataFrame a guardar
+            nombre_archivo: Nombre de la base de datos (sin extensión)
+            tabla: Tabla de destino (se crea si no existe)
+            clave: Columna clave del upsert. Si df no la tiene, las filas solo se insertan
+            indices: Columnas (o grupos de columnas) a indexar para las consultas
+            diferir_indices: Crear los índices después de cargar todas las filas (más rápido que mantenerlos fila a
+                fila). None: solo si la tabla está vacía
+            ruta: Archivo de la base de datos, en lugar de data/processed/{nombre_archivo}.sqlite (ej. una base
+                estable a la que cada ejecución agrega o actualiza filas)
+            **opciones: tamano_lote, filas_por_transaccion y sincronizacion de EscritorSQLite
+
+        Returns:
+            Ruta de la base de datos. Las filas/s de la carga quedan en self.rendimiento_sqlite
+        """
+        from .base_datos import EscritorSQLite # importación diferida: base_datos usa las conversiones de este módulo
+
+        ruta = ruta or f"data/processed/{nombre_archivo}.sqlite"
+        clave = clave if clave in df.columns else None
+        with EscritorSQLite(ruta, tabla, clave, indices, diferir_indices, **opciones) as escritor:
+            escritor.escribir(df)
+
+        self.rendimiento_sqlite = escritor.rendimiento()
+        logger.info("Datos guardados en SQLite en: %s (tabla %s)", ruta, tabla)
+        return ruta
+
 #eta funcion es la que maneja el guardado en multiples formatos al llamar a las otras tres funciones.
     @manejar_error
-    def guardar_multiple_formatos(self, df: pd.DataFrame, nombre_base: str):
-        """Guarda en múltiples formatos"""
+    def guardar_multiple_formatos(self, df: pd.DataFrame, nombre_base: str, formatos: Optional[List[str]] = None,
+                                  paralelo: bool = False, max_workers: Optional[int] = None,
+                                  tipo_pool: str = 'hilos', fallar_si_error: bool = False):
+        """
+        Guarda en múltiples formatos
+
+        Args:
+            df: DataFrame a guardar
+            nombre_base: Nombre de los archivos (sin extensión)
+            formatos: Formatos a generar (por defecto csv, json y excel; parquet hay que pedirlo, necesita pyarrow)
+            paralelo: Si es True cada formato se escribe en un worker distinto al mismo tiempo
+            max_workers: Tamaño del pool (por defecto, uno por formato)
+            tipo_pool: 'hilos' (ThreadPoolExecutor) o 'procesos' (ProcessPoolExecutor, copia df a cada proceso)
+            fallar_si_error: En modo paralelo, lanzar RuntimeError al final si algún formato falló.
+                Si es False los errores quedan en self.errores_por_formato y el resto de formatos se guarda igual
+
+        Returns:
+            Diccionario formato -> ruta. Los segundos por formato quedan en self.tiempos_por_formato
+        """
         rutas = {} # Diccionario para almacenar las rutas de los archivos guardados
-        
-        for formato in ['csv', 'json', 'excel']: # Itera sobre una lista de formatos deseados (csv, json, excel).Esta lista se obtiene de forma estática, pero podría modificarse para aceptar formatos dinámicos según las necesidades.
-            if formato == 'csv':  #si el formato es 'csv', llama al método guardar_como_csv y almacena la ruta devuelta en el diccionario rutas bajo la clave 'csv'.
-                rutas['csv'] = self.guardar_como_csv(df, nombre_base) #entonces este metodod llama al método guardar_como_csv pasando el DataFrame (df) y el nombre base (nombre_base) como argumentos., la funcion que llama crea la carpeta, la ruta y guarda el archivo. y devuelve la ruta del archivo guardado. y esta lo lamcxena en el diccionario rutas con la clave 'csv'.
-            elif formato == 'json': 
-                rutas['json'] = self.guardar_como_json(df, nombre_base) #la ruta que devulve la funcion se almacena en el diccionario rutas bajo la clave 'json' y asi con todos los formatos.
-            elif formato == 'excel':
-                rutas['excel'] = self.guardar_como_excel(df, nombre_base)
-        
+        formatos = formatos or ['csv', 'json', 'excel']
+        self.tiempos_por_formato = {}
+        self.errores_por_formato = {}
+
+        no_soportados = [formato for formato in formatos if formato not in self.formatos_soportados]
+        if no_soportados:
+            raise ValueError(f"Formatos no soportados: {no_soportados}")
+        if tipo_pool not in POOLS:
+            raise ValueError(f"tipo_pool no soportado: {tipo_pool}. Opciones: {list(POOLS)}")
+
+        if not paralelo:
+            for formato in formatos: # Itera sobre la lista de formatos pedidos (por defecto csv, json, excel y parquet).
+                rutas[formato], self.tiempos_por_formato[formato] = _guardar_formato(self, formato, df, nombre_base) #cada formato llama a su método guardar_como_<formato>, que crea la carpeta, la ruta y guarda el archivo, y devuelve la ruta junto con los segundos que tardó.
+            return rutas
+
+        # Los escritores son independientes entre sí y pasan la mayor parte del tiempo en I/O o compresión,
+        # así que se lanzan todos a la vez y el tiempo total se acerca al del formato más lento en lugar de a la suma.
+        with POOLS[tipo_pool](max_workers=max_workers or len(formatos)) as pool:
+            futuros = {pool.submit(_guardar_formato, self, formato, df, nombre_base): formato for formato in formatos}
+            for futuro in as_completed(futuros):
+                formato = futuros[futuro]
+                try:
+                    rutas[formato], self.tiempos_por_formato[formato] = futuro.result()
+                except Exception as e: # un formato que falla no cancela a los demás
+                    self.errores_por_formato[formato] = str(e)
+                    logger.error("Error guardando formato %s: %s", formato, e)
+
+        for formato, segundos in self.tiempos_por_formato.items():
+            logger.info("  %s: %.3f s", formato, segundos)
+
+        if self.errores_por_formato and fallar_si_error:
+            raise RuntimeError(f"Fallaron los formatos: {self.errores_por_formato}")
+
+        rutas = {formato: rutas[formato] for formato in formatos if formato in rutas} # mismo orden que formatos
         return rutas # Devuelve el diccionario rutas que contiene las rutas de los archivos guardados en los diferentes formatos.
 #el método guardar_multiple_formatos es útil cuando se desea guardar los mismos datos en varios formatos para diferentes propósitos o audiencias, asegurando flexibilidad en el acceso y uso de los datos almacenados.
-#si usara rutas.items en main.py podria iterar sobre las rutas devueltas y mostrar o procesar cada archivo guardado según sea necesario. ya que rutas es un diccionario donde las claves son los formatos de archivo y los valores son las rutas correspondientes a los archivos guardados.
\ No newline at end of file
+#si usara rutas.items en main.py podria iterar sobre las rutas devueltas y mostrar o procesar cada archivo guardado según sea necesario. ya que rutas es un diccionario donde las claves son los formatos de archivo y los valores son las rutas correspondientes a los archivos guardados.
+
+    @manejar_error
+    def guardar_perfil(self, datos: Union[pd.DataFrame, EstadisticasColumnas], nombre_archivo: str) -> str:
+        """
+        Guarda el perfil de los datos (por columna: nulos, distintos, media, cuantiles, valores frecuentes) en JSON
+
+        Args:
+            datos: DataFrame, o estadísticas ya acumuladas (ej. chunk a chunk mientras se guardaban los datos)
+            nombre_archivo: Nombre de los datos (sin extensión); el perfil se guarda como {nombre_archivo}_perfil.json
+
+        Returns:
+            Ruta del archivo
+        """
+        estadisticas = datos if isinstance(datos, EstadisticasColumnas) else EstadisticasColumnas.desde_dataframe(datos)
+        ruta = estadisticas.guardar_perfil(f"data/processed/{nombre_archivo}_perfil.json")
+        logger.info("Perfil de los datos guardado en: %s", ruta)
+        return ruta
+
+# guardar_particionado reparte las filas en carpetas según el valor de unas columnas (ciudad=Madrid/anio_ingreso=2020/).
+# Quien solo necesita una ciudad o un año lee esa carpeta (ExtractorDatos.leer_particionado poda el resto por el nombre)
+# en lugar de recorrer todo el archivo. Cada partición es un archivo independiente, así que se escriben en paralelo.
+    @manejar_error
+    def guardar_particionado(self, df: pd.DataFrame, nombre_base: str, columnas: Sequence[str], formato: str = 'parquet',
+                             derivadas: Optional[Dict[str, Callable[[pd.DataFrame], Any]]] = None,
+                             max_workers: Optional[int] = None) -> str:
+        """
+        Guarda el DataFrame particionado al estilo Hive: data/processed/{nombre_base}/col1=valor/col2=valor/parte-00000.{formato}
+
+        Args:
+            df: DataFrame a guardar
+            nombre_base: Nombre de la carpeta de salida (si ya existe, se reemplaza)
+            columnas: Columnas de partición, en orden de anidamiento. Su valor queda en la ruta y no dentro de los archivos
+            formato: parquet, csv o jsonl (csv y jsonl se comprimen con el códec del cargador)
+            derivadas: Columnas de partición calculadas que no están en df, ej.
+                {'anio_ingreso': lambda df: pd.to_datetime(df['fecha_ingreso']).dt.year}
+            max_workers: Hilos que escriben particiones a la vez (por defecto, el de ThreadPoolExecutor)
+
+        Returns:
+            Ruta de la carpeta de salida
+        """
+        if formato not in FORMATOS_PARTICIONADOS:
+            raise ValueError(f"Formato no soportado para particionar: {formato}. Opciones: {FORMATOS_PARTICIONADOS}")
+        derivadas = derivadas or {}
+        no_encontradas = [columna for columna in columnas if columna not in df.columns and columna not in derivadas]
+        if not columnas or no_encontradas:
+            raise KeyError(f"Columnas de partición no encontradas: {no_encontradas or 'ninguna indicada'}")
+
+        claves = pd.DataFrame({columna: np.asarray(derivadas[columna](df) if columna in derivadas else df[columna])
+                               for columna in columnas})
+        grupos = claves.groupby(list(columnas), sort=True, dropna=False, observed=True).indices # valores -> posiciones de sus filas
+        datos = df.drop(columns=[columna for columna in columnas if columna in df.columns])
+
+        if formato == 'parquet':
+            pa, _ = importar_pyarrow()
+        directorio = f"data/processed/{nombre_base}"
+        # se escribe en una carpeta hermana y solo al terminar todas las particiones reemplaza a la anterior: si algo
+        # falla a medias, la salida anterior sigue intacta
+        temporal = directorio + '.tmp'
+        if os.path.exists(temporal): # restos de una ejecución interrumpida
+            shutil.rmtree(temporal)
+        os.makedirs(temporal)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool: # pyarrow y la compresión liberan el GIL mientras escriben
+                futuros = []
+                for valores, posiciones in grupos.items():
+                    valores = valores if len(columnas) > 1 else (valores,) # con una sola columna, groupby no devuelve tuplas
+                    carpeta = f"{temporal}/{ruta_particion(columnas, valores)}"
+                    os.makedirs(carpeta, exist_ok=True)
+                    # las filas de cada partición se separan (y en Parquet se convierten a Arrow) en este hilo: ni pandas ni la
+                    # conversión de pyarrow admiten trabajar a la vez desde varios hilos; en paralelo va la escritura
+                    parte = datos.take(posiciones).reset_index(drop=True)
+                    if formato == 'parquet':
+                        if self.esquema is not None:
+                            parte = self.esquema.aplicar(parte, proyectar=False)
+                        parte = pa.Table.from_pandas(parte, preserve_index=False)
+                    futuros.append(pool.submit(_escribir_particion, self, parte, f"{carpeta}/parte-00000.{formato}", formato))
+                filas = [len(grupos[clave]) for clave in grupos]
+                for futuro in futuros:
+                    futuro.result() # propaga el error de cualquier partición
+        except BaseException:
+            shutil.rmtree(temporal, ignore_errors=True)
+            raise
+
+        # os.replace no sustituye una carpeta que no está vacía: la anterior se aparta antes de poner la nueva
+        anterior = directorio + '.anterior'
+        if os.path.exists(directorio):
+            if os.path.exists(anterior):
+                shutil.rmtree(anterior)
+            os.replace(directorio, anterior)
+        os.replace(temporal, directorio)
+        shutil.rmtree(anterior, ignore_errors=True)
+
+        logger.info("Datos guardados en %s particiones (%s filas) en: %s", len(filas), sum(filas), directorio)
+        return directorio
+
+# guardar_por_chunks es la contraparte de ExtractorDatos.leer_por_chunks: recibe cualquier iterable de DataFrames
+# (por ejemplo un generador que lee, limpia y transforma chunk a chunk) y va agregando cada uno a los archivos de salida.
+# Como nunca se juntan todos los chunks en un solo DataFrame, la memoria queda acotada al tamaño de un chunk.
+    @manejar_error
+    def guardar_por_chunks(self, chunks: Iterable[pd.DataFrame], nombre_base: str,
+                           formatos: Sequence[str] = ('csv', 'json')) -> Dict[str, str]:
+        """
+        Guarda un flujo de DataFrames agregándolos a los archivos de salida
+
+        Args:
+            chunks: Iterable de DataFrames con las mismas columnas
+            nombre_base: Nombre de los archivos (sin extensión)
+            formatos: Formatos de salida (csv, json, jsonl, sqlite)
+
+        Returns:
+            Diccionario formato -> ruta del archivo generado
+        """
+        with EscritorPorChunks(nombre_base, formatos, compresion=self.compresion,
+                               hilos_compresion=self.hilos_compresion) as escritor:
+            for chunk in chunks:
+                escritor.escribir(chunk)
+
+        logger.info("Total registros guardados por chunks: %s", escritor.filas_escritas)
+        return escritor.rutas
+
+# anexar mantiene archivos de salida estables (sin fecha en el nombre) a los que cada ejecución incremental agrega
+# solo las filas nuevas. Con clave, las filas que ya existían con la misma clave se sustituyen (fusión / upsert).
+    @manejar_error
+    def anexar(self, df: pd.DataFrame, nombre_base: str, formatos: Sequence[str] = ('csv', 'jsonl'),
+               clave: Optional[str] = None) -> Dict[str, str]:
+        """
+        Agrega filas a los archivos de salida existentes (o los crea si no existen)
+
+        Args:
+            df: Filas a agregar
+            nombre_base: Nombre de los archivos (sin extensión)
+            formatos: csv, jsonl, parquet y/o sqlite. Parquet se guarda como una carpeta con un archivo por ejecución
+                (un archivo Parquet no admite agregar filas); pd.read_parquet lee la carpeta completa
+            clave: Si se indica, antes de agregar se eliminan de las salidas las filas cuya clave aparece en df
+                (en SQLite las filas se actualizan directamente con un upsert)
+
+        Returns:
+            Diccionario formato -> ruta
+        """
+        no_soportados = [formato for formato in formatos if formato not in FORMATOS_ANEXABLES]
+        if no_soportados:
+            raise ValueError(f"Formatos no soportados para anexar: {no_soportados}. Opciones: {FORMATOS_ANEXABLES}")
+
+        os.makedirs("data/processed", exist_ok=True)
+        if clave is not None:
+            df = df.drop_duplicates(subset=clave, keep='last') # dentro del lote también gana la versión más reciente
+        claves = None
+        if clave is not None:
+            # si la clave es numérica se compara por valor: 3, 3.0 (columna que pasó por float) y "03" son la misma
+            numerica = pd.api.types.is_numeric_dtype(df[clave]) and not pd.api.types.is_bool_dtype(df[clave])
+            claves = {_clave_comparable(valor, numerica) for valor in df[clave].tolist()} - {None}
+
+        rutas = {}
+        for formato in formatos:
+            ruta = f"data/processed/{nombre_base}.{formato}"
+            if claves and os.path.exists(ruta) and formato != 'sqlite':
+                eliminadas = _eliminar_claves(ruta, formato, clave, claves, numerica)
+                if eliminadas:
+                    logger.info("%s: reemplazadas %s filas con clave repetida", ruta, eliminadas)
+
+            if formato == 'csv':
+                existe = os.path.exists(ruta) and os.path.getsize(ruta) > 0
+                with open(ruta, 'a', encoding='utf-8', newline='') as f:
+                    df.to_csv(f, index=False, header=not existe) # la cabecera solo si el archivo es nuevo
+            elif formato == 'jsonl':
+                with open(ruta, 'a', encoding='utf-8') as f:
+                    with EscritorJSON(f, 'lineas') as escritor:
+                        escritor.escribir(df)
+            elif formato == 'sqlite':
+                from .base_datos import EscritorSQLite
+                with EscritorSQLite(ruta, clave=clave) as escritor:
+                    escritor.escribir(df)
+            else:
+                pa, pq = importar_pyarrow()
+                os.makedirs(ruta, exist_ok=True)
+                partes = [nombre for nombre in os.listdir(ruta) if nombre.startswith('parte-')]
+                numero = max((int(nombre[len('parte-'):].split('.')[0]) for nombre in partes), default=0) + 1
+                if self.esquema is not None:
+                    df = self.esquema.aplicar(df, proyectar=False)
+                pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f"{ruta}/parte-{numero:05d}.parquet")
+            rutas[formato] = ruta
+
+        logger.info("Anexados %s registros a %s", len(df), nombre_base)
+        return rutas
+
+
+def _clave_comparable(valor: Any, numerica: bool) -> Any:
+    """Valor de una clave tal como se compara en anexar: número (float) si la clave es numérica, texto si no (None: nulo)"""
+    if not numerica:
+        return None if valor is None else str(valor)
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError): # nulo o texto que no es un número: no coincide con ninguna clave numérica
+        return None
+    return None if np.isnan(numero) else numero
+
+
+def _eliminar_claves(ruta: str, formato: str, clave: str, claves: set, numerica: bool = False) -> int:
+    """Reescribe una salida sin las filas cuya clave (normalizada con _clave_comparable) está en claves; devuelve cuántas se eliminaron"""
+    eliminadas = 0
+    if formato == 'parquet':
+        _, pq = importar_pyarrow()
+        for nombre in sorted(os.listdir(ruta)):
+            parte = f"{ruta}/{nombre}"
+            tabla = pq.read_table(parte)
+            repetidas = np.array([_clave_comparable(valor, numerica) in claves for valor in tabla.column(clave).to_pylist()], dtype=bool)
+            if repetidas.any():
+                eliminadas += int(repetidas.sum())
+                if repetidas.all():
+                    os.remove(parte)
+                else:
+                    pq.write_table(tabla.filter(~repetidas), parte)
+        return eliminadas
+
+    # CSV y JSONL se copian línea a línea a un archivo temporal, sin volver a interpretar ni formatear las filas que se quedan
+    temporal = ruta + '.tmp'
+    with open(ruta, encoding='utf-8', newline='') as entrada, open(temporal, 'w', encoding='utf-8', newline='') as salida:
+        if formato == 'csv':
+            lector = csv.reader(entrada)
+            escritor = csv.writer(salida, lineterminator=os.linesep) # mismo fin de línea que to_csv
+            cabecera = next(lector, None)
+            if cabecera is not None:
+                escritor.writerow(cabecera)
+                posicion = cabecera.index(clave)
+                for fila in lector:
+                    if _clave_comparable(fila[posicion], numerica) in claves:
+                        eliminadas += 1
+                    else:
+                        escritor.writerow(fila)
+        else:
+            for linea in entrada:
+                if _clave_comparable(json.loads(linea).get(clave), numerica) in claves:
+                    eliminadas += 1
+                else:
+                    salida.write(linea)
+    os.replace(temporal, ruta)
+    return eliminadas
+
+
+def _guardar_formato(cargador: CargadorDatos, formato: str, df: pd.DataFrame, nombre_base: str):
+    """Guarda df en un formato y devuelve (ruta, segundos). Es una función de módulo para poder usarla en un ProcessPoolExecutor"""
+    inicio = time.perf_counter()
+    ruta = getattr(cargador, f"guardar_como_{formato}")(df, nombre_base)
+    return ruta, time.perf_counter() - inicio
+
+
+def _escribir_particion(cargador: CargadorDatos, datos, ruta: str, formato: str):
+    """Escribe el archivo de una partición: datos es una tabla de Arrow en Parquet y un DataFrame en csv y jsonl"""
+    if formato == 'parquet':
+        _, pq = importar_pyarrow()
+        pq.write_table(datos, ruta)
+        return
+    ruta = ruta_comprimida(ruta, cargador.compresion)
+    with abrir(ruta, 'w', cargador.compresion, hilos=cargador.hilos_compresion, newline='') as f:
+        if formato == 'csv':
+            datos.to_csv(f, index=False)
+        else:
+            with EscritorJSON(f, 'lineas') as escritor:
+                escritor.escribir(datos)
+
+
+class EscritorPorChunks:
+    """Escribe DataFrames por partes en CSV, JSON y SQLite manteniendo los archivos abiertos"""
+
+    formatos_soportados = ('csv', 'json', 'jsonl', 'sqlite')
+
+    def __init__(self, nombre_base: str, formatos: Sequence[str] = ('csv', 'json'),
+                 directorio: str = "data/processed", compresion: Optional[str] = None, hilos_compresion: int = 1):
+        no_soportados = [formato for formato in formatos if formato not in self.formatos_soportados]
+        if no_soportados:
+            raise ValueError(f"Formatos no soportados para escritura por chunks: {no_soportados}")
+
+        os.makedirs(directorio, exist_ok=True)
+        # csv, json y jsonl se comprimen en streaming si se indica un códec (la ruta lleva su extensión, ej. .csv.gz)
+        self.compresion = resolver_codec('', compresion)
+        self.hilos_compresion = hilos_compresion
+        self.rutas = {formato: f"{directorio}/{nombre_base}.{formato}" if formato == 'sqlite'
+                      else ruta_comprimida(f"{directorio}/{nombre_base}.{formato}", self.compresion) for formato in formatos}
+        self.filas_escritas = 0
+        self.chunks_escritos = 0
+        self._archivos = {}
+
+    def __enter__(self):
+        # newline='' evita que en Windows se escriban saltos de línea dobles en el CSV
+        for formato, ruta in self.rutas.items():
+            if formato != 'sqlite':
+                self._archivos[formato] = abrir(ruta, 'w', self.compresion, hilos=self.hilos_compresion, newline='')
+        # el JSON es un único array compacto que se va llenando chunk a chunk; el JSONL, un registro por línea
+        self._escritores_json = {
+            formato: EscritorJSON(self._archivos[formato], 'lineas' if formato == 'jsonl' else 'array', indentar=False).__enter__()
+            for formato in ('json', 'jsonl') if formato in self._archivos
+        }
+        self._escritor_sqlite = None
+        if 'sqlite' in self.rutas: # la base se crea de nuevo, como los demás archivos; las filas se cargan por lotes
+            from .base_datos import EscritorSQLite
+            if os.path.exists(self.rutas['sqlite']):
+                os.remove(self.rutas['sqlite'])
+            self._escritor_sqlite = EscritorSQLite(self.rutas['sqlite'], clave=None).__enter__()
+        return self
+
+    def escribir(self, df: pd.DataFrame):
+        """Agrega un chunk a todos los archivos abiertos"""
+        if 'csv' in self._archivos:
+            # la cabecera solo se escribe con el primer chunk
+            df.to_csv(self._archivos['csv'], index=False, header=self.chunks_escritos == 0)
+
+        for escritor in self._escritores_json.values():
+            escritor.escribir(df)
+        if self._escritor_sqlite is not None:
+            self._escritor_sqlite.escribir(df)
+
+        self.filas_escritas += len(df)
+        self.chunks_escritos += 1
+
+    def __exit__(self, tipo_error, error, traza):
+        for escritor in self._escritores_json.values():
+            escritor.__exit__(tipo_error, error, traza)
+        if self._escritor_sqlite is not None:
+            self._escritor_sqlite.__exit__(tipo_error, error, traza)
+        for archivo in self._archivos.values():
+            archivo.close()
+        self._archivos = {}
+        return False # no se suprimen las excepciones
+
+
+class EscritorJSON:
+    """Serializa DataFrames a JSON por lotes, directamente desde los arrays de cada columna"""
+
+    formatos_soportados = ('array', 'lineas')
+
+    def __init__(self, archivo, formato: str = 'array', indentar: bool = True, tamano_lote: int = 10_000):
+        if formato not in self.formatos_soportados:
+            raise ValueError(f"Formato JSON no soportado: {formato}. Opciones: {self.formatos_soportados}")
+        if tamano_lote <= 0:
+            raise ValueError(f"tamano_lote debe ser mayor que 0: {tamano_lote}")
+
+        self._archivo = archivo
+        self.formato = formato
+        self.tamano_lote = tamano_lote
+        self.filas_escritas = 0
+        self._indentar = indentar and formato == 'array'
+        # sin indent, json usa su codificador en C, mucho más rápido; default=str cubre tipos raros (Timestamp dentro de object, Decimal...)
+        self._codificador = json.JSONEncoder(ensure_ascii=False, indent=2 if self._indentar else None, default=str)
+
+    def __enter__(self):
+        if self.formato == 'array':
+            self._archivo.write('[')
+        return self
+
+    def escribir(self, df: pd.DataFrame):
+        """Agrega las filas de df al archivo, tamano_lote filas cada vez"""
+        for inicio in range(0, len(df), self.tamano_lote):
+            registros = _registros_json(df.iloc[inicio:inicio + self.tamano_lote])
+
+            if self.formato == 'lineas':
+                self._archivo.write(''.join(self._codificador.encode(registro) + '\n' for registro in registros))
+            else:
+                # se codifica el lote como lista y se le quitan los corchetes; con indent también el último salto de línea.
+                # Así la concatenación de lotes es idéntica a codificar la lista completa de una vez.
+                texto = self._codificador.encode(registros)[1:-1]
+                if self._indentar:
+                    texto = texto[:-1]
+                if self.filas_escritas > 0:
+                    texto = (',' if self._indentar else ', ') + texto
+                self._archivo.write(texto)
+
+            self.filas_escritas += len(registros)
+
+    def __exit__(self, tipo_error, error, traza):
+        if self.formato == 'array':
+            self._archivo.write('\n]' if self._indentar and self.filas_escritas > 0 else ']')
+        return False
+
+
+def _registros_json(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convierte un lote de filas en diccionarios a partir de las columnas ya convertidas a tipos de Python"""
+    columnas = [str(columna) for columna in df.columns]
+    valores = [_valores_json(df.iloc[:, indice]) for indice in range(df.shape[1])]
+    return [dict(zip(columnas, fila)) for fila in zip(*valores)]
+
+
+def _valores_json(serie: pd.Series) -> list:
+    """Convierte una columna a una lista de valores serializables (nulos -> None, fechas -> texto ISO)"""
+    if pd.api.types.is_datetime64_dtype(serie.dtype):
+        texto = np.datetime_as_string(serie.values, unit='s').astype(object) # conversión vectorizada de toda la columna
+        texto[serie.isna().values] = None
+        return texto.tolist()
+    if serie.dtype in (np.float32, np.float16):
+        # float(np.float32(43.74)) da 43.7400016784668; pasando por el texto más corto que representa el valor
+        # (el mismo que escribe el CSV) se obtiene 43.74
+        serie = pd.Series(serie.to_numpy().astype(str).astype('float64'), index=serie.index)
+    if serie.hasnans:
+        return serie.astype(object).where(serie.notna(), None).tolist()
+    return serie.tolist() # tolist convierte los tipos de numpy (int64, float64...) a int y float de Python
+
+
+# openpyxl normal guarda todas las celdas del libro en memoria (un objeto Python por celda) hasta que se cierra el
+# archivo. En modo write_only cada fila se serializa al XML de la hoja en cuanto se agrega y se descarta: la memoria
+# queda acotada al lote que se está convirtiendo, sea cual sea el número de filas.
+class EscritorExcel:
+    """Escribe DataFrames en un .xlsx en modo write_only, repartiendo las filas en hojas Datos_1, Datos_2..."""
+
+    def __init__(self, ruta: str, filas_por_hoja: int = FILAS_MAX_EXCEL - 1, tamano_lote: int = 10_000,
+                 nombre_hoja: str = 'Datos'):
+        """
+        Args:
+            ruta: Archivo .xlsx de salida
+            filas_por_hoja: Filas de datos por hoja (sin contar la cabecera)
+            tamano_lote: Filas que se convierten a valores de Python de cada vez
+            nombre_hoja: Nombre de la hoja de datos; si hacen falta varias se numeran (Datos_1, Datos_2...)
+        """
+        if tamano_lote <= 0:
+            raise ValueError(f"tamano_lote debe ser mayor que 0: {tamano_lote}")
+        from openpyxl import Workbook # openpyxl solo hace falta para Excel
+
+        self.ruta = ruta
+        self.filas_por_hoja = filas_por_hoja
+        self.tamano_lote = tamano_lote
+        self.nombre_hoja = nombre_hoja
+        self.filas_escritas = 0
+        self.hojas = 0
+        self._libro = Workbook(write_only=True)
+        self._hoja = None
+        self._filas_en_hoja = 0
+        self._cabecera = None
+
+    def __enter__(self):
+        return self
+
+    def escribir(self, df: pd.DataFrame):
+        """Agrega las filas de df a las hojas de datos (se pueden hacer varias llamadas con las mismas columnas)"""
+        if self._cabecera is None:
+            self._cabecera = [str(columna) for columna in df.columns]
+        for inicio in range(0, len(df), self.tamano_lote):
+            lote = df.iloc[inicio:inicio + self.tamano_lote]
+            valores = [_valores_excel(lote.iloc[:, indice]) for indice in range(lote.shape[1])]
+            for fila in zip(*valores):
+                if self._hoja is None or self._filas_en_hoja == self.filas_por_hoja:
+                    self._nueva_hoja()
+                self._hoja.append(fila)
+                self._filas_en_hoja += 1
+            self.filas_escritas += len(lote)
+
+    def escribir_hoja(self, nombre: str, df: pd.DataFrame):
+        """Agrega una hoja aparte con df completo (ej. el resumen)"""
+        if self._hoja is None and self._cabecera is not None: # datos sin filas: al menos la hoja con la cabecera
+            self._nueva_hoja()
+        hoja = self._libro.create_sheet(nombre)
+        hoja.append([str(columna) for columna in df.columns])
+        for fila in zip(*(_valores_excel(df.iloc[:, indice]) for indice in range(df.shape[1]))):
+            hoja.append(fila)
+
+    def _nueva_hoja(self):
+        self.hojas += 1
+        self._hoja = self._libro.create_sheet(f"{self.nombre_hoja}_{self.hojas}")
+        self._hoja.append(self._cabecera)
+        self._filas_en_hoja = 0
+
+    def __exit__(self, tipo_error, error, traza):
+        if tipo_error is not None: # exportación a medias: no se guarda un .xlsx válido pero incompleto
+            for hoja in self._libro.worksheets: # cierra la escritura de cada hoja en su temporal (openpyxl los borra al salir)
+                hoja.close()
+            return False
+        if self._hoja is None and self._cabecera is not None:
+            self._nueva_hoja()
+        if self.hojas == 1: # si todo cabe en una hoja se llama como siempre, Datos
+            self._libro.worksheets[0].title = self.nombre_hoja
+        if not self._libro.worksheets: # un libro sin hojas no es un .xlsx válido
+            self._libro.create_sheet(self.nombre_hoja)
+        try:
+            self._libro.save(self.ruta) # en modo write_only solo se puede guardar una vez
+        except BaseException:
+            if os.path.exists(self.ruta): # lo que se llegó a escribir no es un libro completo
+                os.remove(self.ruta)
+            raise
+        return False
+
+
+def _valores_excel(serie: pd.Series) -> list:
+    """Convierte una columna a valores que openpyxl sabe escribir (nulos -> celda vacía, fechas -> datetime)"""
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        if getattr(serie.dt, 'tz', None) is not None: # Excel no guarda zonas horarias
+            serie = serie.dt.tz_localize(None)
+        return serie.astype(object).where(serie.notna(), None).tolist()
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    return _valores_json(serie)
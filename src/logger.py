@@ -16,19 +16,40 @@
 
 import logging # este modulo se utiliza para registrar eventos que ocurren durante la ejecución de un programa
 from datetime import datetime #sirve para trabajar con fechas y horas
-import os
-from venv import logger #sirve para interactuar con el sistema operativo
+import os #sirve para interactuar con el sistema operativo
+import atexit # permite registrar funciones que se ejecutan al terminar el programa
+import functools
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from .metricas import MedicionEtapa, registro_metricas
 
 #logging y datetime  son técnicamente módulos que forman parte de la Biblioteca Estándar de Python.
 #igual os
 #src es un paquete personalizado creado para este proyecto ETL específico. es mi proyecto local que luego importamos en el main.py
 
+class _ArchivoLogDiferido(logging.FileHandler):
+    """FileHandler que abre el archivo (y crea su carpeta) al escribir el primer mensaje, no al crearse"""
+
+    def __init__(self, ruta, encoding=None):
+        super().__init__(ruta, encoding=encoding, delay=True) # delay=True: el archivo se abre en el primer emit
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 #logger.py es un módulo dentro del paquete src que define la configuración y funcionalidad del sistema de logging personalizado para el proyecto ETL.
 class LoggerPersonalizado:
-    def __init__(self, nombre_logger='ETL_Logger'):
-        """Inicializa el sistema de logging personalizado"""
+    def __init__(self, nombre_logger='ETL_Logger', nivel=logging.DEBUG):
+        """Inicializa el sistema de logging personalizado
+
+        Args:
+            nombre_logger: Nombre del logger
+            nivel: Nivel mínimo que se registra. Con logging.INFO los logger.debug(...) de los bucles por chunk
+                se descartan sin llegar a formatear el mensaje
+        """
         self.logger = logging.getLogger(nombre_logger) #logging es un módulo de Python que proporciona una forma flexible de emitir mensajes de log desde programas Python.
-        self.logger.setLevel(logging.DEBUG)
+        self.logger.setLevel(nivel)
 # self es una convención en Python que se refiere a la instancia actual de la clase.
 # nombre_logger es el nombre que se le da al logger para identificarlo.
 #self.logger es el atributo de la clase que almacena el objeto logger. y logging.getLogger(nombre_logger) crea o recupera un logger con el nombre especificado.
@@ -37,12 +58,10 @@ class LoggerPersonalizado:
 
  # Evitar múltiples handlers
         if not self.logger.handlers: #si no hay handlers asociados al logger, entonces se procede a configurar los handlers. los handlers son responsables de enviar los mensajes de log a diferentes destinos, como archivos o la consola.
-            # Crear carpeta de logs si no existe
-            os.makedirs("logs", exist_ok=True) # os.makedirs crea un directorio recursivamente. Si el directorio ya existe, no lanza una excepción gracias a exist_ok=True.
-            
-            # Handler para archivo
+            # Handler para archivo. El archivo (y la carpeta logs) no se crea al configurar el logger sino con el primer
+            # mensaje: importar un módulo del ETL no deja rastros en disco ni abre archivos
             fecha_actual = datetime.now().strftime("%Y%m%d") # datetime.now() obtiene la fecha y hora actuales. .strftime("%Y%m%d") formatea la fecha en una cadena con el formato "AñoMesDía".
-            file_handler = logging.FileHandler( # logging.FileHandler crea un handler que escribe los mensajes de log en un archivo.
+            file_handler = _ArchivoLogDiferido( # un logging.FileHandler que escribe los mensajes de log en un archivo.
                 f"logs/etl_{fecha_actual}.log", #imprime el nombre del archivo de log con la fecha actual.
                 encoding='utf-8' # se usa para asegurarse de que los caracteres especiales se manejen correctamente al escribir en el archivo.
             )
@@ -64,20 +83,144 @@ class LoggerPersonalizado:
     
     def get_logger(self): # devuelve el logger configurado
         return self.logger
+
+
+class _LoggerDiferido:
+    """Se comporta como el logger, pero no lo configura (handlers de archivo y consola) hasta el primer uso"""
+
+    def __init__(self, nombre_logger='ETL_Logger'):
+        self._nombre_logger = nombre_logger
+        self._logger = None
+
+    def __getattr__(self, atributo): # solo se llama con los atributos que no tiene el objeto: info, warning, handlers...
+        if atributo.startswith('_'): # atributos internos (ej. los que busca pickle): no son del logger
+            raise AttributeError(atributo)
+        if self._logger is None:
+            self._logger = LoggerPersonalizado(self._nombre_logger).get_logger()
+        return getattr(self._logger, atributo)
+
+
+def obtener_logger(nombre_logger='ETL_Logger'):
+    """
+    Logger para usar a nivel de módulo (logger = obtener_logger())
+
+    A diferencia de LoggerPersonalizado().get_logger(), importar el módulo no configura nada: los handlers se crean con
+    el primer mensaje. Así importar el paquete no tiene efectos secundarios y los procesos que no registran nada no
+    pagan la configuración
+    """
+    return _LoggerDiferido(nombre_logger)
     
     
+# Logging asíncrono:
+# por defecto cada logger.info(...) escribe en el archivo y en la consola desde el mismo hilo que hace el trabajo, así que
+# el ETL espera a que termine cada escritura. Con el modo asíncrono el logger solo tiene un QueueHandler, que mete el
+# registro en una cola (operación muy barata), y un QueueListener en un hilo aparte saca los registros de la cola y los
+# pasa a los handlers reales (archivo y consola).
+_listeners = {} # nombre_logger -> QueueListener activo
+
+
+class _QueueHandlerDiferido(QueueHandler):
+    """QueueHandler que no formatea el mensaje al encolarlo: el formateo (msg % args) lo hace el hilo del listener"""
+
+    def prepare(self, record):
+        return record
+
+
+def activar_logging_asincrono(nombre_logger='ETL_Logger'):
+    """
+    Pasa los handlers del logger a un hilo en segundo plano
+
+    Args:
+        nombre_logger: Nombre del logger a convertir (se configura si todavía no lo estaba)
+
+    Returns:
+        El logger, que ahora solo encola los mensajes
+    """
+    logger = LoggerPersonalizado(nombre_logger).get_logger()
+    if nombre_logger in _listeners: # ya estaba activado
+        return logger
+
+    handlers = list(logger.handlers)
+    cola = queue.SimpleQueue()
+    listener = QueueListener(cola, *handlers, respect_handler_level=True) # cada handler mantiene su propio nivel (archivo DEBUG, consola INFO)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(_QueueHandlerDiferido(cola))
+    listener.start()
+
+    _listeners[nombre_logger] = listener
+    if len(_listeners) == 1:
+        atexit.register(detener_logging_asincrono) # al salir del programa se vacía la cola para no perder mensajes
+    return logger
+
+
+def detener_logging_asincrono(nombre_logger=None):
+    """Vacía la cola, para el hilo y devuelve los handlers al logger (todos los loggers si nombre_logger es None)"""
+    nombres = [nombre_logger] if nombre_logger else list(_listeners)
+    for nombre in nombres:
+        listener = _listeners.pop(nombre, None)
+        if listener is None:
+            continue
+        listener.stop() # procesa los mensajes pendientes antes de parar
+        logger = logging.getLogger(nombre)
+        for handler in list(logger.handlers):
+            if isinstance(handler, _QueueHandlerDiferido):
+                logger.removeHandler(handler)
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+
+
+def _restaurar_handlers_en_proceso_hijo():
+    """En un proceso creado con fork no existe el hilo del listener: se devuelven los handlers al logger para no perder mensajes"""
+    for nombre, listener in list(_listeners.items()):
+        logger = logging.getLogger(nombre)
+        for handler in list(logger.handlers):
+            if isinstance(handler, _QueueHandlerDiferido):
+                logger.removeHandler(handler)
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+    _listeners.clear()
+
+
+if hasattr(os, 'register_at_fork'): # solo existe en sistemas POSIX (en Windows los procesos no se crean con fork)
+    os.register_at_fork(after_in_child=_restaurar_handlers_en_proceso_hijo)
+
+
+_logger_decorador = None # logger que usa manejar_error; se crea una sola vez en lugar de en cada llamada
+
+
+def _obtener_logger_decorador():
+    global _logger_decorador
+    if _logger_decorador is None:
+        _logger_decorador = LoggerPersonalizado().get_logger()
+    return _logger_decorador
+
+
+def _contar_filas(objeto):
+    """Número de filas si el objeto es un DataFrame (sin importar pandas aquí), None en otro caso"""
+    if hasattr(objeto, 'columns') and hasattr(objeto, 'shape'):
+        return len(objeto)
+    return None
+
+
     # Función para manejo de errores
 def manejar_error(func):
-    """Decorador para manejo de errores en funciones"""
+    """Decorador para manejo de errores en funciones (también registra las métricas de rendimiento de la etapa)"""
+    @functools.wraps(func) # conserva el nombre y el docstring de la función original
     def wrapper(*args, **kwargs): #*args y **kwargs permiten pasar un número variable de argumentos posicionales y de palabras clave a la función decorada. wrapper es una función interna que envuelve la función original (func) para agregar funcionalidad adicional, en este caso, manejo de errores.
-        logger = LoggerPersonalizado().get_logger() #se crea una instancia del logger personalizado y se obtiene el logger configurado.
+        logger = _obtener_logger_decorador() #se obtiene el logger personalizado (creado una sola vez y reutilizado en todas las llamadas).
+        # filas de entrada: las del primer DataFrame que reciba la función (el primer argumento de un método es self)
+        filas_entrada = next((filas for filas in map(_contar_filas, args) if filas is not None), None)
+        medicion = MedicionEtapa(func.__qualname__, filas_entrada) # __qualname__ incluye la clase: TransformadorDatos.limpiar_datos
         try:                                            #se hace un try-except para capturar cualquier excepción que ocurra durante la ejecución de la función decorada.
-                logger.info(f"Ejecutando {func.__name__}")  #se registra un mensaje de información indicando que se está ejecutando la función.
+                logger.info("Ejecutando %s", func.__name__)  #se registra un mensaje de información indicando que se está ejecutando la función. con %s el texto solo se arma si el nivel INFO está activo.
                 resultado = func(*args, **kwargs)          #se llama a la función decorada con los argumentos proporcionados y se almacena el resultado.
-                logger.info(f"{func.__name__} completado exitosamente") #se registra un mensaje de información indicando que la función se completó exitosamente.
+                registro_metricas.registrar(medicion.terminar(_contar_filas(resultado)))
+                logger.info("%s completado exitosamente", func.__name__) #se registra un mensaje de información indicando que la función se completó exitosamente.
                 return resultado    #se devuelve el resultado de la función decorada.
         except Exception as e:
-                logger.error(f"Error en {func.__name__}: {str(e)}")
+                registro_metricas.registrar(medicion.terminar(exito=False))
+                logger.error("Error en %s: %s", func.__name__, e)
                 raise  #si ocurre una excepción, se registra un mensaje de error con los detalles de la excepción y luego se vuelve a lanzar la excepción para que pueda ser manejada más arriba en la pila de llamadas.
     return wrapper #se devuelve la función wrapper, que ahora incluye el manejo de errores alrededor de la función original.
 #la funcion manejar_error es un decorador que se puede aplicar a cualquier función para agregarle manejo de errores y registro de eventos sin modificar el código original de la función.
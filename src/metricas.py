@@ -0,0 +1,124 @@
+"""
+Métricas de rendimiento por etapa del ETL
+
+Cada función decorada con @manejar_error registra aquí cuánto tardó (tiempo real y de CPU), cuántas filas recibió
+y devolvió y cuánto subió el pico de memoria del proceso. Al final de la ejecución se obtiene un reporte en forma
+de diccionario o de archivo JSON para comparar ejecuciones y detectar regresiones.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+try:
+    import resource # solo existe en sistemas POSIX; en Windows la memoria se reporta como None
+except ImportError:
+    resource = None
+
+
+def pico_memoria_mb() -> Optional[float]:
+    """Pico de memoria residente (RSS) del proceso en MB desde que arrancó"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+class MedicionEtapa:
+    """Mide una ejecución de una etapa: se crea al empezar y se cierra con terminar()"""
+
+    def __init__(self, nombre: str, filas_entrada: Optional[int] = None):
+        self.nombre = nombre
+        self.filas_entrada = filas_entrada
+        self._inicio = time.perf_counter()
+        self._inicio_cpu = time.process_time()
+        self._pico_inicial = pico_memoria_mb()
+
+    def terminar(self, filas_salida: Optional[int] = None, exito: bool = True) -> Dict[str, Any]:
+        segundos = time.perf_counter() - self._inicio
+        pico_final = pico_memoria_mb()
+        return {
+            'etapa': self.nombre,
+            'exito': exito,
+            'segundos': segundos,
+            'cpu_segundos': time.process_time() - self._inicio_cpu, # CPU de todo el proceso: incluye otros hilos que trabajen a la vez
+            'filas_entrada': self.filas_entrada,
+            'filas_salida': filas_salida,
+            'filas_por_segundo': self.filas_entrada / segundos if self.filas_entrada and segundos > 0 else None,
+            # cuánto subió el máximo de memoria del proceso durante la etapa (0 si no superó el pico anterior)
+            'incremento_pico_memoria_mb': pico_final - self._pico_inicial if pico_final is not None else None,
+        }
+
+
+class RegistroMetricas:
+    """Acumula las mediciones de todas las etapas de una ejecución"""
+
+    def __init__(self, max_mediciones: int = 1000):
+        # Las mediciones individuales se guardan en una cola acotada (en modo por chunks cada etapa se ejecuta
+        # una vez por chunk); los totales por etapa se acumulan aparte y no crecen con el número de llamadas.
+        self.mediciones = deque(maxlen=max_mediciones)
+        self.por_etapa = {}
+        self._lock = threading.Lock() # las etapas pueden terminar a la vez en hilos distintos (guardado paralelo)
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Empieza una ejecución nueva"""
+        with self._lock:
+            self.mediciones.clear()
+            self.por_etapa = {}
+            self.inicio = datetime.now()
+            self._inicio_perf = time.perf_counter()
+
+    def registrar(self, medicion: Dict[str, Any]):
+        """Agrega la medición de una etapa"""
+        with self._lock:
+            self.mediciones.append(medicion)
+            total = self.por_etapa.setdefault(medicion['etapa'], {
+                'llamadas': 0, 'errores': 0, 'segundos': 0.0, 'cpu_segundos': 0.0,
+                'filas_entrada': 0, 'filas_salida': 0, 'max_incremento_pico_memoria_mb': None,
+            })
+            total['llamadas'] += 1
+            total['errores'] += 0 if medicion['exito'] else 1
+            total['segundos'] += medicion['segundos']
+            total['cpu_segundos'] += medicion['cpu_segundos']
+            total['filas_entrada'] += medicion['filas_entrada'] or 0
+            total['filas_salida'] += medicion['filas_salida'] or 0
+            incremento = medicion['incremento_pico_memoria_mb']
+            if incremento is not None:
+                anterior = total['max_incremento_pico_memoria_mb']
+                total['max_incremento_pico_memoria_mb'] = incremento if anterior is None else max(anterior, incremento)
+
+    def reporte(self) -> Dict[str, Any]:
+        """Devuelve el reporte de la ejecución como diccionario serializable a JSON"""
+        with self._lock:
+            etapas = {}
+            for nombre, total in self.por_etapa.items():
+                etapa = dict(total)
+                etapa['filas_por_segundo'] = (
+                    total['filas_entrada'] / total['segundos'] if total['filas_entrada'] and total['segundos'] > 0 else None
+                )
+                etapas[nombre] = etapa
+            return {
+                'inicio': self.inicio.isoformat(),
+                'duracion_segundos': time.perf_counter() - self._inicio_perf,
+                'pico_memoria_mb': pico_memoria_mb(),
+                'etapas': etapas,
+                'mediciones': list(self.mediciones),
+            }
+
+    def guardar_reporte(self, ruta: str) -> str:
+        """Guarda el reporte en un archivo JSON y devuelve la ruta"""
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.reporte(), f, indent=2, ensure_ascii=False)
+        return ruta
+
+
+registro_metricas = RegistroMetricas() # registro global que usa manejar_error
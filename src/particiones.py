@@ -0,0 +1,102 @@
+"""
+Salidas particionadas al estilo Hive y poda de particiones al leer
+
+Una salida particionada es una carpeta con una subcarpeta por cada combinación de valores de las columnas de partición:
+    datos/ciudad=Madrid/anio_ingreso=2020/parte-00000.parquet
+Las columnas de partición no se guardan dentro de los archivos: su valor está en la ruta. Con un filtro sobre ellas
+(ej. [('ciudad', '==', 'Madrid')]) las carpetas que no pueden cumplirlo se descartan mirando solo los nombres, sin
+abrir sus archivos. Es la misma convención que usan Hive, Spark y pyarrow (pyarrow.dataset lee la carpeta completa;
+pd.read_parquet también, salvo que haya particiones nulas: pyarrow aún no convierte a pandas esas columnas).
+"""
+import operator
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+FORMATOS_PARTICIONADOS = ('parquet', 'csv', 'jsonl')
+VALOR_NULO = '__HIVE_DEFAULT_PARTITION__' # nombre de la partición de los valores nulos (el mismo que usa Hive)
+
+# Operadores de las condiciones (columna, operador, valor) de los filtros, también los de Pipeline.filtrar
+OPERADORES: Dict[str, Callable[[pd.Series, Any], pd.Series]] = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda serie, valor: serie.isin(valor),
+    'not in': lambda serie, valor: ~serie.isin(valor),
+}
+
+
+def _cumple(df: pd.DataFrame, condiciones: Sequence[tuple], tolerar_nulos: bool = False) -> np.ndarray:
+    """Máscara de las filas que cumplen todas las condiciones (columna, operador, valor). Con tolerar_nulos, un nulo cumple"""
+    cumple = np.ones(len(df), dtype=bool)
+    for columna, operador, valor in condiciones:
+        resultado = OPERADORES[operador](df[columna], valor).to_numpy(dtype=bool, na_value=False)
+        if tolerar_nulos:
+            resultado |= df[columna].isna().to_numpy()
+        cumple &= resultado
+    return cumple
+
+
+def ruta_particion(columnas: Sequence[str], valores: Sequence[Any]) -> str:
+    """Subcarpeta de una partición, ej. ciudad=Madrid/anio_ingreso=2020 (los caracteres especiales se codifican como en una URL)"""
+    return '/'.join(f"{quote(str(columna), safe='')}={_texto_valor(valor)}" for columna, valor in zip(columnas, valores))
+
+
+def listar_particiones(directorio: str) -> pd.DataFrame:
+    """
+    Archivos de datos de una salida particionada con los valores de partición de cada uno
+
+    Args:
+        directorio: Carpeta raíz de la salida
+
+    Returns:
+        DataFrame con una fila por archivo: la columna archivo (ruta) y una columna por columna de partición. Los
+        valores son numéricos si todos los de esa columna lo son; las particiones nulas quedan como nulos
+    """
+    filas = []
+    for carpeta, subcarpetas, archivos in os.walk(directorio):
+        subcarpetas.sort() # recorrido en orden: siempre se leen los archivos en el mismo orden
+        relativa = os.path.relpath(carpeta, directorio)
+        partes = [] if relativa == '.' else relativa.split(os.sep)
+        if not all('=' in parte for parte in partes):
+            continue
+        valores = {unquote(clave): (None if valor == VALOR_NULO else unquote(valor))
+                   for clave, valor in (parte.split('=', 1) for parte in partes)}
+        for archivo in sorted(archivos):
+            if not archivo.startswith(('.', '_')) and not archivo.endswith('.tmp'): # ocultos y de control (ej. _SUCCESS)
+                filas.append({'archivo': os.path.join(carpeta, archivo), **valores})
+
+    particiones = pd.DataFrame(filas, columns=['archivo'] + list(dict.fromkeys(clave for fila in filas for clave in fila if clave != 'archivo')))
+    for columna in particiones.columns[1:]:
+        numeros = pd.to_numeric(particiones[columna], errors='coerce')
+        if numeros.notna().sum() == particiones[columna].notna().sum(): # todos los valores son números
+            particiones[columna] = numeros
+    return particiones
+
+
+def podar_particiones(particiones: pd.DataFrame, filtros: Optional[Sequence[tuple]] = None) -> Tuple[pd.DataFrame, List[tuple]]:
+    """
+    Descarta los archivos cuyas particiones no cumplen los filtros sobre columnas de partición
+
+    Args:
+        particiones: Resultado de listar_particiones
+        filtros: Condiciones (columna, operador, valor) con los operadores de OPERADORES
+
+    Returns:
+        (archivos que hay que leer, condiciones sobre columnas que no son de partición: se aplican a las filas al leer)
+    """
+    filtros = list(filtros or [])
+    for columna, operador, _ in filtros:
+        if operador not in OPERADORES:
+            raise ValueError(f"Operador no soportado: {operador}. Opciones: {list(OPERADORES)}")
+    de_particion = [condicion for condicion in filtros if condicion[0] in particiones.columns[1:]]
+    restantes = [condicion for condicion in filtros if condicion[0] not in particiones.columns[1:]]
+    return particiones[_cumple(particiones, de_particion)], restantes
+
+
+def _texto_valor(valor: Any) -> str:
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return VALOR_NULO
+    if isinstance(valor, (float, np.floating)) and float(valor).is_integer(): # un año con nulos en la columna llega como 2020.0
+        valor = int(valor)
+    return quote(str(valor), safe='')
@@ -0,0 +1,497 @@
+"""
+Ejecución del pipeline ETL en modo streaming (por chunks) y como plan perezoso (Pipeline)
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from typing import Dict, Any, Callable, Iterator, List, Optional, Sequence
+from .extractor import ExtractorDatos, _LectorExcelPorChunks
+from .cliente_http import es_url
+from .dependencias import importar_pyarrow
+from .transformador import (TransformadorDatos, TEXTO_DESCONOCIDO, _es_texto, _como_texto,
+                           _rellenar_texto, _es_columna_fecha, _quitar_filas)
+from .fechas import fecha_de_relleno
+from .loader import CargadorDatos
+from .esquema import EsquemaDatos
+from .deduplicacion import Deduplicador
+from .estadisticas import EstadisticasColumnas
+from .reglas import ReglasDatos
+from .particiones import OPERADORES, _cumple # operadores de las condiciones (los mismos con que se podan particiones)
+from .logger import manejar_error, obtener_logger
+
+logger = obtener_logger()
+
+# En modo streaming cada chunk se extrae, limpia, transforma y guarda antes de leer el siguiente.
+# Hay dos operaciones de limpieza que no son locales a un chunk y se resuelven aparte:
+#  - el valor para rellenar nulos numéricos (media, mediana o moda): se calcula antes en una pasada previa que acumula
+#    las estadísticas de cada chunk (ver EstadisticasColumnas), que se pueden sumar sin guardar las filas
+#  - los duplicados: un Deduplicador guarda las huellas de las filas ya vistas para detectar duplicados entre chunks distintos
+# Mientras se guardan los chunks transformados se acumulan también sus estadísticas para el perfil de la salida
+
+
+def calcular_estadisticas(extractor: ExtractorDatos, ruta: str, tipo: str = 'csv', tamano_chunk: int = 100_000,
+                          esquema: Optional[EsquemaDatos] = None, medidas: Sequence[str] = ()) -> EstadisticasColumnas:
+    """
+    Calcula las estadísticas de todas las columnas de un archivo leyéndolo por chunks
+
+    Args:
+        extractor: Extractor con el que se lee el archivo
+        ruta: Ruta del archivo
+        tipo: Tipo de archivo
+        tamano_chunk: Número de filas por chunk
+        esquema: Esquema con el que se lee el archivo (el mismo que en la pasada principal)
+        medidas: Resúmenes opcionales (ver EstadisticasColumnas); sin ninguno, nulos, medias, mínimos y máximos
+
+    Returns:
+        Estadísticas de todas las filas del archivo
+    """
+    estadisticas = EstadisticasColumnas(medidas)
+    for chunk in extractor.leer_por_chunks(ruta, tipo, tamano_chunk, esquema=esquema):
+        estadisticas.actualizar(chunk) # se acumulan sumas y conteos (no medias): el resultado es exactamente la media global
+    return estadisticas
+
+
+def calcular_medias_globales(extractor: ExtractorDatos, ruta: str, tipo: str = 'csv',
+                             tamano_chunk: int = 100_000,
+                             esquema: Optional[EsquemaDatos] = None) -> Dict[str, float]:
+    """
+    Calcula la media de cada columna numérica de un archivo leyéndolo por chunks
+
+    Returns:
+        Diccionario columna -> media (argumentos: ver calcular_estadisticas)
+    """
+    estadisticas = calcular_estadisticas(extractor, ruta, tipo, tamano_chunk, esquema)
+    medias = {columna: estadisticas.media(columna) for columna in estadisticas.columnas}
+    return {columna: media for columna, media in medias.items() if media is not None}
+
+
+@manejar_error
+def ejecutar_etl_por_chunks(ruta: str, nombre_base: str, tipo: str = 'csv', tamano_chunk: int = 100_000,
+                            formatos: Sequence[str] = ('csv', 'json'),
+                            medias_globales: bool = True,
+                            esquema: Optional[EsquemaDatos] = None,
+                            deduplicador: Optional[Deduplicador] = None,
+                            estrategias_relleno: Optional[Dict[str, str]] = None,
+                            perfil: bool = True, compresion: Optional[str] = None,
+                            hilos_compresion: int = 1, reglas: Optional[ReglasDatos] = None) -> Dict[str, Any]:
+    """
+    Ejecuta extracción, limpieza, columnas calculadas y carga chunk a chunk
+
+    Args:
+        ruta: Ruta del archivo de entrada (o URL). Si está comprimido (.gz, .bz2, .xz) se descomprime al leer
+        nombre_base: Nombre de los archivos de salida (sin extensión)
+        tipo: Tipo del archivo de entrada (csv, json)
+        tamano_chunk: Número de filas por chunk
+        formatos: Formatos de salida (csv, json, jsonl, sqlite)
+        medias_globales: Si es True se hace una pasada previa para rellenar nulos con la media (o mediana o moda) de
+            todo el archivo (mismo resultado que el modo normal); si es False se usa la de cada chunk
+        esquema: Tipos compactos y proyección de columnas para leer la entrada (ver EsquemaDatos)
+        deduplicador: Columnas clave y conjunto de filas vistas para eliminar duplicados entre chunks (por defecto
+            se comparan filas completas y solo dentro de esta ejecución). Si tiene ruta, se guarda al terminar
+        estrategias_relleno: Estrategia para rellenar los nulos de cada columna numérica (ver TransformadorDatos)
+        perfil: Si es True se guarda también el perfil de la salida ({nombre_base}_perfil.json)
+        compresion: Códec (gzip, bz2, xz) con que se comprimen en streaming las salidas csv, json y jsonl
+        hilos_compresion: Hilos que comprimen bloques de las salidas en paralelo
+        reglas: Filtros de validez y columnas calculadas (por defecto, los de REGLAS_EMPLEADOS)
+
+    Returns:
+        Diccionario con el resumen de la ejecución
+    """
+    extractor = ExtractorDatos()
+    transformador = TransformadorDatos(estrategias_relleno=estrategias_relleno, reglas=reglas)
+    cargador = CargadorDatos(compresion=compresion, hilos_compresion=hilos_compresion)
+
+    valores_relleno = None
+    if medias_globales:
+        medidas = EstadisticasColumnas.para_estrategias(set(transformador.estrategias_relleno.values())).medidas
+        estadisticas = calcular_estadisticas(extractor, ruta, tipo, tamano_chunk, esquema, medidas)
+        valores_relleno = estadisticas.valores_relleno(transformador.estrategias_relleno)
+    resumen = {'registros_leidos': 0, 'registros_procesados': 0, 'chunks': 0}
+    deduplicador = deduplicador if deduplicador is not None else Deduplicador()
+    estadisticas_salida = EstadisticasColumnas() if perfil else None
+
+    def chunks_transformados() -> Iterator[pd.DataFrame]:
+        for chunk in extractor.leer_por_chunks(ruta, tipo, tamano_chunk, esquema=esquema):
+            resumen['registros_leidos'] += len(chunk)
+            resumen['chunks'] += 1
+
+            limpio = transformador.limpiar_datos(chunk, valores_relleno=valores_relleno, deduplicador=deduplicador)
+            transformado = transformador.agregar_columnas_calculadas(limpio)
+            if estadisticas_salida is not None:
+                estadisticas_salida.actualizar(transformado)
+
+            resumen['registros_procesados'] += len(transformado)
+            yield transformado
+
+    rutas = cargador.guardar_por_chunks(chunks_transformados(), nombre_base, formatos)
+    if estadisticas_salida is not None:
+        rutas['perfil'] = cargador.guardar_perfil(estadisticas_salida, nombre_base)
+    if deduplicador.ruta: # después de escribir las salidas: si algo falla antes, las filas no quedan como vistas
+        deduplicador.guardar()
+
+    logger.info("Pipeline por chunks completado. Filas: %s -> %s", resumen['registros_leidos'], resumen['registros_procesados'])
+    return {
+        'success': True,
+        'registros_leidos': resumen['registros_leidos'],
+        'registros_procesados': resumen['registros_procesados'],
+        'chunks': resumen['chunks'],
+        'archivos_generados': rutas,
+    }
+
+
+# Pipeline declarativo y perezoso: cada método solo añade un paso y devuelve un Pipeline nuevo; nada se lee hasta
+# ejecutar() o guardar(). Antes de ejecutar se construye un plan (ver explicar()) que:
+#  - empuja a la lectura las condiciones de filtrado (las de limpiar y las de filtrar) que se pueden comprobar con los
+#    valores tal como se leen: cada chunk se recorta nada más parsearlo y las filas descartadas no se copian ni se acumulan
+#  - lee solo las columnas que algún paso necesita (usecols en CSV, columnas en Parquet): las demás no se convierten
+#  - junta los pasos consecutivos del mismo tipo: varios filtrar son una sola máscara (una sola copia) y las columnas
+#    calculadas seguidas se agregan sobre el mismo DataFrame, sin copias intermedias
+# El resultado es el mismo que aplicar los pasos uno detrás de otro sobre el archivo completo. Para eso:
+#  - los pasos se siguen aplicando en su sitio; lo empujado a la lectura solo adelanta descartes que ocurrirían igual
+#  - después de limpiar, una condición sobre un valor nulo no lo descarta en la lectura: limpiar lo rellena con la media
+#    y puede acabar cumpliéndola. Las condiciones sobre texto no se adelantan a limpiar (la normalización cambia el valor)
+#  - los valores para rellenar nulos (media, mediana o moda) y la decisión de qué columnas de texto serán categóricas se calculan durante la
+#    lectura con todas las filas, antes de descartar ninguna
+#  - si limpiar elimina duplicados antes de seleccionar, se leen todas las columnas (los duplicados se buscan con la fila
+#    completa), salvo que use un Deduplicador con columnas clave
+
+
+def _es_valor_numerico(valor: Any) -> bool:
+    valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+    return all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in valores)
+
+
+def _describir(condiciones: Sequence[tuple]) -> str:
+    return ' y '.join(f"{columna} {operador} {valor!r}" for columna, operador, valor in condiciones)
+
+
+class Pipeline:
+    """Extracción y transformación de un archivo descritas como una secuencia de pasos que se optimiza antes de ejecutarse
+
+    Ejemplo:
+        Pipeline('datos.csv').limpiar().agregar_columnas_calculadas().filtrar('edad', '>=', 30).ejecutar()
+    """
+
+    def __init__(self, ruta: str, tipo: str = 'csv', tamano_chunk: int = 100_000,
+                 esquema: Optional[EsquemaDatos] = None, transformador: Optional[TransformadorDatos] = None,
+                 pasos: tuple = ()):
+        """
+        Args:
+            ruta: Archivo de entrada (o URL de un CSV)
+            tipo: Tipo del archivo (csv, json con un registro por línea, parquet o excel)
+            tamano_chunk: Filas por chunk de lectura (las condiciones se aplican a cada chunk según se lee)
+            esquema: Tipos compactos y proyección de columnas para leer la entrada
+            transformador: TransformadorDatos con el que se limpia (por defecto uno nuevo)
+            pasos: Uso interno: pasos ya añadidos
+        """
+        if tamano_chunk <= 0:
+            raise ValueError(f"tamano_chunk debe ser mayor que 0: {tamano_chunk}")
+        self.ruta = ruta
+        self.tipo = tipo
+        self.tamano_chunk = tamano_chunk
+        self.esquema = esquema
+        self.transformador = transformador or TransformadorDatos()
+        self.pasos = pasos
+
+    def _con_paso(self, paso: Dict[str, Any]) -> 'Pipeline':
+        return Pipeline(self.ruta, self.tipo, self.tamano_chunk, self.esquema, self.transformador, self.pasos + (paso,))
+
+    def limpiar(self, eliminar_duplicados: bool = True, valores_relleno: Optional[Dict[str, Any]] = None,
+                deduplicador: Optional[Deduplicador] = None) -> 'Pipeline':
+        """Limpieza de TransformadorDatos.limpiar_datos (nulos, textos, filas inválidas, tipos y duplicados)
+
+        Con un deduplicador los duplicados se buscan por su clave (solo se leen esas columnas para compararlas) y
+        las condiciones de los pasos posteriores ya no se adelantan a la lectura: las filas que descarten tienen que
+        pasar antes por el deduplicador
+        """
+        return self._con_paso({'tipo': 'limpiar', 'eliminar_duplicados': eliminar_duplicados,
+                               'valores_relleno': dict(valores_relleno or {}), 'deduplicador': deduplicador})
+
+    def filtrar(self, columna: str, operador: str, valor: Any) -> 'Pipeline':
+        """
+        Conserva las filas que cumplen la condición
+
+        Args:
+            columna: Columna a comparar
+            operador: ==, !=, <, <=, >, >=, in o not in
+            valor: Valor (o lista de valores para in / not in)
+        """
+        if operador not in OPERADORES:
+            raise ValueError(f"Operador no soportado: {operador}. Opciones: {list(OPERADORES)}")
+        return self._con_paso({'tipo': 'filtrar', 'condiciones': [(columna, operador, valor)]})
+
+    def con_columna(self, nombre: str, funcion: Callable[[pd.DataFrame], Any], columnas: Sequence[str]) -> 'Pipeline':
+        """
+        Agrega (o reemplaza) la columna nombre con funcion(df)
+
+        Args:
+            nombre: Columna resultado
+            funcion: Recibe el DataFrame y devuelve los valores de la columna. Tiene que calcular cada fila solo con
+                esa fila (ej. df['salario'] * 12), porque el plan puede descartar antes filas que un paso posterior quitaría
+            columnas: Columnas que usa funcion (para leer solo las necesarias)
+        """
+        def agregar(df: pd.DataFrame):
+            df[nombre] = funcion(df)
+        return self._con_paso({'tipo': 'columnas', 'operaciones': [
+            {'nombre': nombre, 'aplicar': agregar, 'lee': set(columnas), 'escribe': {nombre}}]})
+
+    def agregar_columnas_calculadas(self) -> 'Pipeline':
+        """Columnas de TransformadorDatos.agregar_columnas_calculadas (las de sus reglas: categoria_edad y salario_anual)"""
+        def agregar(df: pd.DataFrame):
+            self.transformador.agregar_columnas_calculadas(df, inplace=True)
+        reglas = self.transformador.reglas
+        return self._con_paso({'tipo': 'columnas', 'operaciones': [
+            {'nombre': ', '.join(reglas.columnas_escritas()), 'aplicar': agregar, 'lee': reglas.columnas_leidas(),
+             'escribe': set(reglas.columnas_escritas())}]})
+
+    def seleccionar(self, columnas: Sequence[str]) -> 'Pipeline':
+        """Conserva solo estas columnas, en este orden"""
+        return self._con_paso({'tipo': 'seleccionar', 'columnas': list(columnas)})
+
+    def plan(self) -> Dict[str, Any]:
+        """
+        Construye el plan de ejecución sin leer nada
+
+        Returns:
+            Diccionario con columnas_leidas (None: todas), filtros_antes (condiciones que se aplican al leer, antes
+            de calcular las medias y categorías de limpiar), filtros_despues (las que se aplican al leer después de
+            calcularlas; un nulo las cumple), estadisticas (si se calculan al leer) y etapas (pasos ya fusionados)
+        """
+        filtros_antes, filtros_despues = [], []
+        producidas = set() # columnas que crea o reemplaza algún paso: sus valores no existen al leer
+        limpiezas = 0
+        for paso in self.pasos:
+            if paso['tipo'] == 'limpiar':
+                limpiezas += 1
+                if limpiezas > 1: # las categorías de una segunda limpieza dependen de las filas que le lleguen
+                    break
+                condiciones = self.transformador.reglas.filtros # _filtrar_filas va antes que los duplicados: se pueden adelantar
+            elif paso['tipo'] == 'filtrar':
+                condiciones = paso['condiciones']
+            else:
+                if paso['tipo'] == 'columnas':
+                    producidas.update(*(operacion['escribe'] for operacion in paso['operaciones']))
+                continue
+            for columna, operador, valor in condiciones:
+                if columna in producidas:
+                    continue
+                if not limpiezas:
+                    filtros_antes.append((columna, operador, valor))
+                elif _es_valor_numerico(valor): # limpiar solo cambia las columnas numéricas al rellenar sus nulos
+                    filtros_despues.append((columna, operador, valor))
+            if paso['tipo'] == 'limpiar' and paso['eliminar_duplicados'] and paso['deduplicador'] is not None:
+                # con una clave, quitar antes una fila inválida haría que se conservara otra con su misma clave
+                break
+
+        return {
+            'columnas_leidas': self._columnas_necesarias(),
+            'filtros_antes': filtros_antes,
+            'filtros_despues': filtros_despues,
+            'estadisticas': limpiezas > 0,
+            'etapas': self._etapas(),
+        }
+
+    def _columnas_necesarias(self) -> Optional[List[str]]:
+        """Columnas de la entrada que usa algún paso hasta el primer seleccionar (None si hacen falta todas)"""
+        necesarias, producidas = set(), set()
+        for paso in self.pasos:
+            if paso['tipo'] == 'seleccionar':
+                necesarias.update(set(paso['columnas']) - producidas)
+                return sorted(necesarias)
+            if paso['tipo'] == 'limpiar':
+                if paso['eliminar_duplicados'] and (paso['deduplicador'] is None or paso['deduplicador'].columnas is None):
+                    return None
+                if paso['eliminar_duplicados']:
+                    necesarias.update(set(paso['deduplicador'].columnas) - producidas)
+                necesarias.update({columna for columna, _, _ in self.transformador.reglas.filtros} - producidas)
+            elif paso['tipo'] == 'filtrar':
+                necesarias.update({columna for columna, _, _ in paso['condiciones']} - producidas)
+            elif paso['tipo'] == 'columnas':
+                for operacion in paso['operaciones']:
+                    necesarias.update(operacion['lee'] - producidas)
+                    producidas.update(operacion['escribe'])
+        return None # sin seleccionar, todas las columnas llegan a la salida
+
+    def _etapas(self) -> List[Dict[str, Any]]:
+        """Pasos con los filtrar y las columnas consecutivas juntados en una sola etapa"""
+        etapas = []
+        for paso in self.pasos:
+            anterior = etapas[-1] if etapas else None
+            if anterior is not None and paso['tipo'] == anterior['tipo'] == 'filtrar':
+                anterior['condiciones'] = anterior['condiciones'] + paso['condiciones']
+            elif anterior is not None and paso['tipo'] == anterior['tipo'] == 'columnas':
+                anterior['operaciones'] = anterior['operaciones'] + paso['operaciones']
+            else:
+                etapas.append(dict(paso))
+        return etapas
+
+    def explicar(self) -> str:
+        """Plan de ejecución en texto, para revisar qué se leerá y en qué orden se aplicará cada paso"""
+        plan = self.plan()
+        lineas = [f"Leer {self.ruta} ({self.tipo}, chunks de {self.tamano_chunk} filas)",
+                  f"    columnas: {plan['columnas_leidas'] if plan['columnas_leidas'] is not None else 'todas'}"]
+        if plan['filtros_antes']:
+            lineas.append(f"    descartar al leer: filas que no cumplen {_describir(plan['filtros_antes'])}")
+        if plan['estadisticas']:
+            lineas.append("    calcular al leer: valores para rellenar nulos y columnas categóricas (con todas las filas)")
+        if plan['filtros_despues']:
+            lineas.append(f"    descartar al leer: filas que no cumplen {_describir(plan['filtros_despues'])} (salvo nulos)")
+        for numero, etapa in enumerate(plan['etapas'], 1):
+            if etapa['tipo'] == 'limpiar':
+                texto = "Limpiar (nulos, textos, filas inválidas, tipos"
+                if etapa['eliminar_duplicados']:
+                    clave = etapa['deduplicador'].columnas if etapa['deduplicador'] is not None else None
+                    texto += f", duplicados por {clave}" if clave else ", duplicados"
+                texto += ")"
+            elif etapa['tipo'] == 'filtrar':
+                texto = f"Filtrar {_describir(etapa['condiciones'])} (una sola máscara)"
+            elif etapa['tipo'] == 'columnas':
+                texto = f"Agregar columnas {', '.join(operacion['nombre'] for operacion in etapa['operaciones'])} (sin copias)"
+            else:
+                texto = f"Seleccionar {etapa['columnas']}"
+            lineas.append(f"{numero}. {texto}")
+        return "\n".join(lineas)
+
+    @manejar_error
+    def ejecutar(self) -> pd.DataFrame:
+        """
+        Ejecuta el plan
+
+        Returns:
+            El mismo DataFrame que se obtiene aplicando los pasos en orden al archivo completo (con índice nuevo 0..n-1)
+        """
+        plan = self.plan()
+        logger.info("Plan de ejecución:\n%s", self.explicar())
+        df, valores_relleno, columnas_categoricas = self._leer(plan)
+
+        primera_limpieza = True
+        for etapa in plan['etapas']:
+            if etapa['tipo'] == 'limpiar':
+                # el DataFrame es del pipeline (lo acaba de crear la lectura): se limpia sin copiarlo
+                opciones = {'eliminar_duplicados': etapa['eliminar_duplicados'], 'inplace': True,
+                            'deduplicador': etapa['deduplicador']}
+                if primera_limpieza:
+                    opciones.update(valores_relleno={**valores_relleno, **etapa['valores_relleno']},
+                                    columnas_categoricas=columnas_categoricas)
+                    primera_limpieza = False
+                elif etapa['valores_relleno']:
+                    opciones['valores_relleno'] = etapa['valores_relleno']
+                df = self.transformador.limpiar_datos(df, **opciones)
+            elif etapa['tipo'] == 'filtrar':
+                df = _quitar_filas(df, ~_cumple(df, etapa['condiciones']), inplace=True)
+            elif etapa['tipo'] == 'columnas':
+                for operacion in etapa['operaciones']:
+                    operacion['aplicar'](df)
+            else:
+                faltan = [columna for columna in etapa['columnas'] if columna not in df.columns]
+                if faltan:
+                    raise KeyError(f"Columnas no encontradas: {faltan}")
+                df = df.reindex(columns=etapa['columnas']) # DataFrame nuevo (no una vista): se le pueden agregar columnas
+        return df.reset_index(drop=True)
+
+    def guardar(self, nombre_base: str, formatos: Optional[List[str]] = None, **opciones) -> Dict[str, str]:
+        """
+        Ejecuta el plan y guarda el resultado
+
+        Args:
+            nombre_base: Nombre de los archivos (sin extensión)
+            formatos: Formatos a generar (ver CargadorDatos.guardar_multiple_formatos)
+            **opciones: Argumentos adicionales para guardar_multiple_formatos (paralelo, fallar_si_error...)
+
+        Returns:
+            Diccionario formato -> ruta
+        """
+        return CargadorDatos().guardar_multiple_formatos(self.ejecutar(), nombre_base, formatos, **opciones)
+
+    def _leer(self, plan: Dict[str, Any]):
+        """Lee la entrada por chunks aplicando la proyección y las condiciones del plan
+
+        Returns:
+            (DataFrame, medias de las columnas numéricas, decisión categórica de cada columna de texto)
+        """
+        columnas, esquema = self._proyeccion(plan['columnas_leidas'])
+        estrategias = self.transformador.estrategias_relleno
+        estadisticas = EstadisticasColumnas.para_estrategias(set(estrategias.values())) # se acumulan chunk a chunk
+        filas = 0
+        hashes_unicos = {} # columna de texto -> hashes de sus valores distintos (8 bytes por valor en lugar del texto)
+
+        partes = []
+        for chunk in self._chunks(columnas, esquema):
+            if plan['columnas_leidas'] is not None and columnas is None: # sin cabecera conocida (URL): se proyecta después
+                chunk = chunk[[columna for columna in chunk.columns if columna in plan['columnas_leidas']]]
+            chunk = self._recortar(chunk, plan['filtros_antes'])
+            if plan['estadisticas']:
+                estadisticas.actualizar(chunk.select_dtypes(include=['number']))
+                filas += len(chunk)
+                for columna in chunk.columns:
+                    if _es_texto(chunk[columna]) and not isinstance(chunk[columna].dtype, pd.CategoricalDtype):
+                        relleno = fecha_de_relleno(chunk[columna]) if _es_columna_fecha(chunk[columna]) else TEXTO_DESCONOCIDO
+                        hashes = pd.util.hash_pandas_object(_como_texto(_rellenar_texto(chunk[columna], relleno)), index=False)
+                        hashes_unicos[columna] = np.union1d(hashes_unicos.get(columna, hashes.to_numpy()[:0]), hashes.to_numpy())
+            partes.append(self._recortar(chunk, plan['filtros_despues'], tolerar_nulos=True))
+
+        medias = estadisticas.valores_relleno(estrategias)
+        categoricas = {columna: len(hashes) <= self.transformador.umbral_categorias * filas
+                       for columna, hashes in hashes_unicos.items()}
+        return _unir_chunks(partes), medias, categoricas
+
+    def _recortar(self, chunk: pd.DataFrame, condiciones: Sequence[tuple], tolerar_nulos: bool = False) -> pd.DataFrame:
+        """Descarta del chunk las filas que no cumplen las condiciones que se pueden evaluar en él"""
+        evaluables = []
+        for condicion in condiciones:
+            if condicion[0] not in chunk.columns:
+                continue
+            try:
+                _cumple(chunk.head(1), [condicion])
+            except TypeError: # ej. comparar con un número una columna leída como texto: se deja para su paso
+                continue
+            evaluables.append(condicion)
+        if not evaluables:
+            return chunk
+        cumple = _cumple(chunk, evaluables, tolerar_nulos)
+        return chunk if cumple.all() else chunk[cumple]
+
+    def _proyeccion(self, necesarias: Optional[List[str]]):
+        """Columnas a pedir al lector (en el orden del archivo) y esquema a usar, recortado a esas columnas"""
+        if necesarias is None:
+            return None, self.esquema
+        cabecera = self._cabecera()
+        if cabecera is None:
+            return None, self.esquema
+        columnas = [columna for columna in cabecera if columna in necesarias
+                    and (self.esquema is None or self.esquema.columnas is None or columna in self.esquema.columnas)]
+        if self.esquema is None:
+            return columnas, None
+        esquema = EsquemaDatos(self.esquema.tipos, columnas, [fecha for fecha in self.esquema.fechas if fecha in columnas],
+                               self.esquema.motor_csv)
+        return None, esquema # con esquema, la proyección va en el propio esquema (también para los tipos y fechas)
+
+    def _cabecera(self) -> Optional[List[str]]:
+        """Columnas del archivo leyendo solo la cabecera (None si no se pueden conocer sin leerlo, ej. una URL)"""
+        if es_url(self.ruta):
+            return None
+        if self.tipo == 'csv':
+            return list(pd.read_csv(self.ruta, encoding='utf-8', nrows=0).columns)
+        if self.tipo == 'json':
+            return list(pd.read_json(self.ruta, lines=True, nrows=1).columns)
+        if self.tipo == 'parquet':
+            _, pq = importar_pyarrow()
+            return list(pq.read_schema(self.ruta).names)
+        if self.tipo == 'excel':
+            with _LectorExcelPorChunks(self.ruta, 1) as lector:
+                return next(iter(lector), pd.DataFrame()).columns.tolist()
+        return None
+
+    def _chunks(self, columnas: Optional[List[str]], esquema: Optional[EsquemaDatos]) -> Iterator[pd.DataFrame]:
+        return ExtractorDatos().leer_por_chunks(self.ruta, self.tipo, self.tamano_chunk, columnas=columnas, esquema=esquema)
+
+
+def _unir_chunks(partes: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena los chunks; las categóricas (con categorías distintas en cada chunk) se unen sin pasar a object"""
+    if not partes:
+        return pd.DataFrame()
+    for columna in partes[0].select_dtypes(include=['category']).columns:
+        if all(isinstance(parte[columna].dtype, pd.CategoricalDtype) for parte in partes):
+            categorias = union_categoricals([parte[columna] for parte in partes]).categories
+            partes = [parte.assign(**{columna: parte[columna].cat.set_categories(categorias)}) for parte in partes]
+    return pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0].reset_index(drop=True)
@@ -0,0 +1,291 @@
+"""
+Reglas de validación y columnas calculadas declaradas en un archivo de configuración
+
+Las reglas que antes estaban escritas en el código del transformador (edad entre 0 y 120, salario positivo,
+categoria_edad, salario_anual) se declaran en un ReglasDatos, que se puede guardar y cargar como JSON:
+
+    {
+      "filtros": [["edad", ">", 0], ["edad", "<", 120], ["salario", ">", 0]],
+      "columnas": [
+        {"nombre": "categoria_edad", "casos": [["edad < 30", "Joven"], ["edad < 50", "Adulto"], ["edad >= 50", "Senior"]],
+         "defecto": "Desconocido"},
+        {"nombre": "salario_anual", "expresion": "salario * 12"}
+      ]
+    }
+
+  - filtros: condiciones (columna, operador, valor) que una fila tiene que cumplir para no descartarse. Se compilan en
+    una sola expresión (edad > 0) & (edad < 120) & (salario > 0): con numexpr (ver requirements.txt) y suficientes
+    filas, DataFrame.eval la recorre de una vez en bloques que caben en la caché, sin una máscara intermedia por
+    condición. Con numpy (pocas filas, numexpr no instalado, operadores in / not in) se recorre una vez por condición
+    y cada resultado se acumula en una única máscara. Al ser condiciones sencillas, Pipeline también puede aplicarlas
+    ya al leer
+  - columnas: columnas calculadas fila a fila, con una expresión de DataFrame.eval o con casos (condición, valor) que
+    se eligen con np.select: el valor del primer caso que se cumple, o defecto si no se cumple ninguno. Cada
+    expresión se analiza y compila una sola vez, al crear las reglas; con numexpr, las expresiones seguidas se
+    evalúan juntas en un solo DataFrame.eval
+
+Una regla cuyas columnas no están en el DataFrame no se aplica (ej. sin columna edad no se filtra por edad).
+Agregar una regla es agregar una línea a la configuración.
+"""
+import ast
+import json
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from .dependencias import numexpr_disponible
+from .particiones import OPERADORES, _cumple
+
+MOTORES = ('auto', 'numexpr', 'numpy')
+# Con menos filas compilar y despachar la expresión a numexpr cuesta más que evaluarla con numpy (pandas usa un
+# umbral parecido para sus propias operaciones)
+MIN_FILAS_NUMEXPR = 50_000
+_COMPARACIONES = ('==', '!=', '<', '<=', '>', '>=') # operadores que numexpr evalúa; 'in' y 'not in' van por numpy
+
+
+class ReglasDatos:
+    """Filtros de validez y columnas calculadas, compilados para evaluarse en una sola pasada"""
+
+    def __init__(self, filtros: Sequence[Sequence[Any]] = (), columnas: Sequence[Dict[str, Any]] = (),
+                 motor: str = 'auto'):
+        """
+        Args:
+            filtros: Condiciones (columna, operador, valor) que tienen que cumplir las filas válidas, con los
+                operadores de Pipeline.filtrar (==, !=, <, <=, >, >=, in, not in). Un nulo no cumple ninguna
+            columnas: Columnas calculadas, en orden (una puede usar las anteriores). Cada una es un diccionario con
+                nombre y, o bien expresion (ej. 'salario * 12'), o bien casos [[condición, valor], ...] y defecto.
+                Las expresiones y condiciones usan la sintaxis de DataFrame.eval y tienen que calcular cada fila solo
+                con esa fila (Pipeline puede descartar filas antes de calcularlas)
+            motor: 'numexpr' (DataFrame.eval con numexpr), 'numpy' (operación por operación) o 'auto' (numexpr si
+                está instalado y hay al menos MIN_FILAS_NUMEXPR filas)
+
+        Raises:
+            ValueError: Si un operador, una expresión o una columna calculada no son válidos
+        """
+        if motor not in MOTORES:
+            raise ValueError(f"Motor no soportado: {motor}. Opciones: {MOTORES}")
+        if motor == 'numexpr' and not numexpr_disponible():
+            raise ImportError("El motor 'numexpr' requiere numexpr: pip install numexpr")
+        self.filtros = [tuple(condicion) for condicion in filtros]
+        for columna, operador, _ in self.filtros:
+            if operador not in OPERADORES:
+                raise ValueError(f"Operador no soportado en el filtro de {columna}: {operador}. Opciones: {list(OPERADORES)}")
+        self.motor = motor
+        self._compiladas: Dict[str, Tuple[Any, Set[str]]] = {} # expresión -> (código compilado, columnas que usa)
+        self._lee: Dict[str, Set[str]] = {} # columna calculada -> columnas que usan sus expresiones
+        self.columnas = [self._compilar_columna(dict(columna)) for columna in columnas]
+
+    def expresion_filtros(self, disponibles: Optional[Sequence[str]] = None) -> str:
+        """Expresión de DataFrame.eval equivalente a los filtros (solo los de columnas disponibles, si se indican)"""
+        return ' & '.join(f'({_expresion_condicion(condicion)})' for condicion in self.filtros
+                          if disponibles is None or condicion[0] in disponibles)
+
+    def filas_invalidas(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Máscara de las filas que no cumplen algún filtro, calculada en una sola evaluación
+
+        Args:
+            df: DataFrame a validar
+
+        Returns:
+            Array de bool, True en las filas que hay que descartar
+        """
+        filtros = [condicion for condicion in self.filtros if condicion[0] in df.columns]
+        if not filtros:
+            return np.zeros(len(df), dtype=bool)
+        if self._usar_numexpr(df, {columna for columna, _, _ in filtros}) and all(operador in _COMPARACIONES for _, operador, _ in filtros):
+            return ~df.eval(self.expresion_filtros(df.columns), engine='numexpr').to_numpy(dtype=bool)
+        return ~_cumple(df, filtros)
+
+    def agregar_columnas(self, df: pd.DataFrame) -> List[str]:
+        """
+        Agrega las columnas calculadas a df (en el propio df)
+
+        Args:
+            df: DataFrame al que se agregan
+
+        Returns:
+            Nombres de las columnas agregadas (las que tienen todas sus columnas de entrada en df)
+        """
+        agregadas = []
+        pendientes = [] # expresiones seguidas: se evalúan juntas
+        for columna in self.columnas:
+            if not self._lee[columna['nombre']] <= set(df.columns) | {pendiente['nombre'] for pendiente in pendientes}:
+                continue
+            if 'expresion' in columna:
+                pendientes.append(columna)
+                continue
+            agregadas += self._evaluar_expresiones(df, pendientes)
+            pendientes = []
+            condiciones = [_a_mascara(self._evaluar(df, condicion), len(df)) for condicion, _ in columna['casos']]
+            df[columna['nombre']] = np.select(condiciones, [valor for _, valor in columna['casos']], default=columna['defecto'])
+            agregadas.append(columna['nombre'])
+        agregadas += self._evaluar_expresiones(df, pendientes)
+        return agregadas
+
+    def columnas_leidas(self) -> Set[str]:
+        """Columnas de entrada que usan las columnas calculadas (sin contar las que calculan otras reglas)"""
+        leidas, escritas = set(), set()
+        for columna in self.columnas:
+            leidas |= self._lee[columna['nombre']] - escritas
+            escritas.add(columna['nombre'])
+        return leidas
+
+    def columnas_escritas(self) -> List[str]:
+        return [columna['nombre'] for columna in self.columnas]
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {'filtros': [list(condicion) for condicion in self.filtros], 'columnas': self.columnas, 'motor': self.motor}
+
+    @classmethod
+    def desde_dict(cls, datos: Dict[str, Any]) -> 'ReglasDatos':
+        return cls(datos.get('filtros', ()), datos.get('columnas', ()), datos.get('motor', 'auto'))
+
+    def guardar(self, ruta: str):
+        """Guarda las reglas en un archivo JSON"""
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.a_dict(), f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'ReglasDatos':
+        """Lee unas reglas guardadas con guardar() (o escritas a mano)"""
+        with open(ruta, encoding='utf-8') as f:
+            return cls.desde_dict(json.load(f))
+
+    def __reduce__(self): # los objetos code compilados no se pueden serializar: se vuelven a compilar al deserializar (ej. en otro proceso)
+        return (ReglasDatos.desde_dict, (self.a_dict(),))
+
+    def __repr__(self):
+        return f"ReglasDatos(filtros={self.filtros}, columnas={self.columnas_escritas()}, motor={self.motor!r})"
+
+    def _usar_numexpr(self, df: pd.DataFrame, columnas: Set[str]) -> bool:
+        if self.motor == 'numpy' or (self.motor == 'auto' and (len(df) < MIN_FILAS_NUMEXPR or not numexpr_disponible())):
+            return False
+        # numexpr solo trabaja con arrays de numpy numéricos (no con categóricas, textos ni tipos nullable de pandas)
+        return all(isinstance(df[columna].dtype, np.dtype) and df[columna].dtype.kind in 'biuf' for columna in columnas)
+
+    def _evaluar(self, df: pd.DataFrame, expresion: str) -> Any:
+        """Evalúa una expresión: con numexpr en una sola pasada; si no, con el código compilado en __init__ (operaciones
+        de pandas una a una, sin volver a analizar el texto como haría DataFrame.eval en cada llamada)"""
+        codigo, nombres = self._compiladas[expresion]
+        if self._usar_numexpr(df, nombres):
+            return df.eval(expresion, engine='numexpr')
+        return eval(codigo, {'__builtins__': {}, '_isin': _isin, **_FUNCIONES}, {nombre: df[nombre] for nombre in nombres})
+
+    def _evaluar_expresiones(self, df: pd.DataFrame, columnas: List[Dict[str, Any]]) -> List[str]:
+        """Agrega las columnas 'nombre = expresion' (en el propio df); con numexpr, todas en un solo DataFrame.eval"""
+        if not columnas:
+            return []
+        leidas = set().union(*(self._lee[columna['nombre']] for columna in columnas)) & set(df.columns)
+        if len(columnas) > 1 and self._usar_numexpr(df, leidas):
+            df.eval('\n'.join(f"`{columna['nombre']}` = {columna['expresion']}" for columna in columnas),
+                    engine='numexpr', inplace=True)
+        else:
+            for columna in columnas: # en orden: una expresión puede usar la columna de la anterior
+                df[columna['nombre']] = self._evaluar(df, columna['expresion'])
+        return [columna['nombre'] for columna in columnas]
+
+    def _compilar_columna(self, columna: Dict[str, Any]) -> Dict[str, Any]:
+        """Comprueba una columna calculada, compila sus expresiones y guarda en _lee las columnas que usan"""
+        nombre = columna.get('nombre')
+        if not isinstance(nombre, str) or not nombre.isidentifier():
+            raise ValueError(f"Nombre de columna calculada no válido: {nombre!r} (tiene que ser un identificador)")
+        if ('expresion' in columna) == ('casos' in columna):
+            raise ValueError(f"La columna calculada {nombre} necesita expresion o casos (uno de los dos)")
+        if 'casos' in columna:
+            columna['casos'] = [list(caso) for caso in columna['casos']]
+            columna.setdefault('defecto', None)
+        expresiones = [columna['expresion']] if 'expresion' in columna else [condicion for condicion, _ in columna['casos']]
+        for expresion in expresiones:
+            if expresion not in self._compiladas:
+                self._compiladas[expresion] = _compilar(expresion)
+        self._lee[nombre] = set().union(*(self._compiladas[expresion][1] for expresion in expresiones))
+        return columna
+
+
+# Funciones que se pueden usar en las expresiones (las mismas que admite DataFrame.eval)
+_FUNCIONES = {nombre: getattr(np, nombre) for nombre in ('abs', 'sqrt', 'exp', 'log', 'log10', 'sin', 'cos', 'tan')}
+_NODOS_PERMITIDOS = (ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Load, ast.Constant,
+                     ast.Call, ast.List, ast.Tuple, ast.boolop, ast.operator, ast.unaryop, ast.cmpop)
+
+
+class _Vectorizar(ast.NodeTransformer):
+    """Reescribe una expresión para que opere sobre columnas enteras, como hace DataFrame.eval:
+    and/or/not -> &/|/~, a < b < c -> (a < b) & (b < c) y x in [...] -> x.isin([...])"""
+
+    def visit_BoolOp(self, nodo):
+        self.generic_visit(nodo)
+        operador = ast.BitAnd() if isinstance(nodo.op, ast.And) else ast.BitOr()
+        resultado = nodo.values[0]
+        for valor in nodo.values[1:]:
+            resultado = ast.BinOp(resultado, operador, valor)
+        return resultado
+
+    def visit_UnaryOp(self, nodo):
+        self.generic_visit(nodo)
+        return ast.UnaryOp(ast.Invert(), nodo.operand) if isinstance(nodo.op, ast.Not) else nodo
+
+    def visit_Compare(self, nodo):
+        self.generic_visit(nodo)
+        partes = []
+        izquierda = nodo.left
+        for operador, derecha in zip(nodo.ops, nodo.comparators):
+            if isinstance(operador, (ast.In, ast.NotIn)):
+                parte = ast.Call(ast.Name('_isin', ast.Load()), [izquierda, derecha], [])
+                partes.append(ast.UnaryOp(ast.Invert(), parte) if isinstance(operador, ast.NotIn) else parte)
+            else:
+                partes.append(ast.Compare(izquierda, [operador], [derecha]))
+            izquierda = derecha
+        resultado = partes[0]
+        for parte in partes[1:]:
+            resultado = ast.BinOp(resultado, ast.BitAnd(), parte)
+        return resultado
+
+
+def _compilar(expresion: str) -> Tuple[Any, Set[str]]:
+    """Compila una expresión de DataFrame.eval a código de Python que opera con columnas; devuelve (código, columnas que usa)"""
+    try:
+        arbol = ast.parse(expresion, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Expresión no válida: {expresion!r} ({e.msg})") from e
+    funciones = set()
+    for nodo in ast.walk(arbol):
+        if not isinstance(nodo, _NODOS_PERMITIDOS):
+            raise ValueError(f"Expresión no válida: {expresion!r} (no se admite {type(nodo).__name__})")
+        if isinstance(nodo, ast.Call):
+            if not isinstance(nodo.func, ast.Name) or nodo.func.id not in _FUNCIONES or nodo.keywords:
+                raise ValueError(f"Expresión no válida: {expresion!r} (funciones admitidas: {sorted(_FUNCIONES)})")
+            funciones.add(id(nodo.func))
+    nombres = {nodo.id for nodo in ast.walk(arbol) if isinstance(nodo, ast.Name) and id(nodo) not in funciones}
+    arbol = ast.fix_missing_locations(_Vectorizar().visit(arbol))
+    return compile(arbol, f'<regla {expresion}>', 'eval'), nombres
+
+
+def _isin(valores: Any, opciones: Sequence[Any]) -> Any:
+    return valores.isin(opciones) if hasattr(valores, 'isin') else np.isin(valores, opciones)
+
+
+def _a_mascara(resultado: Any, filas: int) -> np.ndarray:
+    """Resultado de una condición como array de bool (un nulo no la cumple; un escalar vale para todas las filas)"""
+    if isinstance(resultado, pd.Series):
+        return resultado.to_numpy(dtype=bool, na_value=False)
+    return np.broadcast_to(np.asarray(resultado, dtype=bool), (filas,))
+
+
+def _expresion_condicion(condicion: Tuple[str, str, Any]) -> str:
+    columna, operador, valor = condicion
+    if isinstance(valor, (list, tuple, set)):
+        valor = [elemento.item() if hasattr(elemento, 'item') else elemento for elemento in valor]
+    elif hasattr(valor, 'item'): # de tipo de numpy a int/float de Python (su repr es el de un literal)
+        valor = valor.item()
+    return f'`{columna}` {operador} {valor!r}'
+
+
+# Las reglas de siempre del ETL de empleados: es lo que usa TransformadorDatos si no se le dan otras
+REGLAS_EMPLEADOS = ReglasDatos(
+    filtros=[('edad', '>', 0), ('edad', '<', 120), ('salario', '>', 0)],
+    columnas=[
+        {'nombre': 'categoria_edad', 'casos': [['edad < 30', 'Joven'], ['edad < 50', 'Adulto'], ['edad >= 50', 'Senior']],
+         'defecto': 'Desconocido'},
+        {'nombre': 'salario_anual', 'expresion': 'salario * 12'},
+    ],
+)
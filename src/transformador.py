@@ -1,55 +1,205 @@
+import os
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
+from typing import List, Dict, Any, Optional
 from datetime import datetime
-from .logger import manejar_error, LoggerPersonalizado
+from .logger import manejar_error, obtener_logger
+from .deduplicacion import Deduplicador
+from .fechas import convertir_fechas, fecha_de_relleno
+from .estadisticas import EstadisticasColumnas, ESTRATEGIAS_RELLENO
+from .reglas import ReglasDatos, REGLAS_EMPLEADOS
+
+logger = obtener_logger()
+
+TEXTO_DESCONOCIDO = 'DESCONOCIDO' # valor con el que se rellenan los nulos de las columnas de texto
+MODOS_PRESUPUESTO = ('avisar', 'particionar') # qué hace limpiar_datos si la estimación de memoria supera el presupuesto
+# Versión de las reglas de limpieza y de las columnas calculadas. Forma parte de la clave de la caché de resultados
+# (ver cache.py): hay que subirla cada vez que un cambio en este módulo cambie el resultado para los mismos datos.
+VERSION_TRANSFORMACION = 2
+
+# Condiciones (columna, operador, valor) que una fila tiene que cumplir para que _filtrar_filas no la descarte con las
+# reglas por defecto. Ahora se declaran en reglas.py (TransformadorDatos(reglas=...) acepta otras)
+CONDICIONES_VALIDEZ = tuple(REGLAS_EMPLEADOS.filtros)
+
+def _normalizar_texto(valor: str) -> str:
+    """Quita espacios al inicio y al final, deja un solo espacio entre palabras y capitaliza cada palabra"""
+    # equivale a strip() + title() + re.sub(r'\s+', ' ', ...): split() sin argumentos corta por los mismos
+    # caracteres de espacio que \s y descarta los de los extremos
+    return ' '.join(valor.split()).title()
+
+
+def _es_numerica(serie: pd.Series) -> bool:
+    """Columnas numéricas de cualquier tamaño (int64, float64 y también los tipos reducidos de un EsquemaDatos)"""
+    return pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+
+
+def _es_texto(serie: pd.Series) -> bool:
+    """Columnas de texto: object, texto de pandas/Arrow ('string[pyarrow]') o categóricas"""
+    return serie.dtype == object or isinstance(serie.dtype, (pd.StringDtype, pd.CategoricalDtype))
+
+
+def _es_columna_fecha(serie: pd.Series) -> bool:
+    """Columnas de fechas: ya convertidas, o de texto con 'fecha' en el nombre (se convierten en _convertir_tipos)"""
+    return pd.api.types.is_datetime64_any_dtype(serie) or ('fecha' in str(serie.name).lower() and _es_texto(serie))
+
+
+def _rellenar_texto(serie: pd.Series, valor: Any = TEXTO_DESCONOCIDO) -> pd.Series:
+    """Rellena los nulos de una columna de texto con valor (en una categórica hay que añadir antes la categoría)"""
+    if isinstance(serie.dtype, pd.CategoricalDtype) and valor not in serie.cat.categories:
+        serie = serie.cat.add_categories([valor])
+    return serie.fillna(valor)
+
+
+def _como_texto(serie: pd.Series) -> pd.Series:
+    """Convierte la columna a str solo si hace falta (infer_dtype recorre la columna en C, mucho más barato que astype(str))"""
+    if isinstance(serie.dtype, pd.StringDtype): # texto de pandas/Arrow: ya son strings
+        return serie
+    if pd.api.types.infer_dtype(serie, skipna=False) != 'string':
+        return serie.astype(str)
+    return serie
+
+
+def estimar_pico_limpieza_mb(df: pd.DataFrame, inplace: bool = False) -> float:
+    """
+    Estima la memoria máxima (MB) que ocupan a la vez los datos durante limpiar_datos
+
+    Cuenta el DataFrame de entrada, la copia de trabajo (si no es inplace) y el DataFrame filtrado que se crea
+    al descartar filas. Los pasos por columna (nulos, strings) solo añaden una columna a la vez y no se cuentan.
+    El tamaño de los textos se mide sobre una muestra de filas: medirlo en todas cuesta casi tanto como limpiar.
+
+    Args:
+        df: DataFrame que se va a limpiar
+        inplace: Si la limpieza se hará sobre el propio df
+
+    Returns:
+        Estimación en MB
+    """
+    if len(df) == 0:
+        return 0.0
+    muestra = df.sample(10_000, random_state=0) if len(df) > 10_000 else df
+    tamano_mb = muestra.memory_usage(index=True, deep=True).sum() * (len(df) / len(muestra)) / (1024 * 1024)
+    return tamano_mb * (2 if inplace else 3)
+
+
+def _quitar_filas(df: pd.DataFrame, quitar: np.ndarray, inplace: bool) -> pd.DataFrame:
+    """Descarta las filas marcadas con True en quitar; con inplace=True se eliminan del propio df"""
+    if not quitar.any():
+        return df
+    if inplace:
+        if df.index.is_unique: # drop trabaja por etiquetas: con etiquetas repetidas quitaría también filas válidas
+            df.drop(index=df.index[quitar], inplace=True)
+            return df
+        logger.warning("El índice tiene etiquetas repetidas: las filas se filtran en un DataFrame nuevo")
+    return df[~quitar]
+
+
+def _normalizar_categorias(serie: pd.Series) -> pd.Series:
+    """Normaliza una columna categórica trabajando solo sobre sus categorías (las que quedan iguales se unen)"""
+    codigos_normalizados, categorias = pd.factorize(
+        np.array([_normalizar_texto(str(categoria)) for categoria in serie.cat.categories], dtype=object)
+    )
+    codigos = serie.cat.codes.to_numpy()
+    nuevos_codigos = np.where(codigos >= 0, codigos_normalizados[codigos], -1) # -1 es nulo en una categórica
+    return pd.Series(pd.Categorical.from_codes(nuevos_codigos, categories=categorias), index=serie.index, name=serie.name)
 
-logger = LoggerPersonalizado().get_logger()
 
 class TransformadorDatos:
     """Clase para transformar y limpiar datos"""
     
-    def __init__(self):
-        self.transformaciones_aplicadas = []
+    def __init__(self, umbral_categorias: float = 0.5, estrategias_relleno: Optional[Dict[str, str]] = None,
+                 reglas: Optional[ReglasDatos] = None):
+        self.transformaciones_aplicadas = [] # se vacía al empezar cada limpiar_datos, así no crece entre llamadas
+        self.historial_limpiezas = deque(maxlen=100) # resumen de las últimas limpiezas (las más antiguas se descartan)
+        self.umbral_categorias = umbral_categorias # si una columna de texto tiene como mucho esta proporción de valores distintos, se guarda como categórica
+        self.estrategias_relleno = dict(estrategias_relleno or {}) # columna numérica -> 'media', 'mediana' o 'moda' para rellenar sus nulos (por defecto, media)
+        for estrategia in self.estrategias_relleno.values():
+            if estrategia not in ESTRATEGIAS_RELLENO:
+                raise ValueError(f"Estrategia de relleno no soportada: {estrategia}. Opciones: {ESTRATEGIAS_RELLENO}")
+        self.reglas = reglas if reglas is not None else REGLAS_EMPLEADOS # filtros de validez y columnas calculadas (ver reglas.py)
 #este constructor inicializa una lista vacía llamada transformaciones_aplicadas para llevar un registro de las transformaciones realizadas en los datos.
 
     @manejar_error
-    def limpiar_datos(self, df: pd.DataFrame) -> pd.DataFrame: #esta funcion toma un DataFrame de pandas como entrada y devuelve un DataFrame limpio después de aplicar varias transformaciones.
+    def limpiar_datos(self, df: pd.DataFrame, valores_relleno: Optional[Dict[str, Any]] = None,
+                      eliminar_duplicados: bool = True, inplace: bool = False,
+                      presupuesto_memoria_mb: Optional[float] = None,
+                      si_excede_presupuesto: str = 'avisar',
+                      columnas_categoricas: Optional[Dict[str, bool]] = None,
+                      deduplicador: Optional[Deduplicador] = None) -> pd.DataFrame: #esta funcion toma un DataFrame de pandas como entrada y devuelve un DataFrame limpio después de aplicar varias transformaciones.
         """
         Realiza limpieza básica de datos
         
         Args:
             df: DataFrame a limpiar
+            valores_relleno: Valores para rellenar nulos numéricos por columna (ej. medias globales
+                calculadas sobre todo el archivo cuando df es solo un chunk). Si es None se usa la media de df.
+            eliminar_duplicados: Si es False no se eliminan duplicados (útil cuando se deduplica entre chunks)
+            inplace: Si es True se modifica df directamente en lugar de trabajar sobre una copia (df queda limpio
+                y es el mismo objeto que se devuelve). Ahorra la copia completa del inicio
+            presupuesto_memoria_mb: Memoria máxima que debería usar la limpieza. Si la estimación la supera se
+                registra un aviso y, con si_excede_presupuesto='particionar', se limpia por partes
+            si_excede_presupuesto: 'avisar' (solo aviso) o 'particionar' (limpieza por partes; en ese caso el
+                resultado es un DataFrame nuevo aunque inplace sea True)
+            columnas_categoricas: Qué columnas de texto se guardan como categóricas, decidido fuera (ej. con todas
+                las filas del archivo cuando df ya llega filtrado). Las que no aparecen se deciden con df
+            deduplicador: Si se indica, los duplicados se buscan con sus columnas clave y también respecto a las
+                filas que ya vio en llamadas anteriores (chunks, archivos o ejecuciones previas). Sin él se comparan
+                todas las columnas y solo dentro de df
             
         Returns:
             DataFrame limpio
+
+        Raises:
+            ValueError: Si si_excede_presupuesto no es uno de MODOS_PRESUPUESTO
         """
+        if si_excede_presupuesto not in MODOS_PRESUPUESTO:
+            raise ValueError(f"Modo de presupuesto no soportado: {si_excede_presupuesto}. Opciones: {MODOS_PRESUPUESTO}")
         logger.info("Iniciando limpieza de datos...")
+        self.transformaciones_aplicadas = [] # el registro es de esta limpieza (y de las columnas calculadas que se agreguen después)
+
+        if presupuesto_memoria_mb is not None:
+            pico_estimado = estimar_pico_limpieza_mb(df, inplace)
+            if pico_estimado > presupuesto_memoria_mb:
+                logger.warning("La limpieza puede usar ~%.1f MB y el presupuesto es de %.1f MB",
+                               pico_estimado, presupuesto_memoria_mb)
+                if si_excede_presupuesto == 'particionar':
+                    return self._limpiar_por_partes(df, presupuesto_memoria_mb, pico_estimado, valores_relleno,
+                                                    eliminar_duplicados, columnas_categoricas, deduplicador)
         
-        # Crear copia para no modificar el original
-        df_limpio = df.copy()
+        # Crear copia para no modificar el original (salvo en modo inplace, donde se trabaja sobre el propio df)
+        df_limpio = df if inplace else df.copy()
         
         # 1. Registrar estado inicial
         filas_iniciales = len(df_limpio) #se obtiene el número de filas iniciales del DataFrame y se almacena en filas_iniciales.
         columnas_iniciales = list(df_limpio.columns) #se obtiene la lista de nombres de columnas iniciales del DataFrame y se almacena en columnas_iniciales.
         
         # 2. Manejo de valores nulos
-        self._manejar_nulos(df_limpio) #se llama a un método privado _manejar_nulos para manejar los valores nulos en el DataFrame.
+        self._manejar_nulos(df_limpio, valores_relleno) #se llama a un método privado _manejar_nulos para manejar los valores nulos en el DataFrame.
         
         # 3. Normalizar strings
-        self._normalizar_strings(df_limpio) #se llama a otro método privado _normalizar_strings para normalizar las cadenas de texto en el DataFrame. aqui no se asigna el resultado a df_limpio porque la normalización se realiza en el lugar, modificando directamente el DataFrame pasado como argumento.
+        self._normalizar_strings(df_limpio, columnas_categoricas) #se llama a otro método privado _normalizar_strings para normalizar las cadenas de texto en el DataFrame. aqui no se asigna el resultado a df_limpio porque la normalización se realiza en el lugar, modificando directamente el DataFrame pasado como argumento.
         
         # 4. Filtrar filas inválidas
-        df_limpio = self._filtrar_filas(df_limpio) #se llama a un tercer método privado _filtrar_filas para filtrar filas inválidas del DataFrame y se actualiza df_limpio con el resultado. aqui si se reasigna df_limpio porque el método _filtrar_filas devuelve un nuevo DataFrame con las filas inválidas eliminadas.
+        df_limpio = self._filtrar_filas(df_limpio, inplace) #se llama a un tercer método privado _filtrar_filas para filtrar filas inválidas del DataFrame y se actualiza df_limpio con el resultado. aqui si se reasigna df_limpio porque el método _filtrar_filas devuelve un nuevo DataFrame con las filas inválidas eliminadas.
         
         # 5. Convertir tipos de datos
         self._convertir_tipos(df_limpio) #se llama a un cuarto método privado _convertir_tipos para convertir los tipos de datos en el DataFrame según sea necesario.
         
         # 6. Eliminar duplicados
-        duplicados = df_limpio.duplicated().sum() #se calcula el número de filas duplicadas en el DataFrame y se almacena en duplicados.
-        if duplicados > 0: #si hay filas duplicadas, se eliminan usando drop_duplicates() y se registra un mensaje informativo con el número de registros duplicados eliminados.
-            df_limpio = df_limpio.drop_duplicates()
-            logger.info(f"Eliminados {duplicados} registros duplicados")
+        # máscara con las filas que repiten una fila anterior (las mismas que descartaría drop_duplicates); con deduplicador
+        # solo se compara su clave, y también con las filas que vio en llamadas anteriores
+        if not eliminar_duplicados:
+            duplicadas = None
+        elif deduplicador is not None:
+            duplicadas = deduplicador.marcar_duplicadas(df_limpio)
+        else:
+            duplicadas = df_limpio.duplicated().values
+        duplicados = int(duplicadas.sum()) if eliminar_duplicados else 0 #se calcula el número de filas duplicadas en el DataFrame y se almacena en duplicados.
+        if duplicados > 0: #si hay filas duplicadas, se eliminan y se registra un mensaje informativo con el número de registros duplicados eliminados.
+            df_limpio = _quitar_filas(df_limpio, duplicadas, inplace)
+            logger.info("Eliminados %s registros duplicados", duplicados)
         
         # Registrar transformaciones
         transformacion = {   #se crea un diccionario con los detalles de la transformación realizada, incluyendo la fecha, el número de filas iniciales y finales, las columnas iniciales y las transformaciones aplicadas.
@@ -59,75 +209,106 @@ class TransformadorDatos:
             'columnas': columnas_iniciales,
             'transformaciones': self.transformaciones_aplicadas.copy() #se hace una copia de la lista de transformaciones aplicadas para evitar modificaciones futuras que viene del metodo  manejar_nulos
         }
+        self.historial_limpiezas.append(transformacion) #se guarda el resumen en el historial para poder consultarlo después
         
-        logger.info(f"Limpieza completada. Filas: {filas_iniciales} -> {len(df_limpio)}")
+        logger.info("Limpieza completada. Filas: %s -> %s", filas_iniciales, len(df_limpio))
         
         return df_limpio
 
   #en cada funcion se usa como parametro self porque son métodos de instancia de la clase TransformadorDatos y se necesita para acceder a los atributos y otros métodos de la clase.
-    def _manejar_nulos(self, df: pd.DataFrame): #se usa self porque es un método de instancia de la clase TransformadorDatos. df es el DataFrame que se va a procesar para manejar los valores nulos.
+    def _manejar_nulos(self, df: pd.DataFrame, valores_relleno: Optional[Dict[str, Any]] = None): #se usa self porque es un método de instancia de la clase TransformadorDatos. df es el DataFrame que se va a procesar para manejar los valores nulos.
         """Manejo de valores nulos"""
-        nulos_por_columna = df.isnull().sum() #df.isnull() devuelve un DataFrame booleano del mismo tamaño que df, donde cada celda es True si el valor correspondiente en df es nulo (NaN) y False en caso contrario. .sum() luego suma estos valores booleanos a lo largo de las columnas, dando como resultado una Serie donde el índice son los nombres de las columnas y los valores son el conteo de valores nulos en cada columna. es decir fecha puede tener nulos en varias columnas y esta linea cuenta cuantos nulos hay en cada columna.
+        valores_relleno = valores_relleno or {}
+        # una sola pasada por las columnas: nulos de cada una y, de las numéricas, lo que pide su estrategia de relleno
+        # (suma y conteo para la media, boceto de cuantiles para la mediana, conteos de valores para la moda)
+        estadisticas = self._estadisticas(df)
         
-        for columna, cantidad in nulos_por_columna.items(): #itera sobre cada par columna-cantidad en la Serie nulos_por_columna. columna es el nombre de la columna y cantidad es el número de valores nulos en esa columna.
+        for columna, datos in estadisticas.columnas.items(): #itera sobre cada columna con sus estadísticas. cantidad es el número de valores nulos en esa columna.
+            cantidad = datos.nulos
             if cantidad > 0:
                 # Estrategias diferentes por tipo de columna
-                if df[columna].dtype in ['int64', 'float64']: #si la columna es de tipo numérico (int64 o float64), se calcula la media de la columna y se usan esos valores para reemplazar los nulos.
+                if _es_numerica(df[columna]): #si la columna es de tipo numérico (int64, float64 o un tipo reducido como float32), se calcula la media (o la mediana o la moda, según estrategias_relleno) y se usa para reemplazar los nulos.
                     # Para numéricas: reemplazar con media
-                    media = df[columna].mean()
+                    estrategia = self.estrategias_relleno.get(columna, 'media')
+                    if columna in valores_relleno: # si nos pasan un valor global (lectura por chunks) se usa ese en lugar del de df
+                        media = valores_relleno[columna]
+                    else:
+                        media = estadisticas.valores_relleno(self.estrategias_relleno, columnas=[columna]).get(columna, np.nan) # NaN si la columna no tiene ningún valor
+                    if pd.api.types.is_float_dtype(df[columna]) and isinstance(df[columna].dtype, np.dtype):
+                        media = df[columna].dtype.type(media) # mismo tipo que la columna (ej. float32) para no cambiar su dtype al rellenar
                     df[columna].fillna(media, inplace=True) #fillna(media, inplace=True) reemplaza los valores nulos en la columna con la media calculada. inplace=True significa que la operación se realiza directamente en el DataFrame original sin necesidad de asignarlo a una nueva variable.
                     self.transformaciones_aplicadas.append( #se registra la transformación aplicada en la lista transformaciones_aplicadas. se usa self para acceder al atributo de la instancia actual de la clase. es decir al objeto actual de TransformadorDatos.
-                        f"Reemplazados {cantidad} nulos en '{columna}' con media: {media:.2f}"
-                    )
-                elif df[columna].dtype == 'object': #si la columna es de tipo object (generalmente cadenas de texto), se reemplazan los nulos con la cadena "DESCONOCIDO".
-                    # Para strings: reemplazar con "DESCONOCIDO"
-                    df[columna].fillna('DESCONOCIDO', inplace=True) #fillna('DESCONOCIDO', inplace=True) reemplaza los valores nulos en la columna con la cadena 'DESCONOCIDO'. e inplace=True significa que la operación se realiza directamente en el DataFrame original sin necesidad de asignarlo a una nueva variable.
-                    self.transformaciones_aplicadas.append( #se registra la transformación aplicada en la lista transformaciones_aplicadas. self es para acceder al atributo de la instancia actual de la clase y asi se referencia al objeto actual de TransformadorDatos.
-                        f"Reemplazados {cantidad} nulos en '{columna}' con 'DESCONOCIDO'"
+                        f"Reemplazados {cantidad} nulos en '{columna}' con {estrategia}: {media:.2f}"
                     )
-                elif 'fecha' in columna.lower(): #si el nombre de la columna contiene la palabra 'fecha' (ignorando mayúsculas y minúsculas), se asume que es una columna de fechas.
+                elif _es_columna_fecha(df[columna]): #si el nombre de la columna contiene la palabra 'fecha' (ignorando mayúsculas y minúsculas), se asume que es una columna de fechas. va antes que el caso de texto: las fechas se leen como texto y con 'DESCONOCIDO' luego no se podrían convertir
                     # Para fechas: reemplazar con fecha actual
-                    df[columna].fillna(datetime.now().strftime('%Y-%m-%d'), inplace=True) #fillna(datetime.now().strftime('%Y-%m-%d'), inplace=True) reemplaza los valores nulos en la columna con la fecha actual formateada como 'Año-Mes-Día'. datetime.now() obtiene la fecha y hora actuales, .strftime('%Y-%m-%d') formatea la fecha en una cadena con el formato especificado, e inplace=True significa que la operación se realiza directamente en el DataFrame original sin necesidad de asignarlo a una nueva variable.
+                    hoy = pd.Timestamp(datetime.now().date()) if pd.api.types.is_datetime64_any_dtype(df[columna]) else fecha_de_relleno(df[columna]) # si la columna ya se leyó como fecha (EsquemaDatos con fechas) se rellena con una fecha; si es texto, con la fecha de hoy escrita en el mismo formato que el resto de la columna, para que _convertir_tipos la convierta con ese formato
+                    df[columna] = _rellenar_texto(df[columna], hoy) #fillna reemplaza los valores nulos en la columna con la fecha actual. se asigna la columna porque si es categórica primero hay que añadir la categoría nueva.
                     self.transformaciones_aplicadas.append( #se registra la transformación aplicada en la lista transformaciones_aplicadas. self se usa para acceder al atributo de la instancia actual de la clase y asi referenciar al objeto actual de TransformadorDatos. se usa append para agregar un nuevo elemento a la lista y se pone al final de la lista.
                         f"Reemplazados {cantidad} nulos en '{columna}' con fecha actual"
                     )
+                elif _es_texto(df[columna]): #si la columna es de texto (object, string o category), se reemplazan los nulos con la cadena "DESCONOCIDO".
+                    # Para strings: reemplazar con "DESCONOCIDO"
+                    df[columna] = _rellenar_texto(df[columna]) #reemplaza los valores nulos en la columna con la cadena 'DESCONOCIDO'. se asigna la columna (en lugar de fillna con inplace=True) porque en una categórica primero hay que añadir la categoría nueva.
+                    self.transformaciones_aplicadas.append( #se registra la transformación aplicada en la lista transformaciones_aplicadas. self es para acceder al atributo de la instancia actual de la clase y asi se referencia al objeto actual de TransformadorDatos.
+                        f"Reemplazados {cantidad} nulos en '{columna}' con 'DESCONOCIDO'"
+                    )
 
  #normalizar strings es una funcion privada de la clase TransformadorDatos que se encarga de normalizar las cadenas de texto en un DataFrame de pandas.  
  #con normalizar se refiere a estandarizar el formato de las cadenas para mejorar la consistencia y facilitar el análisis posterior.
-    def _normalizar_strings(self, df: pd.DataFrame): # la funcion espera dos parametros: self, que es una referencia a la instancia actual de la clase TransformadorDatos, y df, que es un DataFrame de pandas que contiene los datos a ser normalizados.
-        """Normaliza strings (mayúsculas, espacios, etc.)"""
-        columnas_string = df.select_dtypes(include=['object']).columns #df.select_dtypes es un método de pandas que selecciona columnas basadas en sus tipos de datos. include=['object'] indica que se desean seleccionar todas las columnas que son de tipo 'object', que en pandas generalmente representa cadenas de texto. .columns luego extrae los nombres de estas columnas seleccionadas y los almacena en la variable columnas_string.
+    def _normalizar_strings(self, df: pd.DataFrame, columnas_categoricas: Optional[Dict[str, bool]] = None): # la funcion espera dos parametros: self, que es una referencia a la instancia actual de la clase TransformadorDatos, y df, que es un DataFrame de pandas que contiene los datos a ser normalizados.
+        """Normaliza strings (mayúsculas, espacios, etc.)
+
+        columnas_categoricas permite fijar desde fuera qué columnas se guardan como categóricas (lo usa el modo
+        paralelo para que todas las particiones decidan igual que si se procesara el DataFrame completo).
+        """
+        columnas_categoricas = columnas_categoricas or {}
+        columnas_string = [columna for columna in df.columns if _es_texto(df[columna])] #se seleccionan las columnas de texto: object (lo que lee pandas por defecto) y también string y category (los tipos compactos de un EsquemaDatos).
         
         for columna in columnas_string:  #itera sobre cada nombre de columna en la lista columnas_string.
-            # Convertir a string, eliminar espacios, capitalizar
-            df[columna] = df[columna].astype(str).str.strip().str.title() #df[columna].astype(str) convierte todos los valores en la columna actual a tipo string. .str.strip() elimina cualquier espacio en blanco al inicio y al final de cada cadena en la columna. .str.title() convierte la primera letra de cada palabra en mayúscula y las demás letras en minúscula. El resultado final se asigna de nuevo a df[columna], actualizando la columna con las cadenas normalizadas.
-            
-            # Reemplazar múltiples espacios por uno solo
-            df[columna] = df[columna].str.replace(r'\s+', ' ', regex=True) #df[columna].str.replace(r'\s+', ' ', regex=True) utiliza una expresión regular para buscar múltiples espacios en blanco (representados por \s+) en cada cadena de la columna y los reemplaza con un solo espacio (' '). El parámetro regex=True indica que el primer argumento es una expresión regular. El resultado se asigna de nuevo a df[columna], actualizando la columna con las cadenas donde los múltiples espacios han sido reemplazados por uno solo.
-                                                                                #r indica que la cadena es una cadena raw (cruda), lo que significa que los caracteres de escape se interpretan literalmente. r\s+ es una expresión regular que coincide con uno o más espacios en blanco consecutivos. r'\s+', ' ' reemplaza esos múltiples espacios con un solo espacio.
+            if isinstance(df[columna].dtype, pd.CategoricalDtype):
+                # Ya es categórica: basta con normalizar las categorías, sin recorrer las filas
+                df[columna] = _normalizar_categorias(df[columna])
+                continue
+
+            # Convertir a string (solo si hace falta: infer_dtype recorre la columna en C y es mucho más barato que astype(str))
+            valores = df[columna]
+            valores = _como_texto(valores)
+
+            # factorize separa la columna en códigos enteros (uno por fila) y la lista de valores únicos
+            codigos, unicos = pd.factorize(valores)
+
+            if columnas_categoricas.get(columna, len(unicos) <= self.umbral_categorias * len(valores)):
+                # Pocos valores distintos (ej. ciudad): se normalizan solo los únicos y se reconstruye la columna con los
+                # códigos. Como dos únicos distintos pueden quedar iguales al normalizar ('madrid' y 'MADRID'), se vuelve
+                # a factorizar el resultado para que las categorías no se repitan.
+                codigos_normalizados, categorias = pd.factorize(
+                    np.array([_normalizar_texto(valor) for valor in unicos], dtype=object)
+                )
+                df[columna] = pd.Categorical.from_codes(codigos_normalizados[codigos], categories=categorias)
+            else:
+                # Texto libre (ej. nombre): una sola pasada con operaciones de str de Python en lugar de tres pasadas de pandas
+                normalizados = np.array([_normalizar_texto(valor) for valor in valores], dtype=object)
+                # si la columna venía como texto de Arrow se mantiene ese tipo (más compacto que object)
+                df[columna] = pd.array(normalizados, dtype=valores.dtype) if isinstance(valores.dtype, pd.StringDtype) else normalizados
+
         self.transformaciones_aplicadas.append("Strings normalizados (strip, title)") #se registra la transformación aplicada en la lista transformaciones_aplicadas.
         
         #("Strings normalizados (strip, title)") es una cadena que describe la transformación realizada, indicando que se han normalizado las cadenas de texto aplicando las funciones strip (eliminar espacios) y title (capitalizar).
 
 # filtrar filas es una funcion privada de la clase TransformadorDatos que se encarga de filtrar filas inválidas en un DataFrame de pandas.
-    def _filtrar_filas(self, df: pd.DataFrame) -> pd.DataFrame: #devuelve un DataFrame de pandas después de filtrar las filas inválidas.
-        """Filtra filas inválidas"""
-        filas_iniciales = len(df) #se obtiene el número de filas iniciales del DataFrame y se almacena en filas_iniciales.
-        
-        # Ejemplo: filtrar edades negativas o muy altas
-        if 'edad' in df.columns:
-            df = df[(df['edad'] > 0) & (df['edad'] < 120)] # si la columna 'edad' existe en el DataFrame, se filtran las filas donde la edad es mayor que 0 y menor que 120. Esto elimina filas con edades negativas o extremadamente altas que se consideran inválidas. y df tendra solo las filas que cumplen con esta condición.
-            filas_filtradas = filas_iniciales - len(df) # se calcula el número de filas que fueron filtradas restando el número de filas actuales del DataFrame (después del filtrado) del número de filas iniciales.
-            if filas_filtradas > 0:   #si se filtraron filas (es decir, si filas_filtradas es mayor que 0), se registra la transformación aplicada en la lista transformaciones_aplicadas.
-                self.transformaciones_aplicadas.append(
-                    f"Filtradas {filas_filtradas} filas con edad inválida"
-                )
-        
-        # Ejemplo: filtrar salarios negativos
-        if 'salario' in df.columns:
-            df = df[df['salario'] > 0] #si la columna 'salario' existe en el DataFrame, se filtran las filas donde el salario es mayor que 0. Esto elimina filas con salarios negativos que se consideran inválidos.
-                                        #aqui vemos que para acceder a una columna de un DataFrame se usa df['nombre_columna'] y no df.nombre_columna
-        return df
+    def _filtrar_filas(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame: #devuelve un DataFrame de pandas después de filtrar las filas inválidas.
+        """Filtra filas inválidas (las que no cumplen los filtros de self.reglas)
+
+        Las condiciones se combinan en una sola máscara, así se crea un único DataFrame filtrado (o ninguno con inplace=True)
+        """
+        invalidas = self.reglas.filas_invalidas(df) # True en las filas que hay que descartar (todos los filtros en una sola evaluación)
+        filas_filtradas = int(invalidas.sum())
+        if filas_filtradas > 0:
+            self.transformaciones_aplicadas.append(
+                f"Filtradas {filas_filtradas} filas inválidas ({self.reglas.expresion_filtros(df.columns)})"
+            )
+        return _quitar_filas(df, invalidas, inplace)
 
 
 # convertir_tipos es una funcion privada de la clase TransformadorDatos que se encarga de convertir los tipos de datos en un DataFrame de pandas según ciertas reglas.
@@ -137,12 +318,18 @@ class TransformadorDatos:
         
         # Detectar columnas de fecha
         for columna in df.columns: #itera sobre cada nombre de columna en el DataFrame.
-            if 'fecha' in columna.lower(): #si el nombre de la columna contiene la palabra 'fecha' (ignorando mayúsculas y minúsculas), se intenta convertir esa columna a tipo datetime.
+            if 'fecha' in columna.lower() and not pd.api.types.is_datetime64_any_dtype(df[columna]): #si el nombre de la columna contiene la palabra 'fecha' (ignorando mayúsculas y minúsculas) y todavía no es de fechas, se intenta convertir esa columna a tipo datetime.
                 try:
-                    df[columna] = pd.to_datetime(df[columna]) #pd.to_datetime(df[columna]) intenta convertir los valores en la columna actual a tipo datetime. El resultado se asigna de nuevo a df[columna], actualizando la columna con los valores convertidos.
-                    tipo_conversiones.append(f"'{columna}' a datetime") #si la conversión es exitosa, se registra la conversión realizada en la lista tipo_conversiones.
-                except:
-                    logger.warning(f"No se pudo convertir {columna} a datetime") #si ocurre un error durante la conversión, se registra una advertencia en el logger indicando que no se pudo convertir la columna a datetime.
+                    # convertir_fechas infiere el formato una vez con una muestra y convierte solo los valores distintos;
+                    # los valores que no encajan quedan como NaT en lugar de impedir la conversión de toda la columna
+                    df[columna], fallidos = convertir_fechas(df[columna])
+                except ValueError as e: # ningún formato conocido encaja: la columna se deja como estaba
+                    logger.warning("No se pudo convertir %s a datetime: %s", columna, e)
+                    continue
+                tipo_conversiones.append(f"'{columna}' a datetime") #si la conversión es exitosa, se registra la conversión realizada en la lista tipo_conversiones.
+                if fallidos:
+                    logger.warning("%s valores de %s no son fechas válidas y quedan como NaT", fallidos, columna)
+                    self.transformaciones_aplicadas.append(f"{fallidos} valores no válidos en '{columna}' convertidos a NaT")
         
         if tipo_conversiones:
             self.transformaciones_aplicadas.append( #si se realizaron conversiones de tipo, se registra la lista de conversiones en la lista transformaciones_aplicadas.
@@ -150,28 +337,207 @@ class TransformadorDatos:
             ) #join se usa para unir los elementos de una lista en una sola cadena, con un separador especificado (en este caso, una coma seguida de un espacio). por ejempl;o, si tipo_conversiones es ["'fecha_nacimiento' a datetime", "'fecha_ingreso' a datetime"], entonces ', '.join(tipo_conversiones) produciría la cadena "'fecha_nacimiento' a datetime, 'fecha_ingreso' a datetime".
 
 
-    @manejar_error # se aplica el decorador manejar_error para agregar manejo de errores y logging automáticamente a la función agregar_columnas_calculadas.
-    def agregar_columnas_calculadas(self, df: pd.DataFrame) -> pd.DataFrame: # esta función toma un DataFrame de pandas como entrada y devuelve un DataFrame modificado con columnas calculadas adicionales. el df ya limpio es el parametro que recibe.
-        """Agrega columnas calculadas"""
-        df_modificado = df.copy() # se crea una copia del DataFrame original para no modificarlo directamente.
-        
-        # Ejemplo: categoría por edad
-        if 'edad' in df_modificado.columns: # si la columna 'edad' existe en el DataFrame, se crean condiciones para categorizar las edades en 'Joven', 'Adulto' y 'Senior'.
-            condiciones = [ #condiciones es una lista de condiciones que se evaluarán para cada fila del DataFrame.
-                (df_modificado['edad'] < 30), # primera condición: edades menores a 30
-                (df_modificado['edad'] < 50),
-                (df_modificado['edad'] >= 50)
-            ]
-            valores = ['Joven', 'Adulto', 'Senior'] #valores correspondientes a cada condición. se clasifican las edades en tres categorías: 'Joven' para edades menores a 30, 'Adulto' para edades entre 30 y 49, y 'Senior' para edades de 50 en adelante. valores es una lista que contiene las categorías correspondientes a cada condición definida en la lista condiciones.
-            
-            df_modificado['categoria_edad'] = np.select(condiciones, valores, default='Desconocido')# np.select(condiciones, valores, default='Desconocido') crea una nueva columna 'categoria_edad' en el DataFrame. Esta función evalúa las condiciones en orden y asigna el valor correspondiente de la lista valores cuando se cumple una condición. Si ninguna condición se cumple, asigna el valor 'Desconocido' como valor predeterminado.
-            self.transformaciones_aplicadas.append("Agregada columna 'categoria_edad'") # se registra la transformación aplicada en la lista transformaciones_aplicadas.
-                #con numpy np.select se pueden evaluar múltiples condiciones y asignar valores correspondientes de manera eficiente en un DataFrame de pandas.
+# limpiar_y_calcular_paralelo hace lo mismo que limpiar_datos seguido de agregar_columnas_calculadas, pero repartiendo
+# el DataFrame en particiones que se procesan en varios procesos a la vez. Las partes que dependen de todo el DataFrame
+# se resuelven en el proceso principal para que el resultado sea idéntico al secuencial:
+#  - antes de repartir: las medias para rellenar nulos y qué columnas de texto serán categóricas
+#  - después de juntar: unir las categorías, convertir tipos (fechas) y eliminar duplicados
+    @manejar_error
+    def limpiar_y_calcular_paralelo(self, df: pd.DataFrame, n_particiones: Optional[int] = None,
+                                    max_workers: Optional[int] = None,
+                                    deduplicador: Optional[Deduplicador] = None) -> pd.DataFrame:
+        """
+        Limpia y agrega columnas calculadas usando varios núcleos
+
+        Args:
+            df: DataFrame a limpiar
+            n_particiones: Número de particiones (por defecto, una por worker)
+            max_workers: Número de procesos (por defecto, los núcleos de la máquina)
+            deduplicador: Columnas clave y filas ya vistas para eliminar duplicados (ver limpiar_datos)
+
+        Returns:
+            El mismo DataFrame que agregar_columnas_calculadas(limpiar_datos(df))
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        self.transformaciones_aplicadas = []
+        n_particiones = max(1, min(n_particiones or max_workers, len(df)))
+        filas_iniciales = len(df)
+
+        # 1. Valores globales: medias de las columnas numéricas con nulos y decisión categórica de cada columna de texto
+        valores_relleno, columnas_categoricas = self._valores_globales(df)
+
+        # 2. Particiones procesadas en paralelo (iloc conserva las etiquetas del índice original)
+        posiciones = np.array_split(np.arange(len(df)), n_particiones)
+        particiones = [df.iloc[posiciones_particion] for posiciones_particion in posiciones]
+        logger.info("Procesando %s particiones con %s procesos", len(particiones), max_workers)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            resultados = list(pool.map(
+                _limpiar_particion,
+                particiones,
+                [valores_relleno] * len(particiones),
+                [columnas_categoricas] * len(particiones),
+                [self.umbral_categorias] * len(particiones),
+                [True] * len(particiones),
+                [self.reglas] * len(particiones)
+            ))
+
+        # 3. Unir, convertir tipos y eliminar duplicados
+        df_resultado = self._unir_particiones(resultados, filas_iniciales, deduplicador=deduplicador)
+
+        for columna in self.reglas.columnas_escritas():
+            if columna in df_resultado.columns:
+                self.transformaciones_aplicadas.append(f"Agregada columna '{columna}'")
+
+        logger.info("Limpieza paralela completada. Filas: %s -> %s", filas_iniciales, len(df_resultado))
+        return df_resultado
+
+    def _limpiar_por_partes(self, df: pd.DataFrame, presupuesto_memoria_mb: float, pico_estimado_mb: float,
+                            valores_relleno: Optional[Dict[str, Any]] = None,
+                            eliminar_duplicados: bool = True,
+                            columnas_categoricas: Optional[Dict[str, bool]] = None,
+                            deduplicador: Optional[Deduplicador] = None) -> pd.DataFrame:
+        """
+        Limpia df por partes de un tamaño que cabe en el presupuesto; mismo resultado que limpiar_datos
+
+        Las partes se limpian una tras otra y de cada una solo se guarda el resultado (ya filtrado, con los textos
+        como códigos de unas categorías comunes). Al juntarlas se liberan y los duplicados se buscan por tramos: el
+        pico queda en unas dos veces el tamaño del resultado, por debajo del de limpiar df de una vez (incluso en modo
+        inplace) salvo en DataFrames pequeños. df no se modifica y su memoria sigue ocupada
+        """
+        filas_iniciales = len(df)
+        filas_por_parte = max(1, int(filas_iniciales * presupuesto_memoria_mb / pico_estimado_mb))
+        logger.info("Limpiando por partes de %s filas", filas_por_parte)
+
+        valores_relleno, categoricas = self._valores_globales(df, valores_relleno)
+        categoricas.update(columnas_categoricas or {})
+        partes = []
+        codigos: Dict[str, Dict[Any, int]] = {} # código común de cada categoría, en orden de aparición (el de union_categoricals)
+        for inicio in range(0, filas_iniciales, filas_por_parte):
+            parte = _limpiar_particion(df.iloc[inicio:inicio + filas_por_parte], valores_relleno, categoricas,
+                                       self.umbral_categorias, agregar_columnas=False, reglas=self.reglas)
+            # cada parte trae sus propias categorías (los mismos textos repetidos en todas): se guardan solo los
+            # códigos comunes y la columna categórica se reconstruye una vez al unir
+            for columna in parte.select_dtypes(include=['category']).columns:
+                posiciones = codigos.setdefault(columna, {})
+                traduccion = np.array([posiciones.setdefault(valor, len(posiciones)) for valor in parte[columna].cat.categories]
+                                      + [-1], dtype=np.int32) # el código -1 (nulo) cae en el -1 final
+                parte[columna] = traduccion[parte[columna].cat.codes.to_numpy()]
+            partes.append(parte)
+        df_limpio = self._unir_particiones(partes, filas_iniciales, eliminar_duplicados, deduplicador,
+                                           {columna: list(posiciones) for columna, posiciones in codigos.items()})
+
+        self.historial_limpiezas.append({
+            'fecha': datetime.now(),
+            'filas_iniciales': filas_iniciales,
+            'filas_finales': len(df_limpio),
+            'columnas': list(df.columns),
+            'transformaciones': self.transformaciones_aplicadas.copy()
+        })
+        logger.info("Limpieza completada. Filas: %s -> %s", filas_iniciales, len(df_limpio))
+        return df_limpio
+
+    def _estadisticas(self, df: pd.DataFrame) -> EstadisticasColumnas:
+        """Estadísticas de df con los resúmenes que necesitan las estrategias de relleno (la media siempre se calcula)"""
+        return EstadisticasColumnas.para_estrategias(set(self.estrategias_relleno.values())).actualizar(df)
+
+    def _valores_globales(self, df: pd.DataFrame, valores_relleno: Optional[Dict[str, Any]] = None):
+        """
+        Calcula sobre todo df lo que la limpieza por particiones necesita que sea común a todas ellas
+
+        Returns:
+            (valores para rellenar nulos numéricos, decisión categórica de cada columna de texto)
+        """
+        estadisticas = self._estadisticas(df)
+        nulos_por_columna = pd.Series({columna: datos.nulos for columna, datos in estadisticas.columnas.items()}, dtype='int64')
+        medias = {
+            columna: np.nan for columna, cantidad in nulos_por_columna.items() if cantidad > 0 and _es_numerica(df[columna])
+        } # NaN si la columna no tiene ningún valor (como la media de pandas)
+        medias.update(estadisticas.valores_relleno(self.estrategias_relleno, columnas=list(medias)))
+        medias.update({columna: valor for columna, valor in (valores_relleno or {}).items() if columna in medias})
+        columnas_categoricas = {}
+        for columna in df.columns:
+            if not _es_texto(df[columna]):
+                continue
+            relleno = fecha_de_relleno(df[columna]) if _es_columna_fecha(df[columna]) else TEXTO_DESCONOCIDO # el mismo que pondrá _manejar_nulos
+            valores = _como_texto(_rellenar_texto(df[columna], relleno))
+            columnas_categoricas[columna] = valores.nunique(dropna=False) <= self.umbral_categorias * len(valores)
+
+        for columna, cantidad in nulos_por_columna.items():
+            if columna in medias:
+                self.transformaciones_aplicadas.append(
+                    f"Reemplazados {cantidad} nulos en '{columna}' con {self.estrategias_relleno.get(columna, 'media')}: {medias[columna]:.2f}"
+                )
+            elif cantidad > 0 and _es_columna_fecha(df[columna]):
+                self.transformaciones_aplicadas.append(f"Reemplazados {cantidad} nulos en '{columna}' con fecha actual")
+            elif cantidad > 0 and columna in columnas_categoricas:
+                self.transformaciones_aplicadas.append(f"Reemplazados {cantidad} nulos en '{columna}' con 'DESCONOCIDO'")
+        return medias, columnas_categoricas
 
-        # Ejemplo: salario anual (si es mensual)
-        if 'salario' in df_modificado.columns: #si la columna de nombre salario esta el dataframe copia
-            df_modificado['salario_anual'] = df_modificado['salario'] * 12  #se crea una nueva columna llamada salario_anual que se calcula multiplicando los valores de la columna salario por 12, asumiendo que el salario es mensual.
-            self.transformaciones_aplicadas.append("Agregada columna 'salario_anual'") 
+    def _unir_particiones(self, resultados: List[pd.DataFrame], filas_iniciales: int,
+                          eliminar_duplicados: bool = True,
+                          deduplicador: Optional[Deduplicador] = None,
+                          categorias_comunes: Optional[Dict[str, list]] = None) -> pd.DataFrame:
+        """
+        Junta las particiones limpias, convierte tipos y elimina duplicados (pasos que necesitan todas las filas)
+
+        Args:
+            categorias_comunes: Columnas que llegan como códigos comunes a todas las particiones, con sus categorías
+        """
+        # las categóricas de cada partición tienen categorías distintas; union_categoricals las junta en el
+        # orden de aparición, que es el mismo que tendría la columna procesada de una vez
+        for columna in resultados[0].select_dtypes(include=['category']).columns:
+            categorias = union_categoricals([resultado[columna] for resultado in resultados]).categories
+            for resultado in resultados:
+                resultado[columna] = resultado[columna].cat.set_categories(categorias)
+        df_resultado = pd.concat(resultados)
+        filas_tramo = max(1, -(-len(df_resultado) // len(resultados))) # tramos del tamaño de una partición para deduplicar
+        resultados.clear() # sus datos ya están copiados en df_resultado: se liberan antes de convertir tipos y deduplicar
+        for columna, valores in (categorias_comunes or {}).items():
+            df_resultado[columna] = pd.Categorical.from_codes(df_resultado[columna].to_numpy(), categories=pd.Index(valores, dtype=object))
+
+        self.transformaciones_aplicadas.append("Strings normalizados (strip, title)")
+        self.transformaciones_aplicadas.append(f"Filtradas {filas_iniciales - len(df_resultado)} filas inválidas")
+
+        self._convertir_tipos(df_resultado)
+
+        if eliminar_duplicados:
+            # duplicated() sobre todas las filas necesita varias veces el tamaño del DataFrame; las huellas del
+            # Deduplicador, calculadas por tramos, solo el de un tramo (sin deduplicador, uno temporal con todas las columnas)
+            deduplicador = deduplicador if deduplicador is not None else Deduplicador()
+            duplicadas = np.concatenate([
+                deduplicador.marcar_duplicadas(df_resultado.iloc[inicio:inicio + filas_tramo])
+                for inicio in range(0, len(df_resultado), filas_tramo)
+            ] or [np.zeros(0, dtype=bool)])
+            if duplicadas.any():
+                # take solo ocupa el tamaño del resultado; drop(inplace=True) necesita además índices auxiliares de todas las filas
+                df_resultado = df_resultado.take(np.flatnonzero(~duplicadas))
+                logger.info("Eliminados %s registros duplicados", int(duplicadas.sum()))
+        return df_resultado
+
+    @manejar_error # se aplica el decorador manejar_error para agregar manejo de errores y logging automáticamente a la función agregar_columnas_calculadas.
+    def agregar_columnas_calculadas(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame: # esta función toma un DataFrame de pandas como entrada y devuelve un DataFrame modificado con columnas calculadas adicionales. el df ya limpio es el parametro que recibe.
+        """Agrega columnas calculadas (con inplace=True se agregan al propio df, sin copiarlo)"""
+        df_modificado = df if inplace else df.copy() # se crea una copia del DataFrame original para no modificarlo directamente.
         
+        # Columnas de self.reglas (por defecto categoria_edad con np.select y salario_anual = salario * 12); las que no
+        # tienen sus columnas de entrada en el DataFrame no se agregan
+        for columna in self.reglas.agregar_columnas(df_modificado):
+            self.transformaciones_aplicadas.append(f"Agregada columna '{columna}'")
+
         return df_modificado #devuelve el DataFrame modificado pero es el copia o el roiginal? es el copia porque se hizo al inicio df_modificado = df.copy() por ende no se modifica el original.
-#como no se modifica el df original, esto se usa mas que nada para hacer pruebas y ver como quedan los datos despues de agregar las columnas calculadas sin afectar el df original.
\ No newline at end of file
+#como no se modifica el df original, esto se usa mas que nada para hacer pruebas y ver como quedan los datos despues de agregar las columnas calculadas sin afectar el df original.
+
+
+def _limpiar_particion(df: pd.DataFrame, valores_relleno: Dict[str, Any], columnas_categoricas: Dict[str, bool],
+                      umbral_categorias: float, agregar_columnas: bool = True,
+                      reglas: Optional[ReglasDatos] = None) -> pd.DataFrame:
+    """Limpieza (y columnas calculadas) de una partición (se ejecuta en un proceso del pool, por eso es de módulo)"""
+    transformador = TransformadorDatos(umbral_categorias, reglas=reglas)
+    df = df.copy()
+    transformador._manejar_nulos(df, valores_relleno)
+    transformador._normalizar_strings(df, columnas_categoricas)
+    df = transformador._filtrar_filas(df, inplace=True) # df ya es una copia propia
+    if agregar_columnas:
+        df = transformador.agregar_columnas_calculadas(df, inplace=True)
+    return df
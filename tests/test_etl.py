@@ -2,25 +2,68 @@
 
 
 import unittest # unittest es el framework de testing que viene con Python. Nos permite verificar que nuestro código funciona correctamente.
+import numpy as np
 import pandas as pd # pandas es una librería para manipulación y análisis de datos. Nos permite trabajar con estructuras de datos como DataFrames.
 import sys # nos permite manipular el path de importación de módulos.
 import os # nos permite interactuar con el sistema operativo, como manejar rutas de archivos.
+import io
+import json
+import logging
+import threading
+import time
+import warnings
+import shutil
+import tracemalloc
+import tempfile # para crear carpetas temporales donde los tests pueden escribir archivos
+import gzip
+import sqlite3
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # servidor HTTP local que hace de servidor remoto en los tests
 
 # Añadir src al path para poder importar los módulos de ETL
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 #Esto es como decirle a Python "Oye, cuando busques módulos para importar, también mira en esta carpeta llamada 'src' que está un nivel arriba de donde estamos ahora".
 
 # Importamos las clases que vamos a testear
-from src import ExtractorDatos, TransformadorDatos, CargadorDatos
+from src import ExtractorDatos, TransformadorDatos, CargadorDatos, ejecutar_etl_por_chunks
+from src import LoggerPersonalizado, activar_logging_asincrono, detener_logging_asincrono, registro_metricas
+from src import EsquemaDatos, ESQUEMA_EMPLEADOS, ejecutar_etl_incremental, EstadoIncremental
+from src.cache import CacheDatos
+from src.cliente_http import ClienteHTTP
+from src import extraer_fuentes, iterar_fuentes, Pipeline, Deduplicador
+from src.fechas import convertir_fechas, inferir_formato_fecha
+from src.estadisticas import EstadisticasColumnas, _numero_de_bits
+from src.transformador import estimar_pico_limpieza_mb
+from src.base_datos import EscritorSQLite
+from src.loader import EscritorExcel
+from src.particiones import listar_particiones
+from src import compresion
+from src.reglas import ReglasDatos, REGLAS_EMPLEADOS
+from src.dependencias import numexpr_disponible
+from benchmarks.generador import generar_datos, generar_por_chunks
+from benchmarks.ejecutar import comparar_con_baseline, medir_importacion
 
-class TestETL(unittest.TestCase): # Creamos una clase de test que hereda de unittest.TestCase que tiene métodos y funcionalidades para crear tests.
+
+class TestConCarpetaTemporal(unittest.TestCase):
+    """Base de los tests que escriben archivos: cada test trabaja en una carpeta temporal para no ensuciar data/ ni logs/ del proyecto"""
+
+    def setUp(self):
+        self.directorio_original = os.getcwd()
+        self.directorio_temporal = tempfile.mkdtemp()
+        os.chdir(self.directorio_temporal)
+
+    def tearDown(self):
+        os.chdir(self.directorio_original)
+        shutil.rmtree(self.directorio_temporal, ignore_errors=True)
+
+
+class TestETL(TestConCarpetaTemporal): # Creamos una clase de test que hereda (a través de TestConCarpetaTemporal) de unittest.TestCase que tiene métodos y funcionalidades para crear tests.
     
     def setUp(self):
         """Configuración inicial para cada test"""
         # Instanciamos los objetos de ETL
         # Este método se ejecuta ANTES de CADA test
         # Es como preparar los ingredientes antes de cada receta
-
+        super().setUp() # carpeta temporal de TestConCarpetaTemporal
 
         self.extractor = ExtractorDatos() # Instancia para pruebas
         self.transformador = TransformadorDatos() #Otra instancia para pruebas
@@ -36,7 +79,7 @@ class TestETL(unittest.TestCase): # Creamos una clase de test que hereda de unit
 
 #¿Por qué setUp() antes de cada test?
 #Para que cada test empiece con datos FRESCOS, no contaminados por tests anteriores.
-    
+
     def test_limpieza_datos(self):
         """Test de limpieza de datos"""
         # 1. Ejecutar la función que queremos probar
@@ -89,6 +132,1192 @@ class TestETL(unittest.TestCase): # Creamos una clase de test que hereda de unit
     #assertIn verifica que el primer argumento esté contenido en el segundo argumento. Si no lo está, el test falla.
      # Traducción: "Afirmo que 'categoria_edad' está en las columnas del DataFrame"
 
+
+class TestStreaming(TestConCarpetaTemporal):
+    """Tests del modo por chunks: debe dar el mismo resultado que procesar todo de una vez"""
+
+    def setUp(self):
+        super().setUp()
+
+        self.ruta_entrada = os.path.join(self.directorio_temporal, 'entrada.csv')
+        pd.DataFrame({
+            'id': [1, 2, 5, 3, 4, 5, 6, 7],
+            'nombre': ['  juan pérez  ', 'MARÍA GARCÍA', 'luis', None, 'ana', 'luis', 'eva', 'pedro'],
+            'edad': [25, None, 41, 30, 150, 41, None, 60],
+            'salario': [30000, 35000, 31000, -1000, 20000, 31000, 45000, 50000]
+        }).to_csv(self.ruta_entrada, index=False)
+
+    def test_leer_archivo_local_devuelve_dataframe(self):
+        df = ExtractorDatos().leer_archivo_local(self.ruta_entrada)
+        self.assertIsInstance(df, pd.DataFrame)
+        self.assertEqual(len(df), 8)
+
+    def test_leer_por_chunks(self):
+        chunks = list(ExtractorDatos().leer_por_chunks(self.ruta_entrada, tamano_chunk=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 2])
+
+    def test_chunks_igual_que_completo(self):
+        transformador = TransformadorDatos()
+        completo = transformador.agregar_columnas_calculadas(
+            transformador.limpiar_datos(pd.read_csv(self.ruta_entrada))
+        )
+
+        # chunks de 3 filas: el duplicado de id 5 queda repartido entre dos chunks
+        resultado = ejecutar_etl_por_chunks(self.ruta_entrada, 'salida', tamano_chunk=3)
+
+        por_chunks = pd.read_csv(resultado['archivos_generados']['csv'])
+        pd.testing.assert_frame_equal(por_chunks, completo.reset_index(drop=True), check_dtype=False)
+        self.assertEqual(resultado['registros_procesados'], len(completo))
+
+        with open(resultado['archivos_generados']['json'], encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), len(completo))
+
+
+class TestParquet(TestConCarpetaTemporal):
+    """Tests del formato Parquet (escritura con estadísticas y lectura columnar)"""
+
+    def setUp(self):
+        super().setUp()
+
+        self.datos = pd.DataFrame({
+            'id': range(1, 11),
+            'ciudad': ['Madrid', 'Sevilla'] * 5,
+            'edad': [20, 25, 30, 35, 40, 45, 50, 55, 60, 65],
+            'salario': [1000.5 * i for i in range(1, 11)]
+        })
+
+    def test_ida_y_vuelta(self):
+        ruta = CargadorDatos().guardar_como_parquet(self.datos, 'datos', compresion='zstd', filas_por_grupo=4)
+        leido = ExtractorDatos().leer_archivo_local(ruta, tipo='parquet')
+        pd.testing.assert_frame_equal(leido, self.datos)
+
+    def test_estadisticas_y_filtros(self):
+        ruta = CargadorDatos().guardar_como_parquet(self.datos, 'datos', filas_por_grupo=4)
+        extractor = ExtractorDatos()
+
+        estadisticas = extractor.estadisticas_parquet(ruta)
+        self.assertEqual(estadisticas['edad']['min'], 20)
+        self.assertEqual(estadisticas['edad']['max'], 65)
+        self.assertEqual(estadisticas['ciudad']['nulos'], 0)
+
+        filtrado = extractor.leer_archivo_local(ruta, tipo='parquet', columnas=['id', 'edad'],
+                                                filtros=[('edad', '>=', 50)])
+        self.assertEqual(list(filtrado.columns), ['id', 'edad'])
+        self.assertEqual(filtrado['id'].tolist(), [7, 8, 9, 10])
+
+    def test_compresion_no_soportada(self):
+        with self.assertRaises(ValueError):
+            CargadorDatos().guardar_como_parquet(self.datos, 'datos', compresion='rar')
+
+
+class TestGuardadoParalelo(TestConCarpetaTemporal):
+    """Tests de guardar_multiple_formatos en modo paralelo"""
+
+    def setUp(self):
+        super().setUp()
+        self.cargador = CargadorDatos()
+
+    def test_paralelo_igual_que_secuencial(self):
+        datos = pd.DataFrame({'id': [1, 2, 3], 'ciudad': ['Madrid', 'Sevilla', 'Madrid']})
+        rutas = self.cargador.guardar_multiple_formatos(datos, 'datos', formatos=['csv', 'json', 'parquet'],
+                                                        paralelo=True, max_workers=2)
+
+        self.assertEqual(list(rutas), ['csv', 'json', 'parquet'])
+        self.assertEqual(set(self.cargador.tiempos_por_formato), {'csv', 'json', 'parquet'})
+        pd.testing.assert_frame_equal(pd.read_csv(rutas['csv']), datos)
+
+    def test_un_formato_falla_y_los_demas_terminan(self):
+        # una columna con tipos mezclados no se puede convertir a Parquet, pero sí a CSV y JSON
+        datos = pd.DataFrame({'id': [1, 2], 'valor': [1, 'texto']})
+        rutas = self.cargador.guardar_multiple_formatos(datos, 'datos', formatos=['csv', 'json', 'parquet'],
+                                                        paralelo=True)
+
+        self.assertEqual(list(rutas), ['csv', 'json'])
+        self.assertIn('parquet', self.cargador.errores_por_formato)
+        self.assertTrue(os.path.exists(rutas['json']))
+
+        with self.assertRaises(RuntimeError):
+            self.cargador.guardar_multiple_formatos(datos, 'datos', formatos=['csv', 'parquet'],
+                                                    paralelo=True, fallar_si_error=True)
+
+    def test_parquet_solo_si_se_pide(self):
+        datos = pd.DataFrame({'id': [1, 2, 3]})
+        rutas = self.cargador.guardar_multiple_formatos(datos, 'datos')
+        self.assertEqual(list(rutas), ['csv', 'json', 'excel'])
+
+    def test_pool_de_procesos(self):
+        datos = pd.DataFrame({'id': [1, 2, 3]})
+        rutas = self.cargador.guardar_multiple_formatos(datos, 'datos', formatos=['csv', 'json'],
+                                                        paralelo=True, tipo_pool='procesos')
+        self.assertEqual(set(rutas), {'csv', 'json'})
+
+
+class TestEscritorJSON(TestConCarpetaTemporal):
+    """Tests del guardado JSON por lotes"""
+
+    def setUp(self):
+        super().setUp()
+        self.cargador = CargadorDatos()
+        self.datos = pd.DataFrame({
+            'id': [1, 2, 3, 4, 5],
+            'nombre': ['Juan Pérez', None, 'Ana', 'Luis', 'Eva'],
+            'salario': [30000.5, 35000.0, float('nan'), 1.0, 2.0]
+        })
+
+    def test_array_indentado_igual_que_json_dump(self):
+        # lotes de 2 filas: el resultado debe ser idéntico a volcar la lista completa con json.dump
+        ruta = self.cargador.guardar_como_json(self.datos, 'datos', tamano_lote=2)
+        esperado = json.dumps(self.datos.astype(object).where(self.datos.notna(), None).to_dict(orient='records'),
+                              indent=2, ensure_ascii=False)
+        with open(ruta, encoding='utf-8') as f:
+            self.assertEqual(f.read(), esperado)
+
+    def test_compacto_y_lineas(self):
+        ruta_compacto = self.cargador.guardar_como_json(self.datos, 'compacto', indentar=False, tamano_lote=2)
+        ruta_lineas = self.cargador.guardar_como_json(self.datos, 'lineas', formato_json='lineas', tamano_lote=2)
+        self.assertTrue(ruta_lineas.endswith('.jsonl'))
+
+        with open(ruta_compacto, encoding='utf-8') as f:
+            compacto = json.load(f)
+        with open(ruta_lineas, encoding='utf-8') as f:
+            lineas = [json.loads(linea) for linea in f]
+
+        self.assertEqual(compacto, lineas)
+        self.assertEqual(len(lineas), 5)
+        self.assertIsNone(lineas[1]['nombre'])
+        self.assertIsNone(lineas[2]['salario'])
+
+    def test_fechas_y_vacio(self):
+        datos = pd.DataFrame({'fecha': pd.to_datetime(['2020-01-15', None])})
+        with open(self.cargador.guardar_como_json(datos, 'fechas'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [{'fecha': '2020-01-15T00:00:00'}, {'fecha': None}])
+
+        with open(self.cargador.guardar_como_json(datos.iloc[:0], 'vacio'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), '[]')
+
+
+class TestCompresion(TestConCarpetaTemporal):
+    """Entradas y salidas comprimidas con gzip, bz2 y xz, también por chunks y con compresión por bloques en paralelo"""
+
+    def setUp(self):
+        super().setUp()
+        self.datos = pd.DataFrame({'id': range(2_000), 'ciudad': ['Madrid', 'Sevilla', 'Cádiz', np.nan] * 500,
+                                   'salario': np.linspace(20_000, 60_000, 2_000)})
+
+    def test_bloques_en_paralelo_se_leen_con_cualquier_descompresor(self):
+        tamano_bloque = compresion.TAMANO_BLOQUE
+        compresion.TAMANO_BLOQUE = 4_096 # bloques pequeños para que el archivo tenga varios miembros
+        try:
+            for codec in compresion.CODECS:
+                with self.subTest(codec=codec):
+                    ruta = compresion.ruta_comprimida('datos.csv', codec)
+                    with compresion.abrir(ruta, 'w', hilos=3, newline='') as f:
+                        self.datos.to_csv(f, index=False)
+                    self.assertEqual(compresion.codec_de_ruta(ruta), codec)
+                    pd.testing.assert_frame_equal(pd.read_csv(ruta), self.datos)
+        finally:
+            compresion.TAMANO_BLOQUE = tamano_bloque
+
+        with compresion.abrir('vacio.gz', 'w', hilos=2):
+            pass
+        with gzip.open('vacio.gz', 'rt') as f:
+            self.assertEqual(f.read(), '')
+
+    def test_cargador_y_extractor(self):
+        cargador = CargadorDatos(compresion='gzip')
+        rutas = cargador.guardar_multiple_formatos(self.datos, 'datos', formatos=['csv', 'json'])
+        self.assertEqual(rutas, {'csv': 'data/processed/datos.csv.gz', 'json': 'data/processed/datos.json.gz'})
+        extractor = ExtractorDatos()
+        pd.testing.assert_frame_equal(extractor.leer_archivo_local(rutas['csv']), self.datos)
+        self.assertEqual(len(extractor.leer_archivo_local(rutas['json'], tipo='json')), len(self.datos))
+
+        rutas = CargadorDatos(compresion='bz2', hilos_compresion=2).guardar_por_chunks(
+            (self.datos.iloc[i:i + 500] for i in range(0, 2_000, 500)), 'chunks', ['csv', 'jsonl'])
+        self.assertEqual(rutas['jsonl'], 'data/processed/chunks.jsonl.bz2')
+        chunks = list(extractor.leer_por_chunks(rutas['csv'], tamano_chunk=700))
+        self.assertEqual([len(chunk) for chunk in chunks], [700, 700, 600])
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), self.datos)
+
+        # un códec indicado explícitamente manda sobre la extensión
+        ruta = extractor.guardar_raw(self.datos, 'crudos', compresion='xz')
+        self.assertEqual(ruta, 'data/raw/crudos.csv.xz')
+        os.rename(ruta, 'crudos.bin')
+        pd.testing.assert_frame_equal(extractor.leer_archivo_local('crudos.bin', compresion='xz'), self.datos)
+
+        with self.assertRaises(ValueError):
+            CargadorDatos(compresion='zip')
+        with self.assertRaises(ValueError):
+            extractor.guardar_raw(self.datos, 'crudos', formato='excel', compresion='gzip')
+
+
+class TestSQLite(TestConCarpetaTemporal):
+    """Carga en bloque en SQLite: upsert por id, índices diferidos y filas/s"""
+
+    def setUp(self):
+        super().setUp()
+        self.cargador = CargadorDatos()
+
+    def test_upsert_por_id(self):
+        datos = pd.DataFrame({'id': [1, 2, 3], 'nombre': pd.Categorical(['Ana', None, 'Luis']), 'edad': [30.0, np.nan, 41.0],
+                              'fecha': pd.to_datetime(['2024-01-02', '2024-01-03', None]), 'activo': [True, False, True]})
+        ruta = self.cargador.guardar_como_sqlite(datos, 'datos', tamano_lote=2, filas_por_transaccion=2)
+        self.assertEqual(self.cargador.rendimiento_sqlite['filas'], 3)
+        self.assertGreater(self.cargador.rendimiento_sqlite['filas_por_segundo'], 0)
+
+        nuevas = pd.DataFrame({'id': [3, 4], 'nombre': ['Luisa', 'Eva'], 'edad': [42.0, 25.0],
+                               'fecha': pd.to_datetime(['2024-02-01', '2024-02-02']), 'activo': [False, True]})
+        self.cargador.guardar_como_sqlite(nuevas, 'datos')
+
+        with sqlite3.connect(ruta) as conexion:
+            filas = conexion.execute('SELECT * FROM datos ORDER BY id').fetchall()
+        self.assertEqual(filas, [(1, 'Ana', 30.0, '2024-01-02T00:00:00', 1), (2, None, None, '2024-01-03T00:00:00', 0),
+                                 (3, 'Luisa', 42.0, '2024-02-01T00:00:00', 0), (4, 'Eva', 25.0, '2024-02-02T00:00:00', 1)])
+
+    def test_indices_diferidos_y_error(self):
+        datos = pd.DataFrame({'id': range(1_000), 'ciudad': ['Madrid', 'Sevilla'] * 500})
+        with EscritorSQLite('base.sqlite', indices=['ciudad']) as escritor:
+            escritor.escribir(datos.iloc[:500])
+            with sqlite3.connect('base.sqlite') as conexion: # durante la carga inicial el índice todavía no existe
+                indices = conexion.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+            self.assertEqual(indices, [])
+            escritor.escribir(datos.iloc[500:])
+        with sqlite3.connect('base.sqlite') as conexion:
+            plan = conexion.execute("EXPLAIN QUERY PLAN SELECT id FROM datos WHERE ciudad = 'Madrid'").fetchall()
+        self.assertIn('idx_datos_ciudad', str(plan))
+
+        # si la carga falla, la transacción en curso se deshace
+        with self.assertRaises(ValueError):
+            with EscritorSQLite('base.sqlite', filas_por_transaccion=10_000) as escritor:
+                escritor.escribir(pd.DataFrame({'id': [5_000], 'ciudad': ['Bilbao']}))
+                escritor.escribir(pd.DataFrame({'id': [5_001]})) # columnas distintas
+        with sqlite3.connect('base.sqlite') as conexion:
+            self.assertEqual(conexion.execute('SELECT COUNT(*) FROM datos').fetchone()[0], 1_000)
+
+    def test_por_chunks_e_incremental(self):
+        datos = pd.DataFrame({'id': range(6), 'valor': [1.5, 2.5, 3.5, 4.5, 5.5, 6.5]})
+        rutas = self.cargador.guardar_por_chunks((datos.iloc[i:i + 2] for i in range(0, 6, 2)), 'datos', ['csv', 'sqlite'])
+        with sqlite3.connect(rutas['sqlite']) as conexion:
+            pd.testing.assert_frame_equal(pd.read_sql('SELECT * FROM datos', conexion), datos.astype({'id': 'int64'}))
+
+        self.cargador.anexar(datos.iloc[:4], 'anexado', formatos=['sqlite'], clave='id')
+        rutas = self.cargador.anexar(datos.iloc[2:].assign(valor=0.0), 'anexado', formatos=['sqlite'], clave='id')
+        with sqlite3.connect(rutas['sqlite']) as conexion:
+            valores = conexion.execute('SELECT valor FROM datos ORDER BY id').fetchall()
+        self.assertEqual(valores, [(1.5,), (2.5,), (0.0,), (0.0,), (0.0,), (0.0,)])
+
+    def test_anexar_con_clave_guardada_como_float(self):
+        # la columna clave pasó por float (ej. un id nulo): en los archivos quedó 2.0 y tiene que coincidir con 2
+        guardados = pd.DataFrame({'id': [1.0, 2.0, np.nan], 'valor': ['a', 'b', 'c']})
+        formatos = ['csv', 'jsonl', 'parquet']
+        self.cargador.anexar(guardados, 'anexado', formatos=formatos)
+
+        rutas = self.cargador.anexar(pd.DataFrame({'id': [2, 3], 'valor': ['B', 'd']}), 'anexado', formatos=formatos, clave='id')
+
+        leidos = {
+            'csv': pd.read_csv(rutas['csv']),
+            'jsonl': pd.read_json(rutas['jsonl'], lines=True),
+            'parquet': pd.read_parquet(rutas['parquet']),
+        }
+        for formato, leido in leidos.items():
+            with self.subTest(formato=formato):
+                self.assertEqual(sorted(leido['valor']), ['B', 'a', 'c', 'd']) # la fila 2 anterior se reemplaza
+
+
+class TestParticiones(TestConCarpetaTemporal):
+    """Salidas particionadas al estilo Hive y poda de particiones al leer"""
+
+    def setUp(self):
+        super().setUp()
+        self.datos = pd.DataFrame({'id': range(8), 'ciudad': ['Madrid', 'Sevilla', 'A Coruña/Norte', None] * 2,
+                                   'fecha_ingreso': pd.to_datetime(['2019-01-01', '2020-05-05', '2021-02-02', '2020-07-07'] * 2),
+                                   'salario': np.arange(8) * 1000.0})
+
+    def test_ida_y_vuelta_parquet(self):
+        directorio = CargadorDatos().guardar_particionado(
+            self.datos, 'empleados', ['ciudad', 'anio_ingreso'],
+            derivadas={'anio_ingreso': lambda df: df['fecha_ingreso'].dt.year})
+        self.assertTrue(os.path.isdir(os.path.join(directorio, 'ciudad=Madrid', 'anio_ingreso=2019')))
+        self.assertTrue(os.path.isdir(os.path.join(directorio, 'ciudad=A%20Coru%C3%B1a%2FNorte')))
+        self.assertTrue(os.path.isdir(os.path.join(directorio, 'ciudad=__HIVE_DEFAULT_PARTITION__')))
+
+        leidos = ExtractorDatos().leer_particionado(directorio).sort_values('id').reset_index(drop=True)
+        self.assertEqual(leidos['anio_ingreso'].tolist(), [2019, 2020, 2021, 2020] * 2)
+        self.assertTrue(leidos['ciudad'].iloc[3] is None or pd.isna(leidos['ciudad'].iloc[3]))
+        pd.testing.assert_frame_equal(leidos[self.datos.columns].fillna({'ciudad': ''}), self.datos.fillna({'ciudad': ''}))
+
+    def test_error_a_medias_conserva_la_salida_anterior(self):
+        cargador = CargadorDatos()
+        directorio = cargador.guardar_particionado(self.datos, 'empleados', ['ciudad'])
+        archivos = sorted(listar_particiones(directorio)['archivo'])
+
+        erroneos = self.datos.assign(mixta=[1, 2, 3, 4, 'a', 'b', 'c', 'd']) # pyarrow no convierte una columna con números y textos
+        with self.assertRaises(Exception):
+            cargador.guardar_particionado(erroneos, 'empleados', ['ciudad'])
+
+        self.assertEqual(sorted(listar_particiones(directorio)['archivo']), archivos)
+        self.assertEqual(len(ExtractorDatos().leer_particionado(directorio)), len(self.datos))
+        self.assertEqual(os.listdir('data/processed'), ['empleados']) # sin carpetas temporales
+
+    def test_poda_de_particiones(self):
+        directorio = CargadorDatos(compresion='gzip').guardar_particionado(self.datos, 'empleados', ['ciudad'], formato='csv')
+        # un archivo de otra partición ilegible: si la poda funciona, no se llega a abrir
+        with open(os.path.join(directorio, 'ciudad=Sevilla', os.listdir(os.path.join(directorio, 'ciudad=Sevilla'))[0]), 'wb') as f:
+            f.write(b'no es gzip')
+
+        extractor = ExtractorDatos()
+        leidos = extractor.leer_particionado(directorio, filtros=[('ciudad', 'in', ['Madrid', 'A Coruña/Norte']),
+                                                                  ('salario', '>', 1000)], columnas=['id', 'ciudad'])
+        self.assertEqual(sorted(leidos['id']), [2, 4, 6])
+        self.assertEqual(list(leidos.columns), ['id', 'ciudad'])
+        with self.assertRaises(ValueError):
+            extractor.leer_particionado(directorio, filtros=[('ciudad', '~', 'Madrid')])
+
+
+class TestNormalizacionStrings(unittest.TestCase):
+    """La normalización por valores únicos debe dar lo mismo que strip + title + reemplazo de espacios fila a fila"""
+
+    def normalizar_fila_a_fila(self, serie):
+        return serie.astype(str).str.strip().str.title().str.replace(r'\s+', ' ', regex=True)
+
+    def test_igual_que_fila_a_fila(self):
+        datos = pd.DataFrame({
+            'ciudad': ['madrid ', ' MADRID', 'sevilla  este', None, 5, 'madrid '] * 10,
+            'nombre': [f'  juan\t {i}  pérez ' for i in range(60)]
+        })
+        esperado = datos.apply(self.normalizar_fila_a_fila)
+
+        transformador = TransformadorDatos()
+        transformador._normalizar_strings(datos)
+
+        # ciudad tiene pocos valores distintos -> categórica; nombre es texto libre -> object
+        self.assertIsInstance(datos['ciudad'].dtype, pd.CategoricalDtype)
+        self.assertEqual(datos['nombre'].dtype, object)
+        self.assertEqual(sorted(datos['ciudad'].cat.categories), ['5', 'Madrid', 'None', 'Sevilla Este'])
+        pd.testing.assert_frame_equal(datos.astype(object), esperado)
+
+
+class TestFechas(unittest.TestCase):
+    """Conversión de fechas con formato inferido: mismo resultado que to_datetime y los valores no válidos se cuentan"""
+
+    def test_formato_inferido_y_no_validos(self):
+        dias = pd.date_range('2020-01-01', periods=40).strftime('%d/%m/%Y')
+        valores = pd.Series(list(dias) * 5 + [None, 'sin fecha', ' 02/03/2020 '], dtype=object)
+        self.assertEqual(inferir_formato_fecha(valores), '%d/%m/%Y') # 13/01/2020 descarta mes/día
+
+        esperado = pd.to_datetime(valores.str.strip(), format='%d/%m/%Y', errors='coerce')
+        for serie in (valores, valores.astype('category')): # por valores únicos y por categorías
+            with self.subTest(tipo=str(serie.dtype)):
+                fechas, fallidos = convertir_fechas(serie)
+                pd.testing.assert_series_equal(fechas, esperado, check_names=False)
+                self.assertEqual(fallidos, 1) # 'sin fecha'; el nulo no cuenta
+
+        with self.assertRaises(ValueError):
+            convertir_fechas(pd.Series(['a', 'b']))
+
+    def test_nulos_de_fecha_antes_que_texto(self):
+        datos = pd.DataFrame({'edad': [30, 40, 50], 'fecha_ingreso': ['15/01/2020', None, 'mal']})
+        transformador = TransformadorDatos()
+        limpio = transformador.limpiar_datos(datos)
+        # el nulo se rellena con la fecha de hoy (no con 'DESCONOCIDO') y la columna se convierte igualmente
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(limpio['fecha_ingreso']))
+        self.assertEqual(limpio['fecha_ingreso'].tolist()[:2], [pd.Timestamp('2020-01-15'), pd.Timestamp.now().normalize()])
+        self.assertTrue(pd.isna(limpio['fecha_ingreso'].iloc[2]))
+        self.assertIn("1 valores no válidos en 'fecha_ingreso' convertidos a NaT", transformador.transformaciones_aplicadas)
+
+
+class TestEstadisticas(TestConCarpetaTemporal):
+    """Estadísticas en una pasada: combinar las de varios chunks da lo mismo que calcularlas sobre todo"""
+
+    def test_fusionar_chunks_igual_que_completo(self):
+        rng = np.random.default_rng(0)
+        datos = pd.DataFrame({'valor': rng.lognormal(8, 1, 40_000), 'grupo': rng.choice(['a', 'b', 'c'], 40_000, p=[.2, .5, .3]),
+                              'clave': rng.integers(0, 5_000, 40_000)})
+        datos.loc[::9, 'valor'] = np.nan
+        estadisticas = EstadisticasColumnas()
+        for inicio in range(0, len(datos), 7_000):
+            estadisticas.fusionar(EstadisticasColumnas.desde_dataframe(datos.iloc[inicio:inicio + 7_000]))
+
+        self.assertEqual(estadisticas.filas, len(datos))
+        self.assertEqual(estadisticas.nulos('valor'), datos['valor'].isna().sum())
+        self.assertAlmostEqual(estadisticas.media('valor'), datos['valor'].mean())
+        for q in (0.1, 0.5, 0.9): # error relativo del boceto: 1 %
+            self.assertAlmostEqual(estadisticas.cuantil('valor', q) / datos['valor'].quantile(q), 1, delta=0.01)
+        self.assertEqual(estadisticas.moda('grupo'), 'b')
+        self.assertEqual(estadisticas.distintos('grupo'), 3)
+        self.assertAlmostEqual(estadisticas.distintos('clave') / datos['clave'].nunique(), 1, delta=0.05)
+
+    def test_rango_exacto_con_cualquier_precision(self):
+        # con precision_distintos=4 el resto tiene 60 bits: en float64 2**60 - 1 se redondearía a 2**60
+        valores = np.array([2 ** 60 - 1, 2 ** 53 + 1, 2 ** 32, 2 ** 32 - 1, 1, 0], dtype=np.uint64)
+        self.assertEqual(_numero_de_bits(valores).tolist(), [60, 54, 33, 32, 1, 0])
+
+        for precision in (4, 12, 18):
+            with self.subTest(precision=precision):
+                estadisticas = EstadisticasColumnas(medidas=('distintos',), precision_distintos=precision)
+                estadisticas.actualizar(pd.DataFrame({'clave': np.arange(50_000)}))
+                # error típico 1.04 / sqrt(2**p): 26 % con p=4
+                self.assertAlmostEqual(estadisticas.distintos('clave') / 50_000, 1, delta=4 * 1.04 / 2 ** (precision / 2))
+
+    def test_estrategias_de_relleno_y_perfil(self):
+        datos = pd.DataFrame({'id': range(1, 9), 'edad': [20, 30, None, 30, 45, None, 60, 31.0],
+                              'salario': [900, 1000, 1000, None, 2000, 5000, 1200, 1100.0]})
+        limpio = TransformadorDatos(estrategias_relleno={'edad': 'mediana', 'salario': 'moda'}).limpiar_datos(datos)
+        self.assertEqual(limpio.loc[2, 'edad'], datos['edad'].median()) # pocos valores: la mediana es exacta
+        self.assertEqual(limpio.loc[3, 'salario'], 1000)
+        with self.assertRaises(ValueError):
+            TransformadorDatos(estrategias_relleno={'edad': 'maximo'})
+
+        # el modo streaming usa las mismas estrategias con los valores de todo el archivo y guarda el perfil de la salida
+        datos.to_csv('entrada.csv', index=False)
+        resultado = ejecutar_etl_por_chunks('entrada.csv', 'salida', tamano_chunk=3,
+                                            estrategias_relleno={'edad': 'mediana', 'salario': 'moda'})
+        pd.testing.assert_frame_equal(pd.read_csv(resultado['archivos_generados']['csv'])[list(datos.columns)], limpio,
+                                      check_dtype=False)
+        with open(resultado['archivos_generados']['perfil'], encoding='utf-8') as f:
+            perfil = json.load(f)
+        self.assertEqual(perfil['filas'], resultado['registros_procesados'])
+        self.assertEqual(perfil['columnas']['edad']['nulos'], 0)
+        self.assertEqual(perfil['columnas']['categoria_edad']['distintos_aprox'], 3)
+
+
+class TestTransformacionParalela(unittest.TestCase):
+    """El modo paralelo debe devolver exactamente lo mismo que el secuencial"""
+
+    def test_igual_que_secuencial(self):
+        filas = 200
+        datos = pd.DataFrame({
+            'id': [i % 150 for i in range(filas)], # ids repetidos: duplicados en particiones distintas
+            'nombre': [None if i % 150 % 17 == 0 else f'  persona {i % 150} ' for i in range(filas)],
+            'edad': [None if i % 150 % 11 == 0 else (i % 150) - 10 for i in range(filas)], # edades negativas y nulas
+            'ciudad': [['madrid', ' SEVILLA', 'valencia', None][i % 150 % 4] if i < 190 else 'bilbao' for i in range(filas)],
+            'salario': [1000.0 + (i % 150) for i in range(filas)],
+            'fecha_ingreso': [f'2020-01-{(i % 150 % 28) + 1:02d}' for i in range(filas)]
+        })
+
+        secuencial = TransformadorDatos()
+        esperado = secuencial.agregar_columnas_calculadas(secuencial.limpiar_datos(datos))
+
+        paralelo = TransformadorDatos()
+        resultado = paralelo.limpiar_y_calcular_paralelo(datos, n_particiones=4, max_workers=2)
+
+        pd.testing.assert_frame_equal(resultado, esperado)
+        self.assertIsInstance(resultado['ciudad'].dtype, pd.CategoricalDtype)
+        # el DataFrame original no se modifica
+        self.assertIsNone(datos.loc[0, 'nombre'])
+
+
+class TestLoggingAsincrono(TestConCarpetaTemporal):
+    """Tests del logging en segundo plano y del decorador"""
+
+    def test_mensajes_en_hilo_aparte(self):
+        logger = LoggerPersonalizado('ETL_Test_Asincrono').get_logger()
+        registros = []
+        capturador = logging.Handler()
+        capturador.emit = lambda registro: registros.append((registro.getMessage(), threading.current_thread().name))
+        logger.addHandler(capturador)
+
+        activar_logging_asincrono('ETL_Test_Asincrono')
+        logger.info("Filas: %s", 10)
+        detener_logging_asincrono('ETL_Test_Asincrono') # vacía la cola antes de devolver
+
+        self.assertEqual(len(registros), 1)
+        mensaje, hilo = registros[0]
+        self.assertEqual(mensaje, "Filas: 10")
+        self.assertNotEqual(hilo, threading.current_thread().name)
+        self.assertIn(capturador, logger.handlers) # los handlers vuelven al logger al detener
+
+    def test_decorador_conserva_nombre(self):
+        self.assertEqual(TransformadorDatos.limpiar_datos.__name__, 'limpiar_datos')
+
+
+class TestMetricas(unittest.TestCase):
+    """Tests de las métricas por etapa"""
+
+    def setUp(self):
+        registro_metricas.reiniciar()
+        self.datos = pd.DataFrame({'id': [1, 2, 2, 3], 'edad': [20, 30, 30, None], 'salario': [100.0, 200.0, 200.0, 300.0]})
+
+    def test_registra_filas_y_tiempo_por_etapa(self):
+        TransformadorDatos().limpiar_datos(self.datos)
+
+        reporte = registro_metricas.reporte()
+        etapa = reporte['etapas']['TransformadorDatos.limpiar_datos']
+        self.assertEqual(etapa['llamadas'], 1)
+        self.assertEqual(etapa['filas_entrada'], 4)
+        self.assertEqual(etapa['filas_salida'], 3) # se eliminó un duplicado
+        self.assertGreaterEqual(etapa['segundos'], 0)
+        json.dumps(reporte) # el reporte debe poder guardarse como JSON
+
+    def test_transformaciones_no_crecen_entre_llamadas(self):
+        transformador = TransformadorDatos()
+        transformador.limpiar_datos(self.datos)
+        primeras = list(transformador.transformaciones_aplicadas)
+        transformador.limpiar_datos(self.datos)
+
+        self.assertEqual(transformador.transformaciones_aplicadas, primeras)
+        self.assertEqual(len(transformador.historial_limpiezas), 2)
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Tests del generador de datos sintéticos y de la comparación con el baseline"""
+
+    def test_generador_determinista_y_proporciones(self):
+        datos = generar_datos(20_000, semilla=7, proporcion_nulos=0.1, proporcion_duplicados=0.05,
+                              proporcion_edades_invalidas=0.02)
+
+        pd.testing.assert_frame_equal(datos, generar_datos(20_000, semilla=7, proporcion_nulos=0.1,
+                                                           proporcion_duplicados=0.05, proporcion_edades_invalidas=0.02))
+        self.assertEqual(len(datos), 20_000)
+        self.assertEqual(int(datos.duplicated().sum()), 1_000)
+        self.assertAlmostEqual(datos['ciudad'].isna().mean(), 0.1, delta=0.01)
+        edades_invalidas = datos['edad'].notna() & ~datos['edad'].between(1, 119)
+        self.assertAlmostEqual(edades_invalidas.mean(), 0.02, delta=0.005)
+
+    def test_chunks_con_ids_consecutivos(self):
+        chunks = list(generar_por_chunks(2_500, tamano_chunk=1_000, proporcion_duplicados=0))
+        self.assertEqual([len(chunk) for chunk in chunks], [1_000, 1_000, 500])
+        ids = pd.concat(chunks)['id']
+        self.assertEqual(ids.tolist(), list(range(1, 2_501)))
+
+    def test_comparacion_marca_regresiones(self):
+        baseline = {'resultados': {'100': {'a': {'segundos': 1.0}, 'b': {'segundos': 1.0}}}}
+        actual = {'resultados': {'100': {'a': {'segundos': 1.1}, 'b': {'segundos': 1.5}, 'nuevo': {'segundos': 1.0}}}}
+
+        comparacion = {fila['benchmark']: fila['regresion'] for fila in comparar_con_baseline(actual, baseline, 0.2)}
+        self.assertEqual(comparacion, {'a': False, 'b': True})
+
+    def test_importacion_rapida_y_sin_efectos(self):
+        paquete = medir_importacion('import src', repeticiones=1)
+        self.assertEqual(paquete['modulos_pesados'], []) # pandas, numpy... se cargan con la primera etapa que se usa
+        self.assertEqual(paquete['archivos_creados'], []) # ni carpeta logs ni archivos abiertos al importar
+
+        etapas = medir_importacion('from src import ExtractorDatos, TransformadorDatos, CargadorDatos', repeticiones=1)
+        self.assertNotIn('requests', etapas['modulos_pesados']) # solo hace falta para las URLs
+        self.assertNotIn('openpyxl', etapas['modulos_pesados']) # solo hace falta para Excel
+        self.assertEqual(etapas['archivos_creados'], [])
+
+        import src
+        self.assertIs(src.CargadorDatos, CargadorDatos)
+        with self.assertRaises(AttributeError):
+            src.NoExiste
+
+
+class TestLimpiezaInplace(unittest.TestCase):
+    """Tests del modo inplace y del presupuesto de memoria"""
+
+    def setUp(self):
+        self.datos = generar_datos(3_000, semilla=3)
+
+    def test_inplace_mismo_resultado_sin_copiar(self):
+        esperado = TransformadorDatos().limpiar_datos(self.datos)
+        datos = self.datos.copy()
+
+        resultado = TransformadorDatos().limpiar_datos(datos, inplace=True)
+
+        self.assertIs(resultado, datos) # se modifica el DataFrame recibido
+        pd.testing.assert_frame_equal(resultado, esperado)
+
+    def test_inplace_con_indice_repetido(self):
+        datos = pd.DataFrame({'edad': [20, -1, 30], 'salario': [10.0, 20.0, 30.0]}, index=[0, 0, 1])
+        resultado = TransformadorDatos().limpiar_datos(datos, inplace=True)
+        self.assertEqual(resultado['edad'].tolist(), [20, 30]) # la etiqueta 0 repetida no arrastra a la fila válida
+
+    def test_presupuesto_excedido_particiona(self):
+        esperado = TransformadorDatos().limpiar_datos(self.datos)
+
+        with self.assertLogs('ETL_Logger', level='WARNING'):
+            resultado = TransformadorDatos().limpiar_datos(self.datos, presupuesto_memoria_mb=0.5,
+                                                           si_excede_presupuesto='particionar')
+
+        pd.testing.assert_frame_equal(resultado, esperado)
+
+    def test_modo_de_presupuesto_no_valido(self):
+        with self.assertRaises(ValueError): # un error de escritura no se queda en un simple aviso
+            TransformadorDatos().limpiar_datos(self.datos, presupuesto_memoria_mb=0.5, si_excede_presupuesto='particion')
+
+    def test_particionar_baja_el_pico_de_memoria(self):
+        # limpiar por partes tiene que ocupar menos memoria que limpiar de una vez, aunque sea inplace
+        datos = generar_datos(200_000, semilla=3)
+        presupuesto = estimar_pico_limpieza_mb(datos, inplace=True) / 8
+        picos, resultados = {}, {}
+        for modo, opciones in [('inplace', {}),
+                               ('particionar', {'presupuesto_memoria_mb': presupuesto, 'si_excede_presupuesto': 'particionar'})]:
+            copia = datos.copy()
+            tracemalloc.start()
+            try:
+                resultados[modo] = TransformadorDatos().limpiar_datos(copia, inplace=True, **opciones)
+                picos[modo] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        pd.testing.assert_frame_equal(resultados['particionar'], resultados['inplace'])
+        self.assertLess(picos['particionar'], picos['inplace'])
+
+
+class TestEsquema(TestConCarpetaTemporal):
+    """Tests de los tipos compactos y la proyección de columnas"""
+
+    def setUp(self):
+        super().setUp()
+        self.datos = generar_datos(2_000, semilla=11)
+        self.datos.to_csv('entrada.csv', index=False)
+
+    def test_inferir_tipos_sin_perder_informacion(self):
+        datos = pd.DataFrame({
+            'id': [1, 2, 300],
+            'edad': [20.0, None, 30.0],
+            'salario': [30000.15, 1.1, 2.2], # con decimales float32 perdería precisión
+            'ciudad': ['Madrid', 'Madrid', 'Madrid'],
+        })
+        esquema = EsquemaDatos.inferir(datos)
+        self.assertEqual(esquema.tipos, {'id': 'int16', 'edad': 'float32', 'ciudad': 'category'})
+
+    def test_lectura_csv_con_esquema(self):
+        esquema = EsquemaDatos({'edad': 'float32', 'ciudad': 'category'}, columnas=['id', 'edad', 'ciudad'])
+        df = ExtractorDatos().leer_archivo_local('entrada.csv', esquema=esquema)
+
+        self.assertEqual(list(df.columns), ['id', 'edad', 'ciudad'])
+        self.assertEqual(df['edad'].dtype, 'float32')
+        self.assertIsInstance(df['ciudad'].dtype, pd.CategoricalDtype)
+
+        chunks = list(ExtractorDatos().leer_por_chunks('entrada.csv', tamano_chunk=500, esquema=esquema))
+        self.assertEqual(chunks[0]['edad'].dtype, 'float32')
+
+    def test_limpieza_con_tipos_compactos(self):
+        compacto = ExtractorDatos().leer_archivo_local('entrada.csv', esquema=ESQUEMA_EMPLEADOS)
+        transformador = TransformadorDatos()
+        esperado = transformador.limpiar_datos(pd.read_csv('entrada.csv'))
+        resultado = transformador.limpiar_datos(compacto)
+
+        self.assertEqual(resultado['edad'].dtype, 'float32') # los tipos compactos se mantienen
+        self.assertEqual(resultado['nombre'].tolist(), esperado['nombre'].tolist())
+        self.assertEqual(resultado['ciudad'].tolist(), esperado['ciudad'].tolist())
+        self.assertEqual(resultado['id'].tolist(), esperado['id'].tolist())
+
+    def test_ids_grandes_no_se_desbordan(self):
+        datos = self.datos.head(3).assign(id=[1, 2 ** 31, 2 ** 40])
+        datos.to_csv('grandes.csv', index=False)
+        for df in (ExtractorDatos().leer_archivo_local('grandes.csv', esquema=ESQUEMA_EMPLEADOS),
+                   ESQUEMA_EMPLEADOS.aplicar(datos)):
+            self.assertEqual(df['id'].tolist(), datos['id'].tolist())
+
+    def test_guardar_y_cargar_esquema(self):
+        ruta = ESQUEMA_EMPLEADOS.guardar('esquema.json')
+        self.assertEqual(EsquemaDatos.cargar(ruta).a_dict(), ESQUEMA_EMPLEADOS.a_dict())
+
+
+class TestIncremental(TestConCarpetaTemporal):
+    """Tests del modo incremental: cada ejecución procesa solo lo posterior a la marca de agua"""
+
+    def setUp(self):
+        super().setUp()
+        self.lote_1 = pd.DataFrame({
+            'id': [1, 2, 3],
+            'nombre': ['juan', 'MARÍA', ' luis '],
+            'edad': [25, None, 41],
+            'salario': [30000, 35000, 31000],
+            'fecha_ingreso': ['2020-01-01', '2020-02-01', '2020-03-01'],
+        })
+        self.lote_2 = pd.DataFrame({
+            'id': [4, 5],
+            'nombre': ['ana', 'eva'],
+            'edad': [33, 50],
+            'salario': [40000, 45000],
+            'fecha_ingreso': ['2020-04-01', '2020-05-01'],
+        })
+        self.lote_1.to_csv('entrada.csv', index=False)
+
+    def _agregar_lote(self, lote):
+        lote.to_csv('entrada.csv', mode='a', header=False, index=False)
+
+    def test_solo_procesa_registros_nuevos(self):
+        for marca in ('id', 'fecha', 'offset'):
+            with self.subTest(marca=marca):
+                nombre = f'salida_{marca}'
+                self.lote_1.to_csv('entrada.csv', index=False)
+                primero = ejecutar_etl_incremental('entrada.csv', nombre, marca=marca)
+                self.assertEqual(primero['registros_procesados'], 3)
+
+                self._agregar_lote(self.lote_2)
+                segundo = ejecutar_etl_incremental('entrada.csv', nombre, marca=marca)
+                self.assertEqual(segundo['registros_nuevos'], 2)
+                self.assertEqual(segundo['marca_anterior'], primero['marca_nueva'])
+
+                sin_cambios = ejecutar_etl_incremental('entrada.csv', nombre, marca=marca)
+                self.assertEqual(sin_cambios['registros_nuevos'], 0)
+
+                csv = pd.read_csv(segundo['archivos_generados']['csv'])
+                self.assertEqual(csv['id'].tolist(), [1, 2, 3, 4, 5])
+                with open(segundo['archivos_generados']['jsonl'], encoding='utf-8') as f:
+                    self.assertEqual(len(f.readlines()), 5)
+
+    def test_relleno_con_media_acumulada(self):
+        ejecutar_etl_incremental('entrada.csv', 'salida')
+        self._agregar_lote(pd.DataFrame({'id': [6], 'nombre': ['sara'], 'edad': [None], 'salario': [1],
+                                         'fecha_ingreso': ['2021-01-01']}))
+        ejecutar_etl_incremental('entrada.csv', 'salida')
+
+        estado = EstadoIncremental().obtener('salida')
+        self.assertEqual(estado['conteos']['edad'], 2)
+        salida = pd.read_csv('data/processed/salida.csv')
+        self.assertEqual(salida.loc[salida['id'] == 6, 'edad'].iloc[0], 33) # media de 25 y 41, no solo del lote nuevo
+
+    def test_fusion_por_clave(self):
+        ejecutar_etl_incremental('entrada.csv', 'salida', clave='id', formatos=('csv', 'jsonl', 'parquet'))
+        self._agregar_lote(pd.DataFrame({'id': [3, 4], 'nombre': ['luis', 'ana'], 'edad': [42, 33],
+                                         'salario': [99000, 40000], 'fecha_ingreso': ['2020-03-01', '2020-04-01']}))
+        resultado = ejecutar_etl_incremental('entrada.csv', 'salida', marca='offset', fuente='por_offset',
+                                             clave='id', formatos=('csv', 'jsonl', 'parquet'))
+
+        self.assertEqual(resultado['registros_nuevos'], 5) # fuente nueva: lee todo el archivo
+        for formato in ('csv', 'jsonl', 'parquet'):
+            with self.subTest(formato=formato):
+                ruta = resultado['archivos_generados'][formato]
+                if formato == 'csv':
+                    salida = pd.read_csv(ruta)
+                elif formato == 'jsonl':
+                    salida = pd.read_json(ruta, lines=True)
+                else:
+                    salida = pd.read_parquet(ruta)
+                self.assertEqual(sorted(salida['id'].tolist()), [1, 2, 3, 4])
+                self.assertEqual(salida.loc[salida['id'] == 3, 'salario'].iloc[0], 99000)
+
+    def test_ultima_linea_incompleta_se_deja_para_despues(self):
+        with open('entrada.csv', 'a', encoding='utf-8') as f:
+            f.write('4,ana,33,40000,2020-04') # todavía se está escribiendo
+        resultado = ejecutar_etl_incremental('entrada.csv', 'salida', marca='offset')
+        self.assertEqual(resultado['registros_nuevos'], 3)
+
+        with open('entrada.csv', 'a', encoding='utf-8') as f:
+            f.write('-01\n')
+        resultado = ejecutar_etl_incremental('entrada.csv', 'salida', marca='offset')
+        self.assertEqual(resultado['registros_nuevos'], 1)
+        self.assertEqual(resultado['marca_nueva'], os.path.getsize('entrada.csv'))
+
+
+class TestCache(TestConCarpetaTemporal):
+    """Tests de la caché por contenido"""
+
+    def setUp(self):
+        super().setUp()
+        generar_datos(500, semilla=3).to_csv('entrada.csv', index=False)
+
+    def test_acierto_si_la_entrada_no_cambia(self):
+        cache = CacheDatos()
+        extractor = ExtractorDatos(cache)
+        primero = extractor.leer_archivo_local('entrada.csv', esquema=ESQUEMA_EMPLEADOS)
+        segundo = ExtractorDatos(CacheDatos()).leer_archivo_local('entrada.csv', esquema=ESQUEMA_EMPLEADOS)
+
+        pd.testing.assert_series_equal(segundo.dtypes, primero.dtypes) # tipos compactos incluidos (category, string[pyarrow])
+        pd.testing.assert_frame_equal(segundo.astype(object).fillna(''), primero.astype(object).fillna('')) # Arrow devuelve None donde read_csv pone NaN
+        self.assertEqual(len(CacheDatos().entradas()), 1)
+
+        # el DataFrame de la caché se puede limpiar sobre sí mismo aunque venga de un archivo mapeado en memoria
+        TransformadorDatos().limpiar_datos(segundo, inplace=True)
+
+    def test_fallo_si_cambia_el_contenido_o_la_configuracion(self):
+        cache = CacheDatos()
+        clave = cache.clave_archivo('entrada.csv', 'transformacion', {'version': 1})
+        self.assertNotEqual(clave, cache.clave_archivo('entrada.csv', 'transformacion', {'version': 2}))
+
+        with open('entrada.csv', 'a', encoding='utf-8') as f:
+            f.write('99999,Nuevo,30,Madrid,1000,2020-01-01\n')
+        os.utime('entrada.csv', ns=(0, 0)) # otra fecha de modificación para que se vuelva a calcular el hash
+        self.assertNotEqual(clave, cache.clave_archivo('entrada.csv', 'transformacion', {'version': 1}))
+
+    def test_expulsa_las_menos_usadas(self):
+        datos = generar_datos(2_000, semilla=1)
+        cache = CacheDatos(max_mb=0.25)
+        cache.guardar('a', datos)
+        cache.guardar('b', datos)
+        cache.obtener('a') # 'a' pasa a ser la más reciente
+        cache.guardar('c', datos)
+
+        claves = [entrada['clave'] for entrada in cache.entradas()]
+        self.assertIn('c', claves)
+        self.assertNotIn('b', claves)
+        self.assertLessEqual(cache.tamano_bytes(), cache.max_bytes)
+
+        self.assertEqual(cache.purgar(), len(claves))
+        self.assertIsNone(cache.obtener('c'))
+
+
+class _ServidorPrueba(BaseHTTPRequestHandler):
+    """Servidor con ETag, Range y gzip; cortar_en corta la primera respuesta tras ese número de bytes"""
+    contenido = b''
+    etag = '"v1"'
+    cortar_en = None
+    peticiones = []
+
+    def do_GET(self):
+        type(self).peticiones.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        cuerpo, estado = self.contenido, 200
+        rango = self.headers.get('Range')
+        if rango and self.headers.get('If-Range', self.etag) == self.etag:
+            desde = int(rango.split('=')[1].rstrip('-'))
+            cuerpo, estado = self.contenido[desde:], 206
+        comprimir = estado == 200 and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if comprimir:
+            cuerpo = gzip.compress(cuerpo)
+
+        self.send_response(estado)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        if comprimir:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if type(self).cortar_en is not None: # simula una conexión que se cae a mitad de la descarga
+            self.wfile.write(cuerpo[:type(self).cortar_en])
+            type(self).cortar_en = None
+            self.close_connection = True
+            return
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestClienteHTTP(TestConCarpetaTemporal):
+    """Tests de la extracción HTTP contra un servidor local"""
+
+    def setUp(self):
+        super().setUp()
+        self.datos = generar_datos(3_000, semilla=5)
+        _ServidorPrueba.contenido = self.datos.to_csv(index=False).encode('utf-8')
+        _ServidorPrueba.etag = '"v1"'
+        _ServidorPrueba.cortar_en = None
+        _ServidorPrueba.peticiones = []
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _ServidorPrueba)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/empleados.csv"
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        super().tearDown()
+
+    def test_descarga_y_304_sin_cambios(self):
+        with ClienteHTTP() as cliente:
+            primera = cliente.descargar(self.url)
+            segunda = cliente.descargar(self.url)
+
+        self.assertEqual(primera['estado'], 'descargado')
+        self.assertLess(primera['bytes'], len(_ServidorPrueba.contenido)) # llegó comprimido con gzip
+        with open(primera['ruta'], 'rb') as f:
+            self.assertEqual(f.read(), _ServidorPrueba.contenido)
+        self.assertEqual(segunda['estado'], 'sin_cambios')
+        self.assertEqual(_ServidorPrueba.peticiones[1]['If-None-Match'], '"v1"')
+
+    def test_reanuda_descarga_cortada(self):
+        _ServidorPrueba.cortar_en = 100_000
+        with ClienteHTTP() as cliente:
+            cliente.sesion.headers['Accept-Encoding'] = 'identity' # sin gzip, para cortar en un byte concreto del archivo
+            resultado = cliente.descargar(self.url)
+
+        self.assertEqual(resultado['reanudaciones'], 1)
+        self.assertEqual(_ServidorPrueba.peticiones[1]['Range'], 'bytes=65536-') # desde el último bloque completo
+        with open(resultado['ruta'], 'rb') as f:
+            self.assertEqual(f.read(), _ServidorPrueba.contenido)
+
+    def test_lectura_por_chunks_en_streaming(self):
+        chunks = list(ExtractorDatos().leer_por_chunks(self.url, tamano_chunk=1_000))
+        self.assertEqual([len(chunk) for chunk in chunks], [1_000, 1_000, 1_000])
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), pd.read_csv(io.BytesIO(_ServidorPrueba.contenido)))
+
+    def test_extraccion_concurrente(self):
+        for numero in range(3):
+            generar_datos(100, semilla=numero, id_inicial=numero * 1000).to_csv(f'region_{numero}.csv', index=False)
+        fuentes = [self.url, 'region_0.csv', 'no_existe.csv', 'region_1.csv', 'region_2.csv']
+
+        for pool in ('hilos', 'procesos'):
+            with self.subTest(pool=pool):
+                df, resumen = extraer_fuentes(fuentes, max_concurrencia=2, max_workers=2, pool=pool)
+
+                self.assertEqual(len(df), len(self.datos) + 300)
+                self.assertEqual(df['fuente'].unique().tolist(), [self.url, 'region_0.csv', 'region_1.csv', 'region_2.csv'])
+                self.assertEqual([fila['exito'] for fila in resumen], [True, True, False, True, True])
+                self.assertIn(resumen[0]['estado'], ('descargado', 'sin_cambios'))
+
+        recibidas = {fuente for fuente, df, _ in iterar_fuentes(fuentes[1:], pool='hilos') if df is not None}
+        self.assertEqual(recibidas, {'region_0.csv', 'region_1.csv', 'region_2.csv'})
+
+    def test_error_sin_respaldo(self):
+        extractor = ExtractorDatos(cliente_http=ClienteHTTP(reintentos=0))
+        sin_servidor = 'http://127.0.0.1:1/empleados.csv' # puerto sin nadie escuchando
+        with self.assertRaises(Exception):
+            extractor.descargar_csv_publico(sin_servidor)
+        respaldo = extractor.descargar_csv_publico(sin_servidor, usar_respaldo=True)
+        self.assertEqual(len(respaldo), 5)
+
+        descargado = extractor.descargar_csv_publico(self.url)
+        self.assertEqual(len(descargado), len(self.datos))
+
+
+class _ClienteLento:
+    """Cliente HTTP falso: cada descarga tarda un poco y se cuentan las que están en curso a la vez"""
+
+    def __init__(self, ruta: str, segundos: float = 0.05):
+        self.ruta = ruta
+        self.segundos = segundos
+        self.en_curso = 0
+        self.maximo = 0
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def descargar(self, url):
+        with self._lock:
+            self.llamadas += 1
+            self.en_curso += 1
+            self.maximo = max(self.maximo, self.en_curso)
+        time.sleep(self.segundos)
+        with self._lock:
+            self.en_curso -= 1
+        return {'ruta': self.ruta, 'estado': 'descargado', 'bytes': 0}
+
+
+class TestExtraccionConcurrente(TestConCarpetaTemporal):
+    """Límite de fuentes en curso y parada de la extracción cuando se deja de iterar"""
+
+    def setUp(self):
+        super().setUp()
+        generar_datos(50, semilla=1).to_csv('fuente.csv', index=False)
+        self.fuentes = [f'http://fuentes.local/{numero}.csv' for numero in range(20)]
+
+    def test_como_mucho_max_concurrencia_en_curso(self):
+        cliente = _ClienteLento('fuente.csv')
+        df, resumen = extraer_fuentes(self.fuentes, max_concurrencia=3, pool='hilos', cliente_http=cliente)
+
+        self.assertEqual(len(df), 50 * len(self.fuentes))
+        self.assertEqual(cliente.llamadas, len(self.fuentes))
+        self.assertEqual(cliente.maximo, 3) # se llega al límite pero no se supera
+
+    def test_dejar_de_iterar_detiene_la_extraccion(self):
+        cliente = _ClienteLento('fuente.csv')
+        for _ in iterar_fuentes(self.fuentes, max_concurrencia=2, pool='hilos', cliente_http=cliente):
+            break # el generador se cierra: la cola llena frena a los productores y se cancela lo pendiente
+
+        self.assertFalse(any(hilo.name == 'extraccion_concurrente' for hilo in threading.enumerate()))
+        llamadas = cliente.llamadas
+        self.assertLess(llamadas, len(self.fuentes))
+        time.sleep(0.2)
+        self.assertEqual(cliente.llamadas, llamadas) # después de cerrar no empieza ninguna descarga más
+        self.assertEqual(cliente.en_curso, 0)
+
+
+class TestExcel(TestConCarpetaTemporal):
+    """Tests del Excel en modo streaming (write_only / read_only de openpyxl)"""
+
+    def setUp(self):
+        super().setUp()
+        self.datos = generar_datos(250, semilla=3)
+
+    def test_streaming_reparte_en_hojas(self):
+        from openpyxl import load_workbook
+        ruta = CargadorDatos().guardar_como_excel(self.datos, 'salida', filas_por_hoja=100)
+
+        libro = load_workbook(ruta, read_only=True)
+        self.assertEqual(libro.sheetnames, ['Datos_1', 'Datos_2', 'Datos_3', 'Resumen'])
+        self.assertEqual(libro['Resumen']['B2'].value, 250)
+        libro.close()
+
+        leido = ExtractorDatos().leer_archivo_local(ruta, 'excel') # las tres hojas de datos, en orden
+        pd.testing.assert_frame_equal(leido, self.datos, check_dtype=False)
+
+        chunks = list(ExtractorDatos().leer_por_chunks(ruta, 'excel', tamano_chunk=60, columnas=['id', 'edad']))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 250)
+        self.assertEqual(list(chunks[0].columns), ['id', 'edad'])
+
+    def test_error_a_medias_no_deja_archivo(self):
+        with self.assertRaises(RuntimeError):
+            with EscritorExcel('salida.xlsx', filas_por_hoja=100) as escritor:
+                escritor.escribir(self.datos.iloc[:150])
+                raise RuntimeError("fallo durante la exportación")
+        self.assertFalse(os.path.exists('salida.xlsx'))
+
+    def test_hoja_con_columna_vacia_sin_avisos(self):
+        datos = self.datos.copy()
+        datos.loc[100:199, 'edad'] = np.nan # toda la columna vacía en la segunda hoja
+        ruta = CargadorDatos().guardar_como_excel(datos, 'salida', filas_por_hoja=100)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error') # el tipo de la columna no depende del comportamiento obsoleto de concat
+            leido = ExtractorDatos().leer_archivo_local(ruta, 'excel')
+
+        self.assertEqual(leido['edad'].dtype, np.float64)
+        pd.testing.assert_frame_equal(leido, datos, check_dtype=False)
+
+    def test_mismo_contenido_que_modo_normal(self):
+        cargador = CargadorDatos()
+        normal = cargador.guardar_como_excel(self.datos, 'normal', streaming=False)
+        streaming = cargador.guardar_como_excel(self.datos, 'streaming', streaming=True)
+        pd.testing.assert_frame_equal(pd.read_excel(streaming, sheet_name='Datos'), pd.read_excel(normal, sheet_name='Datos'))
+
+        with self.assertRaises(ValueError): # sin streaming no se puede repartir en hojas
+            cargador.guardar_como_excel(self.datos, 'normal', streaming=False, filas_por_hoja=100)
+
+
+class TestDeduplicacion(TestConCarpetaTemporal):
+    """Tests de los duplicados por clave y entre lotes"""
+
+    def test_clave_entre_lotes_y_persistencia(self):
+        deduplicador = Deduplicador(['id'], ruta='vistos.npz')
+        primero = pd.DataFrame({'id': [1, 2, 2, 3], 'valor': ['a', 'b', 'c', 'd']})
+        self.assertEqual(deduplicador.marcar_duplicadas(primero).tolist(), [False, False, True, False])
+        deduplicador.guardar()
+
+        # otra ejecución: el id 3 llega como float (chunk con nulos) y sigue siendo el mismo
+        siguiente = Deduplicador(['id'], ruta='vistos.npz')
+        segundo = pd.DataFrame({'id': [3.0, 4.0, None], 'valor': ['x', 'y', 'z']})
+        self.assertEqual(siguiente.descartar(segundo)['valor'].tolist(), ['y', 'z'])
+        self.assertEqual(len(siguiente), 5)
+
+        with self.assertRaises(ValueError): # huellas guardadas con otra clave
+            Deduplicador(['valor'], ruta='vistos.npz')
+
+    def test_bloom_no_deja_pasar_duplicados(self):
+        ids = np.random.default_rng(1).integers(0, 5000, 20_000)
+        esperado = pd.Series(ids).duplicated().to_numpy()
+        for modo, opciones in (('bloom', {'capacidad': 5000}), ('auto', {'max_mb': 0.01})):
+            with self.subTest(modo=modo):
+                deduplicador = Deduplicador(['id'], modo=modo, **opciones)
+                duplicadas = np.concatenate([deduplicador.marcar_duplicadas(pd.DataFrame({'id': ids[inicio:inicio + 3000]}))
+                                             for inicio in range(0, len(ids), 3000)])
+                self.assertTrue(duplicadas[esperado].all()) # un duplicado nunca se toma por nuevo
+                self.assertLess((duplicadas & ~esperado).sum(), 50) # falsos positivos acotados
+                self.assertEqual(deduplicador.estadisticas()['modo'], 'bloom')
+
+    def test_streaming_e_incremental_por_clave(self):
+        datos = pd.DataFrame({'id': [1, 2, 3, 2, 4, 1], 'nombre': ['ana', 'luis', 'eva', 'LUIS B', 'pedro', 'ana'],
+                              'edad': [30, 40, 50, 41, 60, 30], 'salario': [1000, 2000, 3000, 2100, 4000, 1000]})
+        datos.to_csv('entrada.csv', index=False)
+        resultado = ejecutar_etl_por_chunks('entrada.csv', 'salida', tamano_chunk=2, deduplicador=Deduplicador(['id']))
+        self.assertEqual(pd.read_csv(resultado['archivos_generados']['csv'])['id'].tolist(), [1, 2, 3, 4])
+
+        datos.head(3).to_csv('incremental.csv', index=False)
+        deduplicador = Deduplicador(['nombre'], ruta='data/estado/vistos.npz')
+        ejecutar_etl_incremental('incremental.csv', 'inc', marca='offset', deduplicador=deduplicador)
+        with open('incremental.csv', 'a', encoding='utf-8') as f:
+            f.write('7,  ANA ,33,1500\n8,marta,35,1800\n')
+        resultado = ejecutar_etl_incremental('incremental.csv', 'inc', marca='offset',
+                                             deduplicador=Deduplicador(['nombre'], ruta='data/estado/vistos.npz'))
+        self.assertEqual(resultado['registros_procesados'], 1) # 'Ana' ya llegó en la ejecución anterior
+        self.assertEqual(pd.read_csv('data/processed/inc.csv')['nombre'].tolist(), ['Ana', 'Luis', 'Eva', 'Marta'])
+
+
+class TestPipeline(TestConCarpetaTemporal):
+    """Tests del Pipeline perezoso: el plan no puede cambiar el resultado respecto a aplicar los pasos en orden"""
+
+    def setUp(self):
+        super().setUp()
+        datos = generar_datos(600, semilla=7)
+        datos.loc[::17, 'edad'] = None # nulos que limpiar rellena con la media de todas las filas
+        datos.loc[::23, 'salario'] = None
+        datos.loc[::31, 'edad'] = 150
+        pd.concat([datos, datos.head(20)]).to_csv('entrada.csv', index=False)
+
+    def test_mismo_resultado_que_pasos_en_orden(self):
+        transformador = TransformadorDatos()
+        esperado = transformador.agregar_columnas_calculadas(transformador.limpiar_datos(pd.read_csv('entrada.csv')))
+        esperado = esperado[esperado['edad'] >= 40].reset_index(drop=True)
+
+        plan = Pipeline('entrada.csv', tamano_chunk=150).limpiar().agregar_columnas_calculadas().filtrar('edad', '>=', 40)
+        resultado = plan.ejecutar()
+        # el orden de las categorías es el de aparición, que cambia al descartar filas antes; los valores no
+        pd.testing.assert_frame_equal(resultado, esperado, check_categorical=False)
+
+    def test_plan_empuja_filtros_y_columnas(self):
+        plan = (Pipeline('entrada.csv').filtrar('id', '>', 10).limpiar(eliminar_duplicados=False)
+                .agregar_columnas_calculadas().filtrar('edad', '<', 50).filtrar('ciudad', '==', 'Madrid')
+                .filtrar('categoria_edad', '==', 'Joven').seleccionar(['id', 'salario_anual']))
+        detalle = plan.plan()
+
+        self.assertEqual(detalle['columnas_leidas'], ['ciudad', 'edad', 'id', 'salario'])
+        self.assertEqual(detalle['filtros_antes'], [('id', '>', 10)])
+        # ciudad se normaliza al limpiar y categoria_edad no existe al leer: no se adelantan
+        self.assertEqual(detalle['filtros_despues'], [('edad', '>', 0), ('edad', '<', 120), ('salario', '>', 0), ('edad', '<', 50)])
+        self.assertEqual([etapa['tipo'] for etapa in detalle['etapas']], ['filtrar', 'limpiar', 'columnas', 'filtrar', 'seleccionar'])
+        self.assertEqual(len(detalle['etapas'][3]['condiciones']), 3) # los tres filtrar seguidos son una sola máscara
+        self.assertIn("Seleccionar ['id', 'salario_anual']", plan.explicar())
+
+        transformador = TransformadorDatos()
+        esperado = pd.read_csv('entrada.csv')
+        esperado = transformador.agregar_columnas_calculadas(
+            transformador.limpiar_datos(esperado[esperado['id'] > 10], eliminar_duplicados=False))
+        esperado = esperado[(esperado['edad'] < 50) & (esperado['ciudad'] == 'Madrid') & (esperado['categoria_edad'] == 'Joven')]
+        pd.testing.assert_frame_equal(plan.ejecutar(), esperado[['id', 'salario_anual']].reset_index(drop=True))
+
+
+class TestReglas(TestConCarpetaTemporal):
+    """Reglas de validación y columnas calculadas declaradas en configuración"""
+
+    def test_reglas_por_defecto_como_antes(self):
+        datos = pd.DataFrame({'edad': [25, 0, 45, 120, np.nan, 70], 'salario': [100.0, 50.0, -1.0, 10.0, 20.0, 30.0]})
+        self.assertEqual(REGLAS_EMPLEADOS.filas_invalidas(datos).tolist(), [False, True, True, True, True, False])
+        self.assertEqual(REGLAS_EMPLEADOS.expresion_filtros(), "(`edad` > 0) & (`edad` < 120) & (`salario` > 0)")
+
+        self.assertEqual(REGLAS_EMPLEADOS.agregar_columnas(datos), ['categoria_edad', 'salario_anual'])
+        self.assertEqual(datos['categoria_edad'].tolist(), ['Joven', 'Joven', 'Adulto', 'Senior', 'Desconocido', 'Senior'])
+        self.assertEqual(datos['salario_anual'].tolist(), [1200.0, 600.0, -12.0, 120.0, 240.0, 360.0])
+        self.assertEqual(REGLAS_EMPLEADOS.agregar_columnas(pd.DataFrame({'nombre': ['Ana']})), []) # sin sus columnas no se aplican
+
+    def test_reglas_desde_json(self):
+        with open('reglas.json', 'w', encoding='utf-8') as f:
+            json.dump({'filtros': [['edad', '>=', 18], ['ciudad', 'not in', ['Desconocido']]],
+                       'columnas': [{'nombre': 'salario_anual', 'expresion': 'salario * 14'},
+                                    {'nombre': 'neto', 'expresion': 'salario_anual * 0.8'},
+                                    {'nombre': 'tramo', 'casos': [['salario_anual > 30000 and not edad > 60', 'alto']],
+                                     'defecto': 'bajo'}]}, f)
+        reglas = ReglasDatos.cargar('reglas.json')
+        self.assertEqual(reglas.columnas_leidas(), {'salario', 'edad'})
+
+        datos = pd.DataFrame({'id': [1, 2, 3, 4], 'edad': [30, 16, 65, 40], 'ciudad': ['madrid', 'sevilla', 'bilbao', None],
+                              'salario': [3000.0, 1000.0, 2500.0, 1500.0]})
+        transformador = TransformadorDatos(reglas=reglas)
+        resultado = transformador.agregar_columnas_calculadas(transformador.limpiar_datos(datos))
+        self.assertEqual(resultado['id'].tolist(), [1, 3]) # menor de edad y ciudad nula ('Desconocido') descartadas
+        self.assertEqual(resultado['neto'].tolist(), [33600.0, 28000.0])
+        self.assertEqual(resultado['tramo'].tolist(), ['alto', 'bajo'])
+        self.assertNotIn('categoria_edad', resultado.columns)
+
+        # el mismo resultado en paralelo (las reglas viajan a otros procesos) y con el plan, que adelanta los filtros
+        paralelo = TransformadorDatos(reglas=reglas).limpiar_y_calcular_paralelo(datos, max_workers=2)
+        pd.testing.assert_frame_equal(paralelo.reset_index(drop=True), resultado.reset_index(drop=True), check_categorical=False)
+        datos.to_csv('entrada.csv', index=False)
+        plan = Pipeline('entrada.csv', transformador=TransformadorDatos(reglas=reglas)).limpiar().agregar_columnas_calculadas()
+        self.assertEqual(plan.plan()['filtros_despues'], [('edad', '>=', 18)]) # la de ciudad depende de la limpieza de textos
+        pd.testing.assert_frame_equal(plan.ejecutar(), resultado.reset_index(drop=True), check_categorical=False)
+
+    @unittest.skipUnless(numexpr_disponible(), "numexpr no está instalado")
+    def test_motor_numexpr_igual_que_numpy(self):
+        configuracion = {'filtros': [['edad', '>', 0], ['edad', '<', 120], ['salario', '>', 0]],
+                         'columnas': [{'nombre': 'salario_anual', 'expresion': 'salario * 14'},
+                                      {'nombre': 'neto', 'expresion': 'salario_anual * 0.8 - edad'}, # usa la anterior
+                                      {'nombre': 'tramo', 'casos': [['neto > 20000', 'alto']], 'defecto': 'bajo'}]}
+        datos = generar_datos(2_000, semilla=5)[['edad', 'salario']]
+        resultados = {}
+        for motor in ('numexpr', 'numpy'):
+            reglas = ReglasDatos.desde_dict({**configuracion, 'motor': motor})
+            copia = datos.copy()
+            resultados[motor] = (reglas.filas_invalidas(copia), reglas.agregar_columnas(copia), copia)
+
+        np.testing.assert_array_equal(resultados['numexpr'][0], resultados['numpy'][0])
+        self.assertEqual(resultados['numexpr'][1], ['salario_anual', 'neto', 'tramo'])
+        pd.testing.assert_frame_equal(resultados['numexpr'][2], resultados['numpy'][2])
+
+    def test_reglas_no_validas(self):
+        for columna in [{'nombre': 'x', 'expresion': 'edad.__class__'}, {'nombre': 'x', 'expresion': 'open(1)'},
+                        {'nombre': 'x', 'expresion': 'edad +'}, {'nombre': 'x'}, {'nombre': 'x y', 'expresion': '1'}]:
+            with self.assertRaises(ValueError):
+                ReglasDatos(columnas=[columna])
+        with self.assertRaises(ValueError):
+            ReglasDatos(filtros=[('edad', '=>', 1)])
+
+
 if __name__ == '__main__':
     unittest.main() # Esto ejecuta todos los tests cuando corremos este archivo directamente.
     # si __name_ es igual a _'_main_'_ significa que este archivo se está ejecutando directamente (no importado como módulo en otro archivo).
\ No newline at end of file